@@ -3,8 +3,6 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from config import get_config
-from api.routes.seo_analyzer import seo_analyzer_bp
-from api.routes.picpulse import picpulse_bp
 
 # Inicializar extensiones
 db = SQLAlchemy()
@@ -53,6 +51,7 @@ def create_app(config_object):
     from api.routes.snap_video import media_downloader_bp
     from api.routes.social_media_content import social_media_content_bp
     from api.routes.advanced_image_manipulation import advanced_image_bp
+    from api.routes.image_optimizer import image_optimizer_bp
     from api.routes.runwayml import runwayml_bp
     from api.routes.similarweb import similarweb_bp
     from api.routes.google_keyword_insight import keyword_insight_bp
@@ -68,6 +67,8 @@ def create_app(config_object):
     from api.routes.mediafy import mediafy_bp
     from api.routes.perplexity import perplexity_bp
     from api.routes.crypto_tracker import crypto_tracker_bp
+    from api.routes.jobs import jobs_bp
+    from api.routes.domain_intel import domain_intel_bp
 
     # Registrar blueprints con prefijos de versión
     version_prefix = f"/api/{app.config.get('MODE', 'beta_v1')}"
@@ -92,6 +93,7 @@ def create_app(config_object):
     app.register_blueprint(media_downloader_bp, url_prefix=f'{version_prefix}/media-downloader')
     app.register_blueprint(social_media_content_bp, url_prefix=f'{version_prefix}/social-media-content')
     app.register_blueprint(advanced_image_bp, url_prefix=f'{version_prefix}/image-manipulation')
+    app.register_blueprint(image_optimizer_bp, url_prefix=f'{version_prefix}/image-optimize')
     app.register_blueprint(runwayml_bp, url_prefix=f'{version_prefix}/runwayml')
     app.register_blueprint(similarweb_bp, url_prefix=f'{version_prefix}/similarweb')
     app.register_blueprint(keyword_insight_bp, url_prefix=f'{version_prefix}/keyword-insight')
@@ -107,11 +109,33 @@ def create_app(config_object):
     app.register_blueprint(mediafy_bp, url_prefix=f'{version_prefix}/mediafy')
     app.register_blueprint(perplexity_bp, url_prefix=f'{version_prefix}/perplexity')
     app.register_blueprint(crypto_tracker_bp, url_prefix=f'{version_prefix}/crypto-tracker')
+    app.register_blueprint(jobs_bp, url_prefix=f'{version_prefix}/jobs')
+    app.register_blueprint(domain_intel_bp, url_prefix=f'{version_prefix}/domain-intel')
     
     # Inicializar tracking global automático para todas las APIs
     from api.utils.global_tracking import init_global_tracking
     init_global_tracking(app)
     
+    # Presupuesto de tiempo por petición para las llamadas a proveedores externos
+    from api.utils.deadline import init_deadlines
+    init_deadlines(app)
+    
+    # Circuit breakers por proveedor: 503 inmediato (y devolución de créditos) si un host está caído
+    from api.utils.circuit_breaker import init_circuit_breakers
+    init_circuit_breakers(app)
+    
+    # Iniciar el ejecutor de cómputo (pool de procesos para el trabajo intensivo en CPU)
+    from api.utils.process_pool import init_compute_executor
+    init_compute_executor(app)
+    
+    # Iniciar el worker de trabajos asíncronos (consultas a RunwayML y retención de resultados)
+    from api.utils.jobs import start_job_worker
+    start_job_worker(app)
+    
+    # Iniciar el escáner de caducidad de certificados de las watchlists
+    from api.utils.ssl_watch import start_ssl_watch_scheduler
+    start_ssl_watch_scheduler(app)
+    
     # Configurar manejadores de errores
     from api.utils.error_handlers import register_error_handlers
     register_error_handlers(app)
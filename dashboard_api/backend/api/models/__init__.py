@@ -8,5 +8,8 @@ from .user import User
 from .seo_history import SEOHistory
 from .notification import Notification
 from .app import App, ApiUsage, UserApp
+from .job import Job
+from .domain_profile import DomainProfile
+from .ssl_watch import SSLWatch
 
-__all__ = ['db', 'User', 'SEOHistory', 'Notification', 'App', 'ApiUsage', 'UserApp'] 
\ No newline at end of file
+__all__ = ['db', 'User', 'SEOHistory', 'Notification', 'App', 'ApiUsage', 'UserApp', 'Job', 'DomainProfile', 'SSLWatch'] 
\ No newline at end of file
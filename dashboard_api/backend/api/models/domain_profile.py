@@ -0,0 +1,29 @@
+from datetime import datetime
+from api import db
+
+class DomainProfile(db.Model):
+    """Resultado de una fuente (WHOIS, SSL, DR...) para un dominio canónico"""
+    __tablename__ = 'domain_profiles'
+    __table_args__ = (
+        db.UniqueConstraint('domain', 'source', 'path', name='uq_domain_profiles_domain_source_path'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    domain = db.Column(db.String(253), nullable=False, index=True)
+    source = db.Column(db.String(50), nullable=False)  # 'whois', 'ssl', 'ahrefs', 'speed', ...
+    path = db.Column(db.String(512), nullable=False, default='/')  # '/' para datos del dominio completo
+    data = db.Column(db.JSON)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Convertir a diccionario para respuestas JSON"""
+        return {
+            'domain': self.domain,
+            'source': self.source,
+            'path': self.path,
+            'data': self.data,
+            'fetchedAt': self.fetched_at.isoformat() if self.fetched_at else None,
+        }
+
+    def __repr__(self):
+        return f'<DomainProfile {self.domain}{self.path}: {self.source}>'
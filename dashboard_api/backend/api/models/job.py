@@ -0,0 +1,62 @@
+import uuid
+import secrets
+from datetime import datetime
+from api import db
+
+class Job(db.Model):
+    """Modelo para trabajos asíncronos (generaciones en proveedores externos)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # Dos peticiones con la misma clave no pueden crear (y cobrar) dos trabajos
+        db.Index('uq_jobs_user_idempotency_key', 'user_id', 'idempotency_key', unique=True),
+    )
+
+    # Estados posibles de un trabajo
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    FINAL_STATUSES = (STATUS_SUCCEEDED, STATUS_FAILED)
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
+    kind = db.Column(db.String(50), nullable=False, index=True)  # 'runwayml', ...
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED, index=True)
+    upstream_id = db.Column(db.String(100), nullable=True, index=True)  # ID del task en el proveedor
+    callback_token = db.Column(db.String(64), unique=True, nullable=False, default=lambda: secrets.token_urlsafe(32))
+    payload = db.Column(db.JSON)
+    last_update = db.Column(db.JSON)  # Último estado reportado por el proveedor
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)  # Consultas de estado realizadas
+    idempotency_key = db.Column(db.String(100), nullable=True)
+    credits = db.Column(db.Integer, default=0)  # Créditos reservados, se reintegran si el trabajo falla
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # Fin de la retención del resultado
+    next_poll_at = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_final(self):
+        return self.status in self.FINAL_STATUSES
+
+    def to_dict(self):
+        """Convertir a diccionario para respuestas JSON"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'upstreamId': self.upstream_id,
+            'lastUpdate': self.last_update,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
+            'completedAt': self.completed_at.isoformat() if self.completed_at else None,
+            'expiresAt': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id}: {self.kind} - {self.status}>'
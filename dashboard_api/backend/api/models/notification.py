@@ -1,5 +1,5 @@
 from datetime import datetime
-from api.models import db
+from api import db
 
 class Notification(db.Model):
     """Modelo para las notificaciones de usuario"""
@@ -0,0 +1,44 @@
+from datetime import datetime
+from api import db
+
+class SSLWatch(db.Model):
+    """Dominio vigilado por un usuario para avisar antes de que caduque su certificado"""
+    __tablename__ = 'ssl_watchlist'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'host', 'port', name='uq_ssl_watchlist_user_host_port'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    host = db.Column(db.String(253), nullable=False)
+    port = db.Column(db.Integer, nullable=False, default=443)
+    issuer = db.Column(db.String(255), nullable=True)
+    valid_until = db.Column(db.DateTime, nullable=True)
+    days_left = db.Column(db.Integer, nullable=True)
+    is_valid = db.Column(db.Boolean, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    notified_threshold = db.Column(db.Integer, nullable=True)  # Menor umbral (días) ya notificado
+    last_checked_at = db.Column(db.DateTime, nullable=True)
+    next_check_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('ssl_watches', lazy='dynamic'))
+
+    def to_dict(self):
+        """Convertir a diccionario para respuestas JSON"""
+        return {
+            'id': self.id,
+            'host': self.host,
+            'port': self.port,
+            'issuer': self.issuer,
+            'validUntil': self.valid_until.isoformat() if self.valid_until else None,
+            'daysLeft': self.days_left,
+            'isValid': self.is_valid,
+            'lastError': self.last_error,
+            'lastCheckedAt': self.last_checked_at.isoformat() if self.last_checked_at else None,
+            'nextCheckAt': self.next_check_at.isoformat() if self.next_check_at else None,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f'<SSLWatch {self.host}:{self.port} user={self.user_id}>'
@@ -1,6 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
 import requests
 import os
+import base64
+import hashlib
+import logging
+
+from api.utils.credits_config import get_credits_cost
+from api.utils.decorators import credits_required
+from api.utils.image_engine import (
+    ImageEngineError, MAX_PIPELINE_STEPS, normalize_params, normalize_steps, run_pipeline
+)
+from api.utils.page_fetch import PageFetchError, fetch_page
+from api.utils.process_pool import ComputeTimeoutError, get_compute_executor
+from api.utils.result_cache import get_result_cache, canonical_key, get_tool_ttl, cache_bypassed
+from api.utils.rapidapi import upstream_get
+
+logger = logging.getLogger(__name__)
 
 advanced_image_bp = Blueprint('advanced_image', __name__)
 
@@ -15,9 +31,17 @@ ENDPOINTS = {
     'convert': 'convert',
 }
 
+# Operaciones que siguen en el proveedor remoto (no hay motor local para PDF)
+REMOTE_OPERATIONS = {'pdf_to_images'}
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
 @advanced_image_bp.route('', methods=['POST'])
+@jwt_required()
+@credits_required(amount=lambda: get_credits_cost('advanced_image_manipulation'))
 def image_manipulation():
-    data = request.json
+    """Aplica una operación a la imagen (motor local con Pillow; PDF a imágenes en el proveedor remoto)"""
+    data = request.json or {}
     operation = data.get('operation')
     source_url = data.get('source_url')
     params = data.get('params', {})
@@ -27,12 +51,141 @@ def image_manipulation():
     if not source_url:
         return jsonify({'error': 'La URL de la imagen es obligatoria'}), 400
 
+    if operation in REMOTE_OPERATIONS or current_app.config.get('IMAGE_MANIPULATION_ENGINE', 'local') != 'local':
+        return remote_manipulation(operation, source_url, params)
+
+    try:
+        params = normalize_params(operation, params)
+        data, content_type, width, height, hit = run_local_pipeline(source_url, [(operation, params)])
+    except PageFetchError as e:
+        return jsonify({'error': 'No se pudo descargar la imagen', 'details': e.message}), e.status_code
+    except ImageEngineError as e:
+        return jsonify({'error': str(e)}), 400
+    except ComputeTimeoutError:
+        return jsonify({'error': 'La transformación superó el tiempo máximo'}), 504
+
+    # Mismo formato que el proveedor ({"urls": [...]}), con la imagen como data URI
+    response = jsonify({
+        'urls': [f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"],
+        'content_type': content_type,
+        'width': width,
+        'height': height,
+        'bytes': len(data),
+        'operation': operation,
+        'params': params,
+        'provider': 'local'
+    })
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response, 200
+
+
+def pipeline_cost():
+    """Un cobro por operación de la cadena (como si se aplicaran por separado)"""
+    steps = (request.get_json(silent=True) or {}).get('operations')
+    count = len(steps) if isinstance(steps, list) else 1
+    return max(1, min(count, MAX_PIPELINE_STEPS)) * get_credits_cost('advanced_image_manipulation')
+
+
+@advanced_image_bp.route('/pipeline', methods=['POST'])
+@jwt_required()
+@credits_required(amount=pipeline_cost)
+def image_pipeline():
+    """
+    Aplica una cadena de operaciones en una sola pasada (una decodificación y
+    una codificación) y devuelve la imagen resultante en streaming
+
+    Body: {"source_url": "...", "operations": [{"operation": "crop", "params": {...}}, ...]}
+    """
+    data = request.json or {}
+    source_url = data.get('source_url')
+    if not source_url:
+        return jsonify({'error': 'La URL de la imagen es obligatoria'}), 400
+    steps = data.get('operations')
+    if isinstance(steps, list) and any(isinstance(step, dict) and step.get('operation') in REMOTE_OPERATIONS
+                                       for step in steps):
+        return jsonify({'error': 'pdf_to_images no se puede encadenar'}), 400
+
+    try:
+        steps = normalize_steps(steps)
+        image, content_type, width, height, hit = run_local_pipeline(source_url, steps)
+    except PageFetchError as e:
+        return jsonify({'error': 'No se pudo descargar la imagen', 'details': e.message}), e.status_code
+    except ImageEngineError as e:
+        return jsonify({'error': str(e)}), 400
+    except ComputeTimeoutError:
+        return jsonify({'error': 'La transformación superó el tiempo máximo'}), 504
+
+    extension = content_type.split('/')[-1]
+    return Response(
+        stream_bytes(image),
+        mimetype=content_type,
+        headers={
+            'Content-Length': str(len(image)),
+            'Content-Disposition': f'inline; filename="image.{extension}"',
+            'X-Image-Width': str(width),
+            'X-Image-Height': str(height),
+            'X-Cache': 'HIT' if hit else 'MISS'
+        }
+    )
+
+
+def stream_bytes(data):
+    """Entrega la imagen por bloques para no copiarla entera en la respuesta"""
+    view = memoryview(data)
+    for start in range(0, len(view), STREAM_CHUNK_SIZE):
+        yield bytes(view[start:start + STREAM_CHUNK_SIZE])
+
+
+def download_source(source_url):
+    """
+    Descarga la imagen de origen con el fetcher compartido (revalida la copia guardada)
+
+    Raises:
+        PageFetchError: si no se puede descargar, no responde 200 o supera IMAGE_SOURCE_MAX_BYTES
+    """
+    max_bytes = current_app.config.get('IMAGE_SOURCE_MAX_BYTES', 20 * 1024 * 1024)
+    page = fetch_page(source_url, binary=True, max_bytes=max_bytes)
+    if page.status_code != 200:
+        raise PageFetchError(f'La imagen respondió con estado {page.status_code}')
+    if page.truncated:
+        raise PageFetchError(f'La imagen supera el máximo de {max_bytes // (1024 * 1024)} MB', 413)
+    return page.content
+
+
+def run_local_pipeline(source_url, steps):
+    """
+    Ejecuta la cadena de operaciones en el pool de procesos, memoizando el
+    resultado por (hash del contenido, pasos normalizados). Una operación
+    suelta es una cadena de un paso y comparte la caché.
+
+    Returns:
+        tuple: (bytes, content_type, ancho, alto, acierto de caché)
+    """
+    content = download_source(source_url)
+    ttl = get_tool_ttl('image_transform')
+    use_cache = current_app.config.get('RESULT_CACHE_ENABLED', True) and ttl > 0
+    key = canonical_key('image_transform', {
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'steps': [{'operation': operation, 'params': params} for operation, params in steps]
+    })
+    if use_cache and not cache_bypassed():
+        cached = get_result_cache().get(key)
+        if cached is not None:
+            return (*cached, True)
+
+    result = get_compute_executor().run(
+        run_pipeline, content, steps,
+        timeout=current_app.config.get('IMAGE_TRANSFORM_TIMEOUT', 15), name='image_transform'
+    )
+    if use_cache:
+        get_result_cache().set(key, result, ttl, size=len(result[0]))
+    return (*result, False)
+
+
+def remote_manipulation(operation, source_url, params):
+    """Operación en el proveedor remoto (pdf_to_images o IMAGE_MANIPULATION_ENGINE='rapidapi')"""
     url = f"https://advanced-image-manipulation-api.p.rapidapi.com/{ENDPOINTS[operation]}"
     querystring = {'source_url': source_url}
-    
-    # Agregar timestamp para evitar caché
-    import time
-    querystring['_t'] = str(int(time.time()))
 
     if operation == 'convert':
         convert_to = params.get('convert_to')
@@ -79,7 +232,7 @@ def image_manipulation():
         print(f"[IMAGE MANIPULATION] URL: {url}")
         print(f"[IMAGE MANIPULATION] Source URL: {source_url}")
         print(f"[IMAGE MANIPULATION] Params: {querystring}")
-        response = requests.get(url, headers=headers, params=querystring, timeout=20)
+        response = upstream_get(url, headers=headers, params=querystring, timeout=20)
         response.raise_for_status()
         data = response.json()
         print(f"[IMAGE MANIPULATION] Response: {data}")
@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
 import requests
+from api.utils.domain_intel import map_authority_result
+from api.utils.canonical import canonical_domain
+from api.utils.domain_profiles import stored_facet, save_facet, profile_response
+from api.utils.rapidapi import upstream_get
 
 ahrefs_dr_bp = Blueprint('ahrefs_dr', __name__)
 
@@ -10,13 +14,14 @@ def ahrefs_authority():
     if not url_param:
         return jsonify({'error': 'El campo "url" es obligatorio.'}), 400
     
-    # Asegurarnos de que la URL tenga el formato correcto
-    if not url_param.startswith(('http://', 'https://')):
-        url_param = 'https://' + url_param
-    
-    # Extraer el dominio de la URL
-    from urllib.parse import urlparse
-    domain = urlparse(url_param).netloc
+    # El DR varía lentamente: se reutiliza el perfil guardado mientras siga fresco
+    profile_domain = canonical_domain(url_param)
+    if not profile_domain:
+        return jsonify({'error': 'Dominio inválido.'}), 400
+    domain = profile_domain
+    stored = stored_facet(profile_domain, 'ahrefs')
+    if stored is not None:
+        return profile_response(stored, hit=True)
     
     url = f"https://{current_app.config['RAPIDAPI_AHREFS_HOST']}/domain-metrics/{domain}"
     headers = {
@@ -29,7 +34,7 @@ def ahrefs_authority():
     print(f"Headers: {headers}")
     
     try:
-        response = requests.get(url, headers=headers, timeout=20)
+        response = upstream_get(url, headers=headers, timeout=20)
         print(f"Response status code: {response.status_code}")
         print(f"Response headers: {response.headers}")
         print(f"Response text: {response.text}")
@@ -38,18 +43,12 @@ def ahrefs_authority():
         data = response.json()
         
         # Mapear los datos relevantes de la respuesta
-        result = {
-            'domainRating': data.get('ahrefsDR', 0),
-            'urlRating': data.get('ahrefsRank', 0),
-            'backlinks': data.get('ahrefsBacklinks', 0),
-            'refdomains': data.get('ahrefsRefDomains', 0),
-            'traffic': data.get('ahrefsTraffic', 0),
-            'trafficValue': data.get('ahrefsTrafficValue', 0),
-            'organicKeywords': data.get('ahrefsOrganicKeywords', 0)
-        }
+        result = map_authority_result(data)
         
         print("Domain Metrics API response (backend):", result)
-        return jsonify(result), 200
+        if profile_domain:
+            save_facet(profile_domain, 'ahrefs', result)
+        return profile_response(result, hit=False)
     except requests.exceptions.HTTPError as errh:
         print(f"HTTP Error: {errh}")
         print(f"Response text: {response.text}")
@@ -80,7 +79,7 @@ def ahrefs_backlinks():
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
         data = response.json()
         print("Ahrefs Backlinks API response (backend):", data)
@@ -112,7 +111,7 @@ def ahrefs_broken_links():
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
         data = response.json()
         print("Ahrefs Broken Links API response (backend):", data)
@@ -144,7 +143,7 @@ def ahrefs_traffic():
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
         data = response.json()
         print("Ahrefs Traffic API response (backend):", data)
@@ -172,7 +171,7 @@ def ahrefs_keyword_difficulty():
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
         data = response.json()
         print("Ahrefs Keyword Difficulty API response (backend):", data)
@@ -201,7 +200,7 @@ def ahrefs_keyword_suggestions():
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
         data = response.json()
         print("Ahrefs Keyword Suggestions API response (backend):", data)
@@ -1,10 +1,17 @@
 """Módulo para humanización de texto AI"""
-from flask import Blueprint, request, jsonify
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required
 import requests
 import os
 import logging
+from api.utils.deadline import DeadlineExceeded, mark_exceeded
 from api.utils.decorators import credits_required
+from api.utils.error_handlers import ValidationError
+from api.utils.result_cache import memoized
+from api.utils.text_chunks import chunk_document, process_chunks, reassemble
+from api.utils.rapidapi import upstream_post
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -12,6 +19,129 @@ logger = logging.getLogger(__name__)
 # Crear blueprint
 ai_humanizer_bp = Blueprint('ai_humanizer', __name__)
 
+HUMANIZER_BASE_URL = "https://humanizer-apis.p.rapidapi.com/humanizer"
+# Límite de palabras que acepta el proveedor en una sola petición
+SINGLE_REQUEST_MAX_WORDS = 1980
+
+
+def get_humanizer_headers():
+    """Headers para la API de Humanizer"""
+    return {
+        "x-rapidapi-key": os.environ.get('RAPIDAPI_KEY', ''),
+        "x-rapidapi-host": "humanizer-apis.p.rapidapi.com",
+        "Content-Type": "application/json"
+    }
+
+
+def is_retryable_error(error):
+    """Timeouts, errores de conexión, 429 y 5xx se reintentan; el resto de 4xx no"""
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, requests.exceptions.RequestException)
+
+
+def humanize_document(endpoint, text, level, tone, skip_code, skip_markdown):
+    """
+    Humaniza un documento largo: lo divide en fragmentos por párrafos/oraciones,
+    los envía en paralelo al proveedor (con reintentos por fragmento) y devuelve
+    las respuestas en el orden del documento.
+
+    Returns:
+        list: Tuplas (texto original del fragmento, respuesta JSON o None si se saltó)
+    """
+    config = current_app.config
+    chunks = chunk_document(
+        text,
+        config.get('HUMANIZER_CHUNK_WORDS', 500),
+        skip_code=skip_code,
+        skip_markdown=skip_markdown
+    )
+
+    # Los fragmentos corren en hilos del pool: cada uno abre un contexto de la app
+    # (configuración, pool de claves, circuit breakers) con el plazo de la petición
+    app = current_app._get_current_object()
+    deadline = g.get('deadline')
+
+    def humanize_chunk(chunk_text):
+        with app.app_context():
+            g.deadline = deadline
+            return post_chunk(chunk_text)
+
+    def post_chunk(chunk_text):
+        payload = {
+            "text": chunk_text,
+            "level": level,
+            "model": "humanizer",
+            "options": {
+                "tone": tone,
+                "skipCode": skip_code,
+                "skipMarkdown": skip_markdown,
+                "skipQuotation": False
+            }
+        }
+        response = upstream_post(f"{HUMANIZER_BASE_URL}/{endpoint}", json=payload, headers=get_humanizer_headers(), timeout=20)
+        response.raise_for_status()
+        return response.json()
+
+    logger.debug(f"Humanizando documento en {len(chunks)} fragmentos ({endpoint})")
+    try:
+        return process_chunks(
+            chunks,
+            humanize_chunk,
+            max_workers=config.get('HUMANIZER_MAX_WORKERS', 4),
+            retries=config.get('HUMANIZER_CHUNK_RETRIES', 2),
+            should_retry=is_retryable_error,
+            deadline=deadline
+        )
+    except (FutureTimeoutError, DeadlineExceeded):
+        raise mark_exceeded() from None
+
+
+def humanizer_cost(credits_per_call):
+    """
+    Costo dinámico para credits_required: credits_per_call por cada llamada al
+    proveedor (una, o una por fragmento en documentos largos). El documento se
+    valida antes de cobrar.
+    """
+    def cost():
+        data = request.get_json(silent=True) or {}
+        text = data.get('text')
+        if not text:
+            raise ValidationError('El campo "text" es obligatorio.')
+        word_count = len(text.split())
+        max_words = current_app.config.get('HUMANIZER_MAX_WORDS', 20000)
+        if word_count > max_words:
+            raise ValidationError(f'El texto excede el límite de {max_words} palabras. Actual: {word_count} palabras.')
+        if word_count <= SINGLE_REQUEST_MAX_WORDS:
+            return credits_per_call
+        content_type = data.get('type', 'text')
+        chunks = chunk_document(
+            text,
+            current_app.config.get('HUMANIZER_CHUNK_WORDS', 500),
+            skip_code=content_type == 'code',
+            skip_markdown=content_type in ['code', 'article']
+        )
+        return credits_per_call * max(1, sum(1 for _, process in chunks if process))
+    return cost
+
+
+def get_word_limit_error(word_count):
+    """Respuesta de error si el documento supera el máximo permitido (None si es válido)"""
+    max_words = current_app.config.get('HUMANIZER_MAX_WORDS', 20000)
+    if word_count > max_words:
+        return jsonify({'error': f'El texto excede el límite de {max_words} palabras. Actual: {word_count} palabras.'}), 400
+    return None
+
+
+def best_alternatives_text(response_data):
+    """Texto formado por la mejor alternativa (menor probabilidad AI) de cada oración"""
+    sentences = []
+    for sentence_data in response_data if isinstance(response_data, list) else []:
+        options = sentence_data.get('alternatives') or []
+        best = min(options, key=lambda alt: alt.get('ai_probability', 0)) if options else None
+        sentences.append(best.get('sentence', '') if best else sentence_data.get('original', ''))
+    return ' '.join(sentence for sentence in sentences if sentence)
+
 @ai_humanizer_bp.route('/test', methods=['POST'])
 def ai_humanizer_test():
     """Endpoint de prueba para AI Humanizer"""
@@ -28,7 +158,8 @@ def ai_humanizer_test():
 
 @ai_humanizer_bp.route('/', methods=['POST'])
 @jwt_required()
-@credits_required(amount=2)  # AI Humanizer cuesta 2 créditos
+@memoized('ai_humanizer', cost=humanizer_cost(2))
+@credits_required(amount=humanizer_cost(2))  # 2 créditos por llamada al proveedor
 def ai_humanizer():
     try:
         data = request.json
@@ -39,10 +170,11 @@ def ai_humanizer():
         if not text:
             return jsonify({'error': 'El campo "text" es obligatorio.'}), 400
 
-        # Validar longitud del texto (máximo 1980 palabras)
+        # Validar longitud del texto (los documentos largos se procesan por fragmentos)
         word_count = len(text.split())
-        if word_count > 1980:
-            return jsonify({'error': f'El texto excede el límite de 1980 palabras. Actual: {word_count} palabras.'}), 400
+        limit_error = get_word_limit_error(word_count)
+        if limit_error:
+            return limit_error
 
         # Mapear parámetros del frontend
         level = data.get('level', 7)  # Default medio
@@ -53,38 +185,42 @@ def ai_humanizer():
         skip_code = content_type == 'code'
         skip_markdown = content_type in ['code', 'article']
         
-        url = "https://humanizer-apis.p.rapidapi.com/humanizer/language"
-        
-        payload = {
-            "text": text,
-            "level": level,
-            "model": "humanizer",
-            "options": {
-                "tone": tone,
-                "skipCode": skip_code,
-                "skipMarkdown": skip_markdown,
-                "skipQuotation": False
+        chunk_count = 1
+        if word_count > SINGLE_REQUEST_MAX_WORDS:
+            # Documento largo: fragmentos en paralelo reensamblados en orden
+            results = humanize_document('language', text, level, tone, skip_code, skip_markdown)
+            chunk_count = sum(1 for _, result in results if result is not None)
+            humanized_text = reassemble(
+                results,
+                lambda response_data: response_data.get("humanized_text", "")
+            )
+        else:
+            url = f"{HUMANIZER_BASE_URL}/language"
+            
+            payload = {
+                "text": text,
+                "level": level,
+                "model": "humanizer",
+                "options": {
+                    "tone": tone,
+                    "skipCode": skip_code,
+                    "skipMarkdown": skip_markdown,
+                    "skipQuotation": False
+                }
             }
-        }
-        
-        headers = {
-            "x-rapidapi-key": os.environ.get('RAPIDAPI_KEY', ''),
-            "x-rapidapi-host": "humanizer-apis.p.rapidapi.com",
-            "Content-Type": "application/json"
-        }
 
-        logger.debug(f"Enviando solicitud a: {url}")
-        logger.debug(f"Payload: {payload}")
-        
-        response = requests.post(url, json=payload, headers=headers, timeout=20)
-        response.raise_for_status()
-        
-        # Log de la respuesta raw
-        logger.debug(f"Respuesta raw de la API: {response.text}")
-        
-        # La API devuelve {"humanized_text": "..."}
-        response_data = response.json()
-        humanized_text = response_data.get("humanized_text", text)
+            logger.debug(f"Enviando solicitud a: {url}")
+            logger.debug(f"Payload: {payload}")
+            
+            response = upstream_post(url, json=payload, headers=get_humanizer_headers(), timeout=20)
+            response.raise_for_status()
+            
+            # Log de la respuesta raw
+            logger.debug(f"Respuesta raw de la API: {response.text}")
+            
+            # La API devuelve {"humanized_text": "..."}
+            response_data = response.json()
+            humanized_text = response_data.get("humanized_text", text)
         logger.debug(f"Texto humanizado: {humanized_text}")
         
         # Devolvemos el texto humanizado y los metadatos
@@ -96,7 +232,8 @@ def ai_humanizer():
                 "tono": tone,
                 "longitud": f"nivel_{level}",
                 "palabras_originales": word_count,
-                "palabras_humanizadas": len(humanized_text.split())
+                "palabras_humanizadas": len(humanized_text.split()),
+                "fragmentos": chunk_count
             }
         }
         
@@ -105,11 +242,13 @@ def ai_humanizer():
 
     except requests.exceptions.HTTPError as errh:
         logger.error(f"Error HTTP en AI Humanizer: {str(errh)}")
+        # En documentos largos la respuesta fallida es la del fragmento
+        response = errh.response
         error_response = {
             'error': str(errh),
-            'details': response.text if 'response' in locals() else 'No response available'
+            'details': response.text if response is not None else 'No response available'
         }
-        return jsonify(error_response), response.status_code if 'response' in locals() else 500
+        return jsonify(error_response), response.status_code if response is not None else 500
 
     except requests.exceptions.RequestException as err:
         logger.error(f"Error de conexión en AI Humanizer: {str(err)}")
@@ -136,7 +275,8 @@ def ai_humanizer():
 
 @ai_humanizer_bp.route('/basic', methods=['POST'])
 @jwt_required()
-@credits_required(amount=1)  # AI Humanizer Basic cuesta 1 crédito
+@memoized('ai_humanizer_basic', cost=humanizer_cost(1))
+@credits_required(amount=humanizer_cost(1))  # 1 crédito por llamada al proveedor
 def ai_humanizer_basic():
     """Endpoint para modo Basic que devuelve alternativas con scores"""
     try:
@@ -148,10 +288,11 @@ def ai_humanizer_basic():
         if not text:
             return jsonify({'error': 'El campo "text" es obligatorio.'}), 400
 
-        # Validar longitud del texto
+        # Validar longitud del texto (los documentos largos se procesan por fragmentos)
         word_count = len(text.split())
-        if word_count > 1980:
-            return jsonify({'error': f'El texto excede el límite de 1980 palabras. Actual: {word_count} palabras.'}), 400
+        limit_error = get_word_limit_error(word_count)
+        if limit_error:
+            return limit_error
 
         # Mapear parámetros
         level = data.get('level', 7)
@@ -161,33 +302,35 @@ def ai_humanizer_basic():
         skip_code = content_type == 'code'
         skip_markdown = content_type in ['code', 'article']
         
-        url = "https://humanizer-apis.p.rapidapi.com/humanizer/basic"
-        
-        payload = {
-            "text": text,
-            "level": level,
-            "model": "humanizer",
-            "options": {
-                "tone": tone,
-                "skipCode": skip_code,
-                "skipMarkdown": skip_markdown,
-                "skipQuotation": False
+        if word_count > SINGLE_REQUEST_MAX_WORDS:
+            # Documento largo: cada fragmento aporta sus oraciones con alternativas
+            results = humanize_document('basic', text, level, tone, skip_code, skip_markdown)
+            responses = [result for _, result in results if isinstance(result, list)]
+            response_data = [sentence_data for result in responses for sentence_data in result]
+            document_text = reassemble(results, best_alternatives_text)
+        else:
+            url = f"{HUMANIZER_BASE_URL}/basic"
+            
+            payload = {
+                "text": text,
+                "level": level,
+                "model": "humanizer",
+                "options": {
+                    "tone": tone,
+                    "skipCode": skip_code,
+                    "skipMarkdown": skip_markdown,
+                    "skipQuotation": False
+                }
             }
-        }
-        
-        headers = {
-            "x-rapidapi-key": os.environ.get('RAPIDAPI_KEY', ''),
-            "x-rapidapi-host": "humanizer-apis.p.rapidapi.com",
-            "Content-Type": "application/json"
-        }
 
-        logger.debug(f"Enviando solicitud Basic a: {url}")
-        logger.debug(f"Payload: {payload}")
-        
-        response = requests.post(url, json=payload, headers=headers, timeout=20)
-        response.raise_for_status()
-        
-        response_data = response.json()
+            logger.debug(f"Enviando solicitud Basic a: {url}")
+            logger.debug(f"Payload: {payload}")
+            
+            response = upstream_post(url, json=payload, headers=get_humanizer_headers(), timeout=20)
+            response.raise_for_status()
+            
+            response_data = response.json()
+            document_text = None
         logger.debug(f"Respuesta Basic: {response_data}")
         
         # Procesar alternativas
@@ -205,8 +348,13 @@ def ai_humanizer_basic():
         # Obtener la mejor alternativa (menor probabilidad AI)
         best_alternative = min(alternatives, key=lambda x: x['probabilidad_ai']) if alternatives else None
         
+        if document_text is not None:
+            generated = document_text
+        else:
+            generated = best_alternative['texto'] if best_alternative else text
+        
         result = {
-            "contenido_generado": best_alternative['texto'] if best_alternative else text,
+            "contenido_generado": generated,
             "alternativas": alternatives,
             "metadatos": {
                 "tipo": content_type,
@@ -224,11 +372,13 @@ def ai_humanizer_basic():
 
     except requests.exceptions.HTTPError as errh:
         logger.error(f"Error HTTP en AI Humanizer Basic: {str(errh)}")
+        # En documentos largos la respuesta fallida es la del fragmento
+        response = errh.response
         error_response = {
             'error': str(errh),
-            'details': response.text if 'response' in locals() else 'No response available'
+            'details': response.text if response is not None else 'No response available'
         }
-        return jsonify(error_response), response.status_code if 'response' in locals() else 500
+        return jsonify(error_response), response.status_code if response is not None else 500
 
     except requests.exceptions.RequestException as err:
         logger.error(f"Error de conexión en AI Humanizer Basic: {str(err)}")
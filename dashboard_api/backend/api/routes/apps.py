@@ -2,7 +2,6 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from marshmallow import ValidationError
 import os
-import requests
 from flask import current_app
 import logging
 
@@ -12,6 +11,7 @@ from api.models.user import User
 from api.utils.schemas import AppSchema, ApiUsageSchema
 from api.utils.error_handlers import ResourceNotFoundError, ValidationError as ApiValidationError
 from api.utils.decorators import credits_required
+from api.utils.qr_engine import render_qr, QRRenderError
 
 # Crear blueprint
 apps_bp = Blueprint('apps', __name__)
@@ -511,55 +511,15 @@ def toggle_favorite_app(app_id):
 
 @apps_bp.route('/generate-qr', methods=['POST'])
 def generate_qr():
-    """Genera un código QR SVG usando la nueva API y retorna el SVG como string plano"""
+    """Genera un código QR SVG con el motor local y retorna el SVG como string plano"""
     req_data = request.get_json()
     if not req_data or 'data' not in req_data:
         return jsonify({'error': 'Falta el campo data'}), 400
-    qr_data = req_data['data']
-    rapidapi_key = current_app.config.get('RAPIDAPI_KEY')
-    url = 'https://smart-qr-code-with-logo.p.rapidapi.com/generate_svg'
-    headers = {
-        'content-type': 'application/json',
-        'x-rapidapi-key': rapidapi_key,
-        'x-rapidapi-host': 'smart-qr-code-with-logo.p.rapidapi.com',
-    }
-    payload = {
-        'text': qr_data
-    }
     try:
-        logging.info(f"Enviando request a API externa con payload: {payload}")
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
-        logging.info(f"Response status: {response.status_code}, Content-Type: {response.headers.get('content-type')}")
-        
-        if response.status_code != 200:
-            try:
-                return jsonify(response.json()), response.status_code
-            except Exception:
-                return jsonify({'error': 'Error al generar el QR', 'details': response.text}), response.status_code
-        
-        # La API devuelve SVG como texto plano, manejar encoding correctamente
-        try:
-            logging.info("Intentando decodificar respuesta como UTF-8")
-            svg = response.content.decode('utf-8')
-            logging.info(f"SVG decodificado exitosamente, longitud: {len(svg)}")
-        except UnicodeDecodeError as e:
-            logging.warning(f"Error UTF-8: {e}, intentando latin-1")
-            svg = response.content.decode('latin-1')
-            logging.info(f"SVG decodificado con latin-1, longitud: {len(svg)}")
-        
-        if not svg.strip():
-            return jsonify({'error': 'SVG vacío recibido de la API externa'}), 500
-            
-        logging.info(f"Primeros 100 caracteres del SVG: {repr(svg[:100])}")
-        
-        # Validar que sea SVG (más flexible)
-        svg_lower = svg.strip().lower()
-        if not ('<svg' in svg_lower):
-            return jsonify({'error': 'Respuesta no es SVG válido', 'details': svg[:200]}), 500
-        
-        logging.info("SVG válido recibido, enviando al frontend")
-        return jsonify({'svg': svg}), 200
-        
+        svg, _ = render_qr(req_data['data'], {'output_format': 'svg'})
+        return jsonify({'svg': svg.decode('utf-8')}), 200
+    except QRRenderError as e:
+        return jsonify({'error': 'Error al generar el QR', 'details': str(e)}), 400
     except Exception as e:
         logging.error(f"Error en generate_qr: {str(e)}", exc_info=True)
-        return jsonify({'error': 'Error interno al generar el QR', 'details': str(e), 'type': type(e).__name__}), 500 
\ No newline at end of file
+        return jsonify({'error': 'Error interno al generar el QR', 'details': str(e), 'type': type(e).__name__}), 500
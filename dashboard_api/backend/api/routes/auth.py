@@ -9,13 +9,13 @@ from marshmallow import ValidationError
 import secrets
 import datetime
 import os
-import requests
 from urllib.parse import urlencode
 
 from api import db
 from api.models.user import User
 from api.utils.schemas import UserSchema, LoginSchema, ChangePasswordSchema
 from api.utils.error_handlers import AuthenticationError, ValidationError as ApiValidationError
+from api.utils.rapidapi import upstream_get, upstream_post
 from utils.version_control import require_version
 
 # Crear blueprint
@@ -77,7 +77,7 @@ def google_auth_callback():
             'redirect_uri': GOOGLE_REDIRECT_URI
         }
         
-        response = requests.post(token_url, data=token_data)
+        response = upstream_post(token_url, data=token_data)
         if response.status_code != 200:
             raise ApiValidationError("Error al obtener tokens de Google")
         
@@ -87,7 +87,7 @@ def google_auth_callback():
         # Obtener información del usuario
         user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
         headers = {'Authorization': f'Bearer {access_token}'}
-        user_response = requests.get(user_info_url, headers=headers)
+        user_response = upstream_get(user_info_url, headers=headers)
         
         if user_response.status_code != 200:
             raise ApiValidationError("Error al obtener información del usuario")
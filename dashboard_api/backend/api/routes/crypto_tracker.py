@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-import requests
 import logging
 from api.utils.decorators import credits_required
+from api.utils.rapidapi import upstream_get
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +36,7 @@ def get_daily_ohlcv():
         }
         
         logger.info(f"[CryptoTracker] Obteniendo datos OHLCV diarios, limit: {limit}, page: {page}")
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = upstream_get(url, headers=headers, params=params, timeout=10)
         
         if response.status_code != 200:
             return jsonify({
@@ -80,7 +80,7 @@ def get_hourly_ohlcv():
         }
         
         logger.info(f"[CryptoTracker] Obteniendo datos OHLCV por hora, limit: {limit}, page: {page}")
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = upstream_get(url, headers=headers, params=params, timeout=10)
         
         if response.status_code != 200:
             return jsonify({
@@ -117,7 +117,7 @@ def get_market_overview():
         params = {'limit': '100', 'page': '1'}
         
         logger.info(f"[CryptoTracker] Obteniendo resumen del mercado")
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = upstream_get(url, headers=headers, params=params, timeout=10)
         
         if response.status_code != 200:
             return jsonify({
@@ -191,7 +191,7 @@ def get_top_tokens():
         params = {'limit': '100', 'page': '1'}
         
         logger.info(f"[CryptoTracker] Obteniendo tokens más populares")
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = upstream_get(url, headers=headers, params=params, timeout=10)
         
         if response.status_code != 200:
             return jsonify({
@@ -251,7 +251,7 @@ def get_real_time_data():
         params = {'limit': '50', 'page': '1'}
         
         logger.info(f"[CryptoTracker] Obteniendo datos en tiempo real")
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = upstream_get(url, headers=headers, params=params, timeout=10)
         
         if response.status_code != 200:
             return jsonify({
@@ -318,7 +318,7 @@ def get_token_list():
         }
         
         logger.info(f"[CryptoTracker] Obteniendo lista de tokens, limit: {limit}, page: {page}")
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = upstream_get(url, headers=headers, params=params, timeout=10)
         
         if response.status_code != 200:
             return jsonify({
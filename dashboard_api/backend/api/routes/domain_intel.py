@@ -0,0 +1,107 @@
+import json
+import logging
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from api.utils.decorators import charge_credits, refund_credits
+from api.utils.domain_intel import CHECKS, parse_domains, run_bulk_checks
+from api.utils.canonical import canonical_domain
+from api.utils.domain_profiles import get_profile
+from api.utils.result_cache import get_hit_cost
+
+domain_intel_bp = Blueprint('domain_intel', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_BULK_DOMAINS = 500
+
+
+def get_domain_values(data):
+    """Lista de dominios del body: array 'domains' o texto con uno por línea/coma"""
+    values = data.get('domains')
+    if isinstance(values, str):
+        values = values.replace(',', '\n').splitlines()
+    if not isinstance(values, list):
+        return None
+    return [value for value in values if not isinstance(value, str) or value.strip()]
+
+
+def ndjson_line(data):
+    return json.dumps(data, ensure_ascii=False) + '\n'
+
+@domain_intel_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_domain_intel():
+    """
+    Ejecuta varios checks (whois, ssl, ahrefs, similarweb) sobre una lista de
+    dominios y devuelve NDJSON: una línea por dominio en cuanto termina y una
+    línea final de resumen. Los créditos de los checks fallidos se reintegran
+    y los resultados reutilizados de caché se cobran con descuento.
+    """
+    data = request.get_json(silent=True) or {}
+    values = get_domain_values(data)
+    if not values:
+        return jsonify({'error': 'El campo "domains" es obligatorio (lista de dominios)'}), 400
+
+    checks = data.get('checks') or list(CHECKS)
+    unknown = [check for check in checks if check not in CHECKS]
+    if unknown:
+        return jsonify({'error': f'Checks no soportados: {", ".join(map(str, unknown))}', 'available': list(CHECKS)}), 400
+    checks = list(dict.fromkeys(checks))
+
+    try:
+        domains, invalid = parse_domains(values, current_app.config.get('DOMAIN_INTEL_MAX_DOMAINS', MAX_BULK_DOMAINS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not domains:
+        return jsonify({'error': 'Ningún dominio válido', 'invalid': invalid}), 400
+
+    # Reserva de créditos: checks x dominios; se liquida al terminar el stream
+    user_id = get_jwt_identity()
+    check_costs = {check: CHECKS[check][2] for check in checks}
+    reserved, error = charge_credits(user_id, sum(check_costs.values()) * len(domains))
+    if error:
+        return error
+
+    use_cache = data.get('cache') != 'bypass'
+    app = current_app._get_current_object()
+
+    def generate():
+        refund = 0
+        completed = 0
+        try:
+            for value in invalid:
+                yield ndjson_line({'type': 'invalid', 'input': value})
+            for report in run_bulk_checks(app, list(domains), checks, use_cache):
+                completed += 1
+                report['input'] = domains[report['domain']]
+                if reserved:
+                    refund += sum(check_costs[check] for check in report['errors'])
+                    refund += sum(check_costs[check] - get_hit_cost(check_costs[check]) for check in report['cached'])
+                yield ndjson_line(dict(report, type='domain'))
+        finally:
+            if reserved:
+                # Lo no entregado (p. ej. si el cliente se desconecta) también se devuelve
+                refund += sum(check_costs.values()) * (len(domains) - completed)
+                refund_credits(user_id, refund)
+        yield ndjson_line({
+            'type': 'summary',
+            'domains': len(domains),
+            'invalid': len(invalid),
+            'checks': checks,
+            'credits_charged': reserved - refund if reserved else 0
+        })
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@domain_intel_bp.route('/profile/<path:domain>', methods=['GET'])
+@jwt_required()
+def domain_profile(domain):
+    """Perfil guardado del dominio: cada fuente con su fecha de consulta y si sigue fresca"""
+    canonical = canonical_domain(domain)
+    if not canonical:
+        return jsonify({'error': 'Dominio inválido'}), 400
+    return jsonify(get_profile(canonical)), 200
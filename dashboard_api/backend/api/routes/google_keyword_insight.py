@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify, current_app
 import requests
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.rapidapi import upstream_get
 
 keyword_insight_bp = Blueprint('keyword_insight', __name__)
 
@@ -40,7 +41,7 @@ def keyword_insight():
         "x-rapidapi-host": "google-keyword-insight1.p.rapidapi.com"
     }
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
         return jsonify(response.json()), 200
     except requests.exceptions.HTTPError as errh:
@@ -57,7 +58,7 @@ def get_locations():
         "x-rapidapi-host": "google-keyword-insight1.p.rapidapi.com"
     }
     try:
-        response = requests.get(url, headers=headers, timeout=20)
+        response = upstream_get(url, headers=headers, timeout=20)
         response.raise_for_status()
         return jsonify(response.json()), 200
     except requests.exceptions.RequestException as err:
@@ -72,7 +73,7 @@ def get_languages():
         "x-rapidapi-host": "google-keyword-insight1.p.rapidapi.com"
     }
     try:
-        response = requests.get(url, headers=headers, timeout=20)
+        response = upstream_get(url, headers=headers, timeout=20)
         response.raise_for_status()
         return jsonify(response.json()), 200
     except requests.exceptions.RequestException as err:
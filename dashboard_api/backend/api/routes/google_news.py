@@ -3,6 +3,7 @@ import requests
 from flask import Blueprint, jsonify, current_app, request, Response
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.rapidapi import upstream_get
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ def get_world_news():
         
         logger.info(f"Obteniendo noticias del mundo con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -56,7 +57,7 @@ def get_latest_news():
         
         logger.info(f"Obteniendo últimas noticias con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -83,7 +84,7 @@ def get_business_news():
         
         logger.info(f"Obteniendo noticias de negocios con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -110,7 +111,7 @@ def get_entertainment_news():
         
         logger.info(f"Obteniendo noticias de entretenimiento con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -137,7 +138,7 @@ def get_health_news():
         
         logger.info(f"Obteniendo noticias de salud con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -164,7 +165,7 @@ def get_science_news():
         
         logger.info(f"Obteniendo noticias de ciencia con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -191,7 +192,7 @@ def get_sport_news():
         
         logger.info(f"Obteniendo noticias de deportes con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -218,7 +219,7 @@ def get_technology_news():
         
         logger.info(f"Obteniendo noticias de tecnología con lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -249,7 +250,7 @@ def search_news():
         
         logger.info(f"Buscando noticias con keyword: {keyword}, lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -280,7 +281,7 @@ def get_search_suggestions():
         
         logger.info(f"Obteniendo sugerencias para keyword: {keyword}, lr: {lr}")
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -304,7 +305,7 @@ def get_language_regions():
         
         logger.info("Obteniendo regiones de idioma disponibles")
         
-        response = requests.get(url, headers=headers)
+        response = upstream_get(url, headers=headers)
         response.raise_for_status()
         
         result = response.json()
@@ -336,7 +337,7 @@ def proxy_image():
         }
         
         # Timeout más corto para mejor rendimiento
-        response = requests.get(
+        response = upstream_get(
             image_url, 
             headers=headers, 
             stream=True, 
@@ -0,0 +1,259 @@
+"""
+Optimización de imágenes
+Motor local por defecto (api.utils.image_optimizer en el pool de procesos);
+mode=max usa el optimizador de ShortPixel en RapidAPI para la máxima compresión.
+Los resultados se memorizan por hash del contenido y opciones.
+"""
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from werkzeug.utils import secure_filename
+import requests
+import hashlib
+import logging
+
+from api.utils.credits_config import get_credits_cost
+from api.utils.decorators import credits_required
+from api.utils.image_optimizer import DEFAULT_SSIM, OUTPUT_FORMATS, OptimizeError, optimize_image as run_optimizer
+from api.utils.process_pool import ComputeTimeoutError, get_compute_executor
+from api.utils.result_cache import get_result_cache, canonical_key, get_tool_ttl, cache_bypassed
+from api.utils.rapidapi import upstream_post
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Crear blueprint
+image_optimizer_bp = Blueprint('image_optimizer', __name__)
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+FORMATS = {'auto', 'jpg', *OUTPUT_FORMATS}
+MODES = {'balanced', 'max'}
+MIN_SSIM = 0.9
+MAX_SSIM = 0.999
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class OptimizerInputError(Exception):
+    """Parámetros o archivo de la petición no válidos (body y status_code de la respuesta)"""
+
+    def __init__(self, body, status_code=400):
+        super().__init__(body.get('error'))
+        self.body = body
+        self.status_code = status_code
+
+
+def read_options():
+    """
+    Opciones del form-data: format (auto, jpeg, png, webp), mode (balanced o max)
+    y ssim (similitud mínima con el original en las codificaciones con pérdida)
+    """
+    output_format = (request.form.get('format') or 'auto').lower()
+    if output_format not in FORMATS:
+        raise OptimizerInputError({
+            'error': 'Formato de salida no soportado',
+            'details': f'Los formatos permitidos son: {", ".join(sorted(FORMATS))}'
+        })
+    mode = (request.form.get('mode') or 'balanced').lower()
+    if mode not in MODES:
+        raise OptimizerInputError({'error': 'Modo no soportado', 'details': 'Los modos permitidos son: balanced, max'})
+    try:
+        target = float(request.form.get('ssim') or current_app.config.get('IMAGE_OPTIMIZER_SSIM', DEFAULT_SSIM))
+    except ValueError:
+        raise OptimizerInputError({'error': "El parámetro 'ssim' debe ser numérico"})
+    return {
+        'format': 'jpeg' if output_format == 'jpg' else output_format,
+        'mode': mode,
+        'ssim': round(min(max(target, MIN_SSIM), MAX_SSIM), 4)
+    }
+
+
+def read_image():
+    """
+    Valida el archivo 'image' de la petición
+
+    Returns:
+        tuple: (nombre del archivo, bytes)
+    """
+    if 'image' not in request.files:
+        raise OptimizerInputError({
+            'error': 'No se proporcionó ninguna imagen',
+            'details': 'Se requiere un archivo de imagen en el campo "image"'
+        })
+
+    image_file = request.files['image']
+    if image_file.filename == '':
+        raise OptimizerInputError({
+            'error': 'Nombre de archivo vacío',
+            'details': 'No se seleccionó ningún archivo'
+        })
+
+    if '.' not in image_file.filename or \
+       image_file.filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise OptimizerInputError({
+            'error': 'Tipo de archivo no permitido',
+            'details': f'Los tipos de archivo permitidos son: {", ".join(sorted(ALLOWED_EXTENSIONS))}'
+        })
+
+    max_bytes = current_app.config.get('IMAGE_OPTIMIZER_MAX_BYTES', 20 * 1024 * 1024)
+    content = image_file.read(max_bytes + 1)
+    if len(content) > max_bytes:
+        raise OptimizerInputError({
+            'error': 'Archivo demasiado grande',
+            'details': f'El tamaño máximo es {max_bytes // (1024 * 1024)}MB'
+        }, 413)
+    return image_file.filename, content
+
+
+def stream_bytes(data):
+    """Entrega la imagen por bloques para no copiarla entera en la respuesta"""
+    view = memoryview(data)
+    for start in range(0, len(view), STREAM_CHUNK_SIZE):
+        yield bytes(view[start:start + STREAM_CHUNK_SIZE])
+
+
+def output_filename(filename, extension):
+    stem = secure_filename(filename.rsplit('.', 1)[0]) or 'image'
+    return f'optimized_{stem}.{extension}'
+
+
+@image_optimizer_bp.route('', methods=['POST'])
+@jwt_required()
+@credits_required(amount=lambda: get_credits_cost('image_optimizer'))
+def optimize_image():
+    """
+    Optimiza la imagen del campo 'image' del form-data y la devuelve en streaming
+
+    Form-data opcional: format (auto, jpeg, png, webp), mode (balanced o max) y ssim
+    """
+    try:
+        filename, content = read_image()
+        options = read_options()
+    except OptimizerInputError as e:
+        return jsonify(e.body), e.status_code
+
+    if options['mode'] == 'max' or current_app.config.get('IMAGE_OPTIMIZER_ENGINE', 'local') != 'local':
+        return remote_optimize(filename, content)
+
+    ttl = get_tool_ttl('image_optimize')
+    use_cache = current_app.config.get('RESULT_CACHE_ENABLED', True) and ttl > 0
+    key = canonical_key('image_optimize', {
+        'sha256': hashlib.sha256(content).hexdigest(),
+        'format': options['format'],
+        'ssim': options['ssim']
+    })
+    result = get_result_cache().get(key) if use_cache and not cache_bypassed() else None
+    hit = result is not None
+
+    if result is None:
+        try:
+            result = get_compute_executor().run(
+                run_optimizer, content, options['format'], options['ssim'],
+                timeout=current_app.config.get('IMAGE_OPTIMIZER_TIMEOUT', 15), name='image_optimize'
+            )
+        except ComputeTimeoutError:
+            return jsonify({'error': 'La optimización superó el tiempo máximo'}), 504
+        except OptimizeError as e:
+            return jsonify({'error': 'No se pudo optimizar la imagen', 'details': str(e)}), 400
+        if use_cache:
+            get_result_cache().set(key, result, ttl, size=len(result['content']))
+
+    logger.info("[IMAGE OPTIMIZER] %s: %d -> %d bytes (calidad %s, SSIM %s)",
+                filename, result['original_bytes'], result['bytes'], result['quality'], result['ssim'])
+    headers = {
+        'Content-Length': str(result['bytes']),
+        'Content-Disposition': f'attachment; filename={output_filename(filename, result["extension"])}',
+        'X-Original-Size': str(result['original_bytes']),
+        'X-Optimized-Size': str(result['bytes']),
+        'X-Image-Width': str(result['width']),
+        'X-Image-Height': str(result['height']),
+        'X-Image-SSIM': str(result['ssim']),
+        'X-Optimizer-Engine': 'local',
+        'X-Cache': 'HIT' if hit else 'MISS'
+    }
+    if result['quality'] is not None:
+        headers['X-Image-Quality'] = str(result['quality'])
+    return Response(stream_bytes(result['content']), mimetype=result['content_type'], headers=headers)
+
+
+def remote_optimize(filename, content):
+    """
+    Compresión máxima con ShortPixel (RapidAPI). La respuesta se reenvía en
+    streaming a medida que llega y se guarda en la caché al completarse.
+    """
+    api_key = current_app.config.get('RAPIDAPI_KEY')
+    if not api_key:
+        logger.error("RAPIDAPI_KEY no configurada en el backend")
+        return jsonify({
+            'error': 'Configuración de API no disponible',
+            'details': 'La API key no está configurada en el servidor'
+        }), 500
+
+    ttl = get_tool_ttl('image_optimize')
+    use_cache = current_app.config.get('RESULT_CACHE_ENABLED', True) and ttl > 0
+    key = canonical_key('image_optimize', {'sha256': hashlib.sha256(content).hexdigest(), 'mode': 'max'})
+    cache = get_result_cache()
+    cached = cache.get(key) if use_cache and not cache_bypassed() else None
+    disposition = f'attachment; filename=optimized_{secure_filename(filename) or "image"}'
+    if cached is not None:
+        body, content_type = cached
+        return Response(stream_bytes(body), content_type=content_type, headers={
+            'Content-Length': str(len(body)),
+            'Content-Disposition': disposition,
+            'X-Original-Size': str(len(content)),
+            'X-Optimized-Size': str(len(body)),
+            'X-Optimizer-Engine': 'rapidapi',
+            'X-Cache': 'HIT'
+        })
+
+    headers = {
+        'X-RapidAPI-Key': api_key,
+        'X-RapidAPI-Host': current_app.config['RAPIDAPI_HOST']
+    }
+    try:
+        response = upstream_post(
+            current_app.config['RAPIDAPI_URL'],
+            files={'image': (filename, content, request.files['image'].content_type)},
+            headers=headers,
+            stream=True,
+            timeout=60
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error en la petición a RapidAPI: {str(e)}")
+        return jsonify({
+            'error': 'Error de conexión',
+            'details': 'No se pudo conectar con el servicio de optimización'
+        }), 503
+
+    if response.status_code != 200:
+        logger.error(f"Error en RapidAPI: {response.status_code} - {response.text}")
+        response.close()
+        return jsonify({
+            'error': 'Error en el servicio de optimización',
+            'details': 'El servicio de optimización de imágenes no respondió correctamente'
+        }), 502
+
+    content_type = response.headers.get('Content-Type', 'application/octet-stream')
+
+    def relay():
+        chunks = []
+        try:
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                chunks.append(chunk)
+                yield chunk
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Respuesta de RapidAPI interrumpida: {str(e)}")
+            return
+        finally:
+            response.close()
+        if use_cache:
+            body = b''.join(chunks)
+            cache.set(key, (body, content_type), ttl, size=len(body))
+
+    relay_headers = {
+        'Content-Disposition': disposition,
+        'X-Original-Size': str(len(content)),
+        'X-Optimizer-Engine': 'rapidapi',
+        'X-Cache': 'MISS'
+    }
+    if response.headers.get('Content-Length'):
+        relay_headers['Content-Length'] = response.headers['Content-Length']
+    return Response(relay(), content_type=content_type, headers=relay_headers)
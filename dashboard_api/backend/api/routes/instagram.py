@@ -5,8 +5,10 @@ import requests
 import logging
 
 from api.utils.error_handlers import ValidationError
-from api.utils.rapidapi import get_rapidapi_headers, call_rapidapi
+from api.utils.rapidapi import get_rapidapi_headers, call_rapidapi, upstream_get
 from api.utils.decorators import credits_required
+from api.utils.deadline import DeadlineExceeded, mark_exceeded
+from api.utils.canonical import instagram_username
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -31,10 +33,14 @@ def get_premium_headers():
 
 
 
-def validate_username(username: str) -> None:
-    """Validar que se proporcione un username"""
+def validate_username(username: str) -> str:
+    """Validar el username y devolverlo canónico ('@Usuario' o la URL del perfil -> 'usuario')"""
     if not username:
         raise ValidationError("Se requiere un nombre de usuario")
+    handle = instagram_username(username)
+    if not handle:
+        raise ValidationError("Nombre de usuario de Instagram inválido")
+    return handle
 
 # Rutas Premium API
 @instagram_bp.route('/profile/username', methods=['GET'])
@@ -42,14 +48,13 @@ def validate_username(username: str) -> None:
 @credits_required(amount=1)
 def get_profile_by_username():
     """Obtener perfil de Instagram por username usando la Premium API"""
-    username = request.args.get('username')
-    validate_username(username)
+    username = validate_username(request.args.get('username'))
     
     url = f"{PREMIUM_API_BASE}/by/username"
     headers = get_premium_headers()
     params = {"username": username}
     
-    response = requests.get(url, headers=headers, params=params)
+    response = upstream_get(url, headers=headers, params=params)
     return jsonify(response.json()), response.status_code
 
 @instagram_bp.route('/followers', methods=['GET'])
@@ -57,15 +62,14 @@ def get_profile_by_username():
 @credits_required(amount=1)
 def get_followers():
     """Obtener followers de un usuario de Instagram"""
-    username = request.args.get('username')
+    username = validate_username(request.args.get('username'))
     amount = request.args.get('amount', 100)
-    validate_username(username)
     
     url = f"{PREMIUM_API_BASE}/followers"
     headers = get_premium_headers()
     params = {"username": username, "amount": amount}
     
-    response = requests.get(url, headers=headers, params=params)
+    response = upstream_get(url, headers=headers, params=params)
     return jsonify(response.json()), response.status_code
 
 @instagram_bp.route('/following', methods=['GET'])
@@ -73,15 +77,14 @@ def get_followers():
 @credits_required(amount=1)
 def get_following():
     """Obtener following de un usuario de Instagram"""
-    username = request.args.get('username')
+    username = validate_username(request.args.get('username'))
     amount = request.args.get('amount', 100)
-    validate_username(username)
     
     url = f"{PREMIUM_API_BASE}/following"
     headers = get_premium_headers()
     params = {"username": username, "amount": amount}
     
-    response = requests.get(url, headers=headers, params=params)
+    response = upstream_get(url, headers=headers, params=params)
     return jsonify(response.json()), response.status_code
 
 @instagram_bp.route('/posts', methods=['GET'])
@@ -89,9 +92,8 @@ def get_following():
 @credits_required(amount=1)
 def get_posts():
     """Obtener posts de un usuario de Instagram"""
-    username = request.args.get('username')
+    username = validate_username(request.args.get('username'))
     amount = request.args.get('amount', 10)
-    validate_username(username)
     
     url = f"{PREMIUM_API_BASE}/medias"
     headers = get_premium_headers()
@@ -101,15 +103,14 @@ def get_posts():
         "force": request.args.get('force', 'true')
     }
     
-    response = requests.get(url, headers=headers, params=params)
+    response = upstream_get(url, headers=headers, params=params)
     return jsonify(response.json()), response.status_code
 
 @instagram_bp.route('/stories', methods=['GET'])
 @jwt_required()
 def get_stories():
     """Obtener stories de un usuario de Instagram"""
-    username = request.args.get('username')
-    validate_username(username)
+    username = validate_username(request.args.get('username'))
     
     url = f"{PREMIUM_API_BASE}/stories/by/username"
     headers = get_premium_headers()
@@ -118,16 +119,15 @@ def get_stories():
         "force": request.args.get('force', 'true')
     }
     
-    response = requests.get(url, headers=headers, params=params)
+    response = upstream_get(url, headers=headers, params=params)
     return jsonify(response.json()), response.status_code
 
 @instagram_bp.route('/highlights', methods=['GET'])
 @jwt_required()
 def get_highlights():
     """Obtener highlights de un usuario de Instagram"""
-    username = request.args.get('username')
+    username = validate_username(request.args.get('username'))
     amount = request.args.get('amount', 10)
-    validate_username(username)
     
     url = f"{PREMIUM_API_BASE}/highlights"
     headers = get_premium_headers()
@@ -137,15 +137,14 @@ def get_highlights():
         "force": request.args.get('force', 'true')
     }
     
-    response = requests.get(url, headers=headers, params=params)
+    response = upstream_get(url, headers=headers, params=params)
     return jsonify(response.json()), response.status_code
 
 @instagram_bp.route('/full-profile', methods=['GET'])
 @jwt_required()
 def get_full_profile():
     """Obtener perfil completo de Instagram incluyendo followers, following, posts, etc."""
-    username = request.args.get('username')
-    validate_username(username)
+    username = validate_username(request.args.get('username'))
     
     headers = get_premium_headers()
     result = {}
@@ -153,7 +152,7 @@ def get_full_profile():
     # Obtener perfil básico
     user_url = f"{PREMIUM_API_BASE}/by/username"
     user_params = {"username": username}
-    user_resp = requests.get(user_url, headers=headers, params=user_params)
+    user_resp = upstream_get(user_url, headers=headers, params=user_params)
     if user_resp.status_code != 200:
         return jsonify({"error": "No se pudo obtener el perfil", "details": user_resp.text}), user_resp.status_code
     result['profile'] = user_resp.json()
@@ -175,7 +174,11 @@ def get_full_profile():
             params['amount'] = 10
             params['force'] = 'true'
         
-        response = requests.get(endpoint, headers=headers, params=params)
+        try:
+            response = upstream_get(endpoint, headers=headers, params=params)
+        except DeadlineExceeded:
+            # Sin tiempo para el resto: 504 con lo que ya se obtuvo
+            raise mark_exceeded(partial=result, message="El perfil se obtuvo solo en parte antes de agotar el tiempo")
         result[key] = response.json() if response.status_code == 200 else None
     
     return jsonify(result), 200
@@ -184,15 +187,14 @@ def get_full_profile():
 @jwt_required()
 def get_v2_profile_by_username():
     """Obtener perfil de Instagram por username usando la Premium API v2"""
-    username = request.args.get('username')
-    validate_username(username)
+    username = validate_username(request.args.get('username'))
     
     url = f"{PREMIUM_API_V2_BASE}/by/username"
     headers = get_premium_headers()
     params = {"username": username}
     
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()  # Esto lanzará una excepción para códigos de error HTTP
         return jsonify(response.json()), response.status_code
     except requests.exceptions.RequestException as e:
@@ -228,7 +230,7 @@ def get_story_by_url():
         print(f"Parámetros: {params}")
         print(f"Headers: {headers}")
         
-        response = requests.get(api_url, headers=headers, params=params)
+        response = upstream_get(api_url, headers=headers, params=params)
         
         # Debug de la respuesta
         print("\n=== DEBUG RESPUESTA ===")
@@ -331,7 +333,7 @@ def proxy_media():
             'Connection': 'keep-alive'
         }
 
-        response = requests.get(url, headers=headers, stream=True)
+        response = upstream_get(url, headers=headers, stream=True)
         
         if response.status_code != 200:
             return jsonify({'error': f'Error al obtener el medio: {response.status_code}'}), response.status_code
@@ -0,0 +1,59 @@
+import os
+from flask import Blueprint, jsonify, send_file, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from api.models.job import Job
+from api.utils.jobs import get_result_path
+
+jobs_bp = Blueprint('jobs', __name__)
+
+
+def get_user_job(job_id):
+    """Busca un trabajo del usuario autenticado (None si no existe o es de otro usuario)"""
+    job = Job.query.get(job_id)
+    if not job or str(job.user_id) != str(get_jwt_identity()):
+        return None
+    return job
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job_status(job_id):
+    """Estado de un trabajo en segundo plano"""
+    job = get_user_job(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    data = job.to_dict()
+    data['resultUrl'] = url_for('jobs.get_job_result', job_id=job.id)
+    return jsonify(data), 200
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+@jwt_required()
+def get_job_result(job_id):
+    """Resultado de un trabajo terminado (JSON o archivo)"""
+    job = get_user_job(job_id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+
+    if not job.is_final:
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'message': 'El trabajo todavía se está procesando'
+        }), 202
+
+    if job.status == Job.STATUS_FAILED:
+        return jsonify({'job_id': job.id, 'status': job.status, 'error': job.error}), 422
+
+    file_info = (job.result or {}).get('file') if isinstance(job.result, dict) else None
+    if file_info:
+        path = get_result_path(job)
+        if not os.path.exists(path):
+            return jsonify({'error': 'El resultado ya no está disponible'}), 410
+        return send_file(
+            path,
+            mimetype=file_info.get('content_type'),
+            as_attachment=True,
+            download_name=file_info.get('filename') or job.id
+        )
+
+    return jsonify(job.result), 200
@@ -3,6 +3,7 @@ import requests
 from flask import Blueprint, jsonify, current_app, request
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.rapidapi import upstream_get
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +33,7 @@ def get_profile_info():
             'username_or_id_or_url': username
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -62,7 +63,7 @@ def search_posts():
             'search_query': search_query
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -92,7 +93,7 @@ def get_hashtag_info():
             'hashtag': hashtag
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -122,7 +123,7 @@ def get_hashtag_posts():
             'hashtag': hashtag
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -154,7 +155,7 @@ def search_users():
             'search_query': search_query
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -184,7 +185,7 @@ def get_location_info():
             'search_query': location_query
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -214,7 +215,7 @@ def get_location_detail_info():
             'location_id': location_id
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -244,7 +245,7 @@ def get_location_posts():
             'location_query': location_query
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -274,7 +275,7 @@ def get_user_posts():
             'username_or_id_or_url': username
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -304,7 +305,7 @@ def get_user_reels():
             'username_or_id_or_url': username
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -334,7 +335,7 @@ def get_user_stories():
             'username_or_id_or_url': username
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -364,7 +365,7 @@ def get_user_highlights():
             'username_or_id_or_url': username
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -394,7 +395,7 @@ def get_user_tagged():
             'username_or_id_or_url': username
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -424,7 +425,7 @@ def get_audio_info():
             'audio_canonical_id': audio_canonical_id
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         result = response.json()
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
-from api.models import db, Notification
+from api import db
+from api.models import Notification
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 notifications_bp = Blueprint('notifications', __name__)
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
 import requests
+from api.utils.rapidapi import upstream_get
 
 pagespeed_bp = Blueprint('pagespeed_insights', __name__)
 
@@ -36,7 +37,7 @@ def run_pagespeed():
     current_app.logger.debug(f"[WebsiteSpeedTest] Params: {params}")
 
     try:
-        response = requests.get(api_url, headers=headers, params=params, timeout=60)
+        response = upstream_get(api_url, headers=headers, params=params, timeout=60)
         current_app.logger.info(f"[WebsiteSpeedTest] Status: {response.status_code}")
         current_app.logger.debug(f"[WebsiteSpeedTest] Response: {response.text}")
         
@@ -1,8 +1,14 @@
+import json
+import hashlib
 import logging
 import requests
 from flask import Blueprint, jsonify, current_app, request
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.jobs import register_job_handler, async_job, JobError, JobFile
+from api.utils.page_fetch import fetch_page, PageFetchError
+from api.utils.result_cache import get_result_cache, canonical_key, get_tool_ttl
+from api.utils.rapidapi import upstream_get, upstream_post
 
 logger = logging.getLogger(__name__)
 
@@ -48,7 +54,7 @@ def pdf_to_text():
         url = "https://pdf-converter-api.p.rapidapi.com/PdfToText"
         headers = get_headers()
         
-        response = requests.post(url, headers=headers, params=params, files=files)
+        response = upstream_post(url, headers=headers, params=params, files=files)
         response.raise_for_status()
         
         result = response.json()
@@ -65,7 +71,11 @@ def pdf_to_text():
 @jwt_required()
 @credits_required(amount=1)
 def pdf_to_text_url():
-    """Convierte PDF desde URL a texto"""
+    """
+    Convierte PDF desde URL a texto. El PDF se descarga con el fetcher compartido
+    (revalidación con ETag/Last-Modified) y la conversión se reutiliza mientras
+    el contenido no cambie.
+    """
     try:
         pdf_url = request.args.get('pdfUrl')
         if not pdf_url:
@@ -75,21 +85,37 @@ def pdf_to_text_url():
         start_page = request.args.get('startPage', '0')
         end_page = request.args.get('endPage', '0')
         
-        # Llamar a la API de PDF Converter
-        url = "https://pdf-converter-api.p.rapidapi.com/PdfToText"
-        headers = get_headers()
-        params = {
-            'pdfUrl': pdf_url,
-            'startPage': start_page,
-            'endPage': end_page
-        }
-        
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
+        page = fetch_page(pdf_url, max_bytes=current_app.config.get('PDF_URL_MAX_BYTES'), binary=True)
+        if page.status_code != 200:
+            return jsonify({'error': f'No se pudo descargar el PDF (estado {page.status_code})'}), 502
+        if page.truncated:
+            return jsonify({'error': 'El PDF supera el tamaño máximo permitido'}), 413
+        if not page.content.startswith(b'%PDF'):
+            return jsonify({'error': 'La URL no apunta a un archivo PDF'}), 400
+        
+        cache = get_result_cache() if current_app.config.get('RESULT_CACHE_ENABLED', True) else None
+        content_hash = hashlib.sha256(page.content).hexdigest()
+        key = canonical_key('pdf_to_text', {'sha256': content_hash, 'startPage': start_page, 'endPage': end_page})
+        result = cache.get(key) if cache is not None else None
+        if result is None:
+            # Llamar a la API de PDF Converter con el archivo ya descargado
+            files = {'pdfFile': ('document.pdf', page.content, 'application/pdf')}
+            params = {
+                'startPage': start_page,
+                'endPage': end_page
+            }
+            response = upstream_post("https://pdf-converter-api.p.rapidapi.com/PdfToText",
+                                     headers=get_headers(), params=params, files=files)
+            response.raise_for_status()
+            result = response.json()
+            if cache is not None:
+                cache.set(key, result, get_tool_ttl('pdf_to_text'), size=len(json.dumps(result)))
         
-        result = response.json()
         return jsonify(result), 200
         
+    except PageFetchError as e:
+        logger.error(f"Error descargando el PDF: {e.message}")
+        return jsonify({'error': 'No se pudo descargar el PDF', 'details': e.message}), e.status_code
     except requests.RequestException as e:
         logger.error(f"Error en API PDF Converter URL: {str(e)}")
         return jsonify({'error': 'Error al convertir el PDF desde URL'}), 500
@@ -97,8 +123,55 @@ def pdf_to_text_url():
         logger.error(f"Error inesperado: {str(e)}")
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+def get_image_content_type(img_format):
+    """Tipo de contenido de la imagen generada según el formato pedido"""
+    return 'image/tiff' if img_format == 'tifflzw' else 'image/jpeg'
+
+@register_job_handler('pdf_to_image')
+def pdf_to_image_job(payload):
+    """Handler de la conversión de PDF a imagen ejecutada en segundo plano"""
+    files = {'pdfFile': (payload['filename'], payload['content'], 'application/pdf')}
+    params = {
+        'imgFormat': payload['imgFormat'],
+        'startPage': payload['startPage'],
+        'endPage': payload['endPage']
+    }
+    try:
+        response = upstream_post(
+            "https://pdf-converter-api.p.rapidapi.com/PdfToImage",
+            headers=get_headers(), params=params, files=files
+        )
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"Error en API PDF Converter Image (trabajo): {str(e)}")
+        raise JobError('Error al convertir el PDF a imagen')
+
+    if 'json' in response.headers.get('content-type', '') or len(response.content) < 100:
+        raise JobError('La API externa devolvió datos inválidos')
+
+    filename = f"{payload['filename'].replace('.pdf', '')}.{payload['imgFormat']}"
+    return JobFile(response.content, get_image_content_type(payload['imgFormat']), filename)
+
+def build_pdf_to_image_payload():
+    """Valida el PDF subido y devuelve el payload del trabajo (el archivo viaja en memoria)"""
+    pdf_file = request.files.get('pdfFile')
+    if not pdf_file:
+        return jsonify({'error': 'No se envió ningún archivo PDF'}), 400
+    if pdf_file.filename == '':
+        return jsonify({'error': 'No se seleccionó ningún archivo'}), 400
+    if not pdf_file.filename.lower().endswith('.pdf'):
+        return jsonify({'error': 'Solo se aceptan archivos PDF'}), 400
+    return {
+        'filename': pdf_file.filename,
+        'content': pdf_file.read(),
+        'imgFormat': request.form.get('imgFormat', 'tifflzw'),
+        'startPage': request.form.get('startPage', '0'),
+        'endPage': request.form.get('endPage', '0')
+    }
+
 @pdf_converter_bp.route('/to-image', methods=['POST'])
 @jwt_required()
+@async_job('pdf_to_image', 2, build_pdf_to_image_payload)
 @credits_required(amount=2)
 def pdf_to_image():
     """Convierte PDF subido a imagen"""
@@ -147,7 +220,7 @@ def pdf_to_image():
         url = "https://pdf-converter-api.p.rapidapi.com/PdfToImage"
         headers = get_headers()
         
-        response = requests.post(url, headers=headers, params=params, files=files)
+        response = upstream_post(url, headers=headers, params=params, files=files)
         response.raise_for_status()
         
         logger.info("API externa respondió exitosamente")
@@ -175,7 +248,7 @@ def pdf_to_image():
             return jsonify({'error': 'La API externa devolvió datos inválidos'}), 500
         
         # Para imágenes, devolver el contenido binario con headers apropiados
-        content_type = 'image/tiff' if img_format == 'tifflzw' else 'image/jpeg'
+        content_type = get_image_content_type(img_format)
         filename = f"{pdf_file.filename.replace('.pdf', '')}.{img_format}"
         
         # Crear respuesta con headers correctos
@@ -222,11 +295,11 @@ def pdf_to_image_url():
             'endPage': end_page
         }
         
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
         response.raise_for_status()
         
         # Para imágenes, devolver el contenido binario con headers apropiados
-        content_type = 'image/tiff' if img_format == 'tifflzw' else 'image/jpeg'
+        content_type = get_image_content_type(img_format)
         filename = f"converted_pdf.{img_format}"
         
         return response.content, 200, {
@@ -3,6 +3,8 @@ import requests
 from flask import Blueprint, jsonify, current_app, request
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.result_cache import memoized
+from api.utils.rapidapi import upstream_post
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,7 @@ def get_headers():
 
 @perplexity_bp.route('/search', methods=['POST'])
 @jwt_required()
+@memoized('perplexity', cost=3)
 @credits_required(amount=3)
 def search_perplexity():
     """Realiza búsquedas inteligentes usando Perplexity API"""
@@ -39,7 +42,7 @@ def search_perplexity():
         
         logger.info(f"Búsqueda Perplexity: {content}")
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = upstream_post(url, json=payload, headers=headers)
         
         # Perplexity siempre responde con 200, pero hay que verificar el campo 'success'
         result = response.json()
@@ -1,14 +1,37 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required
 import requests
 import logging
-import re
-import json
+import threading
 from api.utils.decorators import credits_required
+from api.utils.image_hash import ImagePrepareError, PerceptualCache, prepare_for_upload
+from api.utils.process_pool import ComputeTimeoutError, get_compute_executor
+from api.utils.result_cache import cache_bypassed, get_hit_cost
+from api.utils.rapidapi import upstream_post
 
 picpulse_bp = Blueprint('picpulse', __name__)
 logger = logging.getLogger(__name__)
 
+PICPULSE_COST = 2
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+ENDPOINTS = {
+    'analyze': 'analyze_image/',
+    'analyze_detailed': 'analyze_image_detailed/',
+}
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+class PicPulseInputError(Exception):
+    """Imagen de la petición no válida (body y status_code de la respuesta)"""
+
+    def __init__(self, body, status_code=400):
+        super().__init__(body.get('error'))
+        self.body = body
+        self.status_code = status_code
+
+
 def sanitize_filename(filename):
     """Sanitiza el nombre del archivo para asegurar compatibilidad con la API"""
     # Obtener la extensión
@@ -16,101 +39,171 @@ def sanitize_filename(filename):
     # Retornar un nombre seguro
     return f"image.{ext}"
 
+
+def get_analysis_cache():
+    """Resultados de PicPulse por hash perceptual, género y grupo de edad"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = PerceptualCache(
+                    max_entries=current_app.config.get('PICPULSE_CACHE_ENTRIES', 1024),
+                    max_distance=current_app.config.get('PICPULSE_HASH_DISTANCE', 4)
+                )
+    return _analysis_cache
+
+
+def read_request_image():
+    """
+    Valida el archivo 'image' de la petición, lo reduce a la resolución de
+    análisis del proveedor si hace falta y calcula sus hashes perceptuales
+
+    Raises:
+        PicPulseInputError: si falta el archivo, no es PNG/JPG o no es una imagen válida
+    """
+    if 'image' not in request.files:
+        logger.error("[PICPULSE] No se encontró archivo 'image' en request.files")
+        raise PicPulseInputError({'error': 'No se proporcionó ninguna imagen'})
+
+    image_file = request.files['image']
+    if image_file.filename == '':
+        logger.error("[PICPULSE] Nombre de archivo vacío")
+        raise PicPulseInputError({'error': 'Nombre de archivo vacío'})
+
+    if '.' not in image_file.filename or \
+       image_file.filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
+        logger.error("[PICPULSE] Tipo de archivo no permitido: %s", image_file.filename)
+        raise PicPulseInputError({'error': 'Tipo de archivo no permitido. Solo PNG, JPG, JPEG'})
+
+    # Las imágenes de más de PICPULSE_MAX_UPLOAD_BYTES ya no se rechazan: se reducen
+    max_input = current_app.config.get('PICPULSE_MAX_INPUT_BYTES', 20 * 1024 * 1024)
+    content = image_file.read(max_input + 1)
+    if len(content) > max_input:
+        logger.error("[PICPULSE] Archivo demasiado grande: más de %s bytes", max_input)
+        raise PicPulseInputError({
+            'error': f'Archivo demasiado grande. Máximo {max_input // (1024 * 1024)}MB permitido.',
+            'max_size': max_input
+        })
+
+    try:
+        prepared = get_compute_executor().run(
+            prepare_for_upload, content,
+            current_app.config.get('PICPULSE_MAX_SIDE', 1024),
+            current_app.config.get('PICPULSE_MAX_UPLOAD_BYTES', 2 * 1024 * 1024),
+            timeout=current_app.config.get('IMAGE_TRANSFORM_TIMEOUT', 15), name='picpulse_prepare'
+        )
+    except ComputeTimeoutError:
+        raise PicPulseInputError({'error': 'La imagen tardó demasiado en procesarse'}, 504)
+    except ImagePrepareError as e:
+        raise PicPulseInputError({'error': str(e)})
+
+    prepared['filename'] = sanitize_filename(image_file.filename)
+    if prepared['resized']:
+        prepared['filename'] = 'image.jpg'
+        logger.info("[PICPULSE] Imagen reducida de %s a %s bytes (%sx%s)",
+                    len(content), len(prepared['content']), prepared['width'], prepared['height'])
+    return prepared
+
+
+def get_prepared_image():
+    """Imagen de la petición actual ya preparada (se procesa una sola vez); None si no es válida"""
+    if 'picpulse_image' not in g:
+        try:
+            g.picpulse_image = read_request_image()
+            g.picpulse_error = None
+        except PicPulseInputError as e:
+            g.picpulse_image = None
+            g.picpulse_error = e
+    return g.picpulse_image
+
+
+def get_audience():
+    return request.form.get('gender', 'Male'), request.form.get('age_group', '25-34')
+
+
+def get_cached_analysis(endpoint):
+    """Resultado guardado para una imagen casi idéntica con la misma audiencia, o None"""
+    if 'picpulse_cached' not in g:
+        image = get_prepared_image()
+        g.picpulse_cached = None
+        if image is not None and current_app.config.get('RESULT_CACHE_ENABLED', True) and not cache_bypassed():
+            g.picpulse_cached = get_analysis_cache().get((endpoint, *get_audience()), image['phash'], image['dhash'])
+    return g.picpulse_cached
+
+
+def analysis_cost(endpoint):
+    """Créditos de la petición: nada si la imagen no es válida y la fracción de acierto si ya se analizó"""
+    def cost():
+        if get_prepared_image() is None:
+            return 0
+        if get_cached_analysis(endpoint) is not None:
+            return get_hit_cost(PICPULSE_COST)
+        return PICPULSE_COST
+    return cost
+
+
+def run_analysis(endpoint):
+    """
+    Analiza la imagen de la petición con PicPulse, o devuelve el resultado de
+    una imagen casi idéntica analizada antes para la misma audiencia
+    """
+    image = get_prepared_image()
+    if image is None:
+        return jsonify(g.picpulse_error.body), g.picpulse_error.status_code
+
+    gender, age_group = get_audience()
+    logger.info("[PICPULSE] Parámetros - Gender: %s, Age Group: %s", gender, age_group)
+
+    cached = get_cached_analysis(endpoint)
+    if cached is not None:
+        logger.info("[PICPULSE] Resultado reutilizado por hash perceptual %016x", image['phash'])
+        response = jsonify(cached)
+        response.headers['X-Cache'] = 'HIT'
+        return response, 200
+
+    url = f"https://{current_app.config['RAPIDAPI_PICPULSE_HOST']}/{ENDPOINTS[endpoint]}"
+    files = {
+        'image': (image['filename'], image['content'], image['content_type'])
+    }
+    params = {
+        'gender': gender,
+        'age_group': age_group
+    }
+    headers = {
+        "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
+        "x-rapidapi-host": current_app.config['RAPIDAPI_PICPULSE_HOST']
+    }
+
+    logger.info("[PICPULSE] Enviando solicitud a RapidAPI (%s, %d bytes)", endpoint, len(image['content']))
+    response = upstream_post(url, files=files, params=params, headers=headers, timeout=60)
+
+    if response.status_code != 200:
+        logger.error("[PICPULSE] Error en RapidAPI (%d): %s", response.status_code, response.text)
+        return jsonify({
+            'error': 'Error en la API de PicPulse',
+            'details': response.text
+        }), response.status_code
+
+    result = response.json()
+    logger.info("[PICPULSE] Respuesta exitosa: %s", response.text)
+    if current_app.config.get('RESULT_CACHE_ENABLED', True):
+        get_analysis_cache().set((endpoint, gender, age_group), image['phash'], image['dhash'], result,
+                                 current_app.config.get('PICPULSE_CACHE_TTL', 7 * 86400))
+    response = jsonify(result)
+    response.headers['X-Cache'] = 'MISS'
+    return response, 200
+
+
 @picpulse_bp.route('/analyze', methods=['POST'])
 @jwt_required()
-@credits_required(amount=2)  # PicPulse cuesta 2 puntos
+@credits_required(amount=analysis_cost('analyze'))  # PicPulse cuesta 2 puntos
 def analyze_image():
     """Endpoint para análisis básico de imagen con PicPulse"""
     try:
         logger.info("[PICPULSE] Request files: %s", request.files)
         logger.info("[PICPULSE] Request form: %s", request.form)
-        
-        # Verificar si se envió un archivo
-        if 'image' not in request.files:
-            logger.error("[PICPULSE] No se encontró archivo 'image' en request.files")
-            return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
-            
-        image_file = request.files['image']
-        logger.info("[PICPULSE] Image file: %s", image_file.filename)
-        
-        # Verificar si el archivo está vacío
-        if image_file.filename == '':
-            logger.error("[PICPULSE] Nombre de archivo vacío")
-            return jsonify({'error': 'Nombre de archivo vacío'}), 400
-            
-        # Verificar el tipo de archivo
-        allowed_extensions = {'png', 'jpg', 'jpeg'}
-        if not '.' in image_file.filename or \
-           image_file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
-            logger.error("[PICPULSE] Tipo de archivo no permitido: %s", image_file.filename)
-            return jsonify({'error': 'Tipo de archivo no permitido. Solo PNG, JPG, JPEG'}), 400
-        
-        # Verificar el tamaño del archivo (máximo 2MB)
-        image_file.seek(0, 2)  # Ir al final del archivo
-        file_size = image_file.tell()  # Obtener el tamaño
-        image_file.seek(0)  # Volver al inicio
-        
-        max_size = 2 * 1024 * 1024  # 2MB en bytes
-        if file_size > max_size:
-            logger.error("[PICPULSE] Archivo demasiado grande: %s bytes", file_size)
-            return jsonify({
-                'error': 'Archivo demasiado grande. Máximo 2MB permitido.',
-                'file_size': file_size,
-                'max_size': max_size
-            }), 400
-        
-        logger.info("[PICPULSE] Tamaño del archivo: %s bytes", file_size)
-        
-        # Obtener parámetros con valores por defecto
-        gender = request.form.get('gender', 'Male')
-        age_group = request.form.get('age_group', '25-34')
-        logger.info("[PICPULSE] Gender: %s, Age Group: %s", gender, age_group)
-        
-        url = "https://picpulse-automated-image-quality-scoring-with-psychology-ai1.p.rapidapi.com/analyze_image/"
-        
-        querystring = {
-            "gender": gender,
-            "age_group": age_group
-        }
-        
-        headers = {
-            "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
-            "x-rapidapi-host": current_app.config['RAPIDAPI_PICPULSE_HOST']
-        }
-        
-        # Preparar archivo para envío
-        image_file.seek(0)
-        
-        # Usar el manejo nativo de requests para multipart/form-data
-        files = {
-            'image': ('image.png', image_file, 'image/png')
-        }
-        
-        headers = {
-            "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
-            "x-rapidapi-host": current_app.config['RAPIDAPI_PICPULSE_HOST']
-        }
-        
-        logger.info("[PICPULSE] Enviando solicitud a RapidAPI")
-        logger.info(f"[PICPULSE] Files: {files}")
-        
-        response = requests.post(
-            url,
-            files=files,
-            headers=headers,
-            params=querystring
-        )
-        
-        if response.status_code != 200:
-            logger.error("[PICPULSE] Error en RapidAPI: %s", response.text)
-            return jsonify({
-                'error': 'Error en la API de PicPulse',
-                'details': response.text
-            }), response.status_code
-            
-        logger.info("[PICPULSE] Respuesta exitosa: %s", response.text)
-        return jsonify(response.json()), 200
-        
+        return run_analysis('analyze')
+
     except requests.exceptions.RequestException as err:
         logger.error("[PICPULSE] Error de conexión: %s", str(err))
         return jsonify({
@@ -126,123 +219,15 @@ def analyze_image():
 
 @picpulse_bp.route('/analyze-detailed', methods=['POST'])
 @jwt_required()
-@credits_required(amount=2)  # PicPulse detailed cuesta 2 puntos
+@credits_required(amount=analysis_cost('analyze_detailed'))  # PicPulse detailed cuesta 2 puntos
 def analyze_image_detailed():
     """Endpoint para análisis detallado de imagen con PicPulse"""
     try:
-        logger.info("="*50)
-        logger.info("[PICPULSE] Iniciando nuevo análisis de imagen")
+        logger.info("[PICPULSE] Iniciando nuevo análisis detallado de imagen")
         logger.info("[PICPULSE] Request files: %s", request.files)
         logger.info("[PICPULSE] Request form: %s", request.form)
-        
-        # Verificar si se envió un archivo
-        if 'image' not in request.files:
-            logger.error("[PICPULSE] No se encontró archivo 'image' en request.files")
-            return jsonify({'error': 'No se proporcionó ninguna imagen'}), 400
-            
-        image_file = request.files['image']
-        logger.info("[PICPULSE] Nombre del archivo: %s", image_file.filename)
-        logger.info("[PICPULSE] Tipo MIME: %s", image_file.content_type)
-        
-        # Verificar si el archivo está vacío
-        if image_file.filename == '':
-            logger.error("[PICPULSE] Nombre de archivo vacío")
-            return jsonify({'error': 'Nombre de archivo vacío'}), 400
-            
-        # Verificar el tipo de archivo
-        allowed_extensions = {'png', 'jpg', 'jpeg'}
-        if not '.' in image_file.filename or \
-           image_file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
-            logger.error("[PICPULSE] Tipo de archivo no permitido: %s", image_file.filename)
-            return jsonify({'error': 'Tipo de archivo no permitido. Solo PNG, JPG, JPEG'}), 400
-        
-        # Verificar el tamaño del archivo (máximo 2MB)
-        image_file.seek(0, 2)  # Ir al final del archivo
-        file_size = image_file.tell()  # Obtener el tamaño
-        image_file.seek(0)  # Volver al inicio
-        
-        max_size = 2 * 1024 * 1024  # 2MB en bytes
-        if file_size > max_size:
-            logger.error("[PICPULSE] Archivo demasiado grande: %s bytes", file_size)
-            return jsonify({
-                'error': 'Archivo demasiado grande. Máximo 2MB permitido.',
-                'file_size': file_size,
-                'max_size': max_size
-            }), 400
-        
-        logger.info("[PICPULSE] Tamaño del archivo: %s bytes", file_size)
-        
-        gender = request.form.get('gender', 'Male')
-        age_group = request.form.get('age_group', '25-34')
-        logger.info("[PICPULSE] Parámetros - Gender: %s, Age Group: %s", gender, age_group)
-        
-        url = "https://picpulse-automated-image-quality-scoring-with-psychology-ai1.p.rapidapi.com/analyze_image_detailed/"
-        
-        # Leer el contenido del archivo
-        image_file.seek(0)
-        image_content = image_file.read()
-        logger.info("[PICPULSE] Tamaño de la imagen: %d bytes", len(image_content))
-
-        # Usar un nombre de archivo seguro
-        safe_filename = sanitize_filename(image_file.filename)
-        
-        # Separar imagen y parámetros
-        files = {
-            'image': (safe_filename, image_content, 'image/png')
-        }
-
-        # Parámetros como query params
-        params = {
-            'gender': gender,
-            'age_group': age_group
-        }
-        
-        headers = {
-            "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
-            "x-rapidapi-host": current_app.config['RAPIDAPI_PICPULSE_HOST']
-        }
-
-        logger.info("[PICPULSE] Configuración de la petición:")
-        logger.info("  - URL: %s", url)
-        logger.info("  - Query params: %s", params)
-        logger.info("  - Nombre archivo seguro: %s", safe_filename)
-        
-        logger.info("[PICPULSE] Enviando solicitud a RapidAPI...")
-        response = requests.post(
-            url,
-            files=files,
-            params=params,
-            headers=headers
-        )
-        
-        if response.status_code != 200:
-            logger.error("[PICPULSE] Error en RapidAPI:")
-            logger.error("  - Status Code: %d", response.status_code)
-            logger.error("  - Response: %s", response.text)
-            try:
-                error_json = response.json()
-                logger.error("  - Error JSON: %s", json.dumps(error_json, indent=2))
-            except:
-                logger.error("  - No se pudo parsear la respuesta como JSON")
-            return jsonify({
-                'error': 'Error en la API de PicPulse',
-                'details': response.text
-            }), response.status_code
-            
-        logger.info("[PICPULSE] Respuesta exitosa:")
-        logger.info("  - Status Code: %d", response.status_code)
-        logger.info("  - Response: %s", response.text)
-        try:
-            result = response.json()
-            logger.info("  - Tiempo de atención: %s ms", result.get('attention_time_ms'))
-            logger.info("  - Probabilidad de gustar: %s%%", round(result.get('probability_of_liking', 0) * 100, 2))
-            logger.info("  - Puntuación combinada: %s", result.get('combined_score'))
-        except:
-            logger.error("  - No se pudo parsear la respuesta como JSON")
-        
-        logger.info("="*50)
-        return jsonify(response.json()), 200
-        
+        return run_analysis('analyze_detailed')
+
     except requests.exceptions.RequestException as err:
         logger.error("[PICPULSE] Error de conexión: %s", str(err))
         return jsonify({
@@ -254,4 +239,4 @@ def analyze_image_detailed():
         return jsonify({
             'error': 'Error interno del servidor',
             'details': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
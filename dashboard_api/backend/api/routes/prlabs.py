@@ -1,10 +1,65 @@
-from flask import Blueprint, request, jsonify, current_app, Response
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+import json
+import logging
 import requests
-from flask_jwt_extended import jwt_required
-from api.utils.decorators import credits_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from api.utils.decorators import credits_required, credits_enabled, charge_credits
 from api.utils.credits_config import compute_prlabs_chat_cost, has_image_from_payload
+from api.utils.sse import SSE_HEADERS, sse_event, iter_sse_data, iter_text_chunks
+from api.utils.rapidapi import upstream_post
 
 prlabs_bp = Blueprint('prlabs', __name__)
+logger = logging.getLogger(__name__)
+
+CHAT_URL = "https://chatgpt-42.p.rapidapi.com/chat"
+
+
+def get_chat_headers():
+    """Headers para el chat de chatgpt-42"""
+    return {
+        "content-type": "application/json",
+        "X-RapidAPI-Key": current_app.config['RAPIDAPI_KEY'],
+        "X-RapidAPI-Host": "chatgpt-42.p.rapidapi.com"
+    }
+
+
+def extract_chat_text(body):
+    """Obtiene el texto de una respuesta completa del chat (según el formato del modelo)"""
+    if not isinstance(body, dict):
+        return str(body or '')
+    if isinstance(body.get('result'), str):
+        return body['result']
+    choices = body.get('choices') or []
+    if choices and isinstance(choices[0], dict):
+        message = choices[0].get('message') or {}
+        return message.get('content') or choices[0].get('text') or ''
+    return body.get('response') or body.get('text') or ''
+
+
+def iter_chat_deltas(response):
+    """
+    Fragmentos de texto de la respuesta del chat a medida que llegan.
+    Si el upstream hace streaming (text/event-stream) se reenvían sus deltas;
+    si devuelve la respuesta completa se re-emite en fragmentos.
+    """
+    if 'text/event-stream' in response.headers.get('Content-Type', ''):
+        for data in iter_sse_data(response):
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                yield data
+                continue
+            if not isinstance(chunk, dict):
+                continue  # Valores sueltos (listas, números...) no llevan texto del chat
+            choices = chunk.get('choices')
+            choice = choices[0] if isinstance(choices, list) and choices and isinstance(choices[0], dict) else {}
+            delta = choice.get('delta')
+            text = (delta.get('content') if isinstance(delta, dict) else None) or chunk.get('result')
+            if text and isinstance(text, str):
+                yield text
+        return
+
+    yield from iter_text_chunks(extract_chat_text(response.json()))
 
 @prlabs_bp.before_request
 def debug_prlabs_headers():
@@ -30,26 +85,13 @@ def chat():
         if not prompt:
             return jsonify({'error': 'El prompt es requerido'}), 400
 
-        url = "https://chatgpt-42.p.rapidapi.com/chat"
-        headers = {
-            "content-type": "application/json",
-            "X-RapidAPI-Key": current_app.config['RAPIDAPI_KEY'],
-            "X-RapidAPI-Host": "chatgpt-42.p.rapidapi.com"
-        }
         payload = {
             "model": model,
             "messages": [{"role": "user", "content": prompt}]
         }
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = upstream_post(CHAT_URL, json=payload, headers=get_chat_headers())
         response.raise_for_status()
-        
-        print("DEBUG PRLABS/CHAT - Respuesta de RapidAPI:")
-        print(f"Status: {response.status_code}")
-        print(f"Headers: {dict(response.headers)}")
-        print(f"Content: {response.text}")
-        print(f"JSON: {response.json()}")
-        
         return jsonify(response.json()), 200
 
     except requests.exceptions.HTTPError as errh:
@@ -57,6 +99,70 @@ def chat():
     except Exception as err:
         return jsonify({'error': 'Error al procesar la solicitud', 'details': str(err)}), 500
 
+@prlabs_bp.route('/chat/stream', methods=['POST'])
+@jwt_required()
+def chat_stream():
+    """
+    Chat con respuesta en streaming (SSE): eventos 'token' con cada fragmento,
+    'error' si el upstream se corta y 'done' al final. Los créditos se liquidan
+    al terminar el stream y sólo si se entregó contenido.
+    """
+    data = request.get_json(silent=True) or {}
+    model = data.get('model', 'gpt-4')
+    prompt = data.get('prompt')
+    if not prompt:
+        return jsonify({'error': 'El prompt es requerido'}), 400
+
+    user_id = get_jwt_identity()
+    cost = compute_prlabs_chat_cost(model, has_image_from_payload(data))
+    if credits_enabled():
+        from api.models.user import User
+        user = User.query.get(user_id)
+        if not user:
+            return jsonify({'error': 'Usuario no encontrado'}), 404
+        if not user.has_credits(cost):
+            return jsonify({
+                'error': 'Créditos insuficientes',
+                'available_credits': user.credits,
+                'required_credits': cost
+            }), 402
+
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": True
+    }
+    try:
+        response = upstream_post(CHAT_URL, json=payload, headers=get_chat_headers(), stream=True, timeout=(10, 120))
+    except requests.RequestException as err:
+        return jsonify({'error': 'Error al procesar la solicitud', 'details': str(err)}), 502
+    if response.status_code >= 400:
+        details = response.text
+        response.close()
+        return jsonify({'error': f'{response.status_code} Error del proveedor', 'details': details}), response.status_code
+
+    def generate():
+        delivered = False
+        try:
+            for delta in iter_chat_deltas(response):
+                delivered = True
+                yield sse_event({'content': delta}, event='token')
+        except (requests.RequestException, ValueError) as err:
+            logger.warning(f"Stream de chat interrumpido: {err}")
+            yield sse_event({'error': 'El proveedor interrumpió la respuesta'}, event='error')
+        finally:
+            response.close()
+
+        # Liquidación: sólo se cobra si el cliente recibió contenido
+        charged = 0
+        if delivered:
+            charged, error = charge_credits(user_id, cost)
+            if error:
+                logger.warning(f"No se pudieron cobrar {cost} créditos al usuario {user_id} al cerrar el stream")
+        yield sse_event({'model': model, 'credits_charged': charged}, event='done')
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 @prlabs_bp.route('/image', methods=['POST'])
 @jwt_required()
 @credits_required(amount=3)
@@ -105,7 +211,7 @@ def generate_image():
         print(f"[PRLABS/IMAGE] Headers: {headers}")
         print(f"[PRLABS/IMAGE] Payload enviado a RapidAPI: {payload}")
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = upstream_post(url, json=payload, headers=headers)
         print(f"[PRLABS/IMAGE] Status RapidAPI: {response.status_code}")
         print(f"[PRLABS/IMAGE] Respuesta RapidAPI: {response.text}")
         response.raise_for_status()
@@ -163,7 +269,7 @@ def text_to_speech():
         print(f"[PRLABS/VOICE] Headers: {headers}")
         print(f"[PRLABS/VOICE] Payload enviado a RapidAPI: {payload}")
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = upstream_post(url, json=payload, headers=headers)
         print(f"[PRLABS/VOICE] Status RapidAPI: {response.status_code}")
         print(f"[PRLABS/VOICE] Respuesta RapidAPI: {response.text[:200]}")
         response.raise_for_status()
@@ -209,7 +315,7 @@ def text_generation():
             "model": model
         }
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = upstream_post(url, json=payload, headers=headers)
         response.raise_for_status()
         return jsonify(response.json()), 200
 
@@ -2,12 +2,15 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
 import requests
 from api.utils.decorators import credits_required
+from api.utils.result_cache import memoized
+from api.utils.rapidapi import upstream_get
 
 # Crear blueprint
 product_description_bp = Blueprint('product_description', __name__)
 
 @product_description_bp.route('/generate', methods=['POST'])
 @jwt_required()
+@memoized('product_description', cost=1)
 @credits_required(amount=1)
 def generate_description():
     print("=== DEBUG PRODUCT DESCRIPTION ===")
@@ -36,7 +39,7 @@ def generate_description():
         "x-rapidapi-host": "ai-ecommerce-product-description-generator.p.rapidapi.com"
     }
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        response = upstream_get(url, headers=headers, params=params, timeout=30)
         response.raise_for_status()
         return jsonify(response.json()), 200
     except requests.exceptions.HTTPError as errh:
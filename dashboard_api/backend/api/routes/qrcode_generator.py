@@ -1,7 +1,19 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g, Response
 from flask_jwt_extended import jwt_required
 import requests
-from api.utils.decorators import credits_required
+import csv
+import io
+import json
+import re
+from api.utils.decorators import credits_required, credits_enabled, refund_credits
+from api.utils.error_handlers import ValidationError
+from api.utils.credits_config import get_credits_cost
+from api.utils.process_pool import get_compute_executor, get_pool_size
+from api.utils.qr_engine import (
+    render_qr_response, normalize_options, iter_render_batch, QRRenderError, BATCH_WINDOW_PER_WORKER
+)
+from api.utils.zip_stream import iter_zip
+from api.utils.rapidapi import upstream_get, upstream_post
 from urllib.parse import urlencode
 
 qrcode_generator_bp = Blueprint('qrcode_generator', __name__)
@@ -9,6 +21,80 @@ qrcode_generator_bp = Blueprint('qrcode_generator', __name__)
 RAPIDAPI_HOST = "qrcode-smart-generator.p.rapidapi.com"
 BASE_URL = f"https://{RAPIDAPI_HOST}"
 
+# Tipos cuyo contenido se construye localmente y se renderizan sin llamar a RapidAPI
+LOCAL_QR_TYPES = {'text', 'email', 'wifi', 'sms', 'telephone', 'contact', 'crypto', 'geolocation'}
+
+# Opciones de estilo que sólo soporta el proveedor remoto
+STYLE_OPTIONS = {
+    'logo', 'logo_url', 'image_url', 'fill_color', 'back_color', 'foreground_color',
+    'background_color', 'color', 'gradient', 'style', 'module_style', 'eye_style', 'frame',
+}
+
+# Opciones de renderizado que no forman parte del contenido del QR
+RENDER_OPTIONS = {'output_format', 'error_correction', 'size', 'box_size', 'margin', 'border'}
+
+
+def build_text_content(qtype: str, pl: dict) -> str:
+    """Construye el texto a codificar en el QR según el tipo (mailto, WIFI, MECARD, bitcoin...)"""
+    qtype = (qtype or '').lower()
+    pl = pl or {}
+    if qtype in {'text', 'arbitrary', 'auto'}:
+        return str(pl.get('data') or '')
+    if qtype == 'email':
+        params = {
+            'subject': pl.get('subject') or '',
+            'body': pl.get('body') or ''
+        }
+        email_addr = pl.get('email') or pl.get('address') or ''
+        query = urlencode({k: v for k, v in params.items() if v})
+        return f"mailto:{email_addr}{('?' + query) if query else ''}"
+    if qtype == 'wifi':
+        ssid = pl.get('ssid') or ''
+        password = pl.get('password') or ''
+        encryption = (pl.get('encryption') or 'WPA').upper()
+        hidden = 'true' if str(pl.get('hidden')).lower() in {'1','true','yes'} else 'false'
+        return f"WIFI:T:{encryption};S:{ssid};P:{password};H:{hidden};;"
+    if qtype == 'sms':
+        number = pl.get('number') or ''
+        body = pl.get('body') or ''
+        query = urlencode({'body': body}) if body else ''
+        return f"sms:{number}{('?' + query) if query else ''}"
+    if qtype == 'telephone':
+        number = pl.get('number') or ''
+        return f"tel:{number}"
+    if qtype == 'contact':
+        name = pl.get('name') or ''
+        phone = pl.get('phone') or ''
+        email = pl.get('email') or ''
+        address = pl.get('address') or ''
+        return f"MECARD:N:{name};TEL:{phone};EMAIL:{email};ADR:{address};;"
+    if qtype == 'crypto':
+        currency = (pl.get('currency') or 'BTC').lower()
+        address = pl.get('address') or ''
+        amount = pl.get('amount')
+        if currency == 'btc':
+            query = urlencode({'amount': amount}) if amount else ''
+            return f"bitcoin:{address}{('?' + query) if query else ''}"
+        return str(pl.get('data') or address)
+    if qtype == 'geolocation':
+        lat = pl.get('latitude') or pl.get('lat') or ''
+        lon = pl.get('longitude') or pl.get('lng') or ''
+        return f"geo:{lat},{lon}"
+    return str(pl.get('data') or '')
+
+
+def is_styled_payload(pl) -> bool:
+    """Indica si el payload pide un QR con estilo (sólo disponible en el proveedor remoto)"""
+    return isinstance(pl, dict) and any(pl.get(key) for key in STYLE_OPTIONS)
+
+
+def build_local_content(qtype: str, pl: dict) -> str:
+    """Contenido para el motor local; si sólo llega 'data' se codifica tal cual"""
+    fields = {k for k, v in pl.items() if k not in RENDER_OPTIONS and v not in (None, '')}
+    if qtype != 'text' and fields <= {'data'}:
+        return str(pl.get('data') or '')
+    return build_text_content(qtype, pl)
+
 
 @qrcode_generator_bp.route('/health', methods=['GET'])
 @jwt_required()
@@ -18,7 +104,7 @@ def health_check():
         "x-rapidapi-host": RAPIDAPI_HOST
     }
     try:
-        response = requests.get(f"{BASE_URL}/health", headers=headers, timeout=15)
+        response = upstream_get(f"{BASE_URL}/health", headers=headers, timeout=15)
         return jsonify(response.json()), response.status_code
     except requests.RequestException as e:
         return jsonify({"error": "Error conectando a QRCode API", "details": str(e)}), 502
@@ -52,59 +138,20 @@ def generate_qr_code():
             'supported_types': list(path_by_type.keys())
         }), 400
 
+    # Tipos simples sin estilo: renderizado local, sin round trip a RapidAPI
+    if qr_type in LOCAL_QR_TYPES and isinstance(payload, dict) and not is_styled_payload(payload):
+        try:
+            body = render_qr_response(build_local_content(qr_type, payload), payload)
+        except QRRenderError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(body), 200
+
     headers = {
         'x-rapidapi-key': current_app.config['RAPIDAPI_KEY'],
         'x-rapidapi-host': RAPIDAPI_HOST,
         'Content-Type': 'application/json'
     }
 
-    def build_text_content(qtype: str, pl: dict) -> str:
-        qtype = (qtype or '').lower()
-        pl = pl or {}
-        if qtype in {'text', 'arbitrary', 'auto'}:
-            return str(pl.get('data') or '')
-        if qtype == 'email':
-            params = {
-                'subject': pl.get('subject') or '',
-                'body': pl.get('body') or ''
-            }
-            email_addr = pl.get('email') or pl.get('address') or ''
-            query = urlencode({k: v for k, v in params.items() if v})
-            return f"mailto:{email_addr}{('?' + query) if query else ''}"
-        if qtype == 'wifi':
-            ssid = pl.get('ssid') or ''
-            password = pl.get('password') or ''
-            encryption = (pl.get('encryption') or 'WPA').upper()
-            hidden = 'true' if str(pl.get('hidden')).lower() in {'1','true','yes'} else 'false'
-            return f"WIFI:T:{encryption};S:{ssid};P:{password};H:{hidden};;"
-        if qtype == 'sms':
-            number = pl.get('number') or ''
-            body = pl.get('body') or ''
-            query = urlencode({'body': body}) if body else ''
-            return f"sms:{number}{('?' + query) if query else ''}"
-        if qtype == 'telephone':
-            number = pl.get('number') or ''
-            return f"tel:{number}"
-        if qtype == 'contact':
-            name = pl.get('name') or ''
-            phone = pl.get('phone') or ''
-            email = pl.get('email') or ''
-            address = pl.get('address') or ''
-            return f"MECARD:N:{name};TEL:{phone};EMAIL:{email};ADR:{address};;"
-        if qtype == 'crypto':
-            currency = (pl.get('currency') or 'BTC').lower()
-            address = pl.get('address') or ''
-            amount = pl.get('amount')
-            if currency == 'btc':
-                query = urlencode({'amount': amount}) if amount else ''
-                return f"bitcoin:{address}{('?' + query) if query else ''}"
-            return str(pl.get('data') or address)
-        if qtype == 'geolocation':
-            lat = pl.get('latitude') or pl.get('lat') or ''
-            lon = pl.get('longitude') or pl.get('lng') or ''
-            return f"geo:{lat},{lon}"
-        return str(pl.get('data') or '')
-
     try:
         # Fallback inteligente: si el tipo requiere campos específicos pero recibimos sólo "data",
         # redirigimos al endpoint /qr/auto para evitar errores de validación de la API externa.
@@ -115,7 +162,7 @@ def generate_qr_code():
         # Asegurar formato por defecto
         if isinstance(payload, dict) and 'output_format' not in payload:
             payload['output_format'] = 'png'
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = upstream_post(url, json=payload, headers=headers, timeout=30)
 
         # Si la API responde 401/403, intentar fallback con proveedor alterno SVG
         if response.status_code in (401, 403):
@@ -125,7 +172,7 @@ def generate_qr_code():
                     'data': build_text_content(qr_type, payload if isinstance(payload, dict) else {}),
                     'output_format': 'png'
                 }
-                text_resp = requests.post(f"{BASE_URL}/qr/text", json=text_payload, headers=headers, timeout=30)
+                text_resp = upstream_post(f"{BASE_URL}/qr/text", json=text_payload, headers=headers, timeout=30)
                 if text_resp.status_code == 200:
                     body = text_resp.json() if text_resp.headers.get('content-type','').startswith('application/json') else {'raw': text_resp.text}
                     body['provider'] = 'qrcode-smart-generator/text'
@@ -140,7 +187,7 @@ def generate_qr_code():
                 'x-rapidapi-host': 'smart-qr-code-with-logo.p.rapidapi.com',
             }
             alt_payload = {'text': build_text_content(qr_type, payload if isinstance(payload, dict) else {})}
-            alt_resp = requests.post(alt_url, headers=alt_headers, json=alt_payload, timeout=30)
+            alt_resp = upstream_post(alt_url, headers=alt_headers, json=alt_payload, timeout=30)
             if alt_resp.status_code == 200:
                 try:
                     svg = alt_resp.content.decode('utf-8')
@@ -196,3 +243,174 @@ def generate_qr_code():
         raise Exception(f"Network error calling QRCode API: {str(e)}")
 
 
+
+
+MAX_BATCH_ITEMS = 5000
+
+
+def parse_batch_items():
+    """
+    Lee los elementos del lote desde la petición.
+
+    Acepta un archivo 'file' (.csv o .jsonl), un cuerpo CSV / JSON lines
+    o un JSON con la lista en 'items'. Las líneas inválidas se conservan
+    como errores para reportarlas en el manifiesto.
+    """
+    upload = request.files.get('file')
+    if upload:
+        raw = upload.read().decode('utf-8-sig', errors='replace')
+        fmt = 'csv' if (upload.filename or '').lower().endswith('.csv') else 'jsonl'
+    elif request.is_json:
+        body = request.get_json(silent=True)
+        items = body.get('items') if isinstance(body, dict) else body
+        if not isinstance(items, list):
+            raise ValueError("Se requiere una lista de elementos en 'items'")
+        return items
+    else:
+        raw = request.get_data(as_text=True)
+        fmt = 'csv' if 'csv' in (request.mimetype or '') else 'jsonl'
+
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(raw))
+        return [{k.strip(): v for k, v in row.items() if k and v not in (None, '')} for row in reader]
+
+    items = []
+    for line_number, line in enumerate(raw.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(QRRenderError(f"Línea {line_number}: JSON inválido"))
+    return items
+
+
+def get_batch_items():
+    """Elementos del lote de la petición actual (se parsean una sola vez)"""
+    if 'qr_batch_items' not in g:
+        try:
+            g.qr_batch_items = parse_batch_items()
+            g.qr_batch_error = None
+        except ValueError as e:
+            g.qr_batch_items = []
+            g.qr_batch_error = str(e)
+    return g.qr_batch_items
+
+
+def prepare_batch_item(item, defaults):
+    """Convierte un elemento del lote en (nombre, contenido, opciones) o lanza QRRenderError"""
+    if isinstance(item, Exception):
+        raise item
+    if isinstance(item, str):
+        item = {'data': item}
+    if not isinstance(item, dict):
+        raise QRRenderError("Cada elemento debe ser un objeto o un texto")
+
+    qr_type = str(item.get('type') or 'text').lower()
+    if isinstance(item.get('payload'), dict):
+        payload = item['payload']
+    else:
+        payload = {k: v for k, v in item.items() if k not in {'type', 'filename', 'payload'}}
+
+    if qr_type not in LOCAL_QR_TYPES | {'arbitrary', 'auto'}:
+        raise QRRenderError(f"Tipo de QR no soportado en lote: {qr_type}")
+    if is_styled_payload(payload):
+        raise QRRenderError("Los QR con estilo no están disponibles en lote")
+
+    options = dict(defaults)
+    options.update({k: payload[k] for k in RENDER_OPTIONS if k in payload})
+    normalize_options(options)
+
+    content = build_local_content(qr_type if qr_type in LOCAL_QR_TYPES else 'text', payload)
+    if not content:
+        raise QRRenderError("El contenido del QR está vacío")
+
+    name = re.sub(r'[^A-Za-z0-9._-]+', '_', str(item.get('filename') or 'qr')).strip('._')[:80] or 'qr'
+    return name, content, options
+
+
+def get_batch_defaults():
+    """Opciones de renderizado comunes del lote (query string o formulario)"""
+    source = request.form if request.files else request.args
+    defaults = {k: source.get(k) for k in RENDER_OPTIONS if source.get(k) not in (None, '')}
+    try:
+        normalize_options(defaults)
+    except QRRenderError as e:
+        raise ValidationError(str(e))
+    return defaults
+
+
+def batch_cost():
+    """
+    Créditos del lote: se valida antes de cobrar, así un lote rechazado (400) no
+    descuenta nada
+    """
+    items = get_batch_items()
+    if g.qr_batch_error:
+        raise ValidationError(g.qr_batch_error)
+    if not items:
+        raise ValidationError('El lote está vacío')
+    if len(items) > MAX_BATCH_ITEMS:
+        raise ValidationError(f'El lote supera el máximo de {MAX_BATCH_ITEMS} elementos')
+    get_batch_defaults()
+    return len(items) * get_credits_cost('qrcode_generator')
+
+
+@qrcode_generator_bp.route('/batch', methods=['POST'])
+@jwt_required()
+@credits_required(amount=batch_cost)
+def generate_qr_batch():
+    """Genera un lote de QR en paralelo y lo devuelve como ZIP en streaming con un manifest.json"""
+    items = get_batch_items()
+    defaults = get_batch_defaults()
+    # El ZIP se genera después de responder: para devolver los créditos de los
+    # elementos fallidos hace falta la app y el cobro hecho por el decorador
+    app = current_app._get_current_object()
+    charged = g.get('credits_charged') if credits_enabled() else None
+
+    manifest = []
+    names = {}
+
+    def jobs():
+        for index, item in enumerate(items):
+            try:
+                name, content, options = prepare_batch_item(item, defaults)
+            except QRRenderError as e:
+                manifest.append({'index': index, 'status': 'error', 'error': str(e)})
+                continue
+            names[index] = name
+            yield index, content, options
+
+    def entries():
+        window = get_pool_size() * BATCH_WINDOW_PER_WORKER
+        for index, data, content_type, error in iter_render_batch(jobs(), get_compute_executor(), window):
+            if error:
+                manifest.append({'index': index, 'name': names[index], 'status': 'error', 'error': error})
+                continue
+            extension = 'svg' if content_type == 'image/svg+xml' else 'png'
+            filename = f"{index + 1:05d}_{names[index]}.{extension}"
+            manifest.append({'index': index, 'name': names[index], 'status': 'ok', 'file': filename})
+            yield filename, data, extension == 'svg'
+
+        manifest.sort(key=lambda entry: entry['index'])
+        failed = sum(1 for entry in manifest if entry['status'] == 'error')
+        refunded = 0
+        if charged and failed:
+            refunded = min(charged[1], failed * get_credits_cost('qrcode_generator'))
+            with app.app_context():
+                refund_credits(charged[0], refunded)
+        summary = {
+            'total': len(items),
+            'generated': len(manifest) - failed,
+            'failed': failed,
+            'credits_refunded': refunded,
+            'items': manifest,
+        }
+        yield 'manifest.json', json.dumps(summary, ensure_ascii=False, indent=2).encode('utf-8'), True
+
+    return Response(
+        iter_zip(entries()),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename="qr_batch.zip"'}
+    )
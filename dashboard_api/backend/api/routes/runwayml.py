@@ -1,9 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required
-import requests
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import logging
+from api.models.job import Job
 from api.utils.decorators import credits_required
+from api.utils.runway_jobs import submit_generation, handle_callback, JOB_KIND
+from api.utils.rapidapi import upstream_get
 
 runwayml_bp = Blueprint('runwayml', __name__)
+logger = logging.getLogger(__name__)
+
+
+def find_job_by_upstream_id(uuid):
+    """Busca el trabajo local asociado a un task de RunwayML"""
+    return Job.query.filter_by(kind=JOB_KIND, upstream_id=uuid).first()
 
 @runwayml_bp.route('/process', methods=['POST'])
 @jwt_required()
@@ -12,12 +21,6 @@ def process_runwayml():
     data = request.json
     print('DEBUG RUNWAYML PAYLOAD:', data)
     operation = data.get('operation')
-    api_key = current_app.config['RAPIDAPI_KEY']
-    headers = {
-        "x-rapidapi-key": api_key,
-        "x-rapidapi-host": "runwayml.p.rapidapi.com",
-        "Content-Type": "application/json"
-    }
 
     if operation == 'generate_by_text':
         required = ['text_prompt', 'model', 'width', 'height', 'motion', 'seed', 'time']
@@ -72,9 +75,11 @@ def process_runwayml():
         return jsonify({'error': 'Invalid operation'}), 400
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        print('RUNWAYML RAW RESPONSE:', response.status_code, response.text)
-        return jsonify(response.json()), response.status_code
+        # El worker de trabajos consulta el estado en segundo plano; el cliente lee el estado desde la DB
+        job, body, status_code = submit_generation(get_jwt_identity(), url, payload)
+        if isinstance(body, dict):
+            body = dict(body, job_id=job.id)
+        return jsonify(body), status_code
     except Exception as e:
         return jsonify({"error": "Error interno del servidor", "details": str(e)}), 500
 
@@ -84,6 +89,17 @@ def process_runwayml():
 def check_task_status(uuid):
     """Verificar el estado de un task de RunwayML"""
     try:
+        # Si el task tiene un trabajo local, responder desde la DB sin llamar al proveedor
+        job = find_job_by_upstream_id(uuid)
+        if job and job.last_update is not None:
+            body = dict(job.last_update)
+            if job.status == Job.STATUS_SUCCEEDED:
+                body['status'] = 'completed'
+            elif job.status == Job.STATUS_FAILED:
+                body.update({'status': 'failed', 'message': job.error})
+            body['job_id'] = job.id
+            return jsonify(body), 200
+
         api_url = f"https://runwayml.p.rapidapi.com/status"
         headers = {
             "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
@@ -91,7 +107,7 @@ def check_task_status(uuid):
         }
         params = {"uuid": uuid}
         
-        response = requests.get(api_url, headers=headers, params=params, timeout=30)
+        response = upstream_get(api_url, headers=headers, params=params, timeout=30)
         
         if response.status_code != 200:
             return jsonify({"error": "Error al consultar estado", "details": response.text}), response.status_code
@@ -108,13 +124,17 @@ def check_task_status(uuid):
 def get_task_result(uuid):
     """Obtener el resultado de un task completado de RunwayML"""
     try:
+        job = find_job_by_upstream_id(uuid)
+        if job and job.result is not None:
+            return jsonify(job.result), 200
+
         api_url = f"https://runwayml.p.rapidapi.com/queue/{uuid}/result"
         headers = {
             "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
             "x-rapidapi-host": "runwayml.p.rapidapi.com"
         }
         
-        response = requests.get(api_url, headers=headers, timeout=30)
+        response = upstream_get(api_url, headers=headers, timeout=30)
         
         if response.status_code != 200:
             return jsonify({"error": "Error al obtener resultado", "details": response.text}), response.status_code
@@ -123,4 +143,24 @@ def get_task_result(uuid):
         
     except Exception as e:
         logger.error(f"Error obteniendo resultado: {str(e)}")
-        return jsonify({"error": "Error interno del servidor", "details": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": "Error interno del servidor", "details": str(e)}), 500 
+
+@runwayml_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Estado de un trabajo de RunwayML servido desde la base de datos"""
+    job = Job.query.filter_by(id=job_id, kind=JOB_KIND).first()
+    if not job or str(job.user_id) != str(get_jwt_identity()):
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job.to_dict()), 200
+
+@runwayml_bp.route('/callback/<token>', methods=['POST'])
+def runwayml_callback(token):
+    """Recibe el webhook de RunwayML con el estado o el resultado de una generación"""
+    body = request.get_json(silent=True)
+    if body is None:
+        body = request.form.to_dict()
+    job = handle_callback(token, body)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify({'received': True, 'status': job.status}), 200
@@ -3,7 +3,12 @@ from flask_jwt_extended import jwt_required
 import requests
 import logging
 import os
+from api.utils.canonical import normalize_url
 from api.utils.decorators import credits_required
+from api.utils.domain_profiles import profile_key_for_url, stored_facet, save_facet, profile_response
+from api.utils.page_fetch import PageFetchError
+from api.utils.seo_audit import audit_url
+from api.utils.rapidapi import upstream_get
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +24,7 @@ def handle_options():
 @jwt_required()
 @credits_required(amount=2)
 def analyze_seo():
-    """Analizar SEO de una URL usando la API de SEO Analyzer"""
+    """Analizar el SEO on-page de una URL (auditoría local; SEO Analyzer como respaldo opcional)"""
     data = request.get_json()
     url = data.get('url')
     
@@ -27,9 +32,23 @@ def analyze_seo():
         return jsonify({'error': 'Se requiere una URL para analizar'}), 400
 
     # Formatear la URL para asegurar que tenga el esquema
-    url = url.strip()
-    if not url.startswith('http://') and not url.startswith('https://'):
-        url = f'https://{url}'
+    url = normalize_url(url)
+
+    profile_domain, path = profile_key_for_url(url)
+    stored = stored_facet(profile_domain, 'seo_audit', path)
+    if stored is not None:
+        return profile_response(stored, hit=True)
+
+    if current_app.config.get('SEO_ANALYZER_ENGINE', 'local') == 'local':
+        try:
+            transformed_data = audit_url(url)
+            if profile_domain:
+                save_facet(profile_domain, 'seo_audit', transformed_data, path)
+            return profile_response(transformed_data, hit=False)
+        except PageFetchError as e:
+            logger.warning(f"[SEOAnalyzer] Auditoría local fallida para {url}: {e.message}")
+            if e.status_code == 400 or not current_app.config.get('SEO_ANALYZER_FALLBACK', False):
+                return jsonify({'error': 'No se pudo analizar la página', 'details': e.message}), e.status_code
 
     api_url = "https://seo-analyzer3.p.rapidapi.com/seo-audit-basic"
     headers = {
@@ -44,7 +63,7 @@ def analyze_seo():
         print(f"[SEOAnalyzer] URL a analizar: {url}")
         print(f"[SEOAnalyzer] Llamando a RapidAPI con: {params}")
         
-        response = requests.get(api_url, headers=headers, params=params)
+        response = upstream_get(api_url, headers=headers, params=params)
         print(f"[SEOAnalyzer] Status: {response.status_code}")
         print(f"[SEOAnalyzer] Response: {response.text[:500]}...")
         
@@ -83,7 +102,9 @@ def analyze_seo():
         print(f"[SEOAnalyzer] Análisis completado exitosamente para: {url}")
         print(f"[SEOAnalyzer] Score calculado: {transformed_data['score']}")
         
-        return jsonify(transformed_data), 200
+        if profile_domain:
+            save_facet(profile_domain, 'seo_audit', transformed_data, path)
+        return profile_response(transformed_data, hit=False)
 
     except requests.exceptions.RequestException as e:
         return jsonify({
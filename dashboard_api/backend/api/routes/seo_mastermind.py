@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, current_app
 import requests
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.result_cache import memoized
+from api.utils.rapidapi import upstream_get
 
 seo_mastermind_bp = Blueprint('seo_mastermind', __name__)
 
@@ -14,6 +16,7 @@ def handle_options():
 @seo_mastermind_bp.route('', methods=['POST'])
 @seo_mastermind_bp.route('/', methods=['POST'])
 @jwt_required()
+@memoized('seo_mastermind', cost=2)
 @credits_required(amount=2)
 def generate_seo():
     """Generar análisis SEO para una keyword"""
@@ -32,7 +35,7 @@ def generate_seo():
 
     try:
         print(f"[SEOMastermind] Analizando keyword: {keyword}")
-        response = requests.get(api_url, headers=headers, params=params)
+        response = upstream_get(api_url, headers=headers, params=params)
         print(f"[SEOMastermind] Status: {response.status_code}")
         print(f"[SEOMastermind] Response: {response.text}")
         
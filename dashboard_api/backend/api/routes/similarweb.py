@@ -3,6 +3,9 @@ from flask_jwt_extended import jwt_required
 import requests
 import os
 from api.utils.decorators import credits_required
+from api.utils.canonical import canonical_domain
+from api.utils.domain_profiles import stored_facet, save_facet, profile_response
+from api.utils.rapidapi import upstream_get
 
 # Crear blueprint
 similarweb_bp = Blueprint('similarweb', __name__)
@@ -16,6 +19,11 @@ def get_insights():
     if not domain:
         return jsonify({'error': 'El campo "domain" es obligatorio.'}), 400
 
+    profile_domain = canonical_domain(domain)
+    stored = stored_facet(profile_domain, 'similarweb')
+    if stored is not None:
+        return profile_response(stored, hit=True)
+
     url = "https://similarweb-insights.p.rapidapi.com/all-insights"
     params = {"domain": domain}
     headers = {
@@ -23,9 +31,12 @@ def get_insights():
         "x-rapidapi-host": "similarweb-insights.p.rapidapi.com"
     }
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
-        return jsonify(response.json()), 200
+        insights = response.json()
+        if profile_domain:
+            save_facet(profile_domain, 'similarweb', insights)
+        return profile_response(insights, hit=False)
     except requests.exceptions.HTTPError as errh:
         return jsonify({'error': str(errh), 'details': response.text}), response.status_code
     except requests.exceptions.RequestException as err:
@@ -50,7 +61,7 @@ def get_website_details():
         "x-rapidapi-host": "similarweb-insights.p.rapidapi.com"
     }
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
+        response = upstream_get(url, headers=headers, params=params, timeout=20)
         response.raise_for_status()
         # Manejar caso de HTML devuelto por error/protección
         if 'text/html' in response.headers.get('content-type', ''):
@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required
 import requests
 import logging
 from api.utils.decorators import credits_required
+from api.utils.jobs import register_job_handler, async_job, JobError
+from api.utils.rapidapi import upstream_post
 
 media_downloader_bp = Blueprint('media_downloader', __name__)
 logger = logging.getLogger(__name__)
@@ -13,8 +15,40 @@ def handle_options():
     """Manejar peticiones OPTIONS para CORS"""
     return '', 200
 
+@register_job_handler('snap_video')
+def snap_video_job(payload):
+    """Handler de la descarga de media ejecutada en segundo plano"""
+    headers = {
+        "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
+        "x-rapidapi-host": "snap-video3.p.rapidapi.com",
+        "Content-Type": "application/x-www-form-urlencoded"
+    }
+    try:
+        response = upstream_post("https://snap-video3.p.rapidapi.com/download", data={"url": payload['url']}, headers=headers, timeout=30)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error de conexión (trabajo): {str(e)}")
+        raise JobError('Error de conexión con la API externa')
+
+    if response.status_code != 200:
+        raise JobError(f'Error en la API de Media Downloader ({response.status_code})')
+    try:
+        response_data = response.json()
+    except ValueError:
+        raise JobError('Respuesta inválida de la API')
+    if not response_data:
+        raise JobError('Respuesta vacía de la API externa')
+    return response_data
+
+def build_download_payload():
+    """Valida la petición de descarga y devuelve el payload del trabajo"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('url'):
+        return jsonify({'error': 'url is required'}), 400
+    return {'url': data['url']}
+
 @media_downloader_bp.route('/download', methods=['POST'])
 @jwt_required()
+@async_job('snap_video', 1, build_download_payload)
 @credits_required(amount=1)  # Snap Video cuesta 1 punto
 def download_media():
     """Descargar videos y audio de múltiples plataformas"""
@@ -39,7 +73,7 @@ def download_media():
         logger.info(f"Headers: {headers}")
         logger.info(f"Payload: {payload}")
         
-        response = requests.post(api_url, data=payload, headers=headers, timeout=30)
+        response = upstream_post(api_url, data=payload, headers=headers, timeout=30)
         
         logger.info(f"Status code de RapidAPI: {response.status_code}")
         logger.info(f"Headers de respuesta: {dict(response.headers)}")
@@ -2,6 +2,8 @@ from flask import Blueprint, request, jsonify, current_app
 import requests
 import logging
 from api.utils.decorators import credits_required
+from api.utils.result_cache import memoized
+from api.utils.rapidapi import upstream_post
 from flask_jwt_extended import jwt_required
 
 social_media_content_bp = Blueprint('social_media_content', __name__)
@@ -9,6 +11,7 @@ logger = logging.getLogger(__name__)
 
 @social_media_content_bp.route('/generate', methods=['POST'])
 # @jwt_required()  # Comentado temporalmente para pruebas
+@memoized('social_media_content', cost=2)
 @credits_required(amount=2)  # Social Media Content cuesta 2 puntos
 def generate_social_media_content():
     """Genera contenido para redes sociales usando la API externa"""
@@ -54,7 +57,7 @@ def generate_social_media_content():
         print(f"Headers: {headers}")
         print(f"URL: {api_url}")
 
-        response = requests.post(api_url, json=payload, headers=headers, timeout=20)
+        response = upstream_post(api_url, json=payload, headers=headers, timeout=20)
         print(f"RapidAPI Status: {response.status_code}")
         print(f"RapidAPI Response: {response.text}")
 
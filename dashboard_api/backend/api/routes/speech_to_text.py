@@ -4,6 +4,8 @@ from flask import Blueprint, jsonify, current_app, request
 from flask_jwt_extended import jwt_required
 from utils.decorators import handle_api_errors
 from api.utils.decorators import credits_required
+from api.utils.jobs import register_job_handler, async_job, JobError
+from api.utils.rapidapi import upstream_get, upstream_post
 
 logger = logging.getLogger(__name__)
 
@@ -23,41 +25,63 @@ def make_api_request(endpoint, method='GET', params=None, data=None):
         headers = get_headers()
         
         # Siempre usar GET con los parámetros como query string
-        response = requests.get(url, headers=headers, params=params)
+        response = upstream_get(url, headers=headers, params=params)
             
         response.raise_for_status()
         return response.json()
     except requests.RequestException as e:
         raise
 
+def get_transcribe_params():
+    """Obtiene url e idioma de la petición según el método (None si falta la URL)"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not data or 'url' not in data:
+            return None
+        return {'url': data['url'], 'lang': data.get('language', 'en')}
+    url = request.args.get('url')
+    if not url:
+        return None
+    return {'url': url, 'lang': request.args.get('lang', 'en')}
+
+def transcribe(url, lang):
+    """Transcribe el audio de una URL con Speech to Text AI"""
+    params = {
+        'url': url,
+        'lang': lang,
+        'task': 'transcribe'
+    }
+    return make_api_request('transcribe', params=params)
+
+@register_job_handler('speech_to_text')
+def speech_to_text_job(payload):
+    """Handler de la transcripción ejecutada en segundo plano"""
+    try:
+        return transcribe(payload['url'], payload['lang'])
+    except requests.RequestException as e:
+        logger.error(f"Error transcribiendo audio en segundo plano: {str(e)}")
+        raise JobError('Error al transcribir el audio')
+
+def build_transcribe_payload():
+    """Valida la petición de transcripción y devuelve el payload del trabajo"""
+    params = get_transcribe_params()
+    if not params:
+        return jsonify({'error': 'Se requiere una URL de audio/video'}), 400
+    return params
+
 @speech_to_text_bp.route('/transcribe', methods=['GET', 'POST'])
 @jwt_required()
+@async_job('speech_to_text', 1, build_transcribe_payload)
 @credits_required(amount=1)
 @handle_api_errors
 def transcribe_audio():
     """Transcribe audio desde una URL"""
-    # Obtener parámetros según el método
-    if request.method == 'POST':
-        data = request.get_json()
-        if not data or 'url' not in data:
-            return jsonify({'error': 'Se requiere una URL de audio/video'}), 400
-        url = data['url']
-        lang = data.get('language', 'en')
-    else:  # GET
-        url = request.args.get('url')
-        if not url:
-            return jsonify({'error': 'Se requiere una URL de audio/video'}), 400
-        lang = request.args.get('lang', 'en')
+    params = get_transcribe_params()
+    if not params:
+        return jsonify({'error': 'Se requiere una URL de audio/video'}), 400
     
     try:
-        # Construir los parámetros de la petición
-        params = {
-            'url': url,
-            'lang': lang,
-            'task': 'transcribe'
-        }
-        
-        result = make_api_request('transcribe', params=params)
+        result = transcribe(params['url'], params['lang'])
         return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': 'Error al transcribir el audio'}), 500
@@ -124,7 +148,7 @@ def whisper_from_url():
         # Filtrar valores None del payload
         payload = {k: v for k, v in payload.items() if v is not None}
         
-        response = requests.post(url, data=payload, headers=headers)
+        response = upstream_post(url, data=payload, headers=headers)
         response.raise_for_status()
         
         result = response.json()
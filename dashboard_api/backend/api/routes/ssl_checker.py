@@ -1,6 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
 import requests
 from api.utils.decorators import credits_required
+from api.utils.domain_intel import map_ssl_result
+from api.utils.canonical import canonical_host
+from api.utils.domain_profiles import stored_facet, save_facet, profile_response
+from api.utils.tls_inspect import (
+    parse_target, inspect_certificate, target_policy, check_port, resolve_public_address, TLSInspectionError,
+    TLSTargetError, DEFAULT_PORT
+)
+from concurrent.futures import ThreadPoolExecutor
+from api.utils.deadline import upstream_timeout
+from api import db
+from api.models import SSLWatch
+from api.utils.rapidapi import upstream_get
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 # Crear blueprint
@@ -19,15 +31,56 @@ def check_ssl():
     if not domain:
         return {'error': 'El campo "domain" es obligatorio.'}, 400
 
+    try:
+        host, port = parse_target(domain, data.get('port'))
+    except (TypeError, ValueError):
+        return {'error': 'El campo "port" debe ser un número de puerto válido.'}, 400
+    if not host:
+        return {'error': 'Dominio o puerto inválido.'}, 400
+    policy = target_policy(current_app.config)
+    try:
+        check_port(port, policy['allowed_ports'])
+    except TLSTargetError as e:
+        return {'error': str(e)}, 400
+
+    # Un registro por (host, puerto): www y el dominio desnudo pueden servir certificados distintos,
+    # así que no se canoniza quitando 'www.'. El puerto por defecto usa la ruta '/'
+    profile_domain = canonical_host(host)
+    profile_path = '/' if port == DEFAULT_PORT else f':{port}'
+    stored = stored_facet(profile_domain, 'ssl', profile_path)
+    if stored is not None:
+        return profile_response({'status': 'success', 'data': stored}, hit=True)
+
+    if current_app.config.get('SSL_CHECKER_ENGINE', 'local') == 'local':
+        max_timeout = current_app.config.get('SSL_CHECKER_TIMEOUT', 10)
+        try:
+            requested = float(data.get('timeout') or max_timeout)
+        except (TypeError, ValueError):
+            return {'error': 'El campo "timeout" debe ser numérico.'}, 400
+        try:
+            # El cliente solo puede acortar el timeout; el plazo de la petición manda
+            timeout = upstream_timeout(min(max(requested, 0.5), max_timeout))
+            result = inspect_certificate(host, port, timeout, **policy)
+            if profile_domain:
+                save_facet(profile_domain, 'ssl', result, profile_path)
+            return profile_response({'status': 'success', 'data': result}, hit=False)
+        except TLSTargetError as e:
+            return {'error': 'Destino no permitido', 'details': str(e)}, 400
+        except TLSInspectionError as e:
+            print(f"[SSLChecker] Inspección local fallida: {e}")
+            if not current_app.config.get('SSL_CHECKER_FALLBACK', True) or port != DEFAULT_PORT:
+                return {'error': 'No se pudo inspeccionar el certificado', 'details': str(e)}, 502
+
+    # Respaldo: RapidAPI (solo admite el puerto por defecto)
     api_url = "https://ssl-checker2.p.rapidapi.com/"
-    params = {"domain": domain}
+    params = {"domain": host}
     headers = {
         "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
         "x-rapidapi-host": "ssl-checker2.p.rapidapi.com"
     }
     print(f"[SSLChecker] Llamando a RapidAPI con: {params}")
     try:
-        response = requests.get(api_url, headers=headers, params=params, timeout=20)
+        response = upstream_get(api_url, headers=headers, params=params, timeout=20)
         print(f"[SSLChecker] Status: {response.status_code}")
         print(f"[SSLChecker] Response: {response.text}")
         response.raise_for_status()
@@ -35,22 +88,10 @@ def check_ssl():
         # Procesar la respuesta para el frontend
         ssl_data = response.json()
         if ssl_data.get('status') == 'success' and ssl_data.get('result'):
-            result = ssl_data['result']
-            return {
-                'status': 'success',
-                'data': {
-                    'issuer': result.get('issuer', '-'),
-                    'validFrom': result.get('validFromDate', '-'),
-                    'validUntil': result.get('expiry', '-'),
-                    'daysLeft': result.get('daysLeft', '-'),
-                    'lifespan': result.get('lifespanInDays', '-'),
-                    'domain': result.get('final_url', domain),
-                    'port': result.get('port', '-'),
-                    'isValid': result.get('isvalidCertificate', False),
-                    'isExpired': result.get('isExpired', False),
-                    'message': result.get('message', '')
-                }
-            }, 200
+            result = map_ssl_result(ssl_data['result'], host)
+            if profile_domain:
+                save_facet(profile_domain, 'ssl', result, profile_path)
+            return profile_response({'status': 'success', 'data': result}, hit=False)
         else:
             return {'error': 'Error en la respuesta de la API externa'}, 500
             
@@ -60,4 +101,81 @@ def check_ssl():
         return {'error': str(errh), 'details': response.text}, response.status_code
     except requests.exceptions.RequestException as err:
         print(f"[SSLChecker] Request Error: {err}")
-        return {'error': 'Error de conexión con la API externa', 'details': str(err)}, 502 
\ No newline at end of file
+        return {'error': 'Error de conexión con la API externa', 'details': str(err)}, 502
+
+@ssl_checker_bp.route('/watchlist', methods=['GET'])
+@jwt_required()
+def get_watchlist():
+    """Dominios vigilados por el usuario con el último estado de su certificado"""
+    watches = SSLWatch.query.filter_by(user_id=int(get_jwt_identity()))\
+        .order_by(SSLWatch.days_left.is_(None), SSLWatch.days_left, SSLWatch.host)\
+        .all()
+    return jsonify({'watchlist': [watch.to_dict() for watch in watches]}), 200
+
+@ssl_checker_bp.route('/watchlist', methods=['POST'])
+@jwt_required()
+def add_to_watchlist():
+    """
+    Agrega dominios a la vigilancia de caducidad ('domains': lista o 'domain').
+    La primera revisión se hace en el siguiente ciclo del escáner.
+    """
+    data = request.get_json(silent=True) or {}
+    values = data.get('domains') or ([data['domain']] if data.get('domain') else [])
+    if not isinstance(values, list) or not values:
+        return jsonify({'error': 'El campo "domains" es obligatorio.'}), 400
+
+    targets, invalid = [], []
+    for value in values:
+        try:
+            host, port = parse_target(value, data.get('port')) if isinstance(value, str) else (None, None)
+        except (TypeError, ValueError):
+            host, port = None, None
+        if host:
+            targets.append((host, port))
+        else:
+            invalid.append(value)
+    targets = list(dict.fromkeys(targets))
+
+    # Mismas restricciones que la inspección (se repiten en cada escaneo por si el DNS cambia)
+    policy = target_policy(current_app.config)
+
+    def check_target(target):
+        try:
+            check_port(target[1], policy['allowed_ports'])
+            resolve_public_address(target[0], target[1], policy['allow_private'])
+        except TLSInspectionError as e:
+            return str(e)
+        return None
+
+    rejected = []
+    if targets:
+        with ThreadPoolExecutor(max_workers=min(16, len(targets))) as executor:
+            errors = list(executor.map(check_target, targets))
+        rejected = [{'domain': f'{host}:{port}', 'error': error} for (host, port), error in zip(targets, errors) if error]
+        targets = [target for target, error in zip(targets, errors) if not error]
+
+    user_id = int(get_jwt_identity())
+    existing = {(watch.host, watch.port) for watch in SSLWatch.query.filter_by(user_id=user_id).all()}
+    new_targets = [target for target in targets if target not in existing]
+    max_entries = current_app.config.get('SSL_WATCHLIST_MAX_ENTRIES', 1000)
+    if len(existing) + len(new_targets) > max_entries:
+        return jsonify({'error': f'La lista de vigilancia admite como máximo {max_entries} dominios'}), 400
+
+    for host, port in new_targets:
+        db.session.add(SSLWatch(user_id=user_id, host=host, port=port))
+    db.session.commit()
+    return jsonify({
+        'added': len(new_targets),
+        'alreadyWatched': len(targets) - len(new_targets),
+        'invalid': invalid,
+        'rejected': rejected
+    }), 201
+
+@ssl_checker_bp.route('/watchlist/<int:watch_id>', methods=['DELETE'])
+@jwt_required()
+def remove_from_watchlist(watch_id):
+    """Deja de vigilar un dominio"""
+    watch = SSLWatch.query.filter_by(id=watch_id, user_id=int(get_jwt_identity())).first_or_404()
+    db.session.delete(watch)
+    db.session.commit()
+    return jsonify({'message': 'Dominio eliminado de la vigilancia'}), 200
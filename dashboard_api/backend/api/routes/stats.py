@@ -6,7 +6,11 @@ import random
 from api import db
 from api.models.app import App, ApiUsage, UserApp
 from api.models.user import User
+from api.utils.circuit_breaker import get_circuit_breakers
 from api.utils.decorators import role_required
+from api.utils.process_pool import get_compute_executor
+from api.utils.rapidapi_keys import get_key_pool
+from api.utils.upstream_policy import get_latency_tracker
 
 # Crear blueprint
 stats_bp = Blueprint('stats', __name__)
@@ -60,30 +64,56 @@ def get_usage(user=None):
         for title, count in usage_counts
     ]
 
+CIRCUIT_STATUS = {'ok': "Operativo", 'warning': "Advertencia", 'critical': "Crítico"}
+
+
+def uptime_status(uptime):
+    """Estado y color según el porcentaje de llamadas exitosas del histórico"""
+    if uptime >= 95:
+        return "Operativo", "success"
+    if uptime >= 80:
+        return "Advertencia", "warning"
+    if uptime >= 50:
+        return "Crítico", "error"
+    return "Fuera de servicio", "error"
+
+
+def app_blueprints(app):
+    """Nombres de blueprint que pueden corresponder a una app (por id y por ruta)"""
+    names = {app.id, (app.route or '').rstrip('/').rsplit('/', 1)[-1]}
+    return {name.replace('-', '_') for name in names if name}
+
+
 def get_api_performance():
-    """Calcular rendimiento real de las APIs basado en ApiUsage"""
+    """
+    Rendimiento de las APIs: el estado sale de los circuit breakers de sus
+    proveedores (ventana reciente) o, si aún no hay circuitos conocidos (tras un
+    reinicio o sin Redis), del uptime; uptime y tiempo medio del histórico de ApiUsage
+    """
+    breakers = get_circuit_breakers()
     apps = App.query.filter_by(is_active=True).all()
     result = []
     
     for app in apps:
+        circuits = [breakers.state(host) for host in sorted(breakers.route_hosts(*app_blueprints(app)))]
         # Obtener todas las llamadas para esta app
         api_usage = ApiUsage.query.filter_by(app_id=app.id).all()
         
-        if not api_usage:
+        if not api_usage and not circuits:
             # Sin datos de uso
             result.append({
                 "api": app.title,
                 "status": "Sin datos",
                 "responseTime": 0,
                 "uptime": 0.0,
-                "lastCheck": "-"
+                "lastCheck": "-",
+                "circuits": []
             })
             continue
         
         # Calcular métricas reales
         total_calls = len(api_usage)
         successful_calls = len([call for call in api_usage if call.status_code < 400])
-        failed_calls = total_calls - successful_calls
         
         # Calcular uptime real (porcentaje de llamadas exitosas)
         uptime = (successful_calls / total_calls * 100) if total_calls > 0 else 0.0
@@ -96,22 +126,21 @@ def get_api_performance():
         last_call = max(api_usage, key=lambda x: x.created_at) if api_usage else None
         last_check = last_call.created_at.strftime('%Y-%m-%d %H:%M') if last_call else "-"
         
-        # Determinar estado basado en uptime
-        if uptime >= 95:
-            status = "Operativo"
-        elif uptime >= 80:
-            status = "Advertencia"
-        elif uptime >= 50:
-            status = "Crítico"
+        # Estado según el peor circuito de sus proveedores
+        if circuits:
+            levels = [breakers.health(circuit) for circuit in circuits]
+            level = 'critical' if 'critical' in levels else 'warning' if 'warning' in levels else 'ok'
+            status = CIRCUIT_STATUS[level]
         else:
-            status = "Fuera de servicio"
+            status, _ = uptime_status(uptime)
         
         result.append({
             "api": app.title,
             "status": status,
             "responseTime": int(avg_response),
             "uptime": round(uptime, 1),
-            "lastCheck": last_check
+            "lastCheck": last_check,
+            "circuits": circuits
         })
     
     return result
@@ -264,6 +293,33 @@ def get_dashboard_stats():
 
 
 
+@stats_bp.route('/compute', methods=['GET'])
+@jwt_required()
+@role_required('admin', 'superadmin')
+def get_compute_stats():
+    """Ocupación y métricas por tarea del ejecutor de cómputo"""
+    return jsonify(get_compute_executor().stats()), 200
+
+
+@stats_bp.route('/rapidapi-keys', methods=['GET'])
+@jwt_required()
+@role_required('admin', 'superadmin')
+def get_rapidapi_key_stats():
+    """Uso, cuota restante y cuarentenas de cada clave de RapidAPI por host"""
+    return jsonify(get_key_pool().stats()), 200
+
+
+@stats_bp.route('/circuits', methods=['GET'])
+@jwt_required()
+@role_required('admin', 'superadmin')
+def get_circuit_stats():
+    """Estado de los circuit breakers de cada proveedor externo (con su p95 y peticiones cubiertas)"""
+    circuits = get_circuit_breakers().snapshot()
+    for host, latency in get_latency_tracker().stats().items():
+        circuits.setdefault(host, {'host': host}).update(latency)
+    return jsonify(circuits), 200
+
+
 @stats_bp.route('/performance/<string:app_id>', methods=['GET'])
 @jwt_required()
 @role_required('admin', 'superadmin')
@@ -306,18 +362,7 @@ def get_api_performance_details(app_id):
     last_check = last_call.created_at.strftime('%Y-%m-%d %H:%M') if last_call else "-"
     
     # Determinar estado
-    if uptime >= 95:
-        status = "Operativo"
-        status_color = "success"
-    elif uptime >= 80:
-        status = "Advertencia"
-        status_color = "warning"
-    elif uptime >= 50:
-        status = "Crítico"
-        status_color = "error"
-    else:
-        status = "Fuera de servicio"
-        status_color = "error"
+    status, status_color = uptime_status(uptime)
     
     # Estadísticas por código de estado
     status_codes = {}
@@ -1,7 +1,14 @@
 from flask import Blueprint, request, jsonify, current_app
 import requests
+import logging
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.canonical import normalize_url
+from api.utils.page_fetch import PageFetchError
+from api.utils.readability import ExtractionError, extract_url
+from api.utils.rapidapi import upstream_get
+
+logger = logging.getLogger(__name__)
 
 text_extract_bp = Blueprint('text_extract', __name__)
 
@@ -13,10 +20,22 @@ def handle_options():
 @jwt_required()
 @credits_required(amount=1)
 def extract_text():
+    """Extraer el texto principal de una URL (extracción local; Text Extract como respaldo)"""
     data = request.json
     url_to_extract = data.get('url')
     if not url_to_extract:
         return jsonify({'error': 'URL is required'}), 400
+    url_to_extract = normalize_url(url_to_extract)
+
+    if current_app.config.get('TEXT_EXTRACT_ENGINE', 'local') == 'local':
+        try:
+            return jsonify(extract_url(url_to_extract)), 200
+        except (PageFetchError, ExtractionError) as e:
+            message = e.message if isinstance(e, PageFetchError) else str(e)
+            logger.warning(f"[TextExtract] Extracción local fallida para {url_to_extract}: {message}")
+            if getattr(e, 'status_code', None) == 400 or not current_app.config.get('TEXT_EXTRACT_FALLBACK', True):
+                status_code = e.status_code if isinstance(e, PageFetchError) else 422
+                return jsonify({'error': 'No se pudo extraer el texto', 'details': message}), status_code
 
     api_url = "https://text-extract7.p.rapidapi.com/"
     headers = {
@@ -24,9 +43,40 @@ def extract_text():
         "x-rapidapi-host": "text-extract7.p.rapidapi.com"
     }
     params = {"url": url_to_extract}
-    response = requests.get(api_url, headers=headers, params=params)
-    # Puede devolver texto plano o JSON, intentamos ambos
     try:
-        return jsonify(response.json()), response.status_code
-    except Exception:
-        return response.text, response.status_code 
\ No newline at end of file
+        response = upstream_get(api_url, headers=headers, params=params, timeout=30)
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': 'Error al conectar con Text Extract', 'details': str(e)}), 502
+    if response.status_code != 200:
+        return jsonify({'error': 'Error en la API de Text Extract', 'details': response.text[:500]}), response.status_code
+    return jsonify(map_upstream_result(url_to_extract, response)), 200
+
+
+def map_upstream_result(url, response):
+    """Adapta la respuesta de Text Extract (texto plano o JSON) al formato de la extracción local"""
+    title = None
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = response.text
+    if isinstance(payload, dict):
+        title = payload.get('title')
+        text = payload.get('text') or payload.get('content') or payload.get('body') or ''
+    elif isinstance(payload, str):
+        text = payload
+    else:
+        text = ''
+    text = text.strip() if isinstance(text, str) else ''
+    return {
+        'url': url,
+        'title': title,
+        'author': None,
+        'lang': None,
+        'excerpt': text[:300],
+        'text': text,
+        'paragraphs': len([part for part in text.split('\n\n') if part.strip()]),
+        'wordCount': len(text.split()),
+        'characters': len(text),
+        'truncated': False,
+        'engine': 'rapidapi'
+    }
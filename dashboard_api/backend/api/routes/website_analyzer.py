@@ -5,10 +5,15 @@ import logging
 import json
 import asyncio
 import aiohttp
-import hashlib
-import time
 from urllib.parse import urlparse
+from api.utils.deadline import upstream_timeout
 from api.utils.decorators import credits_required
+from api.utils.domain_profiles import profile_key_for_url, read_through, stored_facet, save_facet, profile_response
+from api.utils.jobs import register_job_handler, async_job
+from api.utils.page_fetch import PageFetchError
+from api.utils.seo_audit import audit_url
+from api.utils.result_cache import cache_bypassed
+from api.utils.rapidapi import upstream_get
 
 website_analyzer_pro_bp = Blueprint('website_analyzer_pro', __name__)
 logger = logging.getLogger(__name__)
@@ -85,10 +90,9 @@ def print_analysis_results(data_type, response):
         else:
             print("Respuesta raw: No disponible")
 
-async def make_api_call(session, url, params, data_type):
-    """Hace una llamada a la API de RapidAPI de forma asíncrona"""
+async def make_api_call(session, url, params, data_type, timeout):
+    """Hace una llamada a la API de RapidAPI de forma asíncrona (timeout: aiohttp.ClientTimeout)"""
     try:
-        timeout = aiohttp.ClientTimeout(total=60)  # 60 segundos de timeout
         async with session.get(url, params=params, timeout=timeout) as response:
             print_analysis_results(data_type, response)
             if response.status == 200:
@@ -107,8 +111,110 @@ def handle_options():
     """Manejar peticiones OPTIONS para CORS"""
     return '', 200
 
+def analyze_website(url, refresh=False):
+    """
+    Ejecuta el análisis completo (velocidad, SEO, dominio, backlinks y keywords)
+    de una URL, reutilizando el perfil guardado de la página mientras siga fresco
+    """
+    profile_domain, path = profile_key_for_url(url)
+    if not profile_domain:
+        return run_website_analysis(url)
+    data, hit = read_through(profile_domain, 'website_analysis', lambda: run_website_analysis(url),
+                             path=path, refresh=refresh)
+    if hit:
+        print(f"✅ Resultado encontrado en el perfil del dominio para: {url}")
+    return data
+
+def run_website_analysis(url):
+    """Consulta en paralelo todos los endpoints del proveedor para la URL"""
+    # Extraer el dominio de la URL
+    domain = urlparse(url).netloc
+    if not domain:
+        domain = url.split('/')[0]
+
+    # CORRECCIÓN FORZADA: Usar la API correcta directamente
+    api_base = "https://website-analyze-and-seo-audit-pro.p.rapidapi.com"
+    headers = {
+        "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
+        "x-rapidapi-host": "website-analyze-and-seo-audit-pro.p.rapidapi.com"
+    }
+
+    print(f"\nIniciando análisis para: {url}")
+    print(f"Dominio extraído: {domain}")
+    print(f"Config RAPIDAPI_WEBSITE_ANALYZER_HOST: {current_app.config.get('RAPIDAPI_WEBSITE_ANALYZER_HOST', 'NO_DEFINIDO')}")
+    print(f"Headers: {headers}")
+
+    # Hacer todas las llamadas en paralelo: 60 segundos como mucho, sin pasar del plazo de la petición
+    # (total acota la llamada entera, también la lectura del cuerpo)
+    timeout = aiohttp.ClientTimeout(total=upstream_timeout(60))
+
+    async def run_parallel_analysis():
+        async with aiohttp.ClientSession(headers=headers) as session:
+            tasks = [
+                make_api_call(session, f"{api_base}/speed.php", {"website": url}, "Velocidad", timeout),
+                make_api_call(session, f"{api_base}/onpagepro.php", {"website": url}, "SEO", timeout),
+                make_api_call(session, f"{api_base}/domain.php", {"website": url}, "Dominio", timeout),
+                make_api_call(session, f"{api_base}/backlinks.php", {"domain": domain}, "Backlinks Generales", timeout),
+                make_api_call(session, f"{api_base}/excatbacklink.php", {"domain": url}, "Backlinks Exactos", timeout),
+                make_api_call(session, f"{api_base}/newbacklinks.php", {"domain": domain}, "Backlinks Nuevos", timeout),
+                make_api_call(session, f"{api_base}/poorbacklinks.php", {"domain": domain}, "Backlinks Baja Calidad", timeout),
+                make_api_call(session, f"{api_base}/referraldomains.php", {"domain": domain}, "Dominios Referencia", timeout),
+                make_api_call(session, f"{api_base}/topsearchkeywords.php", {"domain": domain}, "Keywords", timeout)
+            ]
+            
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            
+            # Extraer resultados evitando excepciones
+            speed_data = results[0] if not isinstance(results[0], Exception) else None
+            seo_data = results[1] if not isinstance(results[1], Exception) else None
+            domain_data = results[2] if not isinstance(results[2], Exception) else None
+            backlinks_data = results[3] if not isinstance(results[3], Exception) else None
+            exact_backlinks_data = results[4] if not isinstance(results[4], Exception) else None
+            new_backlinks_data = results[5] if not isinstance(results[5], Exception) else None
+            poor_backlinks_data = results[6] if not isinstance(results[6], Exception) else None
+            referral_domains_data = results[7] if not isinstance(results[7], Exception) else None
+            keywords_data = results[8] if not isinstance(results[8], Exception) else None
+            
+            return {
+                'speed': speed_data,
+                'seo': seo_data,
+                'domain': domain_data,
+                'backlinks': {
+                    'general': backlinks_data,
+                    'exact': exact_backlinks_data,
+                    'new': new_backlinks_data,
+                    'poor': poor_backlinks_data,
+                    'referral_domains': referral_domains_data
+                },
+                'keywords': keywords_data
+            }
+
+    # Ejecutar análisis en paralelo
+    result_data = asyncio.run(run_parallel_analysis())
+
+    # Auditoría on-page local: reutiliza la copia de la página del fetcher compartido
+    try:
+        result_data['onpage'] = audit_url(url)
+    except PageFetchError:
+        current_app.logger.exception(f"Error en auditoría on-page de {url}")
+        result_data['onpage'] = None
+    return result_data
+
+@register_job_handler('website_analysis')
+def website_analysis_job(payload):
+    """Handler del análisis completo ejecutado en segundo plano"""
+    return analyze_website(payload['url'], refresh=payload.get('refresh', False))
+
+def build_full_analysis_payload():
+    """Valida la petición de análisis completo y devuelve el payload del trabajo"""
+    url = request.args.get('url')
+    if not url:
+        return jsonify({'error': 'URL es requerida'}), 400
+    return {'url': url, 'refresh': cache_bypassed()}
+
 @website_analyzer_pro_bp.route('/full-analysis', methods=['GET'])
 @jwt_required()
+@async_job('website_analysis', 2, build_full_analysis_payload)
 @credits_required(amount=2)  # Análisis completo cuesta 2 puntos
 def full_analysis():
     """Realiza un análisis completo del sitio web incluyendo velocidad, SEO y dominio"""
@@ -117,91 +223,7 @@ def full_analysis():
         return jsonify({'error': 'URL es requerida'}), 400
 
     try:
-        # Sistema de cache: verificar si ya tenemos resultados recientes
-        cache_key = hashlib.md5(url.encode()).hexdigest()
-        cache_duration = 3600  # 1 hora en segundos
-        
-        # Verificar cache (simulado con diccionario en memoria)
-        if hasattr(current_app, 'website_analysis_cache'):
-            cached_result = current_app.website_analysis_cache.get(cache_key)
-            if cached_result and (time.time() - cached_result['timestamp']) < cache_duration:
-                print(f"✅ Resultado encontrado en cache para: {url}")
-                return jsonify(cached_result['data']), 200
-        else:
-            current_app.website_analysis_cache = {}
-        
-        # Extraer el dominio de la URL
-        domain = urlparse(url).netloc
-        if not domain:
-            domain = url.split('/')[0]
-
-        # CORRECCIÓN FORZADA: Usar la API correcta directamente
-        api_base = "https://website-analyze-and-seo-audit-pro.p.rapidapi.com"
-        headers = {
-            "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
-            "x-rapidapi-host": "website-analyze-and-seo-audit-pro.p.rapidapi.com"
-        }
-
-        print(f"\nIniciando análisis para: {url}")
-        print(f"Dominio extraído: {domain}")
-        print(f"Config RAPIDAPI_WEBSITE_ANALYZER_HOST: {current_app.config.get('RAPIDAPI_WEBSITE_ANALYZER_HOST', 'NO_DEFINIDO')}")
-        print(f"Headers: {headers}")
-
-        # Hacer todas las llamadas en paralelo con timeout de 60 segundos
-        async def run_parallel_analysis():
-            async with aiohttp.ClientSession(headers=headers) as session:
-                tasks = [
-                    make_api_call(session, f"{api_base}/speed.php", {"website": url}, "Velocidad"),
-                    make_api_call(session, f"{api_base}/onpagepro.php", {"website": url}, "SEO"),
-                    make_api_call(session, f"{api_base}/domain.php", {"website": url}, "Dominio"),
-                    make_api_call(session, f"{api_base}/backlinks.php", {"domain": domain}, "Backlinks Generales"),
-                    make_api_call(session, f"{api_base}/excatbacklink.php", {"domain": url}, "Backlinks Exactos"),
-                    make_api_call(session, f"{api_base}/newbacklinks.php", {"domain": domain}, "Backlinks Nuevos"),
-                    make_api_call(session, f"{api_base}/poorbacklinks.php", {"domain": domain}, "Backlinks Baja Calidad"),
-                    make_api_call(session, f"{api_base}/referraldomains.php", {"domain": domain}, "Dominios Referencia"),
-                    make_api_call(session, f"{api_base}/topsearchkeywords.php", {"domain": domain}, "Keywords")
-                ]
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # Extraer resultados evitando excepciones
-                speed_data = results[0] if not isinstance(results[0], Exception) else None
-                seo_data = results[1] if not isinstance(results[1], Exception) else None
-                domain_data = results[2] if not isinstance(results[2], Exception) else None
-                backlinks_data = results[3] if not isinstance(results[3], Exception) else None
-                exact_backlinks_data = results[4] if not isinstance(results[4], Exception) else None
-                new_backlinks_data = results[5] if not isinstance(results[5], Exception) else None
-                poor_backlinks_data = results[6] if not isinstance(results[6], Exception) else None
-                referral_domains_data = results[7] if not isinstance(results[7], Exception) else None
-                keywords_data = results[8] if not isinstance(results[8], Exception) else None
-                
-                return {
-                    'speed': speed_data,
-                    'seo': seo_data,
-                    'domain': domain_data,
-                    'backlinks': {
-                        'general': backlinks_data,
-                        'exact': exact_backlinks_data,
-                        'new': new_backlinks_data,
-                        'poor': poor_backlinks_data,
-                        'referral_domains': referral_domains_data
-                    },
-                    'keywords': keywords_data
-                }
-
-        # Ejecutar análisis en paralelo
-        result_data = asyncio.run(run_parallel_analysis())
-
-        # Guardar en cache para futuras consultas
-        current_app.website_analysis_cache[cache_key] = {
-            'data': result_data,
-            'timestamp': time.time()
-        }
-        print(f"💾 Resultado guardado en cache para: {url}")
-        
-        # Retornar resultados del análisis en paralelo
-        return jsonify(result_data), 200
-
+        return jsonify(analyze_website(url, refresh=cache_bypassed())), 200
     except requests.exceptions.RequestException as e:
         print(f"Error en la petición: {str(e)}")
         return jsonify({
@@ -218,6 +240,11 @@ def analyze_speed():
     if not url:
         return jsonify({'error': 'URL es requerida'}), 400
 
+    profile_domain, path = profile_key_for_url(url)
+    stored = stored_facet(profile_domain, 'speed', path)
+    if stored is not None:
+        return profile_response(stored, hit=True)
+
     try:
         # CORRECCIÓN FORZADA: Usar la API correcta directamente
         api_url = "https://website-analyze-and-seo-audit-pro.p.rapidapi.com/speed.php"
@@ -228,10 +255,13 @@ def analyze_speed():
         
         logger.info(f"Analizando velocidad para: {url}")
         print(f"[DEBUG] RAPIDAPI_WEBSITE_ANALYZER_HOST: {current_app.config.get('RAPIDAPI_WEBSITE_ANALYZER_HOST', 'NO_DEFINIDO')}")
-        response = requests.get(api_url, headers=headers, params={"website": url})
+        response = upstream_get(api_url, headers=headers, params={"website": url})
         response.raise_for_status()
         
-        return jsonify(response.json()), 200
+        speed_data = response.json()
+        if profile_domain:
+            save_facet(profile_domain, 'speed', speed_data, path)
+        return profile_response(speed_data, hit=False)
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error en análisis de velocidad: {str(e)}")
@@ -249,6 +279,11 @@ def analyze_seo():
     if not url:
         return jsonify({'error': 'URL es requerida'}), 400
 
+    profile_domain, path = profile_key_for_url(url)
+    stored = stored_facet(profile_domain, 'seo', path)
+    if stored is not None:
+        return profile_response(stored, hit=True)
+
     try:
         # CORRECCIÓN FORZADA: Usar la API correcta directamente
         api_url = "https://website-analyze-and-seo-audit-pro.p.rapidapi.com/onpagepro.php"
@@ -259,10 +294,13 @@ def analyze_seo():
         
         logger.info(f"Analizando SEO para: {url}")
         print(f"[DEBUG] RAPIDAPI_WEBSITE_ANALYZER_HOST: {current_app.config.get('RAPIDAPI_WEBSITE_ANALYZER_HOST', 'NO_DEFINIDO')}")
-        response = requests.get(api_url, headers=headers, params={"website": url})
+        response = upstream_get(api_url, headers=headers, params={"website": url})
         response.raise_for_status()
         
-        return jsonify(response.json()), 200
+        seo_data = response.json()
+        if profile_domain:
+            save_facet(profile_domain, 'seo', seo_data, path)
+        return profile_response(seo_data, hit=False)
 
     except requests.exceptions.RequestException as e:
         logger.error(f"Error en análisis SEO: {str(e)}")
@@ -1,5 +1,8 @@
 from flask_jwt_extended import jwt_required
 from api.utils.decorators import credits_required
+from api.utils.canonical import canonical_domain
+from api.utils.domain_profiles import stored_facet, save_facet, profile_response
+from api.utils.rapidapi import upstream_get
 from flask import Blueprint, request, jsonify, current_app
 import requests
 
@@ -22,8 +25,12 @@ def get_domain_whois():
     if not url_param:
         return jsonify({'error': 'El campo "url" es obligatorio'}), 400
 
-    # Limpiar la URL (quitar http(s):// si existe)
-    domain = url_param.replace('https://', '').replace('http://', '').split('/')[0]
+    # WHOIS cambia poco: se sirve el perfil guardado mientras siga fresco
+    profile_domain = canonical_domain(url_param)
+    domain = profile_domain or url_param.strip()
+    stored = stored_facet(profile_domain, 'whois')
+    if stored is not None:
+        return profile_response(stored, hit=True)
     
     api_url = "https://whois-lookup-service.p.rapidapi.com/v1/getwhois"
     params = {"url": domain}
@@ -34,7 +41,7 @@ def get_domain_whois():
 
     try:
         print(f"[WhoisLookup] Consultando dominio: {domain}")
-        response = requests.get(api_url, headers=headers, params=params, timeout=20)
+        response = upstream_get(api_url, headers=headers, params=params, timeout=20)
         print(f"[WhoisLookup] Status: {response.status_code}")
         print(f"[WhoisLookup] Response: {response.text}")
         
@@ -44,7 +51,10 @@ def get_domain_whois():
                 'details': response.text
             }), response.status_code
 
-        return jsonify(response.json()), 200
+        whois_data = response.json()
+        if profile_domain:
+            save_facet(profile_domain, 'whois', whois_data)
+        return profile_response(whois_data, hit=False)
 
     except requests.exceptions.RequestException as e:
         print(f"[WhoisLookup] Error: {str(e)}")
@@ -77,7 +87,7 @@ def get_asn_whois():
 
     try:
         print(f"[WhoisLookup] Consultando ASN: {asn}")
-        response = requests.get(api_url, headers=headers, params=params, timeout=20)
+        response = upstream_get(api_url, headers=headers, params=params, timeout=20)
         print(f"[WhoisLookup] Status: {response.status_code}")
         print(f"[WhoisLookup] Response: {response.text}")
         
@@ -116,7 +126,7 @@ def get_ip_whois():
 
     try:
         print(f"[WhoisLookup] Consultando IP: {ip}")
-        response = requests.get(api_url, headers=headers, params=params, timeout=20)
+        response = upstream_get(api_url, headers=headers, params=params, timeout=20)
         print(f"[WhoisLookup] Status: {response.status_code}")
         print(f"[WhoisLookup] Response: {response.text}")
         
@@ -0,0 +1,200 @@
+"""
+Normalización canónica de URLs, dominios y usuarios de redes sociales
+Todas las claves de caché y de deduplicación pasan por aquí, de modo que
+entradas equivalentes ('Example.com/', 'https://example.com' o
+'example.com?utm_source=x') comparten la misma clave.
+
+Reglas de canonical_url:
+- esquema y host en minúsculas, host en IDNA (punycode) y sin punto final
+- sin puerto por defecto ni fragmento
+- sin parámetros de seguimiento (utm_*, fbclid, gclid...) y el resto ordenados
+- ruta vacía como '/', segmentos '.'/'..' resueltos y escapes %xx en mayúsculas;
+  la barra final se conserva salvo en la raíz, porque '/a' y '/a/' pueden ser
+  recursos distintos
+"""
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'gclsrc', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'ttclid', 'twclid',
+    'igshid', 'igsh', 'li_fat_id', 'mc_cid', 'mc_eid', 'mkt_tok', '_ga', '_gl', '_hsenc', '_hsmi',
+    'ref_src', 'ref_url', 'spm', 'scid', 'si',
+}
+TRACKING_PREFIXES = ('utm_', 'hsa_', 'pk_', 'vero_', 'oly_')
+
+# Segmentos de Instagram/TikTok que no son nombres de usuario
+INSTAGRAM_RESERVED = {'p', 'reel', 'reels', 'tv', 'explore', 'accounts', 'direct', 'stories', 'about',
+                      'developer', 'legal', 'web', 'challenge'}
+TIKTOK_RESERVED = {'discover', 'explore', 'foryou', 'following', 'live', 'tag', 'music', 'video',
+                   'search', 'upload', 'login', 'signup', 'embed', 'share', 't'}
+TIKTOK_SHORT_HOSTS = {'vm.tiktok.com', 'vt.tiktok.com'}
+INSTAGRAM_USERNAME_RE = re.compile(r'^[a-z0-9._]{1,30}$')
+TIKTOK_USERNAME_RE = re.compile(r'^[a-z0-9._]{2,24}$')
+
+_PERCENT_RE = re.compile(r'%([0-9a-fA-F]{2})')
+_UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+
+def normalize_url(url):
+    """Añade https:// si falta el esquema"""
+    url = (url or '').strip()
+    if url and not url.lower().startswith(('http://', 'https://')):
+        url = f"https://{url.lstrip('/')}"
+    return url
+
+
+def canonical_host(host):
+    """Host en minúsculas e IDNA, sin punto final. None si no es válido"""
+    host = (host or '').strip().rstrip('.').lower()
+    if not host:
+        return None
+    if host.startswith('[') or host.replace('.', '').isdigit() or ':' in host:
+        return host  # Direcciones IP
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+    return host if len(host) <= 253 else None
+
+
+def canonical_domain(value):
+    """
+    Normaliza un dominio o URL a su forma canónica (host en minúsculas, IDNA,
+    sin esquema, puerto, ruta ni 'www.'). Devuelve None si no es un dominio válido.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    if '://' not in value:
+        value = f'//{value}'
+    try:
+        host = urlsplit(value).hostname
+    except ValueError:
+        return None
+    host = canonical_host(host)
+    if not host:
+        return None
+    if host.startswith('www.'):
+        host = host[4:]
+    if '.' not in host:
+        return None
+    return host
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def _normalize_escape(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else f'%{match.group(1).upper()}'
+
+
+def remove_dot_segments(path):
+    """Resuelve los segmentos '.' y '..' de una ruta (RFC 3986, 5.2.4)"""
+    if '.' not in path:
+        return path
+    output = []
+    segments = path.split('/')
+    for segment in segments[1:] if path.startswith('/') else segments:
+        if segment == '..':
+            if output:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    if segments[-1] in ('.', '..'):
+        output.append('')
+    return '/' + '/'.join(output)
+
+
+def canonical_query(query):
+    """Query sin parámetros de seguimiento y ordenada por nombre"""
+    if not query:
+        return ''
+    params = [(name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+              if not is_tracking_param(name)]
+    return urlencode(sorted(params), doseq=True)
+
+
+def canonical_url(url):
+    """
+    Forma canónica de una URL para claves de caché (ver las reglas del módulo).
+    Devuelve la entrada normalizada tal cual si no se puede interpretar.
+    """
+    url = normalize_url(url)
+    try:
+        parsed = urlsplit(url)
+        port = parsed.port
+    except ValueError:
+        return url
+    scheme = parsed.scheme.lower()
+    host = canonical_host(parsed.hostname) or ''
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{port}'
+    path = remove_dot_segments(_PERCENT_RE.sub(_normalize_escape, parsed.path)) or '/'
+    return urlunsplit((scheme, host, path, canonical_query(parsed.query), ''))
+
+
+def url_key(value):
+    """canonical_url si el valor es una URL http(s) completa; si no, el valor sin cambios"""
+    if isinstance(value, str) and value[:8].lower().startswith(('http://', 'https://')) and ' ' not in value:
+        return canonical_url(value)
+    return value
+
+
+def _path_segments(value, hosts):
+    """(host, segmentos de la ruta) si value es una URL de alguno de los hosts; (None, None) si no"""
+    value = value.strip()
+    candidate = value if '://' in value else f'//{value}'
+    try:
+        parsed = urlsplit(candidate)
+    except ValueError:
+        return None, None
+    host = canonical_domain(parsed.hostname or '') or ''
+    if host not in hosts and not any(host.endswith(f'.{h}') for h in hosts):
+        return None, None
+    return host, [segment for segment in parsed.path.split('/') if segment]
+
+
+def instagram_username(value):
+    """
+    Extrae el usuario de Instagram de '@usuario', 'usuario' o una URL de perfil
+    (instagram.com/usuario/?hl=es, .../stories/usuario/123). None si no es válido.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    _, segments = _path_segments(value, ('instagram.com', 'instagr.am'))
+    if segments is not None:
+        if segments and segments[0].lower() == 'stories' and len(segments) > 1:
+            segments = segments[1:]
+        if not segments or segments[0].lower() in INSTAGRAM_RESERVED:
+            return None
+        value = segments[0]
+    username = value.split('?')[0].split('#')[0].strip('/').lstrip('@').lower()
+    return username if INSTAGRAM_USERNAME_RE.match(username) else None
+
+
+def tiktok_username(value):
+    """
+    Extrae el usuario de TikTok de '@usuario', 'usuario' o una URL
+    (tiktok.com/@usuario, tiktok.com/@usuario/video/123). None si no es válido.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    host, segments = _path_segments(value, ('tiktok.com',))
+    if host in TIKTOK_SHORT_HOSTS:
+        return None  # Enlace corto: el usuario solo se conoce siguiendo la redirección
+    if segments is not None:
+        handle = next((segment for segment in segments if segment.startswith('@')), None)
+        if handle is None:
+            if not segments or segments[0].lower() in TIKTOK_RESERVED:
+                return None
+            handle = segments[0]
+        value = handle
+    username = value.split('?')[0].split('#')[0].strip('/').lstrip('@').lower()
+    return username if TIKTOK_USERNAME_RE.match(username) else None
@@ -0,0 +1,384 @@
+"""
+Circuit breakers por proveedor externo (uno por host)
+
+Cada llamada de upstream_request se anota en una ventana deslizante del host
+(CIRCUIT_WINDOW segundos repartidos en cubetas): llamadas, errores (fallos de
+conexión y respuestas 5xx), llamadas lentas y latencia acumulada. Si con al
+menos CIRCUIT_MIN_CALLS llamadas la proporción de errores o de llamadas lentas
+supera su umbral el circuito se abre: durante CIRCUIT_OPEN_SECONDS las llamadas
+a ese host fallan al instante con un 503 (CircuitOpenError) y se devuelven los
+créditos. Pasado ese tiempo el circuito queda semiabierto y deja pasar una sola
+llamada de prueba, que lo cierra o lo vuelve a abrir.
+
+El estado se comparte entre workers en Redis; si Redis no está disponible cada
+proceso sigue con su propio estado en memoria hasta que Redis vuelve.
+"""
+import math
+import time
+import logging
+import threading
+
+import redis
+from flask import current_app, g, has_app_context
+
+from api.utils.error_handlers import APIError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+KEY_PREFIX = 'circuit'
+DEFAULT_WINDOW = 60
+DEFAULT_BUCKETS = 6
+DEFAULT_MIN_CALLS = 20
+DEFAULT_ERROR_THRESHOLD = 0.5
+DEFAULT_SLOW_CALL = 5.0
+DEFAULT_SLOW_THRESHOLD = 0.5
+DEFAULT_OPEN_SECONDS = 30
+REDIS_RETRY_SECONDS = 30  # Tiempo en memoria local antes de volver a probar Redis
+
+_breakers = None
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(APIError):
+    """El circuito del proveedor está abierto: la llamada no se realiza"""
+    def __init__(self, host, retry_after):
+        super().__init__("El proveedor externo no está disponible temporalmente, inténtalo más tarde",
+                         status_code=503, payload={'upstream': host, 'retry_after': retry_after})
+        self.host = host
+        self.retry_after = retry_after
+
+
+class LocalBreakerStore:
+    """Estado de los circuitos en memoria del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # (host, cubeta) -> contadores
+        self._states = {}  # host -> (estado, abierto en)
+        self._probes = {}  # host -> caducidad de la llamada de prueba
+        self._routes = {}  # blueprint -> hosts
+
+    def record(self, host, bucket, failed, slow, latency, ttl):
+        with self._lock:
+            counters = self._buckets.setdefault((host, bucket), {'calls': 0, 'failures': 0, 'slow': 0, 'latency': 0.0})
+            counters['calls'] += 1
+            counters['failures'] += int(failed)
+            counters['slow'] += int(slow)
+            counters['latency'] += latency
+            oldest = bucket - ttl
+            for key in [key for key in self._buckets if key[1] < oldest]:
+                del self._buckets[key]
+
+    def window(self, host, buckets):
+        totals = {'calls': 0, 'failures': 0, 'slow': 0, 'latency': 0.0}
+        with self._lock:
+            for bucket in buckets:
+                for name, value in self._buckets.get((host, bucket), {}).items():
+                    totals[name] += value
+        return totals
+
+    def clear_window(self, host, buckets):
+        with self._lock:
+            for bucket in buckets:
+                self._buckets.pop((host, bucket), None)
+
+    def get_state(self, host):
+        with self._lock:
+            return self._states.get(host, (CLOSED, 0.0))
+
+    def set_state(self, host, state, opened_at=0.0):
+        with self._lock:
+            self._states[host] = (state, opened_at)
+
+    def acquire_probe(self, host, ttl):
+        now = time.time()
+        with self._lock:
+            if self._probes.get(host, 0) > now:
+                return False
+            self._probes[host] = now + ttl
+            return True
+
+    def release_probe(self, host):
+        with self._lock:
+            self._probes.pop(host, None)
+
+    def add_route_host(self, route, host):
+        with self._lock:
+            self._routes.setdefault(route, set()).add(host)
+
+    def route_hosts(self, route):
+        with self._lock:
+            return set(self._routes.get(route, ()))
+
+    def hosts(self):
+        with self._lock:
+            return {host for host, _ in self._buckets} | set(self._states)
+
+
+class RedisBreakerStore:
+    """Estado de los circuitos compartido entre workers en Redis"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _key(*parts):
+        return ':'.join((KEY_PREFIX,) + tuple(str(part) for part in parts))
+
+    def record(self, host, bucket, failed, slow, latency, ttl):
+        key = self._key('window', host, bucket)
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, 'calls', 1)
+        if failed:
+            pipe.hincrby(key, 'failures', 1)
+        if slow:
+            pipe.hincrby(key, 'slow', 1)
+        pipe.hincrbyfloat(key, 'latency', latency)
+        pipe.expire(key, ttl)
+        pipe.sadd(self._key('hosts'), host)
+        pipe.execute()
+
+    def window(self, host, buckets):
+        pipe = self.client.pipeline()
+        for bucket in buckets:
+            pipe.hgetall(self._key('window', host, bucket))
+        totals = {'calls': 0, 'failures': 0, 'slow': 0, 'latency': 0.0}
+        for counters in pipe.execute():
+            for name, value in (counters or {}).items():
+                name = name.decode() if isinstance(name, bytes) else name
+                totals[name] += float(value) if name == 'latency' else int(value)
+        return totals
+
+    def clear_window(self, host, buckets):
+        self.client.delete(*[self._key('window', host, bucket) for bucket in buckets])
+
+    def get_state(self, host):
+        state, opened_at = self.client.hmget(self._key('state', host), 'state', 'opened_at')
+        if not state:
+            return CLOSED, 0.0
+        state = state.decode() if isinstance(state, bytes) else state
+        return state, float(opened_at or 0)
+
+    def set_state(self, host, state, opened_at=0.0):
+        pipe = self.client.pipeline()
+        pipe.hmset(self._key('state', host), {'state': state, 'opened_at': opened_at})
+        pipe.sadd(self._key('hosts'), host)
+        pipe.execute()
+
+    def acquire_probe(self, host, ttl):
+        return bool(self.client.set(self._key('probe', host), 1, nx=True, ex=max(1, int(math.ceil(ttl)))))
+
+    def release_probe(self, host):
+        self.client.delete(self._key('probe', host))
+
+    def add_route_host(self, route, host):
+        self.client.sadd(self._key('routes', route), host)
+
+    def route_hosts(self, route):
+        return {host.decode() if isinstance(host, bytes) else host
+                for host in self.client.smembers(self._key('routes', route))}
+
+    def hosts(self):
+        return {host.decode() if isinstance(host, bytes) else host
+                for host in self.client.smembers(self._key('hosts'))}
+
+
+class CircuitBreakers:
+    """
+    Circuit breakers de todos los hosts, sobre Redis con respaldo en memoria
+
+    Args:
+        redis_client: Cliente de Redis (None: solo memoria del proceso)
+        window (int): Segundos de la ventana deslizante
+        buckets (int): Cubetas en que se divide la ventana
+        min_calls (int): Llamadas mínimas en la ventana para poder abrir el circuito
+        error_threshold (float): Proporción de errores que abre el circuito
+        slow_call (float): Segundos a partir de los cuales una llamada cuenta como lenta
+        slow_threshold (float): Proporción de llamadas lentas que abre el circuito
+        open_seconds (float): Tiempo que el circuito permanece abierto antes de probar
+    """
+
+    def __init__(self, redis_client=None, window=DEFAULT_WINDOW, buckets=DEFAULT_BUCKETS,
+                 min_calls=DEFAULT_MIN_CALLS, error_threshold=DEFAULT_ERROR_THRESHOLD, slow_call=DEFAULT_SLOW_CALL,
+                 slow_threshold=DEFAULT_SLOW_THRESHOLD, open_seconds=DEFAULT_OPEN_SECONDS):
+        self.bucket_seconds = max(1.0, window / max(1, buckets))
+        self.buckets = max(1, buckets)
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.slow_call = slow_call
+        self.slow_threshold = slow_threshold
+        self.open_seconds = open_seconds
+        self._redis = RedisBreakerStore(redis_client) if redis_client is not None else None
+        self._redis_down_until = 0.0
+        self._local = LocalBreakerStore()
+        self._known_routes = set()
+
+    def _call(self, method, *args):
+        """Ejecuta la operación en Redis o, si no está disponible, en memoria"""
+        if self._redis is not None and time.time() >= self._redis_down_until:
+            try:
+                return getattr(self._redis, method)(*args)
+            except redis.RedisError as e:
+                logger.warning(f"Circuit breakers sin Redis durante {REDIS_RETRY_SECONDS}s: {e}")
+                self._redis_down_until = time.time() + REDIS_RETRY_SECONDS
+        return getattr(self._local, method)(*args)
+
+    def _window_buckets(self, now):
+        current = int(now // self.bucket_seconds)
+        return range(current - self.buckets + 1, current + 1)
+
+    def before_call(self, host):
+        """
+        Comprueba el circuito del host antes de llamarlo
+
+        Returns:
+            bool: True si la llamada es la de prueba de un circuito semiabierto
+
+        Raises:
+            CircuitOpenError: si el circuito está abierto (o ya hay una prueba en curso)
+        """
+        state, opened_at = self._call('get_state', host)
+        if state == CLOSED:
+            return False
+        now = time.time()
+        reopens_at = opened_at + self.open_seconds
+        if state == OPEN and now < reopens_at:
+            raise self._reject(host, reopens_at - now)
+        if not self._call('acquire_probe', host, self.open_seconds):
+            raise self._reject(host, 1)
+        if state == OPEN:
+            self._call('set_state', host, HALF_OPEN, opened_at)
+            logger.info(f"Circuito de {host} semiabierto: llamada de prueba")
+        return True
+
+    @staticmethod
+    def _reject(host, retry_after):
+        retry_after = max(1, int(math.ceil(retry_after)))
+        if has_app_context():
+            g.circuit_open = host
+            g.circuit_retry_after = retry_after
+        return CircuitOpenError(host, retry_after)
+
+    def record(self, host, latency, failed, probe=False, route=None):
+        """Anota el resultado de una llamada y abre o cierra el circuito si corresponde"""
+        now = time.time()
+        slow = latency >= self.slow_call
+        buckets = self._window_buckets(now)
+        self._call('record', host, buckets[-1], failed, slow, latency,
+                   int(math.ceil(self.bucket_seconds * (self.buckets + 1))))
+        if route and (route, host) not in self._known_routes:
+            self._call('add_route_host', route, host)
+            self._known_routes.add((route, host))
+
+        if probe:
+            self._call('release_probe', host)
+            if failed or slow:
+                self._call('set_state', host, OPEN, now)
+                logger.warning(f"Circuito de {host} abierto de nuevo: falló la llamada de prueba")
+            else:
+                self._call('clear_window', host, buckets)
+                self._call('set_state', host, CLOSED, 0.0)
+                logger.info(f"Circuito de {host} cerrado")
+            return
+        if not (failed or slow):
+            return
+        totals = self._call('window', host, buckets)
+        if totals['calls'] < self.min_calls:
+            return
+        if totals['failures'] / totals['calls'] >= self.error_threshold \
+                or totals['slow'] / totals['calls'] >= self.slow_threshold:
+            state, _ = self._call('get_state', host)
+            if state == CLOSED:
+                self._call('set_state', host, OPEN, now)
+                logger.warning(f"Circuito de {host} abierto: {totals['failures']} errores y "
+                               f"{totals['slow']} llamadas lentas de {totals['calls']}")
+
+    def release_probe(self, host):
+        """
+        Libera la llamada de prueba sin veredicto (terminó por nuestro propio plazo,
+        no por el proveedor): el circuito sigue semiabierto y la próxima llamada prueba
+        """
+        self._call('release_probe', host)
+
+    def state(self, host):
+        """Estado del circuito y métricas de la ventana actual"""
+        now = time.time()
+        state, opened_at = self._call('get_state', host)
+        totals = self._call('window', host, self._window_buckets(now))
+        calls = totals['calls']
+        return {
+            'host': host,
+            'state': state,
+            'calls': calls,
+            'error_rate': round(totals['failures'] / calls, 3) if calls else 0.0,
+            'slow_rate': round(totals['slow'] / calls, 3) if calls else 0.0,
+            'avg_latency_ms': round(totals['latency'] / calls * 1000, 1) if calls else 0.0,
+            'retry_after': max(0, int(math.ceil(opened_at + self.open_seconds - now))) if state == OPEN else 0,
+        }
+
+    def health(self, host_state):
+        """Nivel de salud de un circuito: 'ok', 'warning' o 'critical'"""
+        if host_state['state'] == OPEN:
+            return 'critical'
+        if host_state['state'] == HALF_OPEN or host_state['error_rate'] >= self.error_threshold / 2 \
+                or host_state['slow_rate'] >= self.slow_threshold / 2:
+            return 'warning'
+        return 'ok'
+
+    def route_hosts(self, *routes):
+        """Hosts a los que han llamado las rutas de los blueprints indicados"""
+        hosts = set()
+        for route in routes:
+            hosts |= self._call('route_hosts', route)
+        return hosts
+
+    def snapshot(self):
+        return {host: self.state(host) for host in sorted(self._call('hosts'))}
+
+
+def get_circuit_breakers():
+    """Circuit breakers compartidos por el proceso (configurados con la app)"""
+    global _breakers
+    if _breakers is None:
+        with _breakers_lock:
+            if _breakers is None:
+                config = current_app.config if has_app_context() else {}
+                client = None
+                if config.get('CIRCUIT_BREAKER_BACKEND', 'redis') == 'redis':
+                    from utils import rate_limiter
+                    client = rate_limiter.redis_client
+                _breakers = CircuitBreakers(
+                    redis_client=client,
+                    window=config.get('CIRCUIT_WINDOW', DEFAULT_WINDOW),
+                    buckets=config.get('CIRCUIT_BUCKETS', DEFAULT_BUCKETS),
+                    min_calls=config.get('CIRCUIT_MIN_CALLS', DEFAULT_MIN_CALLS),
+                    error_threshold=config.get('CIRCUIT_ERROR_THRESHOLD', DEFAULT_ERROR_THRESHOLD),
+                    slow_call=config.get('CIRCUIT_SLOW_CALL', DEFAULT_SLOW_CALL),
+                    slow_threshold=config.get('CIRCUIT_SLOW_THRESHOLD', DEFAULT_SLOW_THRESHOLD),
+                    open_seconds=config.get('CIRCUIT_OPEN_SECONDS', DEFAULT_OPEN_SECONDS)
+                )
+    return _breakers
+
+
+def init_circuit_breakers(app):
+    """Registra el hook que responde 503 y devuelve los créditos cuando un circuito está abierto"""
+
+    @app.after_request
+    def report_circuit_open(response):
+        # Rutas que capturan cualquier error del proveedor y responden 5xx: si la
+        # llamada no se hizo por un circuito abierto, el cliente recibe 503 y no paga
+        if g.get('circuit_open') and response.status_code >= 500:
+            response.status_code = 503
+            response.headers['Retry-After'] = str(g.get('circuit_retry_after', 1))
+            charged = g.pop('credits_charged', None)
+            if charged:
+                from api.utils.decorators import refund_credits
+                refund_credits(*charged)
+                g.credits_refunded = charged[1]
+        if g.get('credits_refunded'):
+            response.headers['X-Credits-Refunded'] = str(g.credits_refunded)
+        return response
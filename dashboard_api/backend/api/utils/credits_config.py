@@ -41,6 +41,7 @@ CREDITS_COST = {
     'pdf_converter': 1,
     'snap_video': 1,
     'advanced_image_manipulation': 1,
+    'image_optimizer': 1,
     'picpulse': 2,
     
     # Other APIs
@@ -143,6 +144,7 @@ def get_api_cost_by_endpoint(endpoint_path):
         '/pdf-converter/convert': 'pdf_converter',
         '/media-downloader/download': 'snap_video',
         '/image-manipulation/transform': 'advanced_image_manipulation',
+        '/image-optimize': 'image_optimizer',
         '/picpulse/analyze': 'picpulse',
         
         # Other
@@ -0,0 +1,116 @@
+"""
+Presupuesto de tiempo por petición
+Al empezar cada petición se fija en flask.g un plazo según la clase de su ruta
+(UPSTREAM_ROUTE_CLASSES -> UPSTREAM_DEADLINES). Las llamadas a proveedores
+toman su timeout de lo que queda del plazo, de modo que un proveedor colgado
+no retiene un worker más allá del presupuesto de la petición; agotado el plazo
+la respuesta es un 504 inmediato (con los datos parciales si los hay).
+Ese timeout acota cada lectura del socket, no la respuesta entera: los cuerpos
+se leen por bloques con read_within, que comprueba el plazo entre bloque y bloque.
+"""
+import time
+
+import requests
+from flask import current_app, g, has_app_context, request
+
+from api.utils.error_handlers import APIError
+
+DEFAULT_BUDGET = 20.0
+DEFAULT_CALL_TIMEOUT = 30.0
+MIN_CALL_TIMEOUT = 0.5  # Por debajo no merece la pena empezar una llamada
+
+
+class DeadlineExceeded(APIError):
+    """Se agotó el presupuesto de tiempo de la petición"""
+    def __init__(self, message="El proveedor externo no respondió a tiempo", partial=None):
+        super().__init__(message, status_code=504, payload={'partial': partial} if partial is not None else None)
+
+
+def get_route_budget(blueprint):
+    """Segundos de presupuesto para las rutas del blueprint (según su clase)"""
+    route_class = (current_app.config.get('UPSTREAM_ROUTE_CLASSES') or {}).get(blueprint, 'default')
+    budgets = current_app.config.get('UPSTREAM_DEADLINES') or {}
+    return budgets.get(route_class, budgets.get('default', DEFAULT_BUDGET))
+
+
+def start_deadline(seconds):
+    """Fija el plazo de la petición actual a seconds desde ahora"""
+    g.deadline = time.monotonic() + seconds
+    g.deadline_exceeded = False
+
+
+def remaining_time():
+    """Segundos que le quedan a la petición actual (None fuera de una petición con plazo)"""
+    if not has_app_context():
+        return None
+    deadline = g.get('deadline')
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def mark_exceeded(partial=None, message=None):
+    """Marca la petición como fuera de plazo y devuelve la excepción a lanzar"""
+    if has_app_context():
+        g.deadline_exceeded = True
+    return DeadlineExceeded(message or "El proveedor externo no respondió a tiempo", partial=partial)
+
+
+def upstream_timeout(cap=None):
+    """
+    Timeout de lectura para una llamada a un proveedor: lo que queda del plazo,
+    sin pasar de cap (o del timeout por defecto si la llamada no lo fija)
+
+    Raises:
+        DeadlineExceeded: si el plazo ya está (casi) agotado
+    """
+    if cap is None:
+        cap = current_app.config.get('UPSTREAM_DEFAULT_TIMEOUT', DEFAULT_CALL_TIMEOUT) \
+            if has_app_context() else DEFAULT_CALL_TIMEOUT
+    remaining = remaining_time()
+    if remaining is None:
+        return cap
+    if remaining < MIN_CALL_TIMEOUT:
+        raise mark_exceeded()
+    return min(cap, remaining)
+
+
+def read_within(chunks, deadline, close):
+    """
+    Junta los bloques de un cuerpo sin pasar del plazo: un proveedor que envía
+    la respuesta gota a gota renueva el timeout de lectura con cada bloque
+
+    Args:
+        chunks: Iterador de bloques (bytes) de la respuesta pedida en streaming
+        deadline (float): Instante (time.monotonic) en que vence el plazo
+        close: Cierra la respuesta si el plazo vence a medias
+
+    Raises:
+        requests.exceptions.ReadTimeout: si el plazo vence antes del último bloque
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        if time.monotonic() > deadline:
+            close()
+            raise requests.exceptions.ReadTimeout('Se agotó el plazo de la petición leyendo la respuesta')
+    return b''.join(parts)
+
+
+def deadline_passed():
+    remaining = remaining_time()
+    return remaining is not None and remaining < MIN_CALL_TIMEOUT
+
+
+def init_deadlines(app):
+    """Registra los hooks que fijan el plazo de cada petición y normalizan los 504"""
+
+    @app.before_request
+    def set_request_deadline():
+        start_deadline(get_route_budget(request.blueprint))
+
+    @app.after_request
+    def report_deadline_exceeded(response):
+        # Rutas que capturan cualquier error del proveedor y responden 5xx: si la
+        # causa fue el plazo, el cliente recibe 504 (su cuerpo se conserva)
+        if g.get('deadline_exceeded') and response.status_code in (500, 502, 503):
+            response.status_code = 504
+        return response
@@ -1,6 +1,6 @@
 from functools import wraps
 from flask_jwt_extended import get_jwt_identity
-from flask import jsonify, current_app, request
+from flask import jsonify, current_app, request, g
 
 def role_required(*roles):
     """
@@ -44,6 +44,7 @@ def credits_required(amount=1):
             
             # En beta_v2, verificar y descontar créditos
             print(f"[CREDITS_DEBUG] Modo beta_v2 - verificando créditos")
+            executed = False
             try:
                 # Obtener usuario actual
                 user_id = get_jwt_identity()
@@ -88,9 +89,12 @@ def credits_required(amount=1):
                     print(f"[CREDITS_DEBUG] Guardando cambios en DB")
                     db.session.commit()
                     print(f"[CREDITS_DEBUG] Créditos restantes: {user.credits}")
+                    # Para devolverlos si el proveedor no llega a llamarse (circuito abierto)
+                    g.credits_charged = (user.id, required_amount)
                     
                     # Ejecutar la función original
                     print(f"[CREDITS_DEBUG] Ejecutando función original")
+                    executed = True
                     result = fn(*args, **kwargs)
                     
                     # Agregar información de créditos a la respuesta
@@ -104,9 +108,8 @@ def credits_required(amount=1):
                             # Es un Response object de Flask
                             print(f"[CREDITS_DEBUG] Es un Response object en tupla")
                             try:
-                                # Crear nuevo Response con credits_info
+                                # Reescribir el cuerpo conservando las cabeceras (X-Cache...)
                                 import json
-                                from flask import Response
                                 original_data = response_data.get_json()
                                 if isinstance(original_data, dict):
                                     original_data['credits_info'] = {
@@ -114,11 +117,8 @@ def credits_required(amount=1):
                                         'remaining': user.credits
                                     }
                                     print(f"[CREDITS_DEBUG] Credits info agregado a Response: {original_data['credits_info']}")
-                                    return Response(
-                                        json.dumps(original_data),
-                                        status=status_code,
-                                        mimetype='application/json'
-                                    )
+                                    response_data.set_data(json.dumps(original_data))
+                                    return response_data, status_code
                                 else:
                                     return result
                             except Exception as e:
@@ -137,8 +137,8 @@ def credits_required(amount=1):
                         # Es un Response object de Flask (no en tupla)
                         print(f"[CREDITS_DEBUG] Es un Response object directo")
                         try:
+                            # Reescribir el cuerpo conservando las cabeceras (X-Cache...)
                             import json
-                            from flask import Response
                             original_data = result.get_json()
                             if isinstance(original_data, dict):
                                 original_data['credits_info'] = {
@@ -146,11 +146,8 @@ def credits_required(amount=1):
                                     'remaining': user.credits
                                 }
                                 print(f"[CREDITS_DEBUG] Credits info agregado a Response: {original_data['credits_info']}")
-                                return Response(
-                                    json.dumps(original_data),
-                                    status=result.status_code,
-                                    mimetype='application/json'
-                                )
+                                result.set_data(json.dumps(original_data))
+                                return result
                             else:
                                 return result
                         except Exception as e:
@@ -175,12 +172,58 @@ def credits_required(amount=1):
                     db.session.rollback()
                     user.add_credits(required_amount)  # Restaurar créditos
                     db.session.commit()
+                    g.pop('credits_charged', None)
+                    g.credits_refunded = required_amount
                     raise e
                     
             except Exception as e:
+                if executed:
+                    raise  # La función ya se ejecutó (y los créditos se devolvieron): no repetirla gratis
                 # Si no hay JWT o hay error, ejecutar sin descuento de créditos
                 print(f"[CREDITS_DEBUG] Error en decorador: {e}")
                 return fn(*args, **kwargs)
                 
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator 
+
+def credits_enabled():
+    """Indica si el modo actual descuenta créditos (en beta_v1 el uso es gratuito)"""
+    return current_app.config.get('MODE', 'beta_v1') != 'beta_v1'
+
+
+def charge_credits(user_id, amount):
+    """
+    Descuenta créditos fuera del decorador (trabajos asíncronos, streaming...).
+
+    Returns:
+        tuple: (cantidad descontada, respuesta de error o None)
+    """
+    if not credits_enabled() or not amount:
+        return 0, None
+
+    from api.models.user import User
+    from api import db
+    user = User.query.get(user_id)
+    if not user:
+        return 0, (jsonify({'error': 'Usuario no encontrado'}), 404)
+    if not user.deduct_credits(amount):
+        return 0, (jsonify({
+            'error': 'Créditos insuficientes',
+            'available_credits': user.credits,
+            'required_credits': amount,
+            'message': f'Necesitas {amount} crédito(s) para usar esta función. Tienes {user.credits} crédito(s) disponibles.'
+        }), 402)
+    db.session.commit()
+    return amount, None
+
+
+def refund_credits(user_id, amount):
+    """Devuelve créditos descontados previamente"""
+    if not amount or user_id is None:
+        return
+    from api.models.user import User
+    from api import db
+    user = User.query.get(user_id)
+    if user:
+        user.add_credits(amount)
+        db.session.commit()
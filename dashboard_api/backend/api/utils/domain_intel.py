@@ -0,0 +1,220 @@
+"""
+Consultas de inteligencia de dominios (WHOIS, SSL, Ahrefs DR, Similarweb)
+Cada check es una función fetch(domain) -> dict que lanza ExternalApiError si
+el proveedor falla. run_bulk_checks() ejecuta muchos dominios en paralelo
+respetando un límite de concurrencia por host del proveedor y reutilizando
+los resultados aún frescos del store de perfiles de dominio.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from flask import current_app
+
+from api.utils.canonical import canonical_domain
+from api.utils.domain_profiles import read_through
+from api.utils.deadline import upstream_timeout
+from api.utils.error_handlers import ExternalApiError, ValidationError
+from api.utils.tls_inspect import inspect_certificate, target_policy, TLSInspectionError, TLSTargetError
+from api.utils.rapidapi import upstream_get
+
+WHOIS_HOST = "whois-lookup-service.p.rapidapi.com"
+SSL_HOST = "ssl-checker2.p.rapidapi.com"
+SIMILARWEB_HOST = "similarweb-insights.p.rapidapi.com"
+
+_host_semaphores = {}
+_lock = threading.Lock()
+
+
+def get_headers(host):
+    return {
+        "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
+        "x-rapidapi-host": host
+    }
+
+
+def _get_json(url, host, params=None):
+    """GET al proveedor; devuelve el JSON o lanza ExternalApiError"""
+    try:
+        response = upstream_get(url, headers=get_headers(host), params=params, timeout=20)
+    except requests.exceptions.RequestException as e:
+        raise ExternalApiError('Error de conexión con la API externa', payload={'details': str(e)})
+    if response.status_code != 200:
+        error = ExternalApiError(
+            f'La API externa respondió {response.status_code}',
+            payload={'details': response.text[:500]}
+        )
+        error.status_code = response.status_code
+        raise error
+    try:
+        return response.json()
+    except ValueError:
+        raise ExternalApiError('Respuesta inválida de la API externa')
+
+
+def fetch_whois(domain):
+    """Información WHOIS del dominio"""
+    return _get_json(f"https://{WHOIS_HOST}/v1/getwhois", WHOIS_HOST, {"url": domain})
+
+
+def map_ssl_result(result, domain):
+    """Formato de respuesta del SSL checker para el frontend"""
+    return {
+        'issuer': result.get('issuer', '-'),
+        'validFrom': result.get('validFromDate', '-'),
+        'validUntil': result.get('expiry', '-'),
+        'daysLeft': result.get('daysLeft', '-'),
+        'lifespan': result.get('lifespanInDays', '-'),
+        'domain': result.get('final_url', domain),
+        'port': result.get('port', '-'),
+        'isValid': result.get('isvalidCertificate', False),
+        'isExpired': result.get('isExpired', False),
+        'message': result.get('message', '')
+    }
+
+
+def fetch_ssl(domain):
+    """Estado del certificado SSL del dominio (handshake local; RapidAPI como respaldo)"""
+    if current_app.config.get('SSL_CHECKER_ENGINE', 'local') == 'local':
+        try:
+            return inspect_certificate(domain, timeout=upstream_timeout(current_app.config.get('SSL_CHECKER_TIMEOUT', 10)),
+                                       **target_policy(current_app.config))
+        except TLSTargetError as e:
+            raise ValidationError(str(e))
+        except TLSInspectionError as e:
+            if not current_app.config.get('SSL_CHECKER_FALLBACK', True):
+                raise ExternalApiError('No se pudo inspeccionar el certificado', payload={'details': str(e)})
+    ssl_data = _get_json(f"https://{SSL_HOST}/", SSL_HOST, {"domain": domain})
+    if ssl_data.get('status') != 'success' or not ssl_data.get('result'):
+        raise ExternalApiError('Error en la respuesta de la API externa')
+    return map_ssl_result(ssl_data['result'], domain)
+
+
+def map_authority_result(data):
+    """Métricas relevantes de Domain Metrics (Ahrefs)"""
+    return {
+        'domainRating': data.get('ahrefsDR', 0),
+        'urlRating': data.get('ahrefsRank', 0),
+        'backlinks': data.get('ahrefsBacklinks', 0),
+        'refdomains': data.get('ahrefsRefDomains', 0),
+        'traffic': data.get('ahrefsTraffic', 0),
+        'trafficValue': data.get('ahrefsTrafficValue', 0),
+        'organicKeywords': data.get('ahrefsOrganicKeywords', 0)
+    }
+
+
+def fetch_authority(domain):
+    """Domain Rating y métricas de Ahrefs"""
+    host = current_app.config['RAPIDAPI_AHREFS_HOST']
+    return map_authority_result(_get_json(f"https://{host}/domain-metrics/{domain}", host))
+
+
+def fetch_similarweb(domain):
+    """Insights de tráfico de Similarweb"""
+    return _get_json(f"https://{SIMILARWEB_HOST}/all-insights", SIMILARWEB_HOST, {"domain": domain})
+
+
+# check -> (función, host del proveedor (o clave de config), créditos)
+CHECKS = {
+    'whois': (fetch_whois, WHOIS_HOST, 1),
+    'ssl': (fetch_ssl, SSL_HOST, 1),
+    'ahrefs': (fetch_authority, 'RAPIDAPI_AHREFS_HOST', 2),
+    'similarweb': (fetch_similarweb, SIMILARWEB_HOST, 1),
+}
+
+
+def get_check_host(check):
+    host = CHECKS[check][1]
+    return current_app.config.get(host, host) if host.isupper() else host
+
+
+def get_host_semaphore(host):
+    """Semáforo que limita las peticiones simultáneas a un mismo proveedor"""
+    with _lock:
+        if host not in _host_semaphores:
+            limits = current_app.config.get('DOMAIN_INTEL_HOST_CONCURRENCY') or {}
+            _host_semaphores[host] = threading.BoundedSemaphore(limits.get(host, limits.get('default', 4)))
+        return _host_semaphores[host]
+
+
+def run_check(check, domain, use_cache=True):
+    """
+    Ejecuta un check para un dominio
+
+    Returns:
+        tuple: (resultado, servido desde el store)
+    """
+    fetch = CHECKS[check][0]
+
+    def fetch_limited():
+        with get_host_semaphore(get_check_host(check)):
+            return fetch(domain)
+
+    return read_through(domain, check, fetch_limited, refresh=not use_cache)
+
+
+def parse_domains(values, max_domains):
+    """
+    Canoniza y deduplica la lista de dominios (conservando el orden)
+
+    Returns:
+        tuple: (dict dominio -> entradas originales, lista de entradas inválidas)
+    """
+    domains, invalid = {}, []
+    for value in values:
+        if not isinstance(value, str):
+            invalid.append(value)
+            continue
+        domain = canonical_domain(value)
+        if not domain:
+            invalid.append(value)
+            continue
+        if domain not in domains and len(domains) >= max_domains:
+            raise ValueError(f'Se permiten como máximo {max_domains} dominios por petición')
+        domains.setdefault(domain, []).append(value)
+    return domains, invalid
+
+
+def run_bulk_checks(app, domains, checks, use_cache=True):
+    """
+    Ejecuta los checks de todos los dominios en paralelo y va entregando cada
+    dominio en cuanto terminan todos sus checks.
+
+    Yields:
+        dict: {'domain', 'results', 'errors', 'cached'} por dominio
+    """
+    max_workers = app.config.get('DOMAIN_INTEL_MAX_WORKERS', 16)
+
+    def task(check, domain):
+        with app.app_context():
+            return run_check(check, domain, use_cache)
+
+    pending = {domain: len(checks) for domain in domains}
+    reports = {domain: {'domain': domain, 'results': {}, 'errors': {}, 'cached': []} for domain in domains}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='domain-intel')
+    try:
+        futures = {
+            executor.submit(task, check, domain): (check, domain)
+            for domain in domains
+            for check in checks
+        }
+        for future in as_completed(futures):
+            check, domain = futures[future]
+            report = reports[domain]
+            try:
+                result, cached = future.result()
+                report['results'][check] = result
+                if cached:
+                    report['cached'].append(check)
+            except (ExternalApiError, ValidationError) as e:
+                report['errors'][check] = e.message
+            except Exception:
+                report['errors'][check] = 'Error interno al ejecutar el check'
+
+            pending[domain] -= 1
+            if not pending[domain]:
+                yield reports.pop(domain)
+    finally:
+        # Si el cliente se desconecta no se lanzan los checks que faltan
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,123 @@
+"""
+Perfiles de dominio con frescura por fuente
+Cada fuente (WHOIS, SSL, DR, velocidad...) se guarda por dominio canónico en
+la tabla domain_profiles y se considera vigente según su propia antigüedad
+máxima. Las rutas leen a través del store: si el dato está fresco se sirve
+localmente y si no se consulta al proveedor y se guarda.
+"""
+import logging
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from flask import current_app, jsonify
+from sqlalchemy.exc import IntegrityError
+
+from api import db
+from api.models.domain_profile import DomainProfile
+from api.utils.canonical import canonical_domain, canonical_url
+from api.utils.result_cache import cache_bypassed
+
+logger = logging.getLogger(__name__)
+
+# Antigüedad (segundos) de las fuentes sin entrada en DOMAIN_PROFILE_MAX_AGE
+DEFAULT_MAX_AGE = 3600
+
+
+def profile_key_for_url(url):
+    """(dominio canónico, ruta) con la que se guarda el análisis de una URL; (None, None) si no es válida"""
+    domain = canonical_domain(url)
+    if not domain:
+        return None, None
+    parsed = urlsplit(canonical_url(url))
+    path = parsed.path
+    if parsed.query:
+        path = f'{path}?{parsed.query}'
+    return domain, path[:512]
+
+
+def get_max_age(source):
+    """Antigüedad máxima configurada para una fuente"""
+    max_ages = current_app.config.get('DOMAIN_PROFILE_MAX_AGE') or {}
+    return timedelta(seconds=max_ages.get(source, DEFAULT_MAX_AGE))
+
+
+def get_facet(domain, source, path='/', fresh_only=True):
+    """Registro guardado de una fuente para el dominio (None si no existe o está vencido)"""
+    record = DomainProfile.query.filter_by(domain=domain, source=source, path=path).first()
+    if record and fresh_only and datetime.utcnow() - record.fetched_at > get_max_age(source):
+        return None
+    return record
+
+
+def save_facet(domain, source, data, path='/'):
+    """Guarda (o reemplaza) el resultado de una fuente para el dominio"""
+    for _ in range(2):
+        record = DomainProfile.query.filter_by(domain=domain, source=source, path=path).first()
+        if record is None:
+            record = DomainProfile(domain=domain, source=source, path=path)
+            db.session.add(record)
+        record.data = data
+        record.fetched_at = datetime.utcnow()
+        try:
+            db.session.commit()
+            return record
+        except IntegrityError:
+            # Otra petición insertó el mismo dominio/fuente a la vez: actualizar ese registro
+            db.session.rollback()
+    logger.warning(f"No se pudo guardar el perfil {source} de {domain}{path}")
+    return None
+
+
+def read_through(domain, source, fetch, path='/', refresh=False):
+    """
+    Devuelve el dato de una fuente leyendo primero del store
+
+    Args:
+        fetch: función sin argumentos que consulta al proveedor (sus errores se propagan)
+        refresh: ignorar el dato guardado y consultar al proveedor
+
+    Returns:
+        tuple: (datos, servido desde el store)
+    """
+    if not refresh:
+        record = get_facet(domain, source, path)
+        if record is not None:
+            return record.data, True
+
+    data = fetch()
+    try:
+        save_facet(domain, source, data, path)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error guardando el perfil {source} de {domain}: {e}")
+    return data, False
+
+
+def stored_facet(domain, source, path='/'):
+    """
+    Dato fresco guardado para la petición actual, o None si hay que consultar
+    al proveedor (dominio inválido, dato vencido o cache=bypass)
+    """
+    if not domain or cache_bypassed():
+        return None
+    record = get_facet(domain, source, path)
+    return record.data if record is not None else None
+
+
+def profile_response(data, hit, status=200):
+    """Respuesta JSON con la cabecera X-Cache (HIT si salió del store)"""
+    response = jsonify(data)
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response, status
+
+
+def get_profile(domain):
+    """Todas las fuentes guardadas de un dominio, indicando si siguen frescas"""
+    now = datetime.utcnow()
+    facets = {}
+    for record in DomainProfile.query.filter_by(domain=domain).order_by(DomainProfile.source).all():
+        item = record.to_dict()
+        item['fresh'] = now - record.fetched_at <= get_max_age(record.source)
+        key = record.source if record.path == '/' else f'{record.source}:{record.path}'
+        facets[key] = item
+    return {'domain': domain, 'facets': facets}
@@ -66,6 +66,8 @@ class GlobalAPITracker:
             '/api/beta_v2/stats/',          # Estadísticas del sistema
             '/api/beta_v2/notifications/',  # Notificaciones del sistema
             '/api/beta_v2/credits/',        # Sistema de créditos interno
+            '/api/beta_v2/jobs/',           # Estado de trabajos en segundo plano
+            '/api/beta_v2/ssl-checker/watchlist',  # Gestión de la vigilancia de certificados
             '/api/beta_v2/version-info'     # Información de versión
         ]
         
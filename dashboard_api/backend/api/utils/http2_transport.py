@@ -0,0 +1,179 @@
+"""
+Transporte HTTP/2 para las llamadas a proveedores (UPSTREAM_TRANSPORT='http2')
+
+Http2Session ofrece la misma interfaz que la Session de requests que usa
+upstream_request (request(), respuestas con status_code, headers, json(),
+iter_content()... y las excepciones de requests), pero sobre un cliente httpx
+con HTTP/2: todas las llamadas concurrentes de un worker a un mismo host
+*.p.rapidapi.com viajan como streams multiplexados de una única conexión, en
+lugar de una conexión (y un handshake TLS) por petición en vuelo.
+
+httpx[http2] es opcional: sin él upstream_request sigue con HTTP/1.1.
+"""
+import json as jsonlib
+
+import requests
+
+from api.utils.deadline import read_within
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dependencia opcional
+    httpx = None
+
+
+def http2_available():
+    """httpx y h2 están instalados"""
+    if httpx is None:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class Http2Response:
+    """Respuesta de httpx con la interfaz de requests.Response que usan las rutas"""
+
+    def __init__(self, response, streamed):
+        self._response = response
+        self._streamed = streamed
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.reason = response.reason_phrase
+        self.http_version = response.http_version
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        if self._streamed and not self._response.is_stream_consumed:
+            self._response.read()
+        return self._response.content
+
+    @property
+    def text(self):
+        self.content
+        return self._response.text
+
+    @property
+    def encoding(self):
+        return self._response.encoding
+
+    def json(self, **kwargs):
+        return jsonlib.loads(self.text, **kwargs)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        if not self._streamed or self._response.is_stream_consumed:
+            body = self.text if decode_unicode else self.content
+            size = chunk_size or len(body) or 1
+            for start in range(0, len(body), size):
+                yield body[start:start + size]
+            return
+        chunks = self._response.iter_text(chunk_size) if decode_unicode else self._response.iter_bytes(chunk_size)
+        yield from _translate_errors(chunks)
+
+    def iter_lines(self, chunk_size=512, decode_unicode=False, delimiter=None):
+        if self._streamed and not self._response.is_stream_consumed:
+            for line in _translate_errors(self._response.iter_lines()):
+                yield line if decode_unicode else line.encode(self._response.encoding or 'utf-8')
+            return
+        for line in (self.text if decode_unicode else self.content).splitlines():
+            yield line
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            raise requests.exceptions.HTTPError(f"{self.status_code} {kind} Error: {self.reason} for url: {self.url}",
+                                                response=self)
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _requests_error(error):
+    """Excepción de requests equivalente a la de httpx (la que esperan las rutas)"""
+    if isinstance(error, httpx.ConnectTimeout):
+        kind = requests.exceptions.ConnectTimeout
+    elif isinstance(error, httpx.TimeoutException):
+        kind = requests.exceptions.ReadTimeout
+    elif isinstance(error, httpx.UnsupportedProtocol):
+        kind = requests.exceptions.InvalidSchema
+    elif isinstance(error, httpx.TransportError):
+        kind = requests.exceptions.ConnectionError
+    elif isinstance(error, httpx.TooManyRedirects):
+        kind = requests.exceptions.TooManyRedirects
+    elif isinstance(error, httpx.InvalidURL):
+        kind = requests.exceptions.InvalidURL
+    elif isinstance(error, httpx.DecodingError):
+        kind = requests.exceptions.ContentDecodingError
+    else:
+        kind = requests.exceptions.RequestException
+    return kind(str(error))
+
+
+def _translate_errors(iterator):
+    try:
+        yield from iterator
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        raise _requests_error(e) from e
+
+
+class Http2Session:
+    """
+    Cliente HTTP/2 con la interfaz de requests.Session
+
+    Args:
+        max_connections (int): Conexiones abiertas como máximo (entre todos los hosts)
+        keepalive (int): Conexiones ociosas que se conservan
+        http1 (bool): Aceptar HTTP/1.1 si el servidor no negocia HTTP/2 por ALPN
+            (False: HTTP/2 directo, también sin TLS)
+        verify: Verificación TLS (bool o ssl.SSLContext)
+    """
+
+    def __init__(self, max_connections=32, keepalive=16, http1=True, verify=True):
+        if not http2_available():
+            raise RuntimeError('HTTP/2 requiere httpx[http2]')
+        self.client = httpx.Client(
+            http1=http1, http2=True, verify=verify,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=keepalive)
+        )
+
+    def request(self, method, url, params=None, data=None, headers=None, files=None, json=None, timeout=None,
+                stream=False, allow_redirects=True, deadline=None, **kwargs):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            timeout = httpx.Timeout(read, connect=connect, pool=connect)
+        content = None
+        if data is not None and not isinstance(data, dict):
+            content, data = data, None  # Cuerpo en bruto: httpx lo recibe como content
+        bounded = deadline is not None and not stream
+        try:
+            request = self.client.build_request(method, url, params=params, data=data, content=content, files=files,
+                                                json=json, headers=headers, timeout=timeout, **kwargs)
+            response = self.client.send(request, stream=stream or bounded, follow_redirects=allow_redirects)
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise _requests_error(e) from e
+        if bounded:
+            # Lo mismo que hace httpx.Response.read(), con el plazo comprobado entre bloques
+            response._content = read_within(_translate_errors(response.iter_bytes()), deadline, response.close)
+        return Http2Response(response, streamed=stream)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,272 @@
+"""
+Motor local de manipulación de imágenes con Pillow
+Sustituye al proveedor remoto para resize, blur, crop, rotate, thumbnail,
+transpose y convert. transform_image recibe y devuelve bytes y no depende de
+Flask, de modo que se ejecuta en el pool de procesos.
+"""
+import io
+
+from PIL import Image, ImageFilter, ImageOps, UnidentifiedImageError
+
+MAX_DIMENSION = 8192
+MAX_PIXELS = 50_000_000  # Límite contra imágenes "bomba de descompresión"
+MAX_BLUR_RADIUS = 100
+MAX_PIPELINE_STEPS = 10
+ORIENTATION_TAG = 0x0112
+JPEG_QUALITY = 90
+
+OPERATIONS = {'resize', 'blur', 'crop', 'rotate', 'thumbnail', 'transpose', 'convert'}
+
+# Formato de salida -> (formato de Pillow, content_type)
+OUTPUT_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'jpg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+    'gif': ('GIF', 'image/gif'),
+    'bmp': ('BMP', 'image/bmp'),
+    'tiff': ('TIFF', 'image/tiff'),
+}
+
+TRANSPOSE_METHODS = {
+    'flip_left_right': Image.Transpose.FLIP_LEFT_RIGHT,
+    'flip_top_bottom': Image.Transpose.FLIP_TOP_BOTTOM,
+    'rotate_90': Image.Transpose.ROTATE_90,
+    'rotate_180': Image.Transpose.ROTATE_180,
+    'rotate_270': Image.Transpose.ROTATE_270,
+    'transpose': Image.Transpose.TRANSPOSE,
+    'transverse': Image.Transpose.TRANSVERSE,
+}
+
+
+class ImageEngineError(ValueError):
+    """Operación, parámetros o imagen no válidos"""
+
+
+def _int_param(params, name, minimum=None, maximum=None, required=False):
+    value = params.get(name)
+    if value in (None, ''):
+        if required:
+            raise ImageEngineError(f"El parámetro '{name}' es obligatorio")
+        return None
+    try:
+        value = int(float(value))
+    except (TypeError, ValueError):
+        raise ImageEngineError(f"El parámetro '{name}' debe ser numérico")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ImageEngineError(f"El parámetro '{name}' debe estar entre {minimum} y {maximum}")
+    return value
+
+
+def normalize_params(operation, params=None):
+    """
+    Valida los parámetros de una operación y los devuelve normalizados (solo los
+    que la afectan), de modo que peticiones equivalentes compartan clave de caché
+
+    Raises:
+        ImageEngineError: si la operación o los parámetros no son válidos
+    """
+    params = params or {}
+    if operation not in OPERATIONS:
+        raise ImageEngineError(f"Operación no soportada: {operation}")
+
+    if operation in ('resize', 'thumbnail'):
+        width = _int_param(params, 'width', 1, MAX_DIMENSION)
+        height = _int_param(params, 'height', 1, MAX_DIMENSION)
+        if width is None and height is None:
+            raise ImageEngineError("Se requiere 'width' o 'height'")
+        return {'width': width, 'height': height}
+    if operation == 'blur':
+        try:
+            radius = float(params.get('blur', params.get('radius', 2)))
+        except (TypeError, ValueError):
+            raise ImageEngineError("El parámetro 'blur' debe ser numérico")
+        if not 0 <= radius <= MAX_BLUR_RADIUS:
+            raise ImageEngineError(f"El parámetro 'blur' debe estar entre 0 y {MAX_BLUR_RADIUS}")
+        return {'blur': round(radius, 2)}
+    if operation == 'crop':
+        box = {name: _int_param(params, name, 0, MAX_DIMENSION, required=True)
+               for name in ('left', 'upper', 'right', 'lower')}
+        if box['right'] <= box['left'] or box['lower'] <= box['upper']:
+            raise ImageEngineError("El recorte debe cumplir left < right y upper < lower")
+        return box
+    if operation == 'rotate':
+        try:
+            angle = float(params.get('angle', 0)) % 360
+        except (TypeError, ValueError):
+            raise ImageEngineError("El parámetro 'angle' debe ser numérico")
+        return {'angle': round(angle, 2)}
+    if operation == 'transpose':
+        method = str(params.get('method', 'flip_left_right')).lower()
+        if method.isdigit():
+            names = list(TRANSPOSE_METHODS)
+            method = names[int(method)] if int(method) < len(names) else method
+        if method not in TRANSPOSE_METHODS:
+            raise ImageEngineError(f"Método de transposición no soportado: {method}")
+        return {'method': method}
+    convert_to = str(params.get('convert_to') or '').lower().lstrip('.')
+    if not convert_to:
+        raise ImageEngineError('El formato de conversión es obligatorio')
+    if convert_to not in OUTPUT_FORMATS:
+        raise ImageEngineError(f"Formato de conversión no soportado: {convert_to}")
+    return {'convert_to': 'jpeg' if convert_to == 'jpg' else convert_to}
+
+
+def target_size(size, operation, params):
+    """Tamaño final de resize/thumbnail para una imagen de tamaño size (None en otras operaciones)"""
+    width, height = size
+    if operation == 'resize':
+        if params['width'] is None:
+            return max(1, round(width * params['height'] / height)), params['height']
+        if params['height'] is None:
+            return params['width'], max(1, round(height * params['width'] / width))
+        return params['width'], params['height']
+    if operation == 'thumbnail':
+        ratio = min((params['width'] or MAX_DIMENSION) / width, (params['height'] or MAX_DIMENSION) / height, 1)
+        return max(1, round(width * ratio)), max(1, round(height * ratio))
+    return None
+
+
+def open_image(data, first_step=None):
+    """
+    Abre la imagen aplicando la orientación EXIF y el límite de píxeles. Si el
+    primer paso reduce un JPEG, se decodifica en modo draft (escala 1/2, 1/4 o
+    1/8 en el propio decodificador) a un tamaño no menor que el pedido.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, OSError):
+        raise ImageEngineError('El archivo no es una imagen válida')
+    except Image.DecompressionBombError:
+        raise ImageEngineError('La imagen es demasiado grande')
+    if image.width * image.height > MAX_PIXELS:
+        raise ImageEngineError('La imagen es demasiado grande')
+    source_format = (image.format or 'PNG').lower()
+    try:
+        if first_step and image.format == 'JPEG':
+            # Las orientaciones EXIF 5-8 giran 90°: el tamaño pedido se expresa sobre la imagen ya girada
+            rotated = image.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8)
+            size = image.size[::-1] if rotated else image.size
+            target = target_size(size, *first_step)
+            if target and target[0] < size[0] and target[1] < size[1]:
+                image.draft('RGB', target[::-1] if rotated else target)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, SyntaxError) as e:
+        raise ImageEngineError(f'No se pudo decodificar la imagen: {e}')
+    return image, source_format
+
+
+def apply_operation(image, operation, params):
+    """Aplica una operación (con parámetros ya normalizados) y devuelve la nueva imagen"""
+    if operation == 'resize':
+        return image.resize(target_size(image.size, operation, params), Image.Resampling.LANCZOS)
+    if operation == 'thumbnail':
+        image = image.copy()
+        image.thumbnail((params['width'] or MAX_DIMENSION, params['height'] or MAX_DIMENSION),
+                        Image.Resampling.LANCZOS)
+        return image
+    if operation == 'blur':
+        return image.filter(ImageFilter.GaussianBlur(params['blur']))
+    if operation == 'crop':
+        right = min(params['right'], image.width)
+        lower = min(params['lower'], image.height)
+        if right <= params['left'] or lower <= params['upper']:
+            raise ImageEngineError('El recorte queda fuera de la imagen')
+        return image.crop((params['left'], params['upper'], right, lower))
+    if operation == 'rotate':
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        # Mismo sentido que Pillow (antihorario); las esquinas nuevas quedan transparentes o en blanco
+        fill = {'RGBA': (0, 0, 0, 0), 'LA': (0, 0), 'L': 255}.get(image.mode, (255, 255, 255))
+        return image.rotate(params['angle'], resample=Image.Resampling.BICUBIC, expand=True, fillcolor=fill)
+    if operation == 'transpose':
+        return image.transpose(TRANSPOSE_METHODS[params['method']])
+    return image  # convert solo cambia el formato de salida
+
+
+def encode_image(image, output_format):
+    """
+    Codifica la imagen en el formato pedido
+
+    Returns:
+        tuple: (bytes, content_type)
+    """
+    pil_format, content_type = OUTPUT_FORMATS.get(output_format, OUTPUT_FORMATS['png'])
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        if image.mode in ('RGBA', 'LA', 'P'):
+            rgba = image.convert('RGBA')
+            background = Image.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+    elif pil_format in ('PNG', 'WEBP') and image.mode == 'CMYK':
+        image = image.convert('RGB')
+
+    options = {}
+    if pil_format == 'JPEG':
+        options = {'quality': JPEG_QUALITY, 'optimize': True}
+    elif pil_format == 'WEBP':
+        options = {'quality': JPEG_QUALITY, 'method': 4}
+    elif pil_format == 'PNG':
+        options = {'optimize': True}
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue(), content_type
+
+
+def normalize_steps(steps):
+    """
+    Valida una lista de pasos [{'operation': ..., 'params': {...}}, ...] y la
+    devuelve como lista de (operación, parámetros normalizados)
+
+    Raises:
+        ImageEngineError: si la lista o alguno de los pasos no es válido
+    """
+    if not isinstance(steps, list) or not steps:
+        raise ImageEngineError("'operations' debe ser una lista con al menos una operación")
+    if len(steps) > MAX_PIPELINE_STEPS:
+        raise ImageEngineError(f'La cadena admite como máximo {MAX_PIPELINE_STEPS} operaciones')
+    normalized = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise ImageEngineError(f'La operación {index + 1} debe ser un objeto')
+        try:
+            normalized.append((step.get('operation'), normalize_params(step.get('operation'), step.get('params'))))
+        except ImageEngineError as e:
+            raise ImageEngineError(f'Operación {index + 1}: {e}')
+    return normalized
+
+
+def run_pipeline(data, steps):
+    """
+    Aplica una cadena de operaciones con una sola decodificación y una sola
+    codificación. Se ejecuta en el pool de procesos.
+
+    Args:
+        data (bytes): Imagen de origen
+        steps (list): Pasos (operación, parámetros) normalizados con normalize_steps;
+            un convert fija el formato de salida (gana el último)
+
+    Returns:
+        tuple: (bytes, content_type, ancho, alto)
+
+    Raises:
+        ImageEngineError: si la imagen no se puede procesar
+    """
+    image, output_format = open_image(data, steps[0] if steps[0][0] in ('resize', 'thumbnail') else None)
+    for operation, params in steps:
+        if operation == 'convert':
+            output_format = params['convert_to']
+        else:
+            image = apply_operation(image, operation, params)
+    if output_format not in OUTPUT_FORMATS:
+        output_format = 'png'  # Formatos de origen sin codificador (ico, psd...) se devuelven como PNG
+    body, content_type = encode_image(image, output_format)
+    return body, content_type, image.width, image.height
+
+
+def transform_image(data, operation, params):
+    """Aplica una sola operación (ver run_pipeline)"""
+    return run_pipeline(data, [(operation, params)])
@@ -0,0 +1,140 @@
+"""
+Preparación de imágenes para análisis remotos y hashes perceptuales
+prepare_for_upload reduce las imágenes grandes a la resolución que usa el
+proveedor (en lugar de rechazarlas) y calcula pHash y dHash con NumPy, de
+modo que una misma foto reexportada o recomprimida se reconoce como la misma.
+PerceptualCache guarda resultados por hash con tolerancia de distancia de
+Hamming. prepare_for_upload no depende de Flask y se ejecuta en el pool de procesos.
+"""
+import io
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+HASH_SIZE = 8
+PHASH_SAMPLE = 32
+MAX_PIXELS = 50_000_000
+UPLOAD_QUALITY = 90
+
+
+class ImagePrepareError(ValueError):
+    """La imagen no se puede decodificar o es demasiado grande"""
+
+
+def _dct_matrix(size):
+    """Matriz de la DCT-II ortonormal de tamaño size x size"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SAMPLE)
+
+
+def _bits_to_int(bits):
+    return int(''.join('1' if bit else '0' for bit in bits.ravel()), 2)
+
+
+def dhash(image):
+    """Hash de diferencias: compara cada píxel con su vecino de la derecha (64 bits)"""
+    gray = np.asarray(image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR),
+                      dtype=np.int16)
+    return _bits_to_int(gray[:, 1:] > gray[:, :-1])
+
+
+def phash(image):
+    """Hash perceptual: signo de las frecuencias bajas de la DCT frente a su mediana (64 bits)"""
+    gray = np.asarray(image.convert('L').resize((PHASH_SAMPLE, PHASH_SAMPLE), Image.Resampling.BILINEAR),
+                      dtype=np.float64)
+    low = (_DCT @ gray @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def prepare_for_upload(data, max_side, max_bytes):
+    """
+    Reduce la imagen si supera max_side píxeles de lado o max_bytes y calcula sus hashes
+
+    Returns:
+        dict: content (bytes a enviar), content_type, phash, dhash, width, height, resized
+
+    Raises:
+        ImagePrepareError: si no es una imagen válida o no cabe en max_bytes
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_PIXELS:
+            raise ImagePrepareError('La imagen es demasiado grande')
+        source_format = image.format
+        if image.format == 'JPEG' and max(image.size) > max_side:
+            image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise ImagePrepareError('El archivo no es una imagen válida')
+
+    hashes = {'phash': phash(image), 'dhash': dhash(image)}
+    if max(image.size) <= max_side and len(data) <= max_bytes and source_format in ('JPEG', 'PNG'):
+        content_type = 'image/jpeg' if source_format == 'JPEG' else 'image/png'
+        return dict(hashes, content=data, content_type=content_type,
+                    width=image.width, height=image.height, resized=False)
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    if image.mode != 'RGB':
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    for quality in (UPLOAD_QUALITY, 80, 70):
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        if buffer.tell() <= max_bytes:
+            return dict(hashes, content=buffer.getvalue(), content_type='image/jpeg',
+                        width=image.width, height=image.height, resized=True)
+    raise ImagePrepareError('No se pudo reducir la imagen al tamaño máximo del proveedor')
+
+
+class PerceptualCache:
+    """
+    Resultados por (espacio, hashes) con TTL y LRU. Una entrada coincide si su
+    pHash está a una distancia de Hamming no mayor que max_distance y su dHash
+    (más sensible a la recompresión) a no más del doble.
+    """
+
+    def __init__(self, max_entries=1024, max_distance=4):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, phash_value, dhash_value):
+        now = time.monotonic()
+        with self._lock:
+            for key, (value, expires_at) in self._entries.items():
+                if key[0] != namespace or expires_at <= now:
+                    continue
+                if hamming(key[1], phash_value) <= self.max_distance and \
+                        hamming(key[2], dhash_value) <= self.max_distance * 2:
+                    self._entries.move_to_end(key)
+                    return value
+        return None
+
+    def set(self, namespace, phash_value, dhash_value, value, ttl):
+        key = (namespace, phash_value, dhash_value)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,270 @@
+"""
+Optimizador local de imágenes con Pillow y NumPy
+Elimina los metadatos (EXIF, XMP, comentarios; se conserva el perfil ICC),
+guarda los JPEG progresivos y busca la calidad más baja cuya similitud
+estructural (SSIM sobre la luminancia) con el original no baja del objetivo.
+La búsqueda se hace sobre un mosaico de teselas repartidas por la imagen, de
+modo que solo la codificación final trabaja a resolución completa. Los PNG
+se prueban además cuantizados a paleta con el mismo criterio.
+optimize_image no depende de Flask y se ejecuta en el pool de procesos.
+"""
+import io
+
+import numpy as np
+from PIL import Image, ImageOps, ImageSequence, UnidentifiedImageError
+
+MAX_PIXELS = 50_000_000
+MIN_QUALITY = 40
+MAX_QUALITY = 92
+DEFAULT_SSIM = 0.985
+SSIM_WINDOW = 7
+SAMPLE_GRID = 4  # Teselas por lado del mosaico de búsqueda
+SAMPLE_TILE = 128  # Múltiplo de 16 para coincidir con los bloques del JPEG
+WEBP_METHOD = 4
+WEBP_SEARCH_METHOD = 2  # Más rápido durante la búsqueda; la calidad elegida apenas varía
+PNG_OPTIMIZE_PIXELS = 1_000_000
+
+# Formato de salida -> (formato de Pillow, content_type, extensión)
+OUTPUT_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'png': ('PNG', 'image/png', 'png'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'gif': ('GIF', 'image/gif', 'gif'),
+}
+SOURCE_FORMATS = {'JPEG': 'jpeg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+# Claves de Image.info con metadatos que no deben salir en la respuesta
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+
+class OptimizeError(ValueError):
+    """La imagen no se puede decodificar u optimizar"""
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _flatten(image):
+    """Imagen RGB con la transparencia compuesta sobre blanco"""
+    if not _has_alpha(image):
+        return image.convert('RGB') if image.mode not in ('RGB', 'L') else image
+    rgba = image.convert('RGBA')
+    background = Image.new('RGB', rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel('A'))
+    return background
+
+
+def _luma(image):
+    """Luminancia (con la transparencia sobre blanco) como matriz float"""
+    return np.asarray(_flatten(image).convert('L'), dtype=np.float64)
+
+
+def _sample(image):
+    """
+    Mosaico de SAMPLE_GRID x SAMPLE_GRID teselas alineadas a 16 px repartidas por
+    la imagen; las imágenes pequeñas se usan completas
+    """
+    span = SAMPLE_GRID * SAMPLE_TILE
+    if image.width <= span or image.height <= span:
+        return image
+    mosaic = Image.new(image.mode, (span, span))
+    if image.mode == 'P':
+        mosaic.putpalette(image.getpalette())
+    for row in range(SAMPLE_GRID):
+        for column in range(SAMPLE_GRID):
+            left = (image.width - SAMPLE_TILE) * column // (SAMPLE_GRID - 1) // 16 * 16
+            upper = (image.height - SAMPLE_TILE) * row // (SAMPLE_GRID - 1) // 16 * 16
+            tile = image.crop((left, upper, left + SAMPLE_TILE, upper + SAMPLE_TILE))
+            mosaic.paste(tile, (column * SAMPLE_TILE, row * SAMPLE_TILE))
+    return mosaic
+
+
+def _box_mean(values, window):
+    """Media en ventanas window x window (solo posiciones completas) con la imagen integral"""
+    integral = np.pad(values.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    total = (integral[window:, window:] - integral[:-window, window:]
+             - integral[window:, :-window] + integral[:-window, :-window])
+    return total / (window * window)
+
+
+def ssim(reference, candidate, window=SSIM_WINDOW):
+    """SSIM media entre dos luminancias del mismo tamaño (ventana uniforme)"""
+    if min(reference.shape) < window:
+        window = max(1, min(reference.shape))
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mu_x = _box_mean(reference, window)
+    mu_y = _box_mean(candidate, window)
+    var_x = _box_mean(reference * reference, window) - mu_x * mu_x
+    var_y = _box_mean(candidate * candidate, window) - mu_y * mu_y
+    cov = _box_mean(reference * candidate, window) - mu_x * mu_y
+    values = ((2 * mu_x * mu_y + c1) * (2 * cov + c2)) / ((mu_x * mu_x + mu_y * mu_y + c1) * (var_x + var_y + c2))
+    return float(values.mean())
+
+
+def _encode(image, pil_format, quality=None, icc_profile=None, search=False):
+    """Codifica sin metadatos; en la búsqueda se omiten los pasos que no cambian la calidad"""
+    options = {}
+    if icc_profile and not search:
+        options['icc_profile'] = icc_profile
+    if pil_format == 'JPEG':
+        options.update(quality=quality, optimize=not search, progressive=not search)
+    elif pil_format == 'WEBP':
+        options['method'] = WEBP_SEARCH_METHOD if search else WEBP_METHOD
+        if quality is None:
+            options['lossless'] = True
+        else:
+            options['quality'] = quality
+    elif pil_format == 'GIF' or image.width * image.height <= PNG_OPTIMIZE_PIXELS:
+        options['optimize'] = True  # zlib al máximo: en PNG grandes cuesta segundos por poco ahorro
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def _quality_search(sample, pil_format, target):
+    """
+    Búsqueda binaria sobre el mosaico de la calidad más baja con SSIM >= target
+
+    Returns:
+        tuple: (calidad, ssim)
+    """
+    reference = _luma(sample)
+
+    def attempt(quality):
+        data = _encode(sample, pil_format, quality, search=True)
+        return quality, ssim(reference, _luma(Image.open(io.BytesIO(data))))
+
+    best = attempt(MAX_QUALITY)
+    if best[1] < target:
+        return best  # Ni la calidad máxima llega al objetivo: se entrega la más fiel
+    low, high = MIN_QUALITY, MAX_QUALITY - 1
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = attempt(middle)
+        if candidate[1] >= target:
+            best, high = candidate, middle - 1
+        else:
+            low = middle + 1
+    return best
+
+
+def _prefers_lossless(sample, quality):
+    """WebP sin pérdida ocupa menos que con pérdida a la calidad elegida (medido en el mosaico)"""
+    return len(_encode(sample, 'WEBP', search=True)) < len(_encode(sample, 'WEBP', quality, search=True))
+
+
+def _has_metadata(image):
+    """EXIF (con la posible ubicación GPS), XMP, comentarios o chunks de texto PNG"""
+    return any(key in image.info for key in METADATA_KEYS) or bool(getattr(image, 'text', None))
+
+
+def _strip_animation(image, pil_format, icc_profile=None):
+    """Vuelve a guardar todos los fotogramas sin metadatos, sin pérdida y con sus duraciones y bucle"""
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        frame.load()  # WebP solo informa la duración del fotograma al decodificarlo
+        durations.append(frame.info.get('duration', 0))
+    image.seek(0)
+    options = {'save_all': True, 'duration': durations}
+    if 'loop' in image.info:
+        options['loop'] = image.info['loop']
+    if pil_format == 'GIF':
+        options['comment'] = b''  # Si no, el escritor copia el comentario de los fotogramas
+    elif icc_profile:
+        options['icc_profile'] = icc_profile
+    if pil_format == 'WEBP':
+        options.update(lossless=True, method=WEBP_METHOD)
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _quantize(image):
+    return image.convert('RGBA' if _has_alpha(image) else 'RGB').quantize(256, method=Image.Quantize.FASTOCTREE)
+
+
+def optimize_image(data, output_format='auto', target_ssim=DEFAULT_SSIM):
+    """
+    Optimiza una imagen sin dependencias externas
+
+    Args:
+        data (bytes): Imagen original
+        output_format (str): 'auto' (mismo formato), 'jpeg', 'png' o 'webp'
+        target_ssim (float): Similitud mínima con el original en las codificaciones con pérdida
+
+    Returns:
+        dict: content, content_type, extension, format, quality, ssim, width, height,
+            original_bytes, bytes y optimized (False si se devuelve el original, que solo
+            ocurre cuando no lleva metadatos)
+
+    Raises:
+        OptimizeError: si no es una imagen válida o el formato no se puede generar
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_PIXELS:
+            raise OptimizeError('La imagen es demasiado grande')
+        source_format = SOURCE_FORMATS.get(image.format)
+        animated = getattr(image, 'n_frames', 1) > 1
+        icc_profile = image.info.get('icc_profile')
+        metadata = _has_metadata(image)
+        if not animated:
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise OptimizeError('El archivo no es una imagen válida')
+
+    if output_format == 'auto':
+        output_format = source_format or 'png'
+    if output_format not in OUTPUT_FORMATS:
+        raise OptimizeError(f'Formato de salida no soportado: {output_format}')
+    pil_format, content_type, extension = OUTPUT_FORMATS[output_format]
+    result = {'width': image.width, 'height': image.height, 'original_bytes': len(data),
+              'format': output_format, 'content_type': content_type, 'extension': extension,
+              'quality': None, 'ssim': 1.0}
+
+    if animated:
+        # Las animaciones no pasan por la búsqueda de calidad: se devuelven tal cual
+        # en su formato o, si llevan metadatos, recodificadas sin ellos
+        if output_format != source_format:
+            raise OptimizeError('Las imágenes animadas solo se optimizan en su formato original')
+        if not metadata:
+            return dict(result, content=data, bytes=len(data), optimized=False)
+        try:
+            content = _strip_animation(image, pil_format, icc_profile)
+        except (OSError, ValueError):
+            raise OptimizeError('No se pudo recodificar la animación')
+        return dict(result, content=content, bytes=len(content), optimized=True)
+
+    if image.mode == 'CMYK' or (image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P')):
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    if pil_format == 'JPEG':
+        image = _flatten(image)
+    elif pil_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+    if pil_format in ('JPEG', 'WEBP'):
+        sample = _sample(image)
+        quality, score = _quality_search(sample, pil_format, target_ssim)
+        result.update(quality=quality, ssim=round(score, 4))
+        if pil_format == 'WEBP' and source_format in ('png', 'gif') and _prefers_lossless(sample, quality):
+            # Gráficos y capturas suelen ocupar menos en WebP sin pérdida
+            quality = None
+            result.update(quality=None, ssim=1.0)
+        content = _encode(image, pil_format, quality, icc_profile)
+    else:
+        content = _encode(image, pil_format, icc_profile=icc_profile)
+        if image.mode not in ('P', 'L') and pil_format == 'PNG':
+            # Paleta de 256 colores si la pérdida (medida en el mosaico) queda dentro del objetivo
+            sample = _sample(image)
+            score = ssim(_luma(sample), _luma(_quantize(sample)))
+            if score >= target_ssim:
+                palette = _encode(_quantize(image), pil_format, icc_profile=icc_profile)
+                if len(palette) < len(content):
+                    content = palette
+                    result['ssim'] = round(score, 4)
+
+    if output_format == source_format and len(data) <= len(content) and not metadata:
+        # Con metadatos se entrega la recodificación limpia aunque ocupe algo más
+        return dict(result, content=data, bytes=len(data), quality=None, ssim=1.0, optimized=False)
+    return dict(result, content=content, bytes=len(content), optimized=True)
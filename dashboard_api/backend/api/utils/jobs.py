@@ -0,0 +1,350 @@
+"""
+Ejecutor de trabajos en segundo plano para herramientas lentas
+(speech-to-text, análisis de sitios, PDF a imagen, descargas de media...)
+
+Contrato: la ruta responde 202 Accepted con el ID del trabajo y el cliente
+consulta /jobs/<id> y /jobs/<id>/result. Los créditos se reservan al encolar
+y se reintegran si el trabajo falla.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, jsonify, request, url_for
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from api import db
+from api.models.job import Job
+from api.utils.decorators import charge_credits, refund_credits
+
+logger = logging.getLogger(__name__)
+
+# Handlers registrados por tipo de trabajo
+_handlers = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker_lock = threading.Lock()
+_worker_started = False
+
+
+class JobError(Exception):
+    """Error controlado de un trabajo (se guarda como mensaje de error del trabajo)"""
+
+
+class JobFile:
+    """Resultado binario de un trabajo; se guarda en disco durante la retención"""
+
+    def __init__(self, content, content_type, filename):
+        self.content = content
+        self.content_type = content_type
+        self.filename = filename
+
+
+def register_job_handler(kind):
+    """Registra la función que ejecuta los trabajos de un tipo: handler(payload) -> dict | JobFile"""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def wants_async():
+    """El cliente pide ejecución asíncrona con ?async=1 o con el header Prefer: respond-async"""
+    if 'respond-async' in (request.headers.get('Prefer') or '').lower():
+        return True
+    return str(request.args.get('async', '')).lower() in ('1', 'true', 'yes')
+
+
+def get_executor():
+    """Pool de hilos compartido donde corren los trabajos"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                max_workers = current_app.config.get('JOBS_MAX_WORKERS', 4)
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job-runner')
+    return _executor
+
+
+def get_results_dir():
+    """Directorio donde se guardan los resultados binarios de los trabajos"""
+    results_dir = current_app.config.get('JOB_RESULTS_DIR') or os.path.join(current_app.instance_path, 'job_results')
+    os.makedirs(results_dir, exist_ok=True)
+    return results_dir
+
+
+def _storable_payload(payload):
+    """Copia del payload apta para la columna JSON (los bytes sólo viven en memoria)"""
+    return {
+        key: ({'bytes': len(value)} if isinstance(value, (bytes, bytearray)) else value)
+        for key, value in (payload or {}).items()
+    }
+
+
+def enqueue_job(kind, payload, user_id=None, credits=0, idempotency_key=None):
+    """
+    Encola un trabajo, reservando sus créditos
+
+    Returns:
+        tuple: (job, creado, respuesta de error o None). Si ya existe un trabajo
+        con la misma clave de idempotencia se devuelve ese trabajo sin cobrar de nuevo.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Tipo de trabajo no registrado: {kind}")
+
+    if idempotency_key:
+        existing = _find_idempotent_job(kind, user_id, idempotency_key)
+        if existing is not None:
+            return existing
+        # La clave es única por usuario: un trabajo vencido aún sin purgar se libera
+        expired = Job.query.filter(
+            Job.user_id == user_id,
+            Job.idempotency_key == idempotency_key,
+            Job.expires_at <= datetime.utcnow()
+        ).first()
+        if expired is not None:
+            _delete_job(expired)
+            db.session.commit()
+
+    charged, error = charge_credits(user_id, credits)
+    if error:
+        return None, False, error
+
+    job = Job(
+        user_id=user_id,
+        kind=kind,
+        status=Job.STATUS_QUEUED,
+        payload=_storable_payload(payload),
+        idempotency_key=idempotency_key,
+        credits=charged,
+    )
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otra petición con la misma clave ganó la carrera: se devuelve su trabajo
+        db.session.rollback()
+        refund_credits(user_id, charged)
+        existing = _find_idempotent_job(kind, user_id, idempotency_key) if idempotency_key else None
+        if existing is None:
+            raise
+        return existing
+
+    get_executor().submit(_run_job, current_app._get_current_object(), job.id, payload)
+    return job, True, None
+
+
+def _find_idempotent_job(kind, user_id, idempotency_key):
+    """
+    Trabajo vigente con la misma clave de idempotencia
+
+    Returns:
+        tuple | None: (job, False, None), o un error 422 si la clave se usó
+        para otro tipo de trabajo
+    """
+    existing = Job.query.filter(
+        Job.user_id == user_id,
+        Job.idempotency_key == idempotency_key,
+        db.or_(Job.expires_at.is_(None), Job.expires_at > datetime.utcnow())
+    ).first()
+    if existing is None:
+        return None
+    if existing.kind != kind:
+        return None, False, (jsonify({'error': 'La clave de idempotencia ya se usó para otra operación'}), 422)
+    return existing, False, None
+
+
+def _transition(job_id, statuses, values):
+    """
+    Cambia el trabajo solo si sigue en uno de los estados dados (compare-and-set)
+
+    Returns:
+        bool: True si este proceso hizo el cambio
+    """
+    updated = Job.query.filter(Job.id == job_id, Job.status.in_(statuses)).update(
+        values, synchronize_session=False
+    )
+    db.session.commit()
+    return updated == 1
+
+
+def _finished_values(app, **values):
+    completed_at = datetime.utcnow()
+    values.update(
+        completed_at=completed_at,
+        expires_at=completed_at + timedelta(seconds=app.config.get('JOB_RESULT_RETENTION', 86400))
+    )
+    return values
+
+
+def _store_result(job, result):
+    """Guarda el resultado (JSON o archivo) del trabajo"""
+    if isinstance(result, JobFile):
+        path = os.path.join(get_results_dir(), job.id)
+        with open(path, 'wb') as f:
+            f.write(result.content)
+        return {'file': {'content_type': result.content_type, 'filename': result.filename, 'size': len(result.content)}}
+    return result
+
+
+def _run_job(app, job_id, payload):
+    """Ejecuta un trabajo y liquida sus créditos al terminar"""
+    with app.app_context():
+        job = Job.query.get(job_id)
+        # Un trabajo que fail_stale_jobs ya dio por fallido no se ejecuta
+        if not job or not _transition(job_id, [Job.STATUS_QUEUED], {'status': Job.STATUS_RUNNING}):
+            return
+        kind, user_id, credits = job.kind, job.user_id, job.credits
+
+        try:
+            result = _store_result(job, _handlers[kind](payload))
+            values = _finished_values(app, status=Job.STATUS_SUCCEEDED, result=result)
+        except Exception as e:
+            if not isinstance(e, JobError):
+                logger.error(f"Error ejecutando el trabajo {job_id} ({kind}): {e}")
+            db.session.rollback()
+            error = str(e) if isinstance(e, JobError) else 'Error interno al procesar el trabajo'
+            values = _finished_values(app, status=Job.STATUS_FAILED, error=error, credits=0)
+
+        # Solo se liquida si el trabajo sigue en curso: nunca queda a la vez
+        # reembolsado (por colgado) y completado
+        if not _transition(job_id, [Job.STATUS_RUNNING], values):
+            logger.warning(f"El trabajo {job_id} ({kind}) terminó después de darse por colgado; se descarta")
+            if os.path.exists(get_result_path(job)):
+                os.remove(get_result_path(job))
+            return
+        if values['status'] == Job.STATUS_FAILED:
+            # Liquidación: el trabajo fallido no consume créditos
+            refund_credits(user_id, credits)
+
+
+def get_result_path(job):
+    """Ruta del archivo de resultado de un trabajo"""
+    return os.path.join(get_results_dir(), job.id)
+
+
+def purge_expired_jobs():
+    """Elimina los trabajos cuya retención venció, junto con sus archivos"""
+    expired = Job.query.filter(Job.expires_at <= datetime.utcnow()).limit(500).all()
+    for job in expired:
+        _delete_job(job)
+    db.session.commit()
+    return len(expired)
+
+
+def _delete_job(job):
+    path = get_result_path(job)
+    if os.path.exists(path):
+        os.remove(path)
+    db.session.delete(job)
+
+
+def fail_stale_jobs():
+    """Marca como fallidos los trabajos locales que quedaron colgados (p. ej. por un reinicio)"""
+    max_runtime = timedelta(seconds=current_app.config.get('JOB_MAX_RUNTIME', 3600))
+    stale = Job.query.filter(
+        Job.kind.in_(list(_handlers)),
+        Job.status.in_([Job.STATUS_QUEUED, Job.STATUS_RUNNING]),
+        Job.created_at <= datetime.utcnow() - max_runtime
+    ).all()
+    failed = 0
+    for job in stale:
+        user_id, credits = job.user_id, job.credits
+        values = _finished_values(current_app, status=Job.STATUS_FAILED, credits=0,
+                                  error='El trabajo excedió el tiempo máximo de ejecución')
+        # Compare-and-set: si el hilo del trabajo terminó entretanto, su resultado se respeta
+        if _transition(job.id, [Job.STATUS_QUEUED, Job.STATUS_RUNNING], values):
+            refund_credits(user_id, credits)
+            failed += 1
+    return failed
+
+
+def job_status_response(job, status_code=202):
+    """Respuesta 202 Accepted estándar para un trabajo encolado"""
+    status_url = url_for('jobs.get_job_status', job_id=job.id)
+    response = jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': status_url,
+        'result_url': url_for('jobs.get_job_result', job_id=job.id),
+    })
+    response.status_code = status_code
+    response.headers['Location'] = status_url
+    return response
+
+
+def async_job(kind, cost, build_payload):
+    """
+    Decorador que permite ejecutar una ruta como trabajo en segundo plano.
+
+    Si el cliente pide ejecución asíncrona se valida la petición con
+    build_payload() (que devuelve el payload o una respuesta de error) y se
+    responde 202 con el ID del trabajo. En otro caso se ejecuta la ruta normal.
+    Se coloca por encima de credits_required: los créditos del trabajo se
+    reservan aquí.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not wants_async():
+                return fn(*args, **kwargs)
+
+            payload = build_payload()
+            if not isinstance(payload, dict):
+                return payload  # Respuesta de error de validación
+
+            job, created, error = enqueue_job(
+                kind,
+                payload,
+                user_id=get_jwt_identity(),
+                credits=cost() if callable(cost) else cost,
+                idempotency_key=request.headers.get('Idempotency-Key'),
+            )
+            if error:
+                return error
+            return job_status_response(job, 202 if created else 200)
+        return wrapper
+    return decorator
+
+
+def _worker_loop(app):
+    """Bucle de mantenimiento: consultas a RunwayML, trabajos colgados y retención"""
+    from api.utils.runway_jobs import poll_due_jobs
+
+    interval = app.config.get('JOBS_POLL_INTERVAL', 5)
+    purge_every = app.config.get('JOBS_PURGE_INTERVAL', 300)
+    last_purge = 0
+    while True:
+        try:
+            with app.app_context():
+                poll_due_jobs()
+                if time.time() - last_purge >= purge_every:
+                    fail_stale_jobs()
+                    purge_expired_jobs()
+                    last_purge = time.time()
+        except Exception as e:
+            logger.error(f"Error en el worker de trabajos: {e}")
+            with app.app_context():
+                db.session.rollback()
+        time.sleep(interval)
+
+
+def start_job_worker(app):
+    """Arranca (una vez por proceso) el hilo de mantenimiento de trabajos"""
+    global _worker_started
+    if not app.config.get('JOBS_WORKER_ENABLED', True):
+        return False
+    with _worker_lock:
+        if _worker_started:
+            return False
+        thread = threading.Thread(target=_worker_loop, args=(app,), name='job-worker', daemon=True)
+        thread.start()
+        _worker_started = True
+    logger.info("Worker de trabajos iniciado")
+    return True
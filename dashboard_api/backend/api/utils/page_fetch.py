@@ -0,0 +1,369 @@
+"""
+Descarga compartida de páginas públicas para las herramientas basadas en URL
+Lee el cuerpo en streaming con un tope de tamaño y lo decodifica de forma
+incremental, de modo que quien consume el texto (p. ej. un parser HTML) puede
+pedir que se corte la descarga en cuanto tiene lo que necesita. Solo se
+permiten URLs http(s) que resuelvan a direcciones públicas, y la conexión se
+abre contra la IP ya validada (no se vuelve a resolver el nombre).
+
+Los cuerpos se guardan por URL canónica junto con ETag/Last-Modified: mientras
+la copia es fresca se sirve sin red y, después, se revalida con
+If-None-Match/If-Modified-Since, de forma que un 304 no vuelve a transferir
+la página.
+"""
+import re
+import time
+import codecs
+import logging
+import threading
+from urllib.parse import urlparse, urljoin, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+from api.utils.canonical import canonical_host, canonical_url, normalize_url
+from api.utils.deadline import deadline_passed, mark_exceeded, upstream_timeout
+from api.utils.result_cache import TTLCache
+from api.utils.tls_inspect import TLSInspectionError, TLSTargetError, resolve_public_address
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (compatible; OrchestraBot/1.0; +https://orchestra.studio22.do)'
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_TIMEOUT = 15
+MAX_REDIRECTS = 5
+CHUNK_SIZE = 16 * 1024
+
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.IGNORECASE)
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+# Cabeceras de la respuesta que se conservan con la copia guardada
+STORED_HEADERS = ('Content-Type', 'Content-Length', 'Content-Language', 'ETag', 'Last-Modified',
+                  'Cache-Control', 'Date', 'Server', 'X-Robots-Tag')
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+class PageFetchError(Exception):
+    """No se pudo descargar la página (status_code indica la respuesta sugerida)"""
+
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class Page:
+    """
+    Página descargada. text (o content en modo binario) puede estar truncado si
+    se alcanzó el tope o el consumidor cortó la lectura. cache_status es MISS,
+    HIT (copia fresca, sin red) o REVALIDATED (304 del servidor).
+    """
+
+    def __init__(self, url, final_url, status_code, headers, text=None, content=None,
+                 bytes_read=0, truncated=False, cache_status='MISS'):
+        self.url = url
+        self.final_url = final_url
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.content = content
+        self.bytes_read = bytes_read
+        self.truncated = truncated
+        self.cache_status = cache_status
+
+    @property
+    def content_type(self):
+        return self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+def get_page_cache():
+    """Copias de páginas compartidas por todas las herramientas del proceso"""
+    global _page_cache
+    if _page_cache is None:
+        with _page_cache_lock:
+            if _page_cache is None:
+                _page_cache = TTLCache(
+                    max_entries=current_app.config.get('PAGE_CACHE_MAX_ENTRIES', 2048),
+                    max_bytes=current_app.config.get('PAGE_CACHE_MAX_BYTES', 128 * 1024 * 1024)
+                )
+    return _page_cache
+
+
+class PinnedHostAdapter(HTTPAdapter):
+    """HTTPS contra una IP: el SNI y la verificación del certificado usan el nombre original"""
+
+    def __init__(self, hostname, **kwargs):
+        self.hostname = hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.update(server_hostname=self.hostname, assert_hostname=self.hostname)
+        super().init_poolmanager(*args, **kwargs)
+
+
+def check_public_url(url):
+    """
+    Lanza PageFetchError si la URL no es http(s) o apunta a una red interna
+
+    Returns:
+        str: IP validada a la que conectar (None si se permiten redes internas)
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise PageFetchError('URL inválida', 400)
+    if current_app.config.get('PAGE_FETCH_ALLOW_PRIVATE', False):
+        return None
+    try:
+        return resolve_public_address(parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80))
+    except TLSTargetError:
+        raise PageFetchError('La URL apunta a una dirección no pública', 400) from None
+    except TLSInspectionError:
+        raise PageFetchError(f'No se pudo resolver {parsed.hostname}', 502) from None
+
+
+def pinned_get(url, address, headers=None, **kwargs):
+    """
+    requests.get contra address en lugar de volver a resolver el host de la URL
+    (DNS rebinding). Se conservan la cabecera Host y, en HTTPS, el SNI y la
+    verificación del certificado para el nombre original.
+    """
+    parsed = urlsplit(url)
+    hostname = canonical_host(parsed.hostname)
+    if hostname is None:
+        raise PageFetchError('URL inválida', 400)
+    userinfo, _, _ = parsed.netloc.rpartition('@')
+    host = f'[{hostname}]' if ':' in hostname else hostname
+    target = f'[{address}]' if ':' in address else address
+    if parsed.port is not None:
+        host, target = f'{host}:{parsed.port}', f'{target}:{parsed.port}'
+    if userinfo:
+        target = f'{userinfo}@{target}'
+    headers = dict(headers or {}, Host=host)
+    with requests.Session() as session:
+        if parsed.scheme == 'https':
+            session.mount('https://', PinnedHostAdapter(hostname))
+        return session.get(urlunsplit(parsed._replace(netloc=target)), headers=headers, **kwargs)
+
+
+def get_charset(headers, head_bytes):
+    """Charset declarado en Content-Type o en un <meta> del inicio del documento"""
+    for param in headers.get('Content-Type', '').split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset' and value.strip():
+            return value.strip().strip('"\'')
+    match = META_CHARSET_RE.search(head_bytes)
+    if match:
+        return match.group(1).decode('ascii', 'ignore')
+    return 'utf-8'
+
+
+def get_decoder(charset):
+    try:
+        return codecs.getincrementaldecoder(charset)(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+
+def open_url(url, timeout, extra_headers=None):
+    """GET en streaming siguiendo redirecciones y validando cada destino"""
+    headers = {'User-Agent': USER_AGENT, 'Accept': 'text/html,application/xhtml+xml,*/*;q=0.8'}
+    headers.update(extra_headers or {})
+    for _ in range(MAX_REDIRECTS + 1):
+        address = check_public_url(url)
+        try:
+            if address is None:
+                response = requests.get(url, headers=headers, timeout=upstream_timeout(timeout), stream=True,
+                                        allow_redirects=False)
+            else:
+                response = pinned_get(url, address, headers=headers, timeout=upstream_timeout(timeout),
+                                      stream=True, allow_redirects=False)
+        except requests.exceptions.Timeout as e:
+            if deadline_passed():
+                raise mark_exceeded() from None
+            raise PageFetchError(f'Error al descargar la página: {e}')
+        except requests.exceptions.RequestException as e:
+            raise PageFetchError(f'Error al descargar la página: {e}')
+        if response.is_redirect and response.headers.get('Location'):
+            response.close()
+            url = urljoin(url, response.headers['Location'])
+            continue
+        return url, response
+    raise PageFetchError('Demasiadas redirecciones')
+
+
+def read_body(response, max_bytes, binary=False, on_text=None):
+    """
+    Lee el cuerpo por bloques (decodificándolo salvo en modo binario)
+
+    Args:
+        on_text: función que recibe cada bloque de texto; si devuelve True se deja de leer
+
+    Returns:
+        tuple: (texto o bytes, bytes leídos, truncado)
+    """
+    decoder = None
+    parts = []
+    bytes_read = 0
+    truncated = False
+    try:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if not chunk:
+                continue
+            if deadline_passed():
+                raise mark_exceeded()  # El timeout de lectura se renueva con cada bloque
+            if bytes_read + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - bytes_read]
+                truncated = True
+            bytes_read += len(chunk)
+            if binary:
+                parts.append(chunk)
+                if truncated:
+                    break
+                continue
+            if decoder is None:
+                decoder = get_decoder(get_charset(response.headers, chunk[:2048]))
+            text = decoder.decode(chunk)
+            parts.append(text)
+            if truncated or (on_text and on_text(text)):
+                truncated = True
+                break
+        else:
+            if decoder is not None:
+                parts.append(decoder.decode(b'', final=True))
+    except requests.exceptions.RequestException as e:
+        if deadline_passed():
+            raise mark_exceeded() from None
+        raise PageFetchError(f'Error al leer la página: {e}')
+    finally:
+        response.close()
+    return (b'' if binary else '').join(parts), bytes_read, truncated
+
+
+def replay_text(text, on_text):
+    """Pasa una copia guardada al consumidor; devuelve True si la dio por suficiente"""
+    for start in range(0, len(text), CHUNK_SIZE):
+        if on_text(text[start:start + CHUNK_SIZE]):
+            return True
+    return False
+
+
+def get_fresh_for(headers):
+    """Segundos durante los que la copia se sirve sin revalidar"""
+    fresh_for = current_app.config.get('PAGE_CACHE_FRESH_SECONDS', 60)
+    match = MAX_AGE_RE.search(headers.get('Cache-Control', ''))
+    if match:
+        fresh_for = min(int(match.group(1)), current_app.config.get('PAGE_CACHE_MAX_FRESH_SECONDS', 3600))
+    return fresh_for
+
+
+def is_storable(response):
+    cache_control = response.headers.get('Cache-Control', '').lower()
+    return response.status_code == 200 and 'no-store' not in cache_control
+
+
+def build_page(url, entry, cache_status):
+    """Page a partir de una copia guardada"""
+    return Page(url, entry['final_url'], entry['status_code'], entry['headers'],
+                text=entry['text'], content=entry['content'], bytes_read=0,
+                truncated=entry['truncated'], cache_status=cache_status)
+
+
+def consume_entry(entry, on_text):
+    """
+    Pasa la copia guardada al consumidor. Devuelve True si con ella basta: si
+    está completa o si el consumidor se dio por satisfecho antes del final.
+    """
+    if on_text is not None and entry['text'] is not None:
+        return replay_text(entry['text'], on_text) or not entry['truncated']
+    return not entry['truncated']
+
+
+def skip_prefix(on_text, skip):
+    """Envuelve on_text para no volver a pasarle los primeros caracteres que ya recibió"""
+    if on_text is None or not skip:
+        return on_text
+    left = [skip]
+
+    def wrapped(text):
+        if left[0] >= len(text):
+            left[0] -= len(text)
+            return False
+        text, left[0] = text[left[0]:], 0
+        return on_text(text)
+    return wrapped
+
+
+def fetch_page(url, max_bytes=None, timeout=None, on_text=None, binary=False, use_cache=True):
+    """
+    Descarga una página pública reutilizando la copia guardada cuando es posible
+
+    Args:
+        max_bytes: tope del cuerpo (PAGE_FETCH_MAX_BYTES por defecto)
+        on_text: ver read_body; con una copia guardada se le reproduce su texto
+        binary: devolver los bytes en content en lugar de texto decodificado
+        use_cache: False para ignorar la copia guardada
+
+    Raises:
+        PageFetchError: URL no permitida o error de red
+    """
+    url = normalize_url(url)
+    max_bytes = max_bytes or current_app.config.get('PAGE_FETCH_MAX_BYTES', DEFAULT_MAX_BYTES)
+    timeout = timeout or current_app.config.get('PAGE_FETCH_TIMEOUT', DEFAULT_TIMEOUT)
+    cache = get_page_cache() if current_app.config.get('PAGE_CACHE_ENABLED', True) else None
+    key = f"{'bin' if binary else 'text'}:{canonical_url(url)}"
+
+    entry = cache.get(key) if cache is not None and use_cache else None
+    if entry is not None and entry['max_bytes'] < max_bytes and entry['truncated']:
+        entry = None
+
+    extra_headers = {}
+    consumed = 0  # Caracteres de la copia ya entregados al consumidor
+    if entry is not None and time.monotonic() < entry['fresh_until']:
+        if consume_entry(entry, on_text):
+            return build_page(url, entry, 'HIT')
+        consumed = len(entry['text'] or '')
+    elif entry is not None:
+        if entry['headers'].get('ETag'):
+            extra_headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            extra_headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+    final_url, response = None, None
+    if not consumed:
+        final_url, response = open_url(url, timeout, extra_headers)
+        if extra_headers and response.status_code == 304:
+            response.close()
+            entry['fresh_until'] = time.monotonic() + get_fresh_for(entry['headers'])
+            if consume_entry(entry, on_text):
+                return build_page(url, entry, 'REVALIDATED')
+            consumed = len(entry['text'] or '')
+            response = None
+
+    if response is None:
+        # La copia truncada no le basta a este consumidor: descarga completa sin
+        # condiciones, sin repetirle el principio que ya recibió
+        final_url, response = open_url(url, timeout)
+        on_text = skip_prefix(on_text, consumed)
+
+    body, bytes_read, truncated = read_body(response, max_bytes, binary, on_text)
+    headers = dict(response.headers)
+    page = Page(url, final_url, response.status_code, headers,
+                text=None if binary else body, content=body if binary else None,
+                bytes_read=bytes_read, truncated=truncated)
+
+    if cache is not None and is_storable(response):
+        stored_headers = {name: headers[name] for name in STORED_HEADERS if name in headers}
+        cache.set(key, {
+            'final_url': final_url,
+            'status_code': response.status_code,
+            'headers': stored_headers,
+            'text': page.text,
+            'content': page.content,
+            'truncated': truncated,
+            'max_bytes': max_bytes,
+            'fresh_until': time.monotonic() + get_fresh_for(headers),
+        }, current_app.config.get('PAGE_CACHE_TTL', 86400), size=max(1, len(body)))
+    return page
@@ -0,0 +1,367 @@
+"""
+Ejecutor de cómputo compartido para trabajo intensivo en CPU
+(renderizado de QR, transformaciones y optimización de imágenes, extracción de HTML...)
+
+Un pool de procesos que se inicia con create_app y que:
+- acota las tareas en vuelo (workers + COMPUTE_QUEUE_SIZE): run() espera como
+  mucho COMPUTE_QUEUE_WAIT por un hueco y si no lo hay lanza ComputeBusyError (503),
+  de modo que un pico de trabajo CPU no deja sin hilos a las peticiones de E/S;
+- respeta plazos: una tarea que empieza después de su plazo no se ejecuta,
+  run() deja de esperar al cumplirse (ComputeTimeoutError) y en el worker una
+  alarma interrumpe la tarea que lo supera, para que no siga ocupando el proceso;
+- pasa los buffers grandes (bytes >= COMPUTE_SHM_THRESHOLD) por memoria
+  compartida en lugar de serializarlos por la tubería del pool;
+- guarda métricas por tarea (ejecuciones, errores, plazos vencidos, rechazos,
+  espera en cola y tiempo de ejecución) y se detiene de forma ordenada.
+"""
+import os
+import time
+import signal
+import atexit
+import threading
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait as wait_futures
+
+from api.utils.error_handlers import APIError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_QUEUE_WAIT = 2.0
+DEFAULT_SHM_THRESHOLD = 1024 * 1024
+DEFAULT_SHUTDOWN_TIMEOUT = 10.0
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ComputeBusyError(APIError):
+    """El ejecutor está saturado (o deteniéndose) y no admite más tareas"""
+    def __init__(self, message="El servidor está procesando demasiadas tareas, inténtalo en unos segundos",
+                 retry_after=1):
+        super().__init__(message, status_code=503, payload={'retry_after': retry_after})
+
+
+class ComputeTimeoutError(FutureTimeoutError):
+    """La tarea no terminó (o no empezó) antes de su plazo"""
+
+
+class SharedBuffer:
+    """Referencia a un buffer copiado en memoria compartida (se resuelve en el worker)"""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+def _resolve(value):
+    if not isinstance(value, SharedBuffer):
+        return value
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(name=value.name)
+    try:
+        return bytes(block.buf[:value.size])
+    finally:
+        block.close()
+
+
+def _on_deadline(signum, frame):
+    raise ComputeTimeoutError('La tarea superó el tiempo máximo')
+
+
+def _can_interrupt():
+    """Solo el hilo principal de un proceso worker puede recibir la alarma"""
+    return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+
+def _run_task(fn, args, kwargs, submitted_at, deadline):
+    """
+    Envoltorio que se ejecuta en el worker: descarta la tarea si su plazo ya
+    venció mientras esperaba en cola, la interrumpe si lo supera ejecutándose
+    (future.cancel() no detiene una tarea ya empezada) y mide la espera y la
+    ejecución
+
+    Returns:
+        tuple: (resultado, segundos en cola, segundos de ejecución)
+    """
+    started_at = time.time()
+    if deadline is not None and started_at >= deadline:
+        raise ComputeTimeoutError('La tarea superó su plazo antes de empezar')
+    alarm = deadline is not None and _can_interrupt()
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, _on_deadline)
+        signal.setitimer(signal.ITIMER_REAL, deadline - started_at)
+    try:
+        args = [_resolve(arg) for arg in args]
+        kwargs = {key: _resolve(value) for key, value in kwargs.items()}
+        result = fn(*args, **kwargs)
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    return result, started_at - submitted_at, time.time() - started_at
+
+
+class ComputeFuture(Future):
+    """Future de una tarea; cancelarlo cancela también la tarea si aún no ha empezado"""
+
+    def __init__(self):
+        super().__init__()
+        self.inner = None
+        self.timed_out = False
+
+    def cancel(self):
+        if self.inner is not None:
+            self.inner.cancel()
+        return super().cancel()
+
+
+class TaskStats:
+    """Métricas acumuladas de un tipo de tarea"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.queue_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    def to_dict(self):
+        finished = self.completed + self.failed
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'cancelled': self.cancelled,
+            'rejected': self.rejected,
+            'avg_queue_ms': round(self.queue_seconds / finished * 1000, 2) if finished else 0.0,
+            'avg_run_ms': round(self.run_seconds / finished * 1000, 2) if finished else 0.0,
+            'max_run_ms': round(self.max_run_seconds * 1000, 2),
+        }
+
+
+class ComputeExecutor:
+    """
+    Pool de procesos con cola acotada, plazos, memoria compartida y métricas
+
+    Args:
+        max_workers (int): Procesos del pool
+        max_queue (int): Tareas que pueden esperar además de las que se ejecutan
+        queue_wait (float): Segundos que run() espera por un hueco antes de rechazar
+        shm_threshold (int): Tamaño a partir del cual los bytes viajan por memoria compartida
+            (0 lo desactiva)
+        executor: Executor subyacente ya creado (por defecto un ProcessPoolExecutor)
+    """
+
+    def __init__(self, max_workers, max_queue=DEFAULT_QUEUE_SIZE, queue_wait=DEFAULT_QUEUE_WAIT,
+                 shm_threshold=DEFAULT_SHM_THRESHOLD, executor=None):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_wait = queue_wait
+        self._executor = executor or ProcessPoolExecutor(max_workers=self.max_workers)
+        self.shm_threshold = shm_threshold if isinstance(self._executor, ProcessPoolExecutor) else 0
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._inflight = set()
+        self._stats = {}
+        self._closed = False
+
+    def _task_stats(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = TaskStats()
+        return stats
+
+    def _share(self, value, blocks):
+        if not self.shm_threshold or not isinstance(value, (bytes, bytearray)) or len(value) < self.shm_threshold:
+            return value
+        from multiprocessing import shared_memory
+        block = shared_memory.SharedMemory(create=True, size=len(value))
+        block.buf[:len(value)] = value
+        blocks.append(block)
+        return SharedBuffer(block.name, len(value))
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Encola fn(*args, **kwargs) sin plazo. Si el ejecutor está lleno espera a
+        que haya hueco (contrapresión para productores de lotes como los QR).
+        """
+        return self.submit_task(fn, args, kwargs, wait=None)
+
+    def submit_task(self, fn, args=(), kwargs=None, timeout=None, name=None, wait=DEFAULT_QUEUE_WAIT):
+        """
+        Encola una tarea
+
+        Args:
+            timeout (float): Plazo en segundos desde ahora (None: sin plazo)
+            name (str): Nombre para las métricas (por defecto el de la función)
+            wait (float): Espera máxima por un hueco en la cola (None: sin límite)
+
+        Raises:
+            ComputeBusyError: si no hay hueco en wait segundos o el ejecutor se está deteniendo
+        """
+        name = name or getattr(fn, '__name__', 'task')
+        with self._lock:
+            stats = self._task_stats(name)
+            closed = self._closed
+        if closed or not self._slots.acquire(timeout=wait):
+            with self._lock:
+                stats.rejected += 1
+            logger.warning(f"Ejecutor de cómputo saturado: tarea '{name}' rechazada")
+            raise ComputeBusyError()
+
+        blocks = []
+        future = ComputeFuture()
+        submitted_at = time.time()
+        deadline = submitted_at + timeout if timeout is not None else None
+        try:
+            shared_args = [self._share(arg, blocks) for arg in args]
+            shared_kwargs = {key: self._share(value, blocks) for key, value in (kwargs or {}).items()}
+            inner = self._executor.submit(_run_task, fn, shared_args, shared_kwargs, submitted_at, deadline)
+        except Exception:
+            self._slots.release()
+            self._release_blocks(blocks)
+            raise
+        future.inner = inner
+        with self._lock:
+            stats.submitted += 1
+            self._inflight.add(inner)
+        inner.add_done_callback(lambda done: self._finish(done, future, stats, blocks))
+        return future
+
+    def run(self, fn, *args, timeout=None, name=None, **kwargs):
+        """
+        Ejecuta fn en el pool y devuelve su resultado, esperando como mucho timeout segundos
+
+        Raises:
+            ComputeBusyError: si el ejecutor está saturado
+            ComputeTimeoutError: si la tarea no termina a tiempo (se cancela si no ha empezado)
+        """
+        future = self.submit_task(fn, args, kwargs, timeout=timeout, name=name, wait=self.queue_wait)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.timed_out = True
+            future.cancel()
+            raise ComputeTimeoutError('La tarea superó el tiempo máximo') from None
+
+    def _finish(self, inner, future, stats, blocks):
+        self._slots.release()
+        self._release_blocks(blocks)
+        with self._lock:
+            self._inflight.discard(inner)
+            if future.timed_out or (not inner.cancelled() and isinstance(inner.exception(), ComputeTimeoutError)):
+                stats.timeouts += 1
+            if inner.cancelled():
+                stats.cancelled += 1
+            elif inner.exception() is not None:
+                if not isinstance(inner.exception(), ComputeTimeoutError):
+                    stats.failed += 1
+            else:
+                _, queued, ran = inner.result()
+                stats.completed += 1
+                stats.queue_seconds += queued
+                stats.run_seconds += ran
+                stats.max_run_seconds = max(stats.max_run_seconds, ran)
+        if inner.cancelled():
+            future.cancel()
+        elif not future.cancelled():
+            if inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                future.set_result(inner.result()[0])
+
+    @staticmethod
+    def _release_blocks(blocks):
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    def stats(self):
+        """Métricas por tipo de tarea y ocupación actual"""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'queue_size': self.max_queue,
+                'inflight': len(self._inflight),
+                'closed': self._closed,
+                'tasks': {name: stats.to_dict() for name, stats in self._stats.items()},
+            }
+
+    def shutdown(self, timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+        """
+        Deja de admitir tareas, espera hasta timeout a las que están en vuelo y
+        cancela las que sigan en cola
+        """
+        with self._lock:
+            self._closed = True
+            pending = list(self._inflight)
+        not_done = wait_futures(pending, timeout=timeout).not_done if pending else ()
+        if not_done:
+            logger.warning(f"Deteniendo el ejecutor con {len(not_done)} tareas sin terminar")
+        self._executor.shutdown(wait=not not_done, cancel_futures=True)
+
+
+def default_pool_size():
+    """
+    Núcleos repartidos entre los workers de gunicorn (WEB_CONCURRENCY): cada
+    worker crea su propio pool y con cpu_count procesos por worker habría
+    workers × núcleos procesos compitiendo por la CPU
+    """
+    try:
+        web_workers = max(1, int(os.environ.get('WEB_CONCURRENCY') or 1))
+    except ValueError:
+        web_workers = 1
+    return max(1, (os.cpu_count() or 2) // web_workers)
+
+
+def get_pool_size():
+    """Número de procesos del pool (COMPUTE_WORKERS o default_pool_size)"""
+    if _executor is not None:
+        return _executor.max_workers
+    try:
+        return max(1, int(os.environ.get('COMPUTE_WORKERS') or default_pool_size()))
+    except ValueError:
+        return default_pool_size()
+
+
+def init_compute_executor(app):
+    """Crea (una vez por proceso) el ejecutor de cómputo con la configuración de la app"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ComputeExecutor(
+                max_workers=app.config.get('COMPUTE_WORKERS') or get_pool_size(),
+                max_queue=app.config.get('COMPUTE_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+                queue_wait=app.config.get('COMPUTE_QUEUE_WAIT', DEFAULT_QUEUE_WAIT),
+                shm_threshold=app.config.get('COMPUTE_SHM_THRESHOLD', DEFAULT_SHM_THRESHOLD)
+            )
+            logger.info(f"Ejecutor de cómputo iniciado con {_executor.max_workers} procesos")
+    return _executor
+
+
+def get_compute_executor():
+    """Ejecutor de cómputo compartido (se crea con la configuración por defecto si no hay app)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ComputeExecutor(max_workers=get_pool_size())
+    return _executor
+
+
+def shutdown_compute_executor(timeout=DEFAULT_SHUTDOWN_TIMEOUT):
+    """Detiene el ejecutor si está activo"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(timeout=timeout)
+
+
+atexit.register(shutdown_compute_executor)
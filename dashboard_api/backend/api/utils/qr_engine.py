@@ -0,0 +1,173 @@
+"""
+Motor local de generación de códigos QR (PNG y SVG)
+Evita el round trip a RapidAPI para los tipos simples cuyo contenido
+ya se construye localmente.
+"""
+import io
+import base64
+from collections import deque
+from functools import lru_cache
+
+import qrcode
+import qrcode.image.svg
+from qrcode.exceptions import DataOverflowError
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
+
+# Niveles de corrección de errores admitidos
+ERROR_CORRECTION_LEVELS = {
+    'L': ERROR_CORRECT_L,
+    'M': ERROR_CORRECT_M,
+    'Q': ERROR_CORRECT_Q,
+    'H': ERROR_CORRECT_H,
+}
+
+OUTPUT_FORMATS = {'png', 'svg'}
+
+DEFAULT_BOX_SIZE = 10
+DEFAULT_MARGIN = 4
+MAX_BOX_SIZE = 50
+MAX_MARGIN = 20
+MAX_SIZE_PX = 4096
+QR_CACHE_SIZE = 512
+
+# Tareas de lote en vuelo por worker del pool de procesos
+BATCH_WINDOW_PER_WORKER = 8
+
+
+class QRRenderError(ValueError):
+    """Error de validación u opción inválida al renderizar un QR"""
+
+
+def normalize_options(options=None):
+    """Valida y normaliza las opciones de renderizado a una tupla hashable"""
+    options = options or {}
+
+    output_format = str(options.get('output_format') or 'png').lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise QRRenderError(f"Formato de salida no soportado: {output_format}")
+
+    level = str(options.get('error_correction') or 'M').upper()
+    if level not in ERROR_CORRECTION_LEVELS:
+        raise QRRenderError(f"Nivel de corrección no soportado: {level}")
+
+    try:
+        box_size = int(options.get('box_size') or DEFAULT_BOX_SIZE)
+        margin = options.get('margin', options.get('border'))
+        margin = DEFAULT_MARGIN if margin in (None, '') else int(margin)
+        size = options.get('size')
+        size = int(size) if size not in (None, '') else None
+    except (TypeError, ValueError):
+        raise QRRenderError("Las opciones size, box_size y margin deben ser numéricas")
+
+    if not 1 <= box_size <= MAX_BOX_SIZE:
+        raise QRRenderError(f"box_size debe estar entre 1 y {MAX_BOX_SIZE}")
+    if not 0 <= margin <= MAX_MARGIN:
+        raise QRRenderError(f"margin debe estar entre 0 y {MAX_MARGIN}")
+    if size is not None and not 21 <= size <= MAX_SIZE_PX:
+        raise QRRenderError(f"size debe estar entre 21 y {MAX_SIZE_PX} píxeles")
+
+    return output_format, level, box_size, margin, size
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def _render_cached(content, output_format, level, box_size, margin, size):
+    """Renderiza el QR; el resultado (bytes) queda en un LRU por contenido y opciones"""
+    qr = qrcode.QRCode(
+        error_correction=ERROR_CORRECTION_LEVELS[level],
+        box_size=box_size,
+        border=margin,
+    )
+    qr.add_data(content)
+    qr.make(fit=True)
+
+    if size:
+        # Ajustar el tamaño de módulo para aproximarse al ancho pedido
+        total_modules = qr.modules_count + 2 * margin
+        qr.box_size = max(1, size // total_modules)
+
+    buffer = io.BytesIO()
+    if output_format == 'svg':
+        image = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+        image.save(buffer)
+    else:
+        image = qr.make_image()
+        image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_qr(content, options=None):
+    """
+    Genera un código QR localmente
+
+    Args:
+        content (str): Texto a codificar
+        options (dict, optional): output_format ('png'|'svg'), error_correction
+            ('L'|'M'|'Q'|'H'), box_size, margin y size (ancho aproximado en px)
+
+    Returns:
+        tuple: (bytes del archivo, content_type)
+
+    Raises:
+        QRRenderError: Si el contenido o las opciones no son válidos
+    """
+    content = '' if content is None else str(content)
+    if not content:
+        raise QRRenderError("El contenido del QR está vacío")
+
+    output_format, level, box_size, margin, size = normalize_options(options)
+    try:
+        data = _render_cached(content, output_format, level, box_size, margin, size)
+    except DataOverflowError:
+        raise QRRenderError("El contenido es demasiado largo para un código QR")
+
+    content_type = 'image/svg+xml' if output_format == 'svg' else 'image/png'
+    return data, content_type
+
+
+def render_qr_response(content, options=None):
+    """Genera el QR y lo devuelve con el mismo formato JSON que el proveedor remoto"""
+    data, content_type = render_qr(content, options)
+    if content_type == 'image/svg+xml':
+        body = {'svg': data.decode('utf-8'), 'content_type': content_type}
+    else:
+        body = {'image_base64': base64.b64encode(data).decode('utf-8'), 'content_type': content_type}
+    body['provider'] = 'local'
+    return body
+
+
+def cache_info():
+    """Estadísticas del cache LRU de renderizado"""
+    return _render_cached.cache_info()._asdict()
+
+
+def _render_batch_job(job):
+    """Renderiza un elemento del lote dentro de un proceso del pool"""
+    index, content, options = job
+    try:
+        data, content_type = render_qr(content, options)
+        return index, data, content_type, None
+    except QRRenderError as e:
+        return index, None, None, str(e)
+    except Exception as e:
+        return index, None, None, f"Error inesperado: {e}"
+
+
+def iter_render_batch(jobs, executor, window):
+    """
+    Renderiza un lote de QR en paralelo y devuelve los resultados en orden
+
+    Args:
+        jobs: Iterable de tuplas (índice, contenido, opciones)
+        executor: Executor (pool de procesos) donde se renderiza cada QR
+        window (int): Máximo de tareas en vuelo, para no acumular el lote en memoria
+
+    Yields:
+        tuple: (índice, bytes | None, content_type | None, error | None)
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(_render_batch_job, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
@@ -1,12 +1,282 @@
 """
 Utilidades para manejar llamadas a RapidAPI
+upstream_request es el cliente común para los proveedores externos: reutiliza
+las conexiones (Session con pool, HTTP/1.1 o HTTP/2 según UPSTREAM_TRANSPORT), toma el timeout del plazo de la petición,
+pasa por el circuit breaker del host y aplica las políticas de reintento y
+cobertura de api.utils.upstream_policy.
 """
 import time
+import socket
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait as wait_futures
+from functools import partial
+from urllib.parse import urlparse
+
 import requests
-from flask import current_app
+from requests.adapters import HTTPAdapter
+from flask import current_app, g, has_app_context, has_request_context, request
 from api import db
 from api.models.app import ApiUsage
+from api.utils.circuit_breaker import CircuitOpenError, get_circuit_breakers
+from api.utils.deadline import (DeadlineExceeded, MIN_CALL_TIMEOUT, deadline_passed, mark_exceeded, read_within,
+                                remaining_time, upstream_timeout)
 from api.utils.error_handlers import ExternalApiError
+from api.utils.http2_transport import Http2Session, http2_available
+from api.utils.rapidapi_keys import get_key_pool, is_key_rejection, with_pooled_key
+from api.utils.upstream_policy import (DEFAULT_HEDGE_MIN_DELAY, IDEMPOTENT_METHODS, get_hedge_executor,
+                                       get_latency_tracker, get_retry_policy)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_POOL_CONNECTIONS = 32  # Hosts con conexiones guardadas
+DEFAULT_POOL_MAXSIZE = 32  # Conexiones guardadas por host
+BODY_CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _config(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+
+class UpstreamSession(requests.Session):
+    """
+    Session de requests que, con deadline, lee el cuerpo por bloques sin pasar
+    del plazo (el timeout de lectura solo acota cada read() del socket)
+    """
+
+    def request(self, method, url, deadline=None, **kwargs):
+        if deadline is None or kwargs.get('stream'):
+            return super().request(method, url, **kwargs)
+        response = super().request(method, url, **dict(kwargs, stream=True))
+        # Cada bloque de iter_content puede necesitar varias lecturas del socket:
+        # al vencer el plazo se corta la conexión para que ninguna siga esperando
+        watchdog = threading.Timer(max(0.0, deadline - time.monotonic()), _cut_connection, (response,))
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            # Lo mismo que hace Response.content, con el plazo comprobado entre bloques
+            response._content = read_within(response.iter_content(BODY_CHUNK_SIZE), deadline, response.close)
+        except requests.exceptions.RequestException:
+            response.close()
+            if time.monotonic() >= deadline:
+                raise requests.exceptions.ReadTimeout('Se agotó el plazo de la petición leyendo la respuesta') from None
+            raise
+        finally:
+            watchdog.cancel()
+        return response
+
+
+def _cut_connection(response):
+    """Despierta la lectura bloqueada (si la conexión no ha vuelto ya al pool)"""
+    sock = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+    if sock is not None:
+        try:
+            socket.socket.shutdown(sock, socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def create_upstream_session(transport='http1', pool_connections=DEFAULT_POOL_CONNECTIONS,
+                            pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """
+    Session hacia los proveedores: requests con pool keep-alive (HTTP/1.1) o,
+    con transport='http2', el cliente multiplexado de api.utils.http2_transport
+    """
+    if transport == 'http2':
+        if http2_available():
+            return Http2Session(max_connections=pool_maxsize, keepalive=pool_connections)
+        logger.warning("UPSTREAM_TRANSPORT=http2 requiere httpx[http2]; se usa HTTP/1.1")
+    session = UpstreamSession()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_upstream_session():
+    """Session compartida con pool de conexiones keep-alive hacia los proveedores"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_upstream_session(
+                    _config('UPSTREAM_TRANSPORT', 'http1'),
+                    pool_connections=_config('UPSTREAM_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS),
+                    pool_maxsize=_config('UPSTREAM_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE)
+                )
+    return _session
+
+
+def _send(breakers, tracker, method, url, host, timeout, probe, route, deadline, kwargs):
+    """
+    Un intento contra el proveedor (sin contexto de Flask: puede ejecutarse en
+    otro hilo); anota el resultado en el circuit breaker y en las latencias
+    """
+    started = time.monotonic()
+    try:
+        response = get_upstream_session().request(method, url, timeout=timeout, deadline=deadline, **kwargs)
+    except requests.exceptions.RequestException as e:
+        # Un timeout recortado por nuestro propio plazo no es culpa del proveedor
+        out_of_budget = isinstance(e, requests.exceptions.Timeout) and deadline is not None \
+            and deadline - time.monotonic() < MIN_CALL_TIMEOUT
+        if out_of_budget and probe:
+            breakers.release_probe(host)
+        else:
+            breakers.record(host, time.monotonic() - started, failed=not out_of_budget, probe=probe, route=route)
+        raise
+    latency = time.monotonic() - started
+    breakers.record(host, latency, failed=response.status_code >= 500, probe=probe, route=route)
+    if response.status_code < 500:
+        tracker.observe(host, latency)
+    return response
+
+
+def _discard(key_pool, key, host, future):
+    """Cierra la respuesta del intento que perdió la carrera y libera su hueco de la clave"""
+    if key:
+        key_pool.release(key, host)
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _send_hedged(send, tracker, host, read, key_pool=None, key=None):
+    """
+    Lanza el intento y, si tarda más que el p95 del host y queda presupuesto,
+    un segundo intento; devuelve la primera respuesta válida. Cada intento
+    ocupa su propio hueco de la clave: el del perdedor se libera al terminar.
+    """
+    executor = get_hedge_executor()
+    primary = executor.submit(send)
+    hedge_after = max(tracker.percentile(host), _config('UPSTREAM_HEDGE_MIN_DELAY', DEFAULT_HEDGE_MIN_DELAY))
+    done, _ = wait_futures([primary], timeout=min(hedge_after, read))
+    if done or not tracker.try_spend(host):
+        return primary.result()
+
+    if key:
+        key_pool.hold(key, host)
+    hedge = executor.submit(send)
+    discard = partial(_discard, key_pool, key, host)
+    pending = {primary, hedge}
+    winner = None
+    while pending and winner is None:
+        done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None and future.result().status_code < 500:
+                winner = future
+                break
+    if winner is None:
+        hedge.add_done_callback(discard)
+        return primary.result()  # Fallaron los dos: el error del intento original
+    if winner is hedge:
+        tracker.hedge_won(host)
+    for future in {primary, hedge} - {winner}:
+        future.add_done_callback(discard)
+    return winner.result()
+
+
+def _rewind(kwargs):
+    """Rebobina los ficheros del cuerpo para repetir la llamada; False si alguno no se puede"""
+    bodies = [kwargs.get('data')]
+    files = kwargs.get('files') or {}
+    for item in (files.values() if isinstance(files, dict) else [value for _, value in files]):
+        bodies.append(item[1] if isinstance(item, tuple) and len(item) > 1 else item)
+    for body in bodies:
+        if hasattr(body, 'read'):
+            if not (hasattr(body, 'seekable') and body.seekable()):
+                return False
+            body.seek(0)
+    return True
+
+
+def upstream_request(method, url, timeout=None, retry=None, hedge=None, **kwargs):
+    """
+    Llamada a un proveedor externo con el timeout tomado del plazo de la petición
+
+    Reintenta según la política (429/5xx con backoff y jitter, respetando
+    Retry-After) mientras quede plazo, y cubre los GET de las rutas de
+    UPSTREAM_HEDGED_ROUTES con un segundo intento pasado el p95 del host.
+    Si la llamada lleva la clave de RapidAPI se usa la del pool con más cuota
+    para el host; ante un 429 o un 403 de la clave se repite en seguida con otra.
+
+    Args:
+        timeout (float | tuple): Tope propio de la llamada (lectura, o (conexión, lectura));
+            el timeout efectivo nunca supera lo que queda del plazo
+        retry (RetryPolicy): Política de reintentos (por defecto la configurada)
+        hedge (bool): Forzar o impedir la cobertura (por defecto según la ruta)
+
+    Raises:
+        CircuitOpenError: si el circuito del host está abierto (no se llega a llamar)
+        DeadlineExceeded: si el plazo se agota antes o durante la llamada
+        requests.RequestException: en los demás errores de conexión
+    """
+    connect = _config('UPSTREAM_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)
+    if isinstance(timeout, tuple):
+        connect, timeout = timeout
+    method = method.upper()
+    host = urlparse(url).hostname
+    route = request.blueprint if has_request_context() else None
+    deadline = g.get('deadline') if has_app_context() else None
+    policy = retry or get_retry_policy()
+    breakers = get_circuit_breakers()
+    tracker = get_latency_tracker()
+    key_pool = get_key_pool()
+    if hedge is None:
+        hedge = _config('UPSTREAM_HEDGE_ENABLED', True) and route in _config('UPSTREAM_HEDGED_ROUTES', ())
+    hedge = hedge and method in IDEMPOTENT_METHODS
+
+    attempt = 0
+    while True:
+        read = upstream_timeout(timeout)
+        probe = breakers.before_call(host)
+        headers, key = with_pooled_key(key_pool, host, kwargs.get('headers'))
+        send = partial(_send, breakers, tracker, method, url, host, (min(connect, read), read), probe, route,
+                       deadline, dict(kwargs, headers=headers) if key else kwargs)
+        response = error = None
+        try:
+            if hedge and not probe:
+                tracker.earn(host)
+                if tracker.percentile(host) is not None:
+                    response = _send_hedged(send, tracker, host, read, key_pool, key)
+                else:
+                    response = send()
+            else:
+                response = send()
+        except requests.exceptions.RequestException as e:
+            if key:
+                key_pool.release(key, host)
+            if isinstance(e, requests.exceptions.Timeout) and deadline_passed():
+                raise mark_exceeded() from None
+            error = e
+
+        rotate = False
+        if key and response is not None:
+            key_pool.observe(key, host, response)
+            # Cuota agotada o clave rechazada: otra clave puede atenderla ya, sin esperar
+            rotate = (response.status_code == 429 or is_key_rejection(response)) and attempt + 1 < policy.attempts \
+                and key_pool.available(host)
+        delay = 0 if rotate else policy.next_delay(method, attempt, response=response, error=error)
+        remaining = remaining_time()
+        if delay is None or (remaining is not None and remaining - delay < MIN_CALL_TIMEOUT) or not _rewind(kwargs):
+            if error is not None:
+                raise error
+            return response
+        if response is not None:
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def upstream_get(url, **kwargs):
+    return upstream_request('GET', url, **kwargs)
+
+
+def upstream_post(url, **kwargs):
+    return upstream_request('POST', url, **kwargs)
+
 
 def get_rapidapi_headers(host=None):
     """Obtiene los headers necesarios para llamar a RapidAPI"""
@@ -73,9 +343,9 @@ def call_rapidapi(app_id, user_id, method, url, params=None, data=None, headers=
         
         # Realizar solicitud HTTP
         if method.upper() == 'GET':
-            response = requests.get(url, headers=api_headers, params=params)
+            response = upstream_get(url, headers=api_headers, params=params)
         elif method.upper() == 'POST':
-            response = requests.post(url, headers=api_headers, params=params, json=data)
+            response = upstream_post(url, headers=api_headers, params=params, json=data)
         else:
             raise ExternalApiError(f"Método HTTP no soportado: {method}")
         
@@ -106,6 +376,6 @@ def call_rapidapi(app_id, user_id, method, url, params=None, data=None, headers=
         raise ExternalApiError("Respuesta inválida de la API externa")
     except Exception as e:
         current_app.logger.error(f"Error en llamada a RapidAPI: {str(e)}")
-        if isinstance(e, ExternalApiError):
+        if isinstance(e, (ExternalApiError, DeadlineExceeded, CircuitOpenError)):
             raise e
         raise ExternalApiError(f"Error inesperado: {str(e)}") 
\ No newline at end of file
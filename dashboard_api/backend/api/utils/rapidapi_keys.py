@@ -0,0 +1,224 @@
+"""
+Pool de claves de RapidAPI con reparto según la cuota que le queda a cada una
+
+Las rutas siguen poniendo RAPIDAPI_KEY en la cabecera x-rapidapi-key;
+upstream_request la sustituye en cada llamada por la clave del pool con más
+margen para ese host. El margen sale de las cabeceras x-ratelimit-*-remaining /
+-reset que devuelve RapidAPI (por clave y host) menos las llamadas en curso; a
+igualdad se elige la clave menos usada. Un 429 aparta la clave de ese host hasta
+que se renueve su cuota (Retry-After, la cabecera de reset o
+RAPIDAPI_KEY_QUARANTINE) y un 403 cuyo mensaje señala a la clave (sin
+suscripción a esa API, inválida o bloqueada) durante
+RAPIDAPI_KEY_FORBIDDEN_QUARANTINE; los demás 403 son del recurso pedido y no
+apartan la clave.
+"""
+import time
+import logging
+import threading
+
+import requests
+from flask import current_app, has_app_context
+
+from api.utils.upstream_policy import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+KEY_HEADER = 'x-rapidapi-key'
+DEFAULT_QUARANTINE = 60
+DEFAULT_FORBIDDEN_QUARANTINE = 3600
+# Mensajes de RapidAPI en los 403 que se deben a la clave y no a la petición
+KEY_REJECTION_MARKERS = ('not subscribed', 'invalid api key', 'disabled for your subscription',
+                         'blocked', 'suspended')
+MAX_REJECTION_BODY = 2048
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def mask_key(key):
+    """Clave recortada para logs y estadísticas"""
+    return f"{key[:4]}…{key[-4:]}" if key and len(key) > 8 else '…'
+
+
+def parse_rate_limit(headers):
+    """
+    Cuota restante más ajustada de las cabeceras x-ratelimit-* de la respuesta
+
+    Returns:
+        tuple: (llamadas restantes, segundos hasta el reset) o (None, None)
+    """
+    values = {name.lower(): value for name, value in headers.items() if name.lower().startswith('x-ratelimit-')}
+    tightest = (None, None)
+    for name, value in values.items():
+        if not name.endswith('remaining'):
+            continue
+        try:
+            remaining = int(float(value))
+        except ValueError:
+            continue
+        reset = parse_retry_after(values.get(name[:-len('remaining')] + 'reset'))
+        if tightest[0] is None or remaining < tightest[0]:
+            tightest = (remaining, reset)
+    return tightest
+
+
+def is_key_rejection(response):
+    """403 por la clave (suscripción, clave inválida o bloqueada) según el mensaje de RapidAPI"""
+    if response.status_code != 403:
+        return False
+    try:
+        body = response.text[:MAX_REJECTION_BODY].lower()
+    except requests.exceptions.RequestException:
+        return False
+    return any(marker in body for marker in KEY_REJECTION_MARKERS)
+
+
+class KeyUsage:
+    """Uso y cuota conocida de una clave en un host"""
+
+    def __init__(self):
+        self.remaining = None
+        self.reset_at = 0.0
+        self.quarantined_until = 0.0
+        self.inflight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.forbidden = 0
+
+    def headroom(self, now):
+        if self.quarantined_until > now:
+            return float('-inf')
+        if self.remaining is None or (self.reset_at and now >= self.reset_at):
+            return float('inf')  # Cuota desconocida o ya renovada
+        return self.remaining - self.inflight
+
+
+class RapidApiKeyPool:
+    """
+    Claves de RapidAPI con contadores por clave y host
+
+    Args:
+        keys (list): Claves disponibles
+        quarantine (float): Segundos apartada tras un 429 sin indicación de espera
+        forbidden_quarantine (float): Segundos apartada tras un 403 de la clave
+    """
+
+    def __init__(self, keys, quarantine=DEFAULT_QUARANTINE, forbidden_quarantine=DEFAULT_FORBIDDEN_QUARANTINE):
+        self.keys = list(dict.fromkeys(key for key in keys if key))
+        self.quarantine = quarantine
+        self.forbidden_quarantine = forbidden_quarantine
+        self._lock = threading.Lock()
+        self._usage = {}  # (clave, host) -> KeyUsage
+
+    def _get(self, key, host):
+        usage = self._usage.get((key, host))
+        if usage is None:
+            usage = self._usage[(key, host)] = KeyUsage()
+        return usage
+
+    def acquire(self, host):
+        """Clave con más margen para el host (la que antes salga de cuarentena si no hay ninguna libre)"""
+        now = time.time()
+        with self._lock:
+            candidates = [(key, self._get(key, host)) for key in self.keys]
+            if all(usage.headroom(now) == float('-inf') for _, usage in candidates):
+                key, usage = min(candidates, key=lambda item: item[1].quarantined_until)
+            else:
+                key, usage = max(candidates, key=lambda item: (item[1].headroom(now), -item[1].inflight, -item[1].calls))
+            usage.inflight += 1
+            usage.calls += 1
+            return key
+
+    def hold(self, key, host):
+        """Cuenta otra llamada en vuelo con la clave ya elegida (segundo intento de una cobertura)"""
+        with self._lock:
+            usage = self._get(key, host)
+            usage.inflight += 1
+            usage.calls += 1
+
+    def release(self, key, host):
+        """Libera la clave sin respuesta (error de conexión)"""
+        with self._lock:
+            usage = self._get(key, host)
+            usage.inflight = max(0, usage.inflight - 1)
+
+    def observe(self, key, host, response):
+        """Actualiza la cuota de la clave con la respuesta del proveedor"""
+        now = time.time()
+        remaining, reset = parse_rate_limit(response.headers)
+        with self._lock:
+            usage = self._get(key, host)
+            usage.inflight = max(0, usage.inflight - 1)
+            if remaining is not None:
+                usage.remaining = remaining
+                usage.reset_at = now + reset if reset is not None else 0.0
+                if remaining <= 0 and reset is not None:
+                    usage.quarantined_until = max(usage.quarantined_until, now + reset)
+            if response.status_code == 429:
+                usage.throttled += 1
+                wait = parse_retry_after(response.headers.get('Retry-After'))
+                if wait is None:
+                    wait = reset if remaining is not None and remaining <= 0 and reset is not None else self.quarantine
+                usage.quarantined_until = max(usage.quarantined_until, now + wait)
+                logger.warning(f"Clave {mask_key(key)} limitada en {host} durante {wait:.0f}s")
+            elif is_key_rejection(response):
+                usage.forbidden += 1
+                usage.quarantined_until = max(usage.quarantined_until, now + self.forbidden_quarantine)
+                logger.warning(f"Clave {mask_key(key)} rechazada por {host}: apartada {self.forbidden_quarantine}s")
+
+    def available(self, host):
+        """Hay alguna clave fuera de cuarentena para el host"""
+        now = time.time()
+        with self._lock:
+            return any(self._get(key, host).quarantined_until <= now for key in self.keys)
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    'key': f"#{self.keys.index(key) + 1} {mask_key(key)}",
+                    'host': host,
+                    'calls': usage.calls,
+                    'inflight': usage.inflight,
+                    'remaining': usage.remaining,
+                    'throttled': usage.throttled,
+                    'forbidden': usage.forbidden,
+                    'quarantined_for': max(0, round(usage.quarantined_until - now)),
+                }
+                for (key, host), usage in self._usage.items()
+            ]
+
+
+def get_key_pool():
+    """Pool de claves del proceso (RAPIDAPI_KEYS más RAPIDAPI_KEY)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = current_app.config if has_app_context() else {}
+                _pool = RapidApiKeyPool(
+                    list(config.get('RAPIDAPI_KEYS') or ()) + [config.get('RAPIDAPI_KEY')],
+                    quarantine=config.get('RAPIDAPI_KEY_QUARANTINE', DEFAULT_QUARANTINE),
+                    forbidden_quarantine=config.get('RAPIDAPI_KEY_FORBIDDEN_QUARANTINE', DEFAULT_FORBIDDEN_QUARANTINE)
+                )
+    return _pool
+
+
+def with_pooled_key(pool, host, headers):
+    """
+    Copia de las cabeceras con la clave del pool elegida para el host
+
+    Returns:
+        tuple: (cabeceras, clave elegida) o (cabeceras originales, None) si la
+        llamada no usa una clave del pool
+    """
+    if not headers or len(pool.keys) < 2:
+        return headers, None
+    name = next((name for name in headers if name.lower() == KEY_HEADER), None)
+    if name is None or headers[name] not in pool.keys:
+        return headers, None
+    key = pool.acquire(host)
+    pooled = {header: value for header, value in headers.items() if header != name}
+    pooled[KEY_HEADER] = key
+    return pooled, key
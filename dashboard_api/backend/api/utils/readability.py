@@ -0,0 +1,293 @@
+"""
+Extracción local del contenido principal de una página (estilo readability)
+El HTML se recorre con un HTMLParser que arma un árbol ligero de contenedores;
+cada párrafo suma puntos a su contenedor y, en menor medida, al abuelo según
+su longitud y sus comas. La puntuación se corrige por la densidad de enlaces y
+por pistas de class/id (article, content... frente a nav, sidebar, comment...)
+y se devuelve el texto del mejor contenedor.
+
+extract_content no depende de Flask para poder ejecutarse en el pool de procesos.
+"""
+import re
+from html.parser import HTMLParser
+
+from flask import current_app
+
+from api.utils.page_fetch import fetch_page
+from api.utils.process_pool import ComputeBusyError, ComputeTimeoutError, get_compute_executor
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+DEFAULT_TIMEOUT = 5
+MIN_PARAGRAPH_CHARS = 25
+MIN_CONTENT_CHARS = 200
+EXCERPT_CHARS = 300
+
+# Elementos cuyo contenido nunca forma parte del texto principal
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form', 'button',
+             'select', 'textarea', 'nav', 'footer', 'aside', 'header', 'figure', 'canvas'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+# Bloques de texto que puntúan a su contenedor
+BLOCK_TAGS = {'p', 'pre', 'blockquote', 'li', 'td', 'dd', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+TAG_WEIGHTS = {'article': 10, 'main': 5, 'div': 5, 'section': 3, 'pre': 3, 'td': 3, 'blockquote': 3,
+               'ol': -3, 'ul': -3, 'dl': -3, 'form': -3, 'th': -5}
+
+POSITIVE_RE = re.compile(r'article|body|content|entry|main|page|post|story|text|blog', re.IGNORECASE)
+NEGATIVE_RE = re.compile(r'banner|breadcrumb|combx|comment|cookie|disqus|footer|header|menu|modal|'
+                         r'nav|newsletter|popup|promo|related|share|sidebar|social|sponsor|widget|'
+                         r'\bad-|\bads\b', re.IGNORECASE)
+UNLIKELY_RE = re.compile(r'cookie|comment|disqus|newsletter|popup|modal|share|social|sponsor|'
+                         r'sidebar|related|\bad-|\bads\b', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class ExtractionError(Exception):
+    """No se encontró contenido principal suficiente en la página"""
+
+
+class Node:
+    __slots__ = ('tag', 'parent', 'weight', 'score', 'chars', 'link_chars', 'scored')
+
+    def __init__(self, tag, parent, weight):
+        self.tag = tag
+        self.parent = parent
+        self.weight = weight
+        self.score = 0.0
+        self.chars = 0
+        self.link_chars = 0
+        self.scored = False
+
+
+class ContentParser(HTMLParser):
+    """Recorre el documento acumulando párrafos y puntuando sus contenedores"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#root', None, 0)
+        self.stack = [self.root]
+        self.skip = 0
+        self.skip_stack = []
+        self.title = None
+        self.lang = None
+        self.meta = {}
+        self.blocks = []  # (tag, texto, contenedor, caracteres en enlaces)
+        self._block = None
+        self._title_parts = None
+        self._link_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {key.lower(): (value or '') for key, value in attrs}
+        if tag == 'html':
+            self.lang = attrs.get('lang') or None
+        elif tag == 'title' and self.title is None:
+            self._title_parts = []
+        elif tag == 'meta':
+            name = (attrs.get('name') or attrs.get('property') or '').lower()
+            if name in ('description', 'og:description', 'og:title', 'author') and name not in self.meta:
+                self.meta[name] = attrs.get('content', '').strip()
+        if tag in VOID_TAGS:
+            if tag == 'br' and self._block is not None:
+                self._block[1].append('\n')
+            return
+
+        hints = f"{attrs.get('class', '')} {attrs.get('id', '')}"
+        if self.skip or tag in SKIP_TAGS or (tag not in ('html', 'body', 'article', 'main')
+                                             and UNLIKELY_RE.search(hints) and not POSITIVE_RE.search(hints)):
+            self.skip += 1
+            self.skip_stack.append(tag)
+            return
+
+        if tag in BLOCK_TAGS and self._block is not None and self._block[0] in ('p', tag):
+            self._close_block()
+        if tag == 'p' and self.stack[-1].tag == 'p':
+            self.stack.pop()
+
+        weight = TAG_WEIGHTS.get(tag, 0)
+        if POSITIVE_RE.search(hints):
+            weight += 25
+        if NEGATIVE_RE.search(hints):
+            weight -= 25
+        node = Node(tag, self.stack[-1], weight)
+        self.stack.append(node)
+        if tag in BLOCK_TAGS and self._block is None:
+            self._block = [tag, [], node.parent, 0]
+        elif tag == 'a':
+            self._link_depth += 1
+
+    def handle_endtag(self, tag):
+        if self.skip:
+            if self.skip_stack and self.skip_stack[-1] == tag:
+                self.skip_stack.pop()
+                self.skip -= 1
+            return
+        if tag == 'title' and self._title_parts is not None:
+            self.title = ' '.join(''.join(self._title_parts).split()) or None
+            self._title_parts = None
+            return
+        if not any(node.tag == tag for node in self.stack[1:]):
+            return  # Cierre sin apertura: se ignora
+        while self.stack[-1].tag != tag:
+            self._pop()
+        self._pop()
+
+    def _pop(self):
+        node = self.stack.pop()
+        if node.tag == 'a' and self._link_depth:
+            self._link_depth -= 1
+        if self._block is not None and node.tag == self._block[0]:
+            self._close_block()
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+            return
+        if self.skip or self._block is None:
+            return
+        self._block[1].append(data)
+        if self._link_depth:
+            self._block[3] += len(data.strip())
+
+    def _close_block(self):
+        tag, parts, container, link_chars = self._block
+        self._block = None
+        text = WHITESPACE_RE.sub(' ', ''.join(parts)).strip()
+        if not text:
+            return
+        self.blocks.append((tag, text, container, link_chars))
+        # Solo los párrafos con sustancia puntúan a sus contenedores
+        if len(text) < MIN_PARAGRAPH_CHARS or tag.startswith('h'):
+            return
+        points = 1 + text.count(',') + text.count('،') + min(len(text) // 100, 3)
+        for level, node in enumerate(self._ancestors(container, 2)):
+            if not node.scored:
+                node.scored = True
+                node.score += node.weight
+            node.score += points if level == 0 else points / 2
+        node = container
+        while node is not None:
+            node.chars += len(text)
+            node.link_chars += link_chars
+            node = node.parent
+
+    @staticmethod
+    def _ancestors(node, depth):
+        found = []
+        while node is not None and node.tag != '#root' and len(found) < depth:
+            found.append(node)
+            node = node.parent
+        return found
+
+    def close(self):
+        super().close()
+        if self._block is not None:
+            self._close_block()
+
+
+def link_density(node):
+    return node.link_chars / node.chars if node.chars else 0
+
+
+def best_container(parser):
+    """Contenedor con mayor puntuación corregida por densidad de enlaces"""
+    candidates = {}
+    for _, _, container, _ in parser.blocks:
+        for node in ContentParser._ancestors(container, 2):
+            if node.scored:
+                candidates[id(node)] = node
+    best, best_score = None, 0
+    for node in candidates.values():
+        score = node.score * (1 - link_density(node))
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+def extract_content(html, url=None):
+    """
+    Extrae el contenido principal de un documento HTML
+
+    Returns:
+        dict: title, lang, excerpt, text, paragraphs, wordCount, characters
+
+    Raises:
+        ExtractionError: si no hay texto principal suficiente
+    """
+    parser = ContentParser()
+    parser.feed(html)
+    parser.close()
+
+    best = best_container(parser)
+    if best is not None:
+        # Párrafos del contenedor elegido y de sus hermanos con buena puntuación
+        threshold = max(10, best.score * 0.2)
+        parents = {id(best)}
+        if best.parent is not None:
+            for _, _, container, _ in parser.blocks:
+                node = container
+                while node is not None and node.parent is not best.parent:
+                    node = node.parent
+                if node is not None and node is not best and node.scored \
+                        and node.score * (1 - link_density(node)) >= threshold:
+                    parents.add(id(node))
+        selected = []
+        for tag, text, container, link_chars in parser.blocks:
+            node = container
+            while node is not None and id(node) not in parents:
+                node = node.parent
+            if node is None:
+                continue
+            if link_chars > len(text) * 0.5 and not tag.startswith('h'):
+                continue
+            selected.append(text)
+    else:
+        selected = [text for tag, text, _, link_chars in parser.blocks
+                    if len(text) >= MIN_PARAGRAPH_CHARS and link_chars <= len(text) * 0.5]
+
+    text = '\n\n'.join(selected)
+    if len(text) < MIN_CONTENT_CHARS:
+        raise ExtractionError('No se encontró contenido principal suficiente')
+
+    title = parser.title or parser.meta.get('og:title')
+    excerpt = parser.meta.get('description') or parser.meta.get('og:description') or text[:EXCERPT_CHARS]
+    return {
+        'url': url,
+        'title': title,
+        'author': parser.meta.get('author') or None,
+        'lang': parser.lang,
+        'excerpt': excerpt,
+        'text': text,
+        'paragraphs': len(selected),
+        'wordCount': len(text.split()),
+        'characters': len(text),
+    }
+
+
+def extract_url(url):
+    """
+    Descarga la página con el fetcher compartido y extrae su contenido
+    principal en el pool de procesos
+
+    Raises:
+        PageFetchError: si la página no se puede descargar
+        ExtractionError: si la página no es HTML, no tiene contenido suficiente
+            o la extracción supera TEXT_EXTRACT_TIMEOUT
+    """
+    max_bytes = current_app.config.get('TEXT_EXTRACT_MAX_BYTES', DEFAULT_MAX_BYTES)
+    page = fetch_page(url, max_bytes=max_bytes)
+    if page.status_code != 200:
+        raise ExtractionError(f'La página respondió con estado {page.status_code}')
+    if page.content_type not in ('text/html', 'application/xhtml+xml', ''):
+        raise ExtractionError(f'Tipo de contenido no soportado: {page.content_type}')
+
+    try:
+        result = get_compute_executor().run(
+            extract_content, page.text, page.final_url,
+            timeout=current_app.config.get('TEXT_EXTRACT_TIMEOUT', DEFAULT_TIMEOUT), name='text_extract'
+        )
+    except ComputeTimeoutError:
+        raise ExtractionError('La extracción superó el tiempo máximo')
+    except ComputeBusyError:
+        raise ExtractionError('El ejecutor de cómputo está saturado')
+    result['truncated'] = page.truncated
+    result['engine'] = 'local'
+    return result
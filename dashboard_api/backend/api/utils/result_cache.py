@@ -0,0 +1,219 @@
+"""
+Memoización de resultados de herramientas deterministas
+Las peticiones idénticas (misma herramienta y mismo payload normalizado) se
+responden desde memoria sin llamar al proveedor, cobrando sólo una fracción
+de los créditos. La caché es por proceso y está acotada en entradas y bytes.
+"""
+import re
+import json
+import math
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+
+from api.utils.canonical import canonical_url, url_key
+from api.utils.decorators import charge_credits
+
+# Campos de control que no forman parte de la clave
+IGNORED_FIELDS = {'cache'}
+# Campos que siempre contienen una URL, aunque llegue sin esquema
+URL_FIELDS = {'url', 'website', 'link', 'pdfurl', 'pdf_url', 'imageurl', 'image_url', 'audiourl', 'audio_url'}
+
+_LINE_ENDINGS_RE = re.compile(r'\r\n?')
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+class TTLCache:
+    """Caché LRU con expiración por entrada, acotada por número de entradas y por bytes"""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (expira, tamaño, valor)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Valor vigente de la clave o None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl, size=1):
+        """Guarda un valor durante ttl segundos; los más antiguos se descartan al superar los límites"""
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + ttl, size, value)
+            self._size += size
+            while len(self._data) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._size, 'hits': self.hits, 'misses': self.misses}
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self._size -= size
+
+
+def get_result_cache():
+    """Caché de resultados compartida por el proceso"""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = TTLCache(
+                    max_entries=current_app.config.get('RESULT_CACHE_MAX_ENTRIES', 2048),
+                    max_bytes=current_app.config.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+                )
+    return _result_cache
+
+
+def normalize_payload(value):
+    """Normaliza un payload para que entradas equivalentes produzcan la misma clave"""
+    if isinstance(value, dict):
+        return {
+            str(key): normalize_url_field(item) if str(key).lower() in URL_FIELDS else normalize_payload(item)
+            for key, item in value.items()
+            if key not in IGNORED_FIELDS and item is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalize_payload(item) for item in value]
+    if isinstance(value, str):
+        return url_key(unicodedata.normalize('NFC', _LINE_ENDINGS_RE.sub('\n', value)).strip())
+    return value
+
+
+def normalize_url_field(value):
+    """URL canónica de un campo de URL (valor único o lista de la query string)"""
+    if isinstance(value, str) and value.strip():
+        return canonical_url(value)
+    if isinstance(value, (list, tuple)):
+        return [normalize_url_field(item) for item in value]
+    return normalize_payload(value)
+
+
+def canonical_key(tool, payload):
+    """Hash canónico de (herramienta, payload normalizado)"""
+    canonical = json.dumps(
+        {'tool': tool, 'payload': normalize_payload(payload)},
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str
+    )
+    return f"{tool}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def get_request_payload():
+    """Parámetros de la petición actual que determinan el resultado (query + body JSON)"""
+    body = request.get_json(silent=True)
+    return {'args': request.args.to_dict(flat=False), 'body': body if body is not None else request.form.to_dict()}
+
+
+def cache_bypassed():
+    """El cliente pide saltarse la caché con cache=bypass (query o body)"""
+    if request.args.get('cache') == 'bypass':
+        return True
+    body = request.get_json(silent=True)
+    return isinstance(body, dict) and body.get('cache') == 'bypass'
+
+
+def get_tool_ttl(tool):
+    """TTL configurado para la herramienta (0 desactiva la memoización)"""
+    ttls = current_app.config.get('RESULT_CACHE_TTLS') or {}
+    return ttls.get(tool, current_app.config.get('RESULT_CACHE_DEFAULT_TTL', 3600))
+
+
+def get_hit_cost(cost):
+    """Créditos que se cobran por un acierto de caché"""
+    ratio = current_app.config.get('RESULT_CACHE_HIT_COST_RATIO', 0.5)
+    return max(0, math.floor(cost * ratio))
+
+
+def _current_user_id():
+    try:
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def memoized(tool, cost):
+    """
+    Decorador de memoización para rutas que devuelven JSON deterministas.
+    Se coloca por encima de credits_required: en un acierto no se ejecuta la
+    ruta y se cobra get_hit_cost(cost) en lugar del costo completo. cost puede
+    ser el mismo callable que recibe credits_required, para que el descuento
+    se aplique a lo que habría costado la petición.
+    Uso: @memoized('ai_humanizer', cost=2) o @memoized('ai_humanizer', cost=humanizer_cost(2))
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            ttl = get_tool_ttl(tool)
+            if not current_app.config.get('RESULT_CACHE_ENABLED', True) or ttl <= 0:
+                return fn(*args, **kwargs)
+            if cache_bypassed():
+                response = current_app.make_response(fn(*args, **kwargs))
+                response.headers['X-Cache'] = 'BYPASS'
+                return response
+
+            cache = get_result_cache()
+            key = canonical_key(tool, dict(get_request_payload(), view_args=kwargs))
+            cached = cache.get(key)
+            if cached is not None:
+                body = json.loads(cached)
+                user_id = _current_user_id()
+                if user_id is not None:
+                    charged, error = charge_credits(user_id, get_hit_cost(cost() if callable(cost) else cost))
+                    if error:
+                        return error
+                    if isinstance(body, dict):
+                        body['credits_info'] = {'deducted': charged, 'cached': True}
+                response = jsonify(body)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(fn(*args, **kwargs))
+            response.headers['X-Cache'] = 'MISS'
+            if response.status_code == 200 and response.is_json:
+                body = response.get_json(silent=True)
+                if isinstance(body, dict):
+                    body = {k: v for k, v in body.items() if k != 'credits_info'}
+                if body is not None:
+                    serialized = json.dumps(body, ensure_ascii=False)
+                    cache.set(key, serialized, ttl, size=len(serialized))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,208 @@
+"""
+Trabajos asíncronos de RunwayML
+Un único bucle consulta el estado de todas las generaciones pendientes con
+backoff exponencial, y los webhooks del proveedor actualizan el trabajo
+directamente. Los clientes consultan el estado desde nuestra base de datos.
+"""
+import random
+import logging
+from datetime import datetime, timedelta
+
+import requests
+from flask import current_app
+
+from api import db
+from api.models.job import Job
+from api.utils.rapidapi import upstream_get, upstream_post
+
+logger = logging.getLogger(__name__)
+
+RUNWAYML_HOST = "runwayml.p.rapidapi.com"
+RUNWAYML_BASE_URL = f"https://{RUNWAYML_HOST}"
+JOB_KIND = 'runwayml'
+
+# Estados que reporta el proveedor
+SUCCESS_STATES = {'success', 'succeeded', 'completed', 'complete', 'done', 'finished'}
+FAILURE_STATES = {'failed', 'error', 'cancelled', 'canceled'}
+RESULT_URL_KEYS = ('video_url', 'url', 'result_url')
+
+# Tiempo que un worker reserva un trabajo mientras consulta su estado
+POLL_LEASE_SECONDS = 60
+POLL_BATCH_SIZE = 50
+
+
+def get_headers():
+    """Obtiene los headers necesarios para la API de RunwayML"""
+    return {
+        "x-rapidapi-key": current_app.config['RAPIDAPI_KEY'],
+        "x-rapidapi-host": RUNWAYML_HOST,
+        "Content-Type": "application/json"
+    }
+
+
+def build_callback_url(job):
+    """URL pública donde el proveedor notificará el resultado (None si no hay URL pública configurada)"""
+    public_url = current_app.config.get('PUBLIC_API_URL')
+    if not public_url:
+        return None
+    mode = current_app.config.get('MODE', 'beta_v1')
+    return f"{public_url.rstrip('/')}/api/{mode}/runwayml/callback/{job.callback_token}"
+
+
+def classify_state(body):
+    """Traduce el estado del proveedor a 'success', 'failed' o 'running'"""
+    state = str((body or {}).get('status') or '').strip().lower()
+    if state in SUCCESS_STATES:
+        return 'success'
+    if state in FAILURE_STATES:
+        return 'failed'
+    return 'running'
+
+
+def finish_job(job, status, result=None, error=None):
+    """Marca un trabajo como terminado"""
+    job.status = status
+    job.result = result if result is not None else job.result
+    job.error = error
+    job.next_poll_at = None
+    job.completed_at = datetime.utcnow()
+
+
+def schedule_next_poll(job):
+    """Programa la siguiente consulta con backoff exponencial y jitter"""
+    config = current_app.config
+    job.attempts = (job.attempts or 0) + 1
+
+    max_age = timedelta(seconds=config.get('RUNWAYML_JOB_MAX_AGE', 7200))
+    if job.created_at and datetime.utcnow() - job.created_at > max_age:
+        finish_job(job, Job.STATUS_FAILED, error='Tiempo de espera agotado para la generación')
+        return
+
+    base_delay = config.get('RUNWAYML_POLL_BASE_DELAY', 10)
+    max_delay = config.get('RUNWAYML_POLL_MAX_DELAY', 300)
+    delay = min(base_delay * 2 ** (job.attempts - 1), max_delay) * random.uniform(0.8, 1.2)
+    job.next_poll_at = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def submit_generation(user_id, url, payload):
+    """
+    Crea el trabajo y envía la generación a RunwayML
+
+    Returns:
+        tuple: (job, cuerpo de la respuesta del proveedor, status code)
+    """
+    job = Job(user_id=user_id, kind=JOB_KIND, status=Job.STATUS_QUEUED)
+    db.session.add(job)
+    db.session.flush()  # Asigna id y callback_token
+
+    if not payload.get('callback_url'):
+        callback_url = build_callback_url(job)
+        if callback_url:
+            payload = dict(payload, callback_url=callback_url)
+    job.payload = payload
+
+    try:
+        response = upstream_post(url, json=payload, headers=get_headers(), timeout=30)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {'raw': response.text}
+    except requests.RequestException as e:
+        finish_job(job, Job.STATUS_FAILED, error=f"Error de conexión con RunwayML: {e}")
+        db.session.commit()
+        raise
+
+    if response.status_code != 200 or not isinstance(body, dict) or not body.get('uuid'):
+        finish_job(job, Job.STATUS_FAILED, error=f"RunwayML respondió {response.status_code}")
+        job.last_update = body if isinstance(body, dict) else {'raw': body}
+    else:
+        job.upstream_id = body['uuid']
+        job.status = Job.STATUS_RUNNING
+        job.last_update = body
+        job.next_poll_at = datetime.utcnow() + timedelta(seconds=current_app.config.get('RUNWAYML_POLL_BASE_DELAY', 10))
+
+    db.session.commit()
+    return job, body, response.status_code
+
+
+def apply_update(job, body):
+    """Aplica un estado reportado por el proveedor (consulta o webhook) y devuelve el estado clasificado"""
+    job.last_update = body
+    state = classify_state(body)
+    if state == 'failed':
+        finish_job(job, Job.STATUS_FAILED, error=body.get('message') or body.get('error') or 'La generación falló')
+    return state
+
+
+def fetch_result(job):
+    """Obtiene el resultado de una generación terminada"""
+    response = upstream_get(
+        f"{RUNWAYML_BASE_URL}/queue/{job.upstream_id}/result",
+        headers=get_headers(),
+        timeout=30
+    )
+    if response.status_code == 200:
+        finish_job(job, Job.STATUS_SUCCEEDED, result=response.json())
+
+
+def poll_job(job):
+    """Consulta el estado de un trabajo en el proveedor"""
+    try:
+        response = upstream_get(
+            f"{RUNWAYML_BASE_URL}/status",
+            headers=get_headers(),
+            params={"uuid": job.upstream_id},
+            timeout=30
+        )
+        if response.status_code == 200:
+            if apply_update(job, response.json()) == 'success':
+                fetch_result(job)
+        else:
+            logger.warning(f"RunwayML status {response.status_code} para el job {job.id}")
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"Error consultando el job {job.id} en RunwayML: {e}")
+
+    if not job.is_final:
+        schedule_next_poll(job)
+
+
+def poll_due_jobs(limit=POLL_BATCH_SIZE):
+    """Consulta todos los trabajos pendientes cuya próxima consulta ya venció"""
+    now = datetime.utcnow()
+    jobs = Job.query.filter(
+        Job.kind == JOB_KIND,
+        Job.status == Job.STATUS_RUNNING,
+        Job.next_poll_at <= now
+    ).order_by(Job.next_poll_at).limit(limit).with_for_update(skip_locked=True).all()
+
+    if not jobs:
+        db.session.rollback()
+        return 0
+
+    # Reservar los trabajos para que otros workers no los consulten a la vez
+    for job in jobs:
+        job.next_poll_at = now + timedelta(seconds=POLL_LEASE_SECONDS)
+    db.session.commit()
+
+    for job in jobs:
+        poll_job(job)
+        db.session.commit()
+    return len(jobs)
+
+
+def handle_callback(token, body):
+    """Procesa el webhook del proveedor; devuelve el trabajo o None si el token no existe"""
+    job = Job.query.filter_by(callback_token=token, kind=JOB_KIND).first()
+    if not job or job.is_final:
+        return job
+
+    body = body if isinstance(body, dict) else {'raw': body}
+    state = apply_update(job, body)
+    if not job.is_final:
+        if any(body.get(key) for key in RESULT_URL_KEYS):
+            finish_job(job, Job.STATUS_SUCCEEDED, result=body)
+        elif state == 'success':
+            # El webhook no trae el resultado: el worker lo obtiene en la siguiente vuelta
+            job.next_poll_at = datetime.utcnow()
+    db.session.commit()
+    return job
@@ -0,0 +1,224 @@
+"""
+Auditoría SEO on-page local
+La página se descarga en streaming y se analiza con un HTMLParser incremental
+que deja de leer en cuanto ha procesado el <head> y un presupuesto del <body>.
+Se extraen título, metas, encabezados, imágenes sin alt, enlaces, canonical y
+robots, y se calcula una puntuación con la lista de problemas encontrados.
+"""
+from html.parser import HTMLParser
+from urllib.parse import urlparse, urljoin
+
+from flask import current_app
+
+from api.utils.page_fetch import fetch_page
+
+DEFAULT_BODY_BUDGET = 256 * 1024  # Caracteres del <body> que se analizan
+MAX_SAMPLES = 10
+
+# Etiquetas cuyo texto no es contenido visible
+SKIP_TEXT_TAGS = {'script', 'style', 'noscript', 'template', 'svg'}
+
+
+class OnPageParser(HTMLParser):
+    """Parser incremental que acumula las señales on-page del documento"""
+
+    def __init__(self, page_url):
+        super().__init__(convert_charrefs=True)
+        self.page_host = (urlparse(page_url).hostname or '').lower()
+        self.page_url = page_url
+        self.lang = None
+        self.title = None
+        self.meta = {}
+        self.canonical = None
+        self.hreflang = 0
+        self.headings = {'h1': [], 'h1Count': 0, 'h2Count': 0, 'h3Count': 0}
+        self.images = {'count': 0, 'withoutAlt': 0, 'withoutAltSamples': []}
+        self.links = {'internal': 0, 'external': 0, 'nofollow': 0}
+        self.words = 0
+        self.in_body = False
+        self.body_chars = 0
+        self._title_parts = None
+        self._h1_parts = None
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {key.lower(): (value or '') for key, value in attrs}
+        if tag == 'html':
+            self.lang = attrs.get('lang') or None
+        elif tag == 'body':
+            self.in_body = True
+        elif tag == 'title' and self.title is None:
+            self._title_parts = []
+        elif tag == 'meta':
+            name = (attrs.get('name') or attrs.get('property') or '').lower()
+            if name and name not in self.meta:
+                self.meta[name] = attrs.get('content', '').strip()
+        elif tag == 'link':
+            rel = attrs.get('rel', '').lower().split()
+            if 'canonical' in rel and self.canonical is None:
+                self.canonical = urljoin(self.page_url, attrs.get('href', '').strip())
+            elif 'alternate' in rel and attrs.get('hreflang'):
+                self.hreflang += 1
+        elif tag == 'h1':
+            self.headings['h1Count'] += 1
+            self._h1_parts = []
+        elif tag in ('h2', 'h3'):
+            self.headings[f'{tag}Count'] += 1
+        elif tag == 'img':
+            self.images['count'] += 1
+            if not attrs.get('alt', '').strip():
+                self.images['withoutAlt'] += 1
+                if len(self.images['withoutAltSamples']) < MAX_SAMPLES:
+                    self.images['withoutAltSamples'].append(attrs.get('src', ''))
+        elif tag == 'a' and attrs.get('href'):
+            self._count_link(attrs)
+        if tag in SKIP_TEXT_TAGS:
+            self._skip += 1
+
+    def _count_link(self, attrs):
+        href = attrs['href'].strip()
+        if href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+            return
+        host = (urlparse(urljoin(self.page_url, href)).hostname or '').lower()
+        internal = host == self.page_host or host.endswith(f'.{self.page_host}') or self.page_host.endswith(f'.{host}')
+        self.links['internal' if internal else 'external'] += 1
+        if 'nofollow' in attrs.get('rel', '').lower().split():
+            self.links['nofollow'] += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title_parts is not None:
+            self.title = ' '.join(''.join(self._title_parts).split())
+            self._title_parts = None
+        elif tag == 'h1' and self._h1_parts is not None:
+            if len(self.headings['h1']) < MAX_SAMPLES:
+                self.headings['h1'].append(' '.join(''.join(self._h1_parts).split()))
+            self._h1_parts = None
+        elif tag == 'head':
+            self.in_body = True
+        if tag in SKIP_TEXT_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+            return
+        if self._skip:
+            return
+        if self._h1_parts is not None:
+            self._h1_parts.append(data)
+        if self.in_body:
+            self.words += len(data.split())
+
+    def feed_chunk(self, text, body_budget):
+        """Procesa un bloque; devuelve True cuando ya se agotó el presupuesto del body"""
+        self.feed(text)
+        if self.in_body:
+            self.body_chars += len(text)
+        return self.in_body and self.body_chars >= body_budget
+
+    def result(self):
+        return {
+            'title': self.title,
+            'titleLength': len(self.title) if self.title else 0,
+            'metaDescription': self.meta.get('description'),
+            'metaDescriptionLength': len(self.meta.get('description') or ''),
+            'metaRobots': self.meta.get('robots'),
+            'viewport': self.meta.get('viewport'),
+            'openGraph': {key: value for key, value in self.meta.items() if key.startswith('og:')},
+            'canonical': self.canonical,
+            'lang': self.lang,
+            'hreflang': self.hreflang,
+            'headings': dict(self.headings),
+            'images': dict(self.images),
+            'links': dict(self.links),
+            'wordCount': self.words,
+        }
+
+
+def score_audit(onpage, http_status, using_https, content_bytes):
+    """
+    Puntuación 0-100 y lista de problemas a partir de las señales on-page
+
+    Returns:
+        tuple: (puntuación, problemas)
+    """
+    issues = []
+
+    def issue(code, severity, message, penalty):
+        issues.append({'code': code, 'severity': severity, 'message': message, 'penalty': penalty})
+
+    if not using_https:
+        issue('no_https', 'high', 'La página no usa HTTPS', 20)
+    if http_status != 200:
+        issue('http_status', 'high', f'La página respondió con estado {http_status}', 30)
+    if content_bytes > 5000 * 1024:
+        issue('page_size', 'medium', 'La página pesa más de 5 MB', 10)
+
+    robots = (onpage['metaRobots'] or '').lower()
+    if 'noindex' in robots:
+        issue('noindex', 'high', 'La meta robots impide la indexación (noindex)', 15)
+
+    if not onpage['title']:
+        issue('missing_title', 'high', 'Falta la etiqueta <title>', 15)
+    elif not 10 <= onpage['titleLength'] <= 60:
+        issue('title_length', 'low', 'El título debería tener entre 10 y 60 caracteres', 5)
+
+    if not onpage['metaDescription']:
+        issue('missing_meta_description', 'medium', 'Falta la meta descripción', 10)
+    elif not 50 <= onpage['metaDescriptionLength'] <= 160:
+        issue('meta_description_length', 'low', 'La meta descripción debería tener entre 50 y 160 caracteres', 5)
+
+    h1_count = onpage['headings']['h1Count']
+    if not h1_count:
+        issue('missing_h1', 'medium', 'No hay ningún encabezado H1', 10)
+    elif h1_count > 1:
+        issue('multiple_h1', 'low', f'Hay {h1_count} encabezados H1', 5)
+
+    without_alt = onpage['images']['withoutAlt']
+    if without_alt:
+        issue('images_without_alt', 'medium', f'{without_alt} imágenes sin texto alternativo', min(10, without_alt * 2))
+
+    if not onpage['canonical']:
+        issue('missing_canonical', 'low', 'Falta la URL canónica', 5)
+    if not onpage['viewport']:
+        issue('missing_viewport', 'medium', 'Falta la meta viewport (móvil)', 5)
+    if not onpage['lang']:
+        issue('missing_lang', 'low', 'Falta el atributo lang en <html>', 3)
+
+    score = 100 - sum(item['penalty'] for item in issues)
+    return max(0, min(100, score)), issues
+
+
+def audit_url(url):
+    """
+    Descarga la página (head + presupuesto del body) y devuelve la auditoría con
+    el mismo formato que la respuesta del SEO Analyzer más el detalle on-page
+
+    Raises:
+        PageFetchError: si la página no se puede descargar
+    """
+    budget = current_app.config.get('SEO_AUDIT_BODY_BUDGET', DEFAULT_BODY_BUDGET)
+    parser = OnPageParser(url)
+    page = fetch_page(url, on_text=lambda text: parser.feed_chunk(text, budget))
+    parser.close()
+    onpage = parser.result()
+
+    content_length = page.headers.get('Content-Length')
+    content_bytes = int(content_length) if content_length and content_length.isdigit() else page.bytes_read
+    using_https = page.final_url.startswith('https://')
+    score, issues = score_audit(onpage, page.status_code, using_https, content_bytes)
+    return {
+        'url': page.final_url,
+        'input_type': 'url',
+        'http_status': page.status_code,
+        'using_https': using_https,
+        'content_size': {
+            'bytes': content_bytes,
+            'kb': round(content_bytes / 1024, 2)
+        },
+        'headers': page.headers,
+        'score': score,
+        'onpage': onpage,
+        'issues': issues,
+        'engine': 'local'
+    }
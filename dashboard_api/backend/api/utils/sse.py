@@ -0,0 +1,51 @@
+"""
+Utilidades para respuestas Server-Sent Events (SSE)
+Permiten reenviar al cliente los tokens de un modelo a medida que llegan,
+ya sea desde un upstream que hace streaming o re-emitiendo en fragmentos
+una respuesta completa.
+"""
+import re
+import json
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # Evita que nginx acumule la respuesta
+}
+
+# Palabra más el espacio que la sigue: al re-emitir se conserva el texto exacto
+_WORD_RE = re.compile(r'\S+\s*|\s+')
+
+
+def sse_event(data, event=None):
+    """Formatea un evento SSE; los dicts y listas se serializan como JSON"""
+    if not isinstance(data, str):
+        data = json.dumps(data, ensure_ascii=False)
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def iter_sse_data(response):
+    """Recorre los campos 'data' de un stream SSE del upstream (requests con stream=True)"""
+    # SSE siempre es UTF-8; requests usaría ISO-8859-1 si el Content-Type no trae charset
+    for raw_line in response.iter_lines():
+        if isinstance(raw_line, bytes):
+            raw_line = raw_line.decode('utf-8', errors='replace')
+        if not raw_line or not raw_line.startswith('data:'):
+            continue
+        data = raw_line[5:].strip()
+        if data == '[DONE]':
+            return
+        yield data
+
+
+def iter_text_chunks(text, words_per_chunk=3):
+    """Divide un texto completo en fragmentos de pocas palabras para re-emitirlo como stream"""
+    buffer = []
+    for match in _WORD_RE.finditer(text or ''):
+        buffer.append(match.group(0))
+        if len(buffer) >= words_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
@@ -0,0 +1,201 @@
+"""
+Vigilancia programada de caducidad de certificados SSL
+Un hilo por proceso revisa periódicamente las entradas de ssl_watchlist cuya
+próxima revisión ha vencido: agrupa los (host, puerto) repetidos entre
+usuarios, hace los handshakes en paralelo con concurrencia limitada y jitter,
+guarda el resultado y crea de una sola vez las notificaciones de los
+certificados que han cruzado un umbral de días restantes.
+"""
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from api import db
+from api.models.notification import Notification
+from api.models.ssl_watch import SSLWatch
+from api.utils.tls_inspect import inspect_many, target_policy
+
+logger = logging.getLogger(__name__)
+
+_scheduler_started = False
+_scheduler_lock = threading.Lock()
+
+
+def get_thresholds(config):
+    """Umbrales de aviso (días restantes) de mayor a menor; 0 significa caducado"""
+    thresholds = set(config.get('SSL_WATCH_THRESHOLDS') or [30, 14, 7, 1])
+    thresholds.add(0)
+    return sorted(thresholds, reverse=True)
+
+
+def crossed_threshold(days_left, thresholds):
+    """Menor umbral alcanzado por los días restantes (None si está por encima de todos)"""
+    reached = [threshold for threshold in thresholds if days_left <= threshold]
+    return min(reached) if reached else None
+
+
+def build_notification(watch, days_left, valid_until, threshold, now):
+    """Fila de notificación (para inserción en bloque) de un umbral cruzado"""
+    target = watch['host'] if watch['port'] == 443 else f"{watch['host']}:{watch['port']}"
+    if threshold == 0:
+        kind, title = 'error', 'Certificado SSL caducado'
+        message = f'El certificado de {target} caducó el {valid_until:%d/%m/%Y}.'
+    else:
+        kind, title = 'warning', 'Certificado SSL próximo a caducar'
+        message = f'El certificado de {target} caduca en {days_left} días ({valid_until:%d/%m/%Y}).'
+    return {
+        'user_id': watch['user_id'],
+        'type': kind,
+        'title': title,
+        'message': message,
+        'category': 'system',
+        'read': False,
+        'created_at': now,
+    }
+
+
+def next_check_time(now, interval):
+    """Próxima revisión con un ±10% aleatorio para repartir la carga en el tiempo"""
+    return now + timedelta(seconds=interval * random.uniform(0.9, 1.1))
+
+
+def claim_due_watches(config, limit):
+    """
+    Toma las entradas pendientes más antiguas y aplaza su próxima revisión para
+    que otro proceso no las escanee a la vez
+
+    Returns:
+        list: dicts con los campos necesarios para el escaneo
+    """
+    now = datetime.utcnow()
+    watches = SSLWatch.query.filter(SSLWatch.next_check_at <= now)\
+        .order_by(SSLWatch.next_check_at)\
+        .limit(limit)\
+        .with_for_update(skip_locked=True)\
+        .all()
+    lease = now + timedelta(seconds=config.get('SSL_WATCH_LEASE', 900))
+    claimed = []
+    for watch in watches:
+        watch.next_check_at = lease
+        claimed.append({
+            'id': watch.id,
+            'user_id': watch.user_id,
+            'host': watch.host,
+            'port': watch.port,
+            'notified_threshold': watch.notified_threshold,
+        })
+    db.session.commit()
+    return claimed
+
+
+def scan_due_watches(config, limit=None):
+    """
+    Escanea un lote de entradas pendientes
+
+    Returns:
+        dict: {'scanned', 'targets', 'errors', 'notifications'}
+    """
+    watches = claim_due_watches(config, limit or config.get('SSL_WATCH_BATCH_SIZE', 2000))
+    if not watches:
+        return {'scanned': 0, 'targets': 0, 'errors': 0, 'notifications': 0}
+
+    by_target = {}
+    for watch in watches:
+        by_target.setdefault((watch['host'], watch['port']), []).append(watch)
+
+    thresholds = get_thresholds(config)
+    interval = config.get('SSL_WATCH_INTERVAL', 12 * 3600)
+    retry_interval = config.get('SSL_WATCH_RETRY_INTERVAL', 3600)
+    updates, notifications, errors = [], [], 0
+
+    for target, result, error in inspect_many(
+            list(by_target),
+            timeout=config.get('SSL_CHECKER_TIMEOUT', 10),
+            max_workers=config.get('SSL_WATCH_CONCURRENCY', 64),
+            jitter=config.get('SSL_WATCH_JITTER', 0.5),
+            **target_policy(config)):
+        now = datetime.utcnow()
+        if error:
+            errors += 1
+            for watch in by_target[target]:
+                updates.append({
+                    'id': watch['id'],
+                    'last_error': error[:1000],
+                    'last_checked_at': now,
+                    'next_check_at': next_check_time(now, retry_interval),
+                })
+            continue
+
+        days_left = result['daysLeft']
+        valid_until = datetime.fromisoformat(result['validUntil']).replace(tzinfo=None)
+        threshold = crossed_threshold(days_left, thresholds)
+        for watch in by_target[target]:
+            update = {
+                'id': watch['id'],
+                'issuer': str(result['issuer'])[:255],
+                'valid_until': valid_until,
+                'days_left': days_left,
+                'is_valid': result['isValid'],
+                'last_error': None,
+                'last_checked_at': now,
+                'next_check_at': next_check_time(now, interval),
+                # Si el certificado se renovó, el umbral sube y se vuelve a avisar al bajar de nuevo
+                'notified_threshold': threshold,
+            }
+            notified = watch['notified_threshold']
+            if threshold is not None and (notified is None or threshold < notified):
+                notifications.append(build_notification(watch, days_left, valid_until, threshold, now))
+            updates.append(update)
+
+    db.session.bulk_update_mappings(SSLWatch, updates)
+    if notifications:
+        db.session.bulk_insert_mappings(Notification, notifications)
+    db.session.commit()
+
+    logger.info(f"Vigilancia SSL: {len(watches)} entradas, {len(by_target)} certificados, "
+                f"{errors} errores, {len(notifications)} notificaciones")
+    return {
+        'scanned': len(watches),
+        'targets': len(by_target),
+        'errors': errors,
+        'notifications': len(notifications),
+    }
+
+
+def scan_all_due(app):
+    """Escanea lotes hasta que no quedan entradas pendientes"""
+    totals = {'scanned': 0, 'targets': 0, 'errors': 0, 'notifications': 0}
+    while True:
+        with app.app_context():
+            summary = scan_due_watches(app.config)
+        for key, value in summary.items():
+            totals[key] += value
+        if not summary['scanned']:
+            return totals
+
+
+def _scheduler_loop(app):
+    interval = app.config.get('SSL_WATCH_SCAN_INTERVAL', 300)
+    while True:
+        try:
+            scan_all_due(app)
+        except Exception as e:
+            logger.error(f"Error en la vigilancia SSL: {e}")
+        time.sleep(interval)
+
+
+def start_ssl_watch_scheduler(app):
+    """Arranca (una vez por proceso) el hilo que escanea la watchlist"""
+    global _scheduler_started
+    if not app.config.get('SSL_WATCH_ENABLED', True):
+        return False
+    with _scheduler_lock:
+        if _scheduler_started:
+            return False
+        thread = threading.Thread(target=_scheduler_loop, args=(app,), name='ssl-watch', daemon=True)
+        thread.start()
+        _scheduler_started = True
+    logger.info("Vigilancia de certificados SSL iniciada")
+    return True
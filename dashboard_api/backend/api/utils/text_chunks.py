@@ -0,0 +1,201 @@
+"""
+División de documentos largos en fragmentos para procesarlos en paralelo
+Los cortes se hacen en límites de párrafo y, si hace falta, de oración. Los
+bloques de código y de markdown nunca se parten, y se pueden dejar tal cual
+(sin enviarlos al proveedor). El texto reensamblado conserva los espacios y
+saltos de línea originales.
+"""
+import re
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BLOCK_TEXT = 'text'
+BLOCK_CODE = 'code'
+BLOCK_MARKDOWN = 'markdown'
+
+_FENCE_RE = re.compile(r'^\s{0,3}(`{3,}|~{3,})')
+_MARKDOWN_LINE_RE = re.compile(r'^\s{0,3}(#{1,6}\s|\||([-*_]\s*){3,}$|<[a-zA-Z/!]|!\[)')
+_SENTENCE_RE = re.compile(r'.+?(?:[.!?…]+["\')\]]*(?=\s)|$)\s*', re.S)
+_WORD_RE = re.compile(r'\S+\s*')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def split_blocks(text):
+    """
+    Divide el texto en bloques (tipo, texto): párrafos, bloques de código
+    delimitados y grupos de líneas de markdown (títulos, tablas, HTML...).
+    Las líneas en blanco quedan al final del bloque que las precede.
+    """
+    blocks = []
+    kind, lines, fence = None, [], None
+
+    def flush():
+        if lines:
+            blocks.append((kind, ''.join(lines)))
+
+    for line in text.splitlines(keepends=True):
+        if fence:
+            lines.append(line)
+            if line.strip().startswith(fence):
+                fence = None
+            continue
+
+        if not line.strip():
+            if kind is None:
+                kind = BLOCK_TEXT
+            lines.append(line)
+            continue
+
+        opening = _FENCE_RE.match(line)
+        line_kind = BLOCK_CODE if opening else BLOCK_MARKDOWN if _MARKDOWN_LINE_RE.match(line) else BLOCK_TEXT
+        # Un bloque termina con una línea en blanco o al cambiar de tipo
+        ends_block = lines and (not lines[-1].strip() or line_kind != kind or line_kind == BLOCK_CODE)
+        if ends_block:
+            flush()
+            lines = []
+        if not lines:
+            kind = line_kind
+        lines.append(line)
+        if opening:
+            fence = opening.group(1)
+
+    flush()
+    return blocks
+
+
+def split_long_text(text, max_words):
+    """Divide un párrafo demasiado largo en oraciones (o palabras, como último recurso)"""
+    pieces = []
+    for sentence in _SENTENCE_RE.findall(text):
+        if count_words(sentence) <= max_words:
+            pieces.append(sentence)
+            continue
+        words = _WORD_RE.findall(sentence)
+        for start in range(0, len(words), max_words):
+            pieces.append(''.join(words[start:start + max_words]))
+    # Espacios iniciales que el patrón de oraciones no captura
+    leading = text[:len(text) - len(text.lstrip())]
+    if leading and pieces:
+        pieces[0] = leading + pieces[0]
+    return pieces
+
+
+def chunk_document(text, max_words, skip_code=False, skip_markdown=False):
+    """
+    Agrupa los bloques del documento en fragmentos de hasta max_words palabras.
+
+    Returns:
+        list: Tuplas (texto, procesar). Los fragmentos con procesar=False
+        (código o markdown que se deben saltar) se reensamblan tal cual.
+    """
+    chunks = []
+    current, current_words = [], 0
+
+    def close_chunk():
+        nonlocal current, current_words
+        if current:
+            chunks.append((''.join(current), True))
+        current, current_words = [], 0
+
+    for kind, block in split_blocks(text):
+        # Un bloque de código delimitado también es sintaxis markdown
+        if (kind == BLOCK_CODE and (skip_code or skip_markdown)) or (kind == BLOCK_MARKDOWN and skip_markdown):
+            close_chunk()
+            chunks.append((block, False))
+            continue
+
+        words = count_words(block)
+        # El código y el markdown son atómicos aunque superen el tamaño
+        pieces = [block] if kind != BLOCK_TEXT or words <= max_words else split_long_text(block, max_words)
+        for piece in pieces:
+            piece_words = count_words(piece)
+            if current and current_words + piece_words > max_words:
+                close_chunk()
+            current.append(piece)
+            current_words += piece_words
+    close_chunk()
+    return chunks
+
+
+def get_executor(max_workers):
+    """Pool de hilos compartido para procesar fragmentos (acota la concurrencia total)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='text-chunks')
+    return _executor
+
+
+def call_with_retry(fn, arg, retries=2, base_delay=0.5, should_retry=None):
+    """Ejecuta fn(arg) reintentando con backoff exponencial y jitter mientras should_retry(error) lo permita"""
+    for attempt in range(retries + 1):
+        try:
+            return fn(arg)
+        except Exception as e:
+            if attempt == retries or (should_retry and not should_retry(e)):
+                raise
+            delay = base_delay * 2 ** attempt * random.uniform(0.8, 1.2)
+            logger.warning(f"Fragmento falló (intento {attempt + 1}/{retries + 1}): {e}. Reintentando en {delay:.1f}s")
+            time.sleep(delay)
+
+
+def process_chunks(chunks, fn, max_workers=4, retries=2, should_retry=None, deadline=None):
+    """
+    Procesa en paralelo (y con reintentos) los fragmentos marcados.
+    fn recibe el fragmento sin los espacios de los extremos y se ejecuta en
+    hilos del pool, sin contexto de Flask (fn debe abrir el suyo si lo necesita).
+
+    Args:
+        deadline (float): Instante (time.monotonic) a partir del cual no se espera
+            más: se cancelan los fragmentos que no han empezado y se lanza TimeoutError
+
+    Returns:
+        list: Tuplas (texto original, resultado) en el orden del documento;
+        el resultado es None para los fragmentos que se saltan.
+    """
+    executor = get_executor(max_workers)
+    pending = []
+    for text, process in chunks:
+        future = None
+        if process and text.strip():
+            future = executor.submit(call_with_retry, fn, text.strip(), retries, 0.5, should_retry)
+        pending.append((text, future))
+    results = []
+    try:
+        for text, future in pending:
+            if future is None:
+                results.append((text, None))
+                continue
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            results.append((text, future.result(timeout)))
+    except Exception:
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+        raise
+    return results
+
+
+def reassemble(results, to_text=str):
+    """Une los resultados en orden, conservando los espacios originales de cada fragmento"""
+    parts = []
+    for text, result in results:
+        if result is None:
+            parts.append(text)
+            continue
+        leading = text[:len(text) - len(text.lstrip())]
+        trailing = text[len(text.rstrip()):]
+        parts.append(leading + to_text(result) + trailing)
+    return ''.join(parts)
@@ -0,0 +1,252 @@
+"""
+Inspección local de certificados TLS
+Abre una conexión TLS (con SNI) contra host:puerto y lee el certificado del
+propio handshake, sin pasar por ningún proveedor externo. Si el certificado no
+se puede verificar (autofirmado, caducado, nombre incorrecto...) se repite el
+handshake sin verificación para poder informar igualmente sus fechas.
+
+Solo se conecta a puertos TLS conocidos (ALLOWED_PORTS) de hosts que resuelven
+a direcciones públicas, y los errores de conexión no distinguen la causa: la
+herramienta no sirve para sondear la red interna ni para escanear puertos.
+"""
+import ssl
+import time
+import random
+import socket
+import logging
+import ipaddress
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pyasn1.codec.der import decoder as der_decoder
+from pyasn1_modules import rfc2459
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 443
+DEFAULT_TIMEOUT = 10
+MAX_TIMEOUT = 10
+
+# HTTPS, SMTPS, LDAPS, DNS sobre TLS, IMAPS, POP3S y HTTPS alternativo
+ALLOWED_PORTS = (443, 465, 636, 853, 993, 995, 8443)
+
+# OIDs de los atributos del emisor que se muestran (en orden de preferencia)
+ISSUER_OIDS = {
+    '2.5.4.10': 'organizationName',
+    '2.5.4.3': 'commonName',
+}
+
+
+class TLSInspectionError(Exception):
+    """No se pudo completar el handshake TLS con el servidor"""
+    pass
+
+
+class TLSTargetError(TLSInspectionError):
+    """El destino no se puede inspeccionar (puerto no permitido o dirección interna)"""
+    pass
+
+
+def target_policy(config):
+    """Restricciones de destino configuradas (argumentos de inspect_certificate / inspect_many)"""
+    return {
+        'allow_private': config.get('SSL_CHECKER_ALLOW_PRIVATE', False),
+        'allowed_ports': config.get('SSL_CHECKER_PORTS', ALLOWED_PORTS),
+    }
+
+
+def check_port(port, allowed_ports=ALLOWED_PORTS):
+    """Lanza TLSTargetError si el puerto no es uno de los puertos TLS permitidos"""
+    if allowed_ports is not None and port not in allowed_ports:
+        ports = ', '.join(str(allowed) for allowed in allowed_ports)
+        raise TLSTargetError(f'Puerto no permitido: {port}. Puertos admitidos: {ports}')
+
+
+def resolve_public_address(host, port, allow_private=False):
+    """
+    Dirección IP a la que conectar para host, comprobando que todas las que
+    resuelve son públicas (se conecta a la IP ya validada, no se vuelve a resolver)
+
+    Raises:
+        TLSTargetError: si alguna dirección no es pública
+        TLSInspectionError: si el dominio no resuelve
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise TLSInspectionError(f'No se pudo resolver {host}')
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not addresses:
+        raise TLSInspectionError(f'No se pudo resolver {host}')
+    if not allow_private:
+        for address in addresses:
+            if not ipaddress.ip_address(address.split('%')[0]).is_global:
+                raise TLSTargetError(f'{host} apunta a una dirección no pública')
+    return addresses[0]
+
+
+def parse_target(value, port=None):
+    """
+    Host y puerto a inspeccionar a partir de un dominio o URL
+
+    Returns:
+        tuple: (host, puerto) o (None, None) si no es válido
+    """
+    value = (value or '').strip()
+    if not value:
+        return None, None
+    try:
+        parsed = urlparse(value if '://' in value else f'//{value}')
+        host, url_port = parsed.hostname, parsed.port
+    except ValueError:
+        return None, None
+    if not host:
+        return None, None
+    try:
+        host = host.rstrip('.').encode('idna').decode('ascii').lower()
+    except UnicodeError:
+        return None, None
+    port = int(port or url_port or DEFAULT_PORT)
+    if not 0 < port < 65536:
+        return None, None
+    return host, port
+
+
+def _handshake(host, address, port, deadline, verify):
+    """Devuelve (certificado decodificado o None, certificado DER) del servidor"""
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    try:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout('plazo agotado')
+        with socket.create_connection((address, port), timeout=remaining) as sock:
+            # El handshake comparte el plazo total con la conexión
+            sock.settimeout(max(0.01, deadline - time.monotonic()))
+            with context.wrap_socket(sock, server_hostname=host) as tls:
+                return tls.getpeercert() if verify else None, tls.getpeercert(binary_form=True)
+    except ssl.SSLCertVerificationError:
+        raise
+    except (OSError, ssl.SSLError) as e:
+        # Mismo mensaje para puerto cerrado, filtrado o sin TLS: la causa solo va al log
+        logger.debug(f"Handshake TLS fallido con {host}:{port} ({address}): {e}")
+        raise TLSInspectionError(f'No se pudo establecer la conexión TLS con {host}:{port}')
+
+
+def _issuer_from_peercert(cert):
+    attributes = dict(item for rdn in cert.get('issuer', ()) for item in rdn)
+    for name in ISSUER_OIDS.values():
+        if attributes.get(name):
+            return attributes[name]
+    return '-'
+
+
+def _decode_der(der):
+    """(emisor, inicio, fin) de un certificado DER"""
+    cert, _ = der_decoder.decode(der, asn1Spec=rfc2459.Certificate())
+    tbs = cert['tbsCertificate']
+    attributes = {}
+    for rdn in tbs['issuer'][0]:
+        for attribute in rdn:
+            oid = str(attribute['type'])
+            if oid in ISSUER_OIDS:
+                value, _ = der_decoder.decode(attribute['value'], asn1Spec=rfc2459.DirectoryString())
+                attributes[ISSUER_OIDS[oid]] = str(value.getComponent())
+    issuer = next((attributes[name] for name in ISSUER_OIDS.values() if attributes.get(name)), '-')
+    validity = tbs['validity']
+    not_before = validity['notBefore'].getComponent().asDateTime.astimezone(timezone.utc)
+    not_after = validity['notAfter'].getComponent().asDateTime.astimezone(timezone.utc)
+    return issuer, not_before, not_after
+
+
+def inspect_certificate(host, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT, allow_private=False,
+                        allowed_ports=ALLOWED_PORTS):
+    """
+    Estado del certificado que presenta host:puerto, con el mismo formato que
+    la respuesta del SSL checker (ver domain_intel.map_ssl_result)
+
+    Args:
+        timeout: tiempo total (resolución, conexión y handshakes), hasta MAX_TIMEOUT
+        allow_private: permitir direcciones internas (solo pruebas)
+        allowed_ports: puertos admitidos (None: cualquiera)
+
+    Raises:
+        TLSTargetError: si el destino no está permitido
+        TLSInspectionError: si no hay conexión o el handshake falla
+    """
+    deadline = time.monotonic() + min(float(timeout or DEFAULT_TIMEOUT), MAX_TIMEOUT)
+    check_port(port, allowed_ports)
+    address = resolve_public_address(host, port, allow_private)
+    message = 'El certificado es válido'
+    try:
+        cert, der = _handshake(host, address, port, deadline, verify=True)
+        verified = True
+    except ssl.SSLCertVerificationError as e:
+        # Segundo handshake sin verificar solo para leer las fechas del certificado
+        message = e.verify_message or str(e)
+        cert, der = _handshake(host, address, port, deadline, verify=False)
+        verified = False
+
+    if cert:
+        issuer = _issuer_from_peercert(cert)
+        not_before = datetime.fromtimestamp(ssl.cert_time_to_seconds(cert['notBefore']), timezone.utc)
+        not_after = datetime.fromtimestamp(ssl.cert_time_to_seconds(cert['notAfter']), timezone.utc)
+    else:
+        try:
+            issuer, not_before, not_after = _decode_der(der)
+        except Exception as e:
+            raise TLSInspectionError(f'Certificado ilegible en {host}:{port}: {e}')
+
+    now = datetime.now(timezone.utc)
+    is_expired = now > not_after
+    if is_expired:
+        message = 'El certificado ha caducado'
+    return {
+        'issuer': issuer,
+        'validFrom': not_before.isoformat(),
+        'validUntil': not_after.isoformat(),
+        'daysLeft': (not_after - now).days,
+        'lifespan': (not_after - not_before).days,
+        'domain': host,
+        'port': port,
+        'isValid': verified and not is_expired,
+        'isExpired': is_expired,
+        'message': message
+    }
+
+
+def inspect_many(targets, timeout=DEFAULT_TIMEOUT, max_workers=32, jitter=0, allow_private=False,
+                 allowed_ports=ALLOWED_PORTS):
+    """
+    Inspecciona muchos (host, puerto) en paralelo y entrega cada resultado en
+    cuanto termina su handshake
+
+    Args:
+        jitter: espera aleatoria máxima (segundos) antes de cada handshake para
+            no abrir todas las conexiones a la vez
+
+    Yields:
+        tuple: ((host, puerto), resultado o None, error o None)
+    """
+    targets = list(dict.fromkeys(targets))
+    if not targets:
+        return
+
+    def task(host, port):
+        if jitter:
+            time.sleep(random.uniform(0, jitter))
+        return inspect_certificate(host, port, timeout, allow_private, allowed_ports)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(targets)), thread_name_prefix='tls-inspect')
+    try:
+        futures = {executor.submit(task, host, port): (host, port) for host, port in targets}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except TLSInspectionError as e:
+                yield futures[future], None, str(e)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,209 @@
+"""
+Políticas de reintento y de peticiones cubiertas (hedging) para los proveedores
+
+- RetryPolicy: reintentos con backoff exponencial y jitter completo ante 429/5xx
+  y errores de conexión, respetando Retry-After. Los POST solo se reintentan ante
+  429 (el proveedor no llegó a procesarlos).
+- LatencyTracker: últimas latencias de cada host para estimar su p95 y un
+  presupuesto de cobertura por host (cubeta de fichas: cada petición cubrible
+  aporta UPSTREAM_HEDGE_RATIO fichas y cada segundo intento gasta una), de modo
+  que las peticiones cubiertas no superan esa fracción del tráfico.
+"""
+import math
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from flask import current_app, has_app_context
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_BASE_DELAY = 0.25
+DEFAULT_RETRY_MAX_DELAY = 4.0
+DEFAULT_RETRY_AFTER_MAX = 10.0
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+DEFAULT_HEDGE_RATIO = 0.1
+DEFAULT_HEDGE_BURST = 10
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_HEDGE_MIN_DELAY = 0.05
+DEFAULT_HEDGE_WORKERS = 32
+LATENCY_SAMPLES = 200
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+_tracker = None
+_hedge_executor = None
+_lock = threading.Lock()
+
+
+def _config(name, default):
+    return current_app.config.get(name, default) if has_app_context() else default
+
+
+def parse_retry_after(value):
+    """Segundos de una cabecera Retry-After (número o fecha HTTP); None si no es válida"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Cuándo y cuánto esperar antes de repetir una llamada
+
+    Args:
+        attempts (int): Intentos totales (1 desactiva los reintentos)
+        base_delay (float): Espera base del backoff exponencial
+        max_delay (float): Tope de la espera calculada
+        retry_after_max (float): Un Retry-After mayor no se espera (se devuelve la respuesta)
+        statuses (tuple): Códigos que se reintentan
+    """
+
+    def __init__(self, attempts=DEFAULT_RETRY_ATTEMPTS, base_delay=DEFAULT_RETRY_BASE_DELAY,
+                 max_delay=DEFAULT_RETRY_MAX_DELAY, retry_after_max=DEFAULT_RETRY_AFTER_MAX,
+                 statuses=DEFAULT_RETRY_STATUSES):
+        self.attempts = max(1, int(attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_after_max = retry_after_max
+        self.statuses = frozenset(statuses)
+
+    def backoff(self, attempt):
+        """Backoff exponencial con jitter completo para el intento attempt (desde 0)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def next_delay(self, method, attempt, response=None, error=None):
+        """
+        Segundos a esperar antes del siguiente intento, o None si no hay que reintentar
+
+        Args:
+            attempt (int): Intento que acaba de terminar (desde 0)
+            response: Respuesta obtenida (si la hay)
+            error: Excepción de requests (si la llamada falló)
+        """
+        if attempt + 1 >= self.attempts:
+            return None
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if error is not None:
+            # Sin respuesta: solo es seguro repetir lo idempotente (o si no llegó a conectar)
+            if idempotent and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                return self.backoff(attempt)
+            if isinstance(error, requests.exceptions.ConnectTimeout):
+                return self.backoff(attempt)
+            return None
+        if response is None or response.status_code not in self.statuses:
+            return None
+        if response.status_code != 429 and not idempotent:
+            return None
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is None:
+            return self.backoff(attempt)
+        if retry_after > self.retry_after_max:
+            return None
+        return retry_after + random.uniform(0, self.base_delay)  # Jitter para no volver todos a la vez
+
+
+def get_retry_policy():
+    """Política de reintentos configurada en la app"""
+    return RetryPolicy(
+        attempts=_config('UPSTREAM_RETRY_ATTEMPTS', DEFAULT_RETRY_ATTEMPTS),
+        base_delay=_config('UPSTREAM_RETRY_BASE_DELAY', DEFAULT_RETRY_BASE_DELAY),
+        max_delay=_config('UPSTREAM_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY),
+        retry_after_max=_config('UPSTREAM_RETRY_AFTER_MAX', DEFAULT_RETRY_AFTER_MAX),
+        statuses=_config('UPSTREAM_RETRY_STATUSES', DEFAULT_RETRY_STATUSES)
+    )
+
+
+class LatencyTracker:
+    """Latencias recientes por host (p95) y presupuesto de peticiones cubiertas"""
+
+    def __init__(self, ratio=DEFAULT_HEDGE_RATIO, burst=DEFAULT_HEDGE_BURST, min_samples=DEFAULT_HEDGE_MIN_SAMPLES,
+                 samples=LATENCY_SAMPLES):
+        self.ratio = ratio
+        self.burst = burst
+        self.min_samples = min_samples
+        self.samples = samples
+        self._lock = threading.Lock()
+        self._latencies = {}  # host -> deque de segundos
+        self._tokens = {}  # host -> fichas de cobertura disponibles
+        self._hedges = {}  # host -> [cubiertas, ganadas por el segundo intento]
+
+    def observe(self, host, latency):
+        with self._lock:
+            latencies = self._latencies.get(host)
+            if latencies is None:
+                latencies = self._latencies[host] = deque(maxlen=self.samples)
+            latencies.append(latency)
+
+    def percentile(self, host, q=0.95):
+        """Percentil q de las latencias recientes del host (None con pocas muestras)"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(host, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(math.ceil(q * len(latencies))) - 1)]
+
+    def earn(self, host):
+        """Una petición cubrible suma ratio fichas al presupuesto del host"""
+        with self._lock:
+            self._tokens[host] = min(self.burst, self._tokens.get(host, 0.0) + self.ratio)
+
+    def try_spend(self, host):
+        """Gasta una ficha para lanzar un segundo intento; False si no hay presupuesto"""
+        with self._lock:
+            if self._tokens.get(host, 0.0) < 1:
+                return False
+            self._tokens[host] -= 1
+            self._hedges.setdefault(host, [0, 0])[0] += 1
+            return True
+
+    def hedge_won(self, host):
+        with self._lock:
+            self._hedges.setdefault(host, [0, 0])[1] += 1
+
+    def stats(self):
+        with self._lock:
+            hosts = list(self._latencies)
+            hedges = {host: list(counts) for host, counts in self._hedges.items()}
+        result = {}
+        for host in hosts:
+            p95 = self.percentile(host)
+            sent, won = hedges.get(host, (0, 0))
+            result[host] = {'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                            'hedged': sent, 'hedge_wins': won}
+        return result
+
+
+def get_latency_tracker():
+    """Seguimiento de latencias compartido por el proceso"""
+    global _tracker
+    if _tracker is None:
+        with _lock:
+            if _tracker is None:
+                _tracker = LatencyTracker(
+                    ratio=_config('UPSTREAM_HEDGE_RATIO', DEFAULT_HEDGE_RATIO),
+                    burst=_config('UPSTREAM_HEDGE_BURST', DEFAULT_HEDGE_BURST),
+                    min_samples=_config('UPSTREAM_HEDGE_MIN_SAMPLES', DEFAULT_HEDGE_MIN_SAMPLES)
+                )
+    return _tracker
+
+
+def get_hedge_executor():
+    """Hilos para lanzar en paralelo los intentos de una petición cubierta"""
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=_config('UPSTREAM_HEDGE_WORKERS', DEFAULT_HEDGE_WORKERS),
+                                                     thread_name_prefix='upstream-hedge')
+    return _hedge_executor
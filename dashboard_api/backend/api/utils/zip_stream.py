@@ -0,0 +1,48 @@
+"""
+Construcción incremental de archivos ZIP para respuestas en streaming
+El ZIP nunca se mantiene completo en memoria: cada entrada se emite
+en cuanto se escribe.
+"""
+import zipfile
+
+
+class _StreamBuffer:
+    """Destino de escritura no posicionable que acumula bytes hasta que se drenan"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """
+    Genera un ZIP a partir de un iterable de entradas
+
+    Args:
+        entries: Iterable de tuplas (nombre, bytes, comprimir)
+
+    Yields:
+        bytes: Fragmentos del ZIP listos para enviarse al cliente
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w') as archive:
+        for name, data, compress in entries:
+            compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            archive.writestr(name, data, compress_type=compression)
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    chunk = buffer.drain()
+    if chunk:
+        yield chunk
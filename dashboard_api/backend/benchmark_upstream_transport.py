@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Benchmark del transporte hacia los proveedores: Session de requests con pool
+(HTTP/1.1) frente a Http2Session (HTTP/2 multiplexado).
+
+Levanta en local un servidor que imita a un host *.p.rapidapi.com (TLS con
+certificado autofirmado, HTTP/2 o HTTP/1.1 según ALPN, latencia fija por
+petición) y lanza el mismo lote de peticiones concurrentes con cada transporte,
+configurados con el mismo tamaño de pool que en la app. Por cada uno muestra
+el tiempo total, las peticiones por segundo, los percentiles de latencia y las
+conexiones (es decir, handshakes TLS) que tuvo que aceptar el servidor.
+
+Uso:
+    python benchmark_upstream_transport.py --requests 2000 --concurrency 64
+
+Requiere httpx[http2] y, para el certificado del servidor, cryptography
+(pip install cryptography; no es una dependencia de la app).
+"""
+import ssl
+import json
+import time
+import asyncio
+import logging
+import argparse
+import datetime
+import tempfile
+import threading
+import statistics
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from api.utils.http2_transport import Http2Session, http2_available
+from api.utils.rapidapi import create_upstream_session
+
+BODY = json.dumps({'status': 'ok', 'items': list(range(20))}).encode()
+
+
+def create_certificate(directory):
+    """Certificado autofirmado para localhost (cert, clave)"""
+    try:
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+    except ImportError:
+        raise SystemExit('El servidor de prueba con TLS requiere cryptography: pip install cryptography') from None
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1)).not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost')]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = Path(directory) / 'cert.pem', Path(directory) / 'key.pem'
+    cert_path.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                           serialization.NoEncryption()))
+    return str(cert_path), str(key_path)
+
+
+class StandInServer:
+    """
+    Servidor local que imita a un proveedor: HTTP/2 o HTTP/1.1 (keep-alive) según
+    ALPN, con latencia fija por petición; cuenta conexiones y peticiones
+
+    Args:
+        latency (float): Segundos que tarda cada respuesta
+        tls (bool): Servir con TLS (con False solo HTTP/2 directo o HTTP/1.1 en claro)
+    """
+
+    def __init__(self, latency=0.02, tls=True):
+        self.latency = latency
+        self.tls = tls
+        self.connections = {'h2': 0, 'http/1.1': 0}
+        self.requests = 0
+        self.cert_path = None
+        self.port = None
+        self._tmp = tempfile.TemporaryDirectory()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._server = None
+        self._writers = set()
+
+    @property
+    def base_url(self):
+        return f"{'https' if self.tls else 'http'}://localhost:{self.port}"
+
+    def client_ssl_context(self):
+        return ssl.create_default_context(cafile=self.cert_path)
+
+    def start(self):
+        context = None
+        if self.tls:
+            self.cert_path, key_path = create_certificate(self._tmp.name)
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(self.cert_path, key_path)
+            context.set_alpn_protocols(['h2', 'http/1.1'])
+        self._thread.start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, 'localhost', 0, ssl=context, backlog=1024), self._loop).result()
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        async def shutdown():
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()  # Los handlers terminan al leer el fin de la conexión
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            if tasks:
+                await asyncio.wait(tasks, timeout=2)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._tmp.cleanup()
+
+    def reset(self):
+        self.connections = {'h2': 0, 'http/1.1': 0}
+        self.requests = 0
+
+    async def _handle(self, reader, writer):
+        ssl_object = writer.get_extra_info('ssl_object')
+        protocol = ssl_object.selected_alpn_protocol() if ssl_object else None
+        if protocol is None:
+            # Sin TLS: HTTP/2 directo si el cliente abre con el preámbulo de HTTP/2
+            preface = await reader.read(3)
+            protocol = 'h2' if preface == b'PRI' else 'http/1.1'
+            reader = _Prefixed(reader, preface)
+        self.connections[protocol if protocol == 'h2' else 'http/1.1'] += 1
+        self._writers.add(writer)
+        try:
+            if protocol == 'h2':
+                await self._serve_h2(reader, writer)
+            else:
+                await self._serve_http1(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve_http1(self, reader, writer):
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            if length:
+                await reader.readexactly(length)
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: '
+                         + str(len(BODY)).encode() + b'\r\n\r\n' + BODY)
+            await writer.drain()
+
+    async def _serve_h2(self, reader, writer):
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+
+        connection = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        writer.write(connection.data_to_send())
+
+        async def respond(stream_id):
+            await asyncio.sleep(self.latency)
+            try:
+                connection.send_headers(stream_id, [(':status', '200'), ('content-type', 'application/json'),
+                                                    ('content-length', str(len(BODY)))])
+                connection.send_data(stream_id, BODY, end_stream=True)
+            except h2.exceptions.ProtocolError:
+                return  # El cliente cerró la conexión o el stream mientras tanto
+            writer.write(connection.data_to_send())
+
+        while True:
+            data = await reader.read(65535)
+            if not data:
+                return
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.DataReceived):
+                    connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    self.requests += 1
+                    asyncio.ensure_future(respond(event.stream_id))
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            writer.write(connection.data_to_send())
+            await writer.drain()
+
+
+class _Prefixed:
+    """Reader que devuelve primero los bytes ya leídos para detectar el protocolo"""
+
+    def __init__(self, reader, prefix):
+        self._reader = reader
+        self._prefix = prefix
+
+    async def read(self, n=-1):
+        if self._prefix:
+            data, self._prefix = self._prefix, b''
+            return data
+        return await self._reader.read(n)
+
+    async def readuntil(self, separator):
+        data, self._prefix = self._prefix, b''
+        return data + await self._reader.readuntil(separator)
+
+    async def readexactly(self, n):
+        data, self._prefix = self._prefix[:n], self._prefix[n:]
+        return data + await self._reader.readexactly(n - len(data))
+
+
+def run_load(session, url, total, concurrency, timeout=(3.05, 30), **kwargs):
+    """Lanza total GET concurrentes y devuelve (segundos, latencias, errores)"""
+    def call(_):
+        started = time.perf_counter()
+        try:
+            response = session.request('GET', url, timeout=timeout, headers={'x-rapidapi-key': 'benchmark'}, **kwargs)
+            response.json()
+            return time.perf_counter() - started, response.status_code != 200
+        except Exception:
+            return time.perf_counter() - started, True
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    return time.perf_counter() - started, [latency for latency, _ in results], sum(error for _, error in results)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara el transporte HTTP/1.1 con pool y el HTTP/2 multiplexado')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.02, help='Latencia simulada del proveedor (s)')
+    parser.add_argument('--pool-maxsize', type=int, default=32, help='UPSTREAM_POOL_MAXSIZE')
+    args = parser.parse_args()
+
+    # Con más hilos que conexiones en el pool urllib3 avisa de cada conexión que descarta:
+    # es justo el coste que mide la columna de conexiones
+    logging.getLogger('urllib3.connectionpool').setLevel(logging.ERROR)
+    if not http2_available():
+        raise SystemExit('El transporte HTTP/2 requiere httpx[http2] (pip install "httpx[http2]")')
+
+    server = StandInServer(latency=args.latency).start()
+    url = f'{server.base_url}/v1/benchmark'
+    print(f"{args.requests} peticiones, {args.concurrency} en paralelo, latencia simulada {args.latency * 1000:.0f} ms\n")
+    print(f"{'transporte':<12}{'total s':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'conexiones':>12}{'errores':>9}")
+    try:
+        transports = {
+            # verify por petición: requests antepone REQUESTS_CA_BUNDLE al verify de la Session
+            'http1': (create_upstream_session('http1', pool_connections=args.pool_maxsize,
+                                              pool_maxsize=args.pool_maxsize), {'verify': server.cert_path}),
+            'http2': (Http2Session(max_connections=args.pool_maxsize, keepalive=args.pool_maxsize,
+                                   verify=server.client_ssl_context()), {}),
+        }
+        for transport, (session, options) in transports.items():
+            run_load(session, url, args.concurrency, args.concurrency, **options)  # Calentamiento
+            server.reset()
+            elapsed, latencies, errors = run_load(session, url, args.requests, args.concurrency, **options)
+            connections = sum(server.connections.values())
+            print(f"{transport:<12}{elapsed:>9.2f}{args.requests / elapsed:>9.0f}"
+                  f"{statistics.median(latencies) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+                  f"{percentile(latencies, 0.99) * 1000:>9.1f}{connections:>12}{errors:>9}")
+            session.close()
+    finally:
+        server.stop()
+    print("\nconexiones: conexiones TLS nuevas (handshakes) que aceptó el servidor tras el calentamiento")
+
+
+if __name__ == '__main__':
+    main()
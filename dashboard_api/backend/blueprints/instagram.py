@@ -2,35 +2,18 @@ import logging
 import requests
 from flask import Blueprint, request, jsonify, current_app
 from utils.decorators import handle_api_errors
+from api.utils.canonical import instagram_username
 
 logger = logging.getLogger(__name__)
 instagram_bp = Blueprint('instagram', __name__)
 
 def clean_username(username):
-    """Limpia el nombre de usuario eliminando caracteres no válidos como @"""
+    """Limpia el nombre de usuario ('@usuario' o URL del perfil) con la normalización canónica"""
     if not username:
         return username
-    
-    # Eliminar @ al inicio si está presente
-    if username.startswith('@'):
-        username = username[1:]
-    
-    # Eliminar espacios en blanco
-    username = username.strip()
-    
-    # Eliminar URL si es una URL completa
-    if '/' in username:
-        parts = username.split('/')
-        username = parts[-1]
-        if not username:  # Si termina con /, tomar el penúltimo
-            username = parts[-2]
-    
-    # Eliminar parámetros de URL si existen
-    if '?' in username:
-        username = username.split('?')[0]
-    
-    logger.debug(f"Nombre de usuario limpiado: '{username}'")
-    return username
+    cleaned = instagram_username(username) or username.strip().lstrip('@')
+    logger.debug(f"Nombre de usuario limpiado: '{cleaned}'")
+    return cleaned
 
 @instagram_bp.route('/followers', methods=['GET'])
 @handle_api_errors
@@ -45,7 +45,12 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # Configuración de RapidAPI
-    RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY')
+    # Varias suscripciones (RAPIDAPI_KEYS separadas por comas) se reparten según la cuota de cada una;
+    # RAPIDAPI_KEY, la que ponen las rutas, es por defecto la primera
+    RAPIDAPI_KEYS = [key.strip() for key in os.environ.get('RAPIDAPI_KEYS', '').split(',') if key.strip()]
+    RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY') or (RAPIDAPI_KEYS[0] if RAPIDAPI_KEYS else None)
+    RAPIDAPI_KEY_QUARANTINE = int(os.environ.get('RAPIDAPI_KEY_QUARANTINE', 60))  # Tras un 429 sin Retry-After
+    RAPIDAPI_KEY_FORBIDDEN_QUARANTINE = int(os.environ.get('RAPIDAPI_KEY_FORBIDDEN_QUARANTINE', 3600))  # Tras un 403 de la clave (sin suscripción, inválida)
     RAPIDAPI_HOST = os.environ.get('RAPIDAPI_HOST', 'pagepeeker-shortpixel-image-optimiser-v1.p.rapidapi.com')
     RAPIDAPI_URL = os.environ.get('RAPIDAPI_URL', 'https://pagepeeker-shortpixel-image-optimiser-v1.p.rapidapi.com/v1/reducer.php')
     RAPIDAPI_PICPULSE_HOST = os.environ.get('RAPIDAPI_PICPULSE_HOST', 'picpulse-automated-image-quality-scoring-with-psychology-ai1.p.rapidapi.com')
@@ -62,6 +67,194 @@ class Config:
     GOOGLE_NEWS_DEFAULT_LANGUAGE = 'en-US'
     GOOGLE_NEWS_CACHE_TIMEOUT = 300  # 5 minutos en segundos
     
+    # Trabajos asíncronos (worker de consultas y webhooks)
+    PUBLIC_API_URL = os.environ.get('PUBLIC_API_URL')  # URL pública para recibir webhooks
+    JOBS_WORKER_ENABLED = os.environ.get('JOBS_WORKER_ENABLED', 'true').lower() == 'true'
+    JOBS_POLL_INTERVAL = int(os.environ.get('JOBS_POLL_INTERVAL', 5))
+    RUNWAYML_POLL_BASE_DELAY = int(os.environ.get('RUNWAYML_POLL_BASE_DELAY', 10))
+    RUNWAYML_POLL_MAX_DELAY = int(os.environ.get('RUNWAYML_POLL_MAX_DELAY', 300))
+    RUNWAYML_JOB_MAX_AGE = int(os.environ.get('RUNWAYML_JOB_MAX_AGE', 7200))
+    JOBS_MAX_WORKERS = int(os.environ.get('JOBS_MAX_WORKERS', 4))
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR')  # Por defecto <instance>/job_results
+    JOB_RESULT_RETENTION = int(os.environ.get('JOB_RESULT_RETENTION', 86400))  # 24 horas
+    JOB_MAX_RUNTIME = int(os.environ.get('JOB_MAX_RUNTIME', 3600))
+    
+    # Ejecutor de cómputo: pool de procesos para QR, imágenes y extracción de HTML
+    COMPUTE_WORKERS = int(os.environ.get('COMPUTE_WORKERS') or 0)  # 0: núcleos / WEB_CONCURRENCY
+    COMPUTE_QUEUE_SIZE = int(os.environ.get('COMPUTE_QUEUE_SIZE', 64))  # Tareas en espera además de las que se ejecutan
+    COMPUTE_QUEUE_WAIT = float(os.environ.get('COMPUTE_QUEUE_WAIT', 2))  # Espera por un hueco antes de responder 503
+    COMPUTE_SHM_THRESHOLD = 1024 * 1024  # Buffers desde este tamaño viajan por memoria compartida
+    
+    # Llamadas a proveedores externos: cada petición tiene un presupuesto de tiempo según la
+    # clase de su ruta y ninguna llamada espera más de lo que queda de él (504 al agotarse)
+    UPSTREAM_DEADLINES = {
+        'default': float(os.environ.get('UPSTREAM_DEADLINE', 20)),
+        'fast': 10,  # Consultas simples (WHOIS, SSL, noticias, cotizaciones)
+        'ai': 60,  # Generación de texto
+        'media': 45,  # Descargas y conversiones de ficheros
+        'batch': 120,  # Lotes de dominios
+    }
+    UPSTREAM_ROUTE_CLASSES = {
+        'perplexity': 'ai',
+        'seo_mastermind': 'ai',
+        'ai_humanizer': 'ai',
+        'product_description': 'ai',
+        'social_media_content': 'ai',
+        'prlabs': 'ai',
+        'runwayml': 'media',
+        'media_downloader': 'media',
+        'mediafy': 'media',
+        'speech_to_text': 'media',
+        'pdf_converter': 'media',
+        'domain_intel': 'batch',
+        'google_news': 'fast',
+        'whois_lookup': 'fast',
+        'ssl_checker': 'fast',
+        'crypto_tracker': 'fast',
+    }
+    UPSTREAM_DEFAULT_TIMEOUT = float(os.environ.get('UPSTREAM_DEFAULT_TIMEOUT', 30))  # Tope de lectura si la llamada no fija otro
+    UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+    UPSTREAM_POOL_CONNECTIONS = int(os.environ.get('UPSTREAM_POOL_CONNECTIONS', 16))  # Hosts con conexiones reutilizables
+    UPSTREAM_POOL_MAXSIZE = int(os.environ.get('UPSTREAM_POOL_MAXSIZE', 32))  # Conexiones por host
+    # 'http2' multiplexa las llamadas a cada host en una sola conexión (requiere httpx[http2])
+    UPSTREAM_TRANSPORT = os.environ.get('UPSTREAM_TRANSPORT', 'http1')
+    
+    # Circuit breakers por host de proveedor (estado compartido en Redis, en memoria si no hay Redis)
+    CIRCUIT_BREAKER_BACKEND = os.environ.get('CIRCUIT_BREAKER_BACKEND', 'redis')  # 'redis' o 'local'
+    CIRCUIT_WINDOW = int(os.environ.get('CIRCUIT_WINDOW', 60))  # Ventana deslizante en segundos
+    CIRCUIT_BUCKETS = 6
+    CIRCUIT_MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', 20))  # Llamadas mínimas en la ventana para abrir
+    CIRCUIT_ERROR_THRESHOLD = float(os.environ.get('CIRCUIT_ERROR_THRESHOLD', 0.5))
+    CIRCUIT_SLOW_CALL = float(os.environ.get('CIRCUIT_SLOW_CALL', 5))  # Segundos a partir de los que una llamada es lenta
+    CIRCUIT_SLOW_THRESHOLD = float(os.environ.get('CIRCUIT_SLOW_THRESHOLD', 0.5))
+    CIRCUIT_OPEN_SECONDS = int(os.environ.get('CIRCUIT_OPEN_SECONDS', 30))
+    
+    # Reintentos ante 429/5xx (backoff exponencial con jitter, respetando Retry-After) mientras quede plazo
+    UPSTREAM_RETRY_ATTEMPTS = int(os.environ.get('UPSTREAM_RETRY_ATTEMPTS', 3))  # Intentos totales
+    UPSTREAM_RETRY_BASE_DELAY = 0.25
+    UPSTREAM_RETRY_MAX_DELAY = 4.0
+    UPSTREAM_RETRY_AFTER_MAX = 10.0  # Un Retry-After mayor no se espera
+    UPSTREAM_RETRY_STATUSES = (429, 500, 502, 503, 504)
+    
+    # Peticiones cubiertas: los GET de estas rutas lanzan un segundo intento pasado el p95 del host,
+    # sin superar UPSTREAM_HEDGE_RATIO segundos intentos por petición
+    UPSTREAM_HEDGE_ENABLED = os.environ.get('UPSTREAM_HEDGE_ENABLED', 'true').lower() == 'true'
+    UPSTREAM_HEDGED_ROUTES = ('whois_lookup', 'keyword_insight', 'google_news', 'similarweb')
+    UPSTREAM_HEDGE_RATIO = float(os.environ.get('UPSTREAM_HEDGE_RATIO', 0.1))
+    UPSTREAM_HEDGE_BURST = 10  # Fichas acumulables por host
+    UPSTREAM_HEDGE_MIN_SAMPLES = 20  # Latencias necesarias para estimar el p95
+    UPSTREAM_HEDGE_MIN_DELAY = 0.05
+    UPSTREAM_HEDGE_WORKERS = int(os.environ.get('UPSTREAM_HEDGE_WORKERS', 32))
+    
+    # Memoización de resultados de herramientas deterministas
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 2048))
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    RESULT_CACHE_HIT_COST_RATIO = float(os.environ.get('RESULT_CACHE_HIT_COST_RATIO', 0.5))  # Fracción del costo cobrada en un acierto
+    RESULT_CACHE_DEFAULT_TTL = 3600
+    RESULT_CACHE_TTLS = {
+        'ai_humanizer': 86400,
+        'ai_humanizer_basic': 86400,
+        'product_description': 86400,
+        'social_media_content': 86400,
+        'seo_mastermind': 21600,
+        'perplexity': 900,  # Las búsquedas envejecen rápido
+        'pdf_to_text': 86400,  # Clave por hash del PDF descargado
+        'image_transform': 86400,  # Clave por hash de la imagen, operación y parámetros
+        'image_optimize': 86400,  # Clave por hash de la imagen y opciones
+    }
+    
+    # AI Humanizer: documentos largos divididos en fragmentos
+    HUMANIZER_MAX_WORDS = int(os.environ.get('HUMANIZER_MAX_WORDS', 20000))
+    HUMANIZER_CHUNK_WORDS = int(os.environ.get('HUMANIZER_CHUNK_WORDS', 500))
+    HUMANIZER_MAX_WORKERS = int(os.environ.get('HUMANIZER_MAX_WORKERS', 4))
+    HUMANIZER_CHUNK_RETRIES = int(os.environ.get('HUMANIZER_CHUNK_RETRIES', 2))
+    
+    # Inteligencia de dominios en lote (WHOIS, SSL, Ahrefs, Similarweb)
+    DOMAIN_INTEL_MAX_DOMAINS = int(os.environ.get('DOMAIN_INTEL_MAX_DOMAINS', 500))
+    DOMAIN_INTEL_MAX_WORKERS = int(os.environ.get('DOMAIN_INTEL_MAX_WORKERS', 16))
+    DOMAIN_INTEL_HOST_CONCURRENCY = {  # Peticiones simultáneas por proveedor
+        'default': 4,
+        'whois-lookup-service.p.rapidapi.com': 4,
+        'ssl-checker2.p.rapidapi.com': 6,
+        'domain-metrics-check.p.rapidapi.com': 3,
+        'similarweb-insights.p.rapidapi.com': 3,
+    }
+    
+    # SSL checker: inspección local del certificado con RapidAPI como respaldo
+    SSL_CHECKER_ENGINE = os.environ.get('SSL_CHECKER_ENGINE', 'local')  # 'local' o 'rapidapi'
+    SSL_CHECKER_FALLBACK = os.environ.get('SSL_CHECKER_FALLBACK', 'true').lower() == 'true'
+    SSL_CHECKER_TIMEOUT = float(os.environ.get('SSL_CHECKER_TIMEOUT', 10))  # Máximo por inspección
+    SSL_CHECKER_PORTS = (443, 465, 636, 853, 993, 995, 8443)  # Puertos TLS que se pueden inspeccionar
+    SSL_CHECKER_ALLOW_PRIVATE = False  # Permitir hosts que resuelven a redes internas (solo pruebas)
+    
+    # Vigilancia de caducidad de certificados (watchlist por usuario)
+    SSL_WATCH_ENABLED = os.environ.get('SSL_WATCH_ENABLED', 'true').lower() == 'true'
+    SSL_WATCHLIST_MAX_ENTRIES = int(os.environ.get('SSL_WATCHLIST_MAX_ENTRIES', 1000))
+    SSL_WATCH_THRESHOLDS = [30, 14, 7, 1]  # Días restantes en los que se avisa (además de al caducar)
+    SSL_WATCH_SCAN_INTERVAL = 300  # Cada cuánto busca el escáner entradas pendientes (segundos)
+    SSL_WATCH_INTERVAL = 12 * 3600  # Tiempo entre revisiones de un mismo certificado
+    SSL_WATCH_RETRY_INTERVAL = 3600  # Reintento tras un error de conexión
+    SSL_WATCH_BATCH_SIZE = 2000
+    SSL_WATCH_CONCURRENCY = int(os.environ.get('SSL_WATCH_CONCURRENCY', 64))  # Handshakes simultáneos
+    SSL_WATCH_JITTER = 0.5  # Espera aleatoria máxima antes de cada handshake (segundos)
+    SSL_WATCH_LEASE = 900  # Aplazamiento de las entradas tomadas por un escaneo en curso
+    
+    # Descarga de páginas para las herramientas basadas en URL
+    PAGE_FETCH_MAX_BYTES = int(os.environ.get('PAGE_FETCH_MAX_BYTES', 5 * 1024 * 1024))
+    PAGE_FETCH_TIMEOUT = float(os.environ.get('PAGE_FETCH_TIMEOUT', 15))
+    PAGE_FETCH_ALLOW_PRIVATE = False  # Permitir URLs que resuelven a redes internas (solo pruebas)
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 2048))
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+    PAGE_CACHE_TTL = 86400  # Tiempo que se conserva una copia para revalidarla
+    PAGE_CACHE_FRESH_SECONDS = 60  # Copia servida sin revalidar si el servidor no indica max-age
+    PAGE_CACHE_MAX_FRESH_SECONDS = 3600  # Tope al max-age del servidor
+    PDF_URL_MAX_BYTES = int(os.environ.get('PDF_URL_MAX_BYTES', 20 * 1024 * 1024))
+    
+    # SEO Analyzer: auditoría on-page local; seo-analyzer3 solo como respaldo opcional
+    SEO_ANALYZER_ENGINE = os.environ.get('SEO_ANALYZER_ENGINE', 'local')  # 'local' o 'rapidapi'
+    SEO_ANALYZER_FALLBACK = os.environ.get('SEO_ANALYZER_FALLBACK', 'false').lower() == 'true'
+    SEO_AUDIT_BODY_BUDGET = 256 * 1024  # Caracteres del <body> analizados tras el <head>
+
+    # Extracción de texto: motor local (readability en el pool de procesos) con Text Extract como respaldo
+    TEXT_EXTRACT_ENGINE = os.environ.get('TEXT_EXTRACT_ENGINE', 'local')  # 'local' o 'rapidapi'
+    TEXT_EXTRACT_FALLBACK = os.environ.get('TEXT_EXTRACT_FALLBACK', 'true').lower() == 'true'
+    TEXT_EXTRACT_TIMEOUT = int(os.environ.get('TEXT_EXTRACT_TIMEOUT', 5))
+    TEXT_EXTRACT_MAX_BYTES = int(os.environ.get('TEXT_EXTRACT_MAX_BYTES', 2 * 1024 * 1024))
+
+    # Manipulación de imágenes: motor local con Pillow; pdf_to_images sigue en el proveedor remoto
+    IMAGE_MANIPULATION_ENGINE = os.environ.get('IMAGE_MANIPULATION_ENGINE', 'local')  # 'local' o 'rapidapi'
+    IMAGE_SOURCE_MAX_BYTES = int(os.environ.get('IMAGE_SOURCE_MAX_BYTES', 20 * 1024 * 1024))
+    IMAGE_TRANSFORM_TIMEOUT = int(os.environ.get('IMAGE_TRANSFORM_TIMEOUT', 15))
+
+    # Optimización de imágenes: motor local (búsqueda de calidad por SSIM); mode=max usa ShortPixel
+    IMAGE_OPTIMIZER_ENGINE = os.environ.get('IMAGE_OPTIMIZER_ENGINE', 'local')  # 'local' o 'rapidapi'
+    IMAGE_OPTIMIZER_SSIM = float(os.environ.get('IMAGE_OPTIMIZER_SSIM', 0.985))
+    IMAGE_OPTIMIZER_MAX_BYTES = int(os.environ.get('IMAGE_OPTIMIZER_MAX_BYTES', 20 * 1024 * 1024))
+    IMAGE_OPTIMIZER_TIMEOUT = int(os.environ.get('IMAGE_OPTIMIZER_TIMEOUT', 15))
+
+    # PicPulse: las imágenes grandes se reducen a la resolución de análisis y los resultados
+    # se reutilizan para fotos casi idénticas (hash perceptual) con la misma audiencia
+    PICPULSE_MAX_SIDE = int(os.environ.get('PICPULSE_MAX_SIDE', 1024))
+    PICPULSE_MAX_UPLOAD_BYTES = 2 * 1024 * 1024  # Límite del proveedor
+    PICPULSE_MAX_INPUT_BYTES = int(os.environ.get('PICPULSE_MAX_INPUT_BYTES', 20 * 1024 * 1024))
+    PICPULSE_CACHE_ENTRIES = int(os.environ.get('PICPULSE_CACHE_ENTRIES', 1024))
+    PICPULSE_CACHE_TTL = 7 * 86400
+    PICPULSE_HASH_DISTANCE = 4  # Bits de pHash que pueden diferir (el doble en dHash)
+    
+    # Perfiles de dominio: antigüedad máxima (segundos) de cada fuente antes de volver a consultarla
+    DOMAIN_PROFILE_MAX_AGE = {
+        'whois': 7 * 86400,
+        'ahrefs': 3 * 86400,
+        'similarweb': 86400,
+        'seo': 86400,
+        'seo_audit': 86400,
+        'ssl': 6 * 3600,
+        'website_analysis': 3600,
+        'speed': 15 * 60,
+    }
+    
     # Instagram API config
     INSTAGRAM_API_BASE_URL = os.environ.get('INSTAGRAM_API_BASE_URL')
     INSTAGRAM_API_KEY = os.environ.get('INSTAGRAM_API_KEY')
@@ -98,6 +291,10 @@ class TestingConfig(Config):
     DEBUG = True
     LOG_LEVEL = 'DEBUG'
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URI', 'sqlite:///:memory:')
+    JOBS_WORKER_ENABLED = False
+    SSL_WATCH_ENABLED = False
+    CIRCUIT_BREAKER_BACKEND = 'local'
+    UPSTREAM_RETRY_ATTEMPTS = 1
 
 class ProductionConfig(Config):
     """Configuración para producción"""
@@ -108,7 +305,6 @@ class ProductionConfig(Config):
     # En producción, se deben establecer valores seguros para las claves secretas
     SECRET_KEY = os.environ.get('SECRET_KEY')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
-    RAPIDAPI_KEY = os.environ.get('RAPIDAPI_KEY')
 
 # Mapeo de configuraciones según el entorno
 config_by_name = {
@@ -0,0 +1,32 @@
+"""Add idempotency, credits and retention columns to jobs
+
+Revision ID: b7e2d9c1f4a3
+Revises: a1f3c2d4e5b6
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d9c1f4a3'
+down_revision = 'a1f3c2d4e5b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('jobs', sa.Column('idempotency_key', sa.String(length=100), nullable=True))
+    op.add_column('jobs', sa.Column('credits', sa.Integer(), nullable=True))
+    op.add_column('jobs', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.create_index('uq_jobs_user_idempotency_key', 'jobs', ['user_id', 'idempotency_key'], unique=True)
+    op.create_index(op.f('ix_jobs_expires_at'), 'jobs', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_jobs_expires_at'), table_name='jobs')
+    op.drop_index('uq_jobs_user_idempotency_key', table_name='jobs')
+    op.drop_column('jobs', 'expires_at')
+    op.drop_column('jobs', 'credits')
+    op.drop_column('jobs', 'idempotency_key')
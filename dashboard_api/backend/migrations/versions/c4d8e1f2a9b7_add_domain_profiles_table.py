@@ -0,0 +1,35 @@
+"""Add domain_profiles table
+
+Revision ID: c4d8e1f2a9b7
+Revises: b7e2d9c1f4a3
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e1f2a9b7'
+down_revision = 'b7e2d9c1f4a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('domain_profiles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('domain', sa.String(length=253), nullable=False),
+    sa.Column('source', sa.String(length=50), nullable=False),
+    sa.Column('path', sa.String(length=512), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('domain', 'source', 'path', name='uq_domain_profiles_domain_source_path')
+    )
+    op.create_index(op.f('ix_domain_profiles_domain'), 'domain_profiles', ['domain'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_domain_profiles_domain'), table_name='domain_profiles')
+    op.drop_table('domain_profiles')
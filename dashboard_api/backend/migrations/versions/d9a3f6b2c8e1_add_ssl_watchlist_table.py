@@ -0,0 +1,45 @@
+"""Add ssl_watchlist table
+
+Revision ID: d9a3f6b2c8e1
+Revises: c4d8e1f2a9b7
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3f6b2c8e1'
+down_revision = 'c4d8e1f2a9b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ssl_watchlist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('host', sa.String(length=253), nullable=False),
+    sa.Column('port', sa.Integer(), nullable=False),
+    sa.Column('issuer', sa.String(length=255), nullable=True),
+    sa.Column('valid_until', sa.DateTime(), nullable=True),
+    sa.Column('days_left', sa.Integer(), nullable=True),
+    sa.Column('is_valid', sa.Boolean(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('notified_threshold', sa.Integer(), nullable=True),
+    sa.Column('last_checked_at', sa.DateTime(), nullable=True),
+    sa.Column('next_check_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'host', 'port', name='uq_ssl_watchlist_user_host_port')
+    )
+    op.create_index(op.f('ix_ssl_watchlist_user_id'), 'ssl_watchlist', ['user_id'], unique=False)
+    op.create_index(op.f('ix_ssl_watchlist_next_check_at'), 'ssl_watchlist', ['next_check_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ssl_watchlist_next_check_at'), table_name='ssl_watchlist')
+    op.drop_index(op.f('ix_ssl_watchlist_user_id'), table_name='ssl_watchlist')
+    op.drop_table('ssl_watchlist')
@@ -142,9 +142,13 @@ const AdvancedImageManipulation = () => {
     setError(null);
     setProcessedImageUrl(null);
     try {
+      const token = localStorage.getItem('token');
       const response = await fetch(`${API_BASE_URL}/image-manipulation`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          ...(token ? { 'Authorization': `Bearer ${token}` } : {})
+        },
         body: JSON.stringify({
           operation,
           source_url: imageUrl,
@@ -1,5 +1,6 @@
 import os
 import pytest
+import requests
 from backend.app import create_app
 
 @pytest.fixture
@@ -20,4 +21,99 @@ def client(app):
 @pytest.fixture
 def runner(app):
     """Runner de comandos para pruebas CLI."""
-    return app.test_cli_runner() 
\ No newline at end of file
+    return app.test_cli_runner() 
+
+class FakeResponse:
+    """Respuesta de requests mínima para simular a un proveedor externo"""
+
+    def __init__(self, status_code=200, body=None, content=b'', headers=None):
+        self.status_code = status_code
+        self._body = body
+        self.content = content
+        self.headers = headers or {}
+        self.text = str(body)
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f'{self.status_code} Error', response=self)
+
+
+@pytest.fixture
+def app_with_user():
+    """
+    Fábrica de apps de prueba con la base de datos creada y un usuario con sesión.
+    app_with_user(credits=250, **config) devuelve la app (con su contexto activo)
+    con TEST_USER_ID y TEST_TOKEN en la configuración; al terminar se borra la base.
+    """
+    from flask_jwt_extended import create_access_token
+    from api import create_app as create_api_app, db
+    from api.models.user import User
+    from config import TestingConfig
+
+    contexts = []
+
+    def make(credits=250, **config):
+        app = create_api_app(TestingConfig)
+        app.config.update(config)
+        context = app.app_context()
+        context.push()
+        contexts.append(context)
+        db.create_all()
+        user = User('tester@example.com', 'secret', 'Tester', credits=credits)
+        db.session.add(user)
+        db.session.commit()
+        app.config['TEST_USER_ID'] = user.id
+        app.config['TEST_TOKEN'] = create_access_token(identity=str(user.id))
+        return app
+
+    yield make
+    for context in reversed(contexts):
+        db.session.remove()
+        db.drop_all()
+        context.pop()
+
+
+@pytest.fixture
+def page_server():
+    """
+    Servidor HTTP local para las herramientas que descargan páginas.
+    Las rutas se registran en server.routes: path -> (status, headers, body) o una
+    función que recibe las cabeceras de la petición y devuelve esa tupla.
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.server.requests.append((self.path, dict(self.headers)))
+            route = self.server.routes.get(self.path)
+            if route is None:
+                status, headers, body = 404, {}, b'not found'
+            else:
+                status, headers, body = route(self.headers) if callable(route) else route
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.routes = {}
+    server.requests = []
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,58 @@
+import pytest
+
+from api.utils.canonical import canonical_domain, canonical_url, instagram_username, tiktok_username
+from api.utils.domain_profiles import profile_key_for_url
+from api.utils.result_cache import canonical_key
+
+
+@pytest.mark.parametrize('value', [
+    'Example.com/',
+    'https://example.com',
+    'example.com?utm_source=x',
+    'HTTPS://EXAMPLE.COM:443/#top',
+    'https://example.com/?fbclid=abc&utm_medium=social',
+])
+def test_equivalent_urls_share_canonical_form(value):
+    assert canonical_url(value) == 'https://example.com/'
+
+
+def test_canonical_url_rules():
+    assert canonical_url('https://Bücher.de/a/./b/../c?z=1&a=2&gclid=9') == 'https://xn--bcher-kva.de/a/c?a=2&z=1'
+    assert canonical_url('http://example.com:8080/%7euser/%2f') == 'http://example.com:8080/~user/%2F'
+    assert canonical_url('https://example.com/blog/') == 'https://example.com/blog/'
+    assert canonical_url('https://example.com/blog') == 'https://example.com/blog'
+
+
+def test_canonical_domain():
+    assert canonical_domain('https://www.Bücher.de/x?y=1') == 'xn--bcher-kva.de'
+    assert canonical_domain('EXAMPLE.com.') == 'example.com'
+    assert canonical_domain('localhost') is None and canonical_domain('') is None
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('@Foo.Bar', 'foo.bar'),
+    ('https://www.instagram.com/foo_bar/?hl=es', 'foo_bar'),
+    ('instagram.com/stories/foo/123', 'foo'),
+    ('https://instagram.com/p/Cabc123/', None),
+    ('https://example.com/foo', None),
+])
+def test_instagram_username(value, expected):
+    assert instagram_username(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('@Foo', 'foo'),
+    ('https://www.tiktok.com/@foo.bar/video/123?lang=es', 'foo.bar'),
+    ('https://vm.tiktok.com/ZMabc/', None),
+    ('tiktok.com/discover', None),
+])
+def test_tiktok_username(value, expected):
+    assert tiktok_username(value) == expected
+
+
+def test_cache_keys_ignore_url_spelling():
+    assert canonical_key('tool', {'url': 'Example.com/?utm_source=x'}) == \
+        canonical_key('tool', {'url': 'https://example.com'})
+    assert profile_key_for_url('https://www.example.com/a?utm_campaign=x&b=1') == ('example.com', '/a?b=1')
+    assert canonical_key('tool', {'args': {'url': ['example.com/?utm_source=x']}}) == \
+        canonical_key('tool', {'args': {'url': ['https://example.com/']}})
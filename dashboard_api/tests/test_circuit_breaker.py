@@ -0,0 +1,124 @@
+import time
+from unittest import mock
+
+import pytest
+import redis
+import requests
+
+from api import db
+from api.models.app import ApiUsage, App
+from api.models.user import User
+from api.routes.stats import get_api_performance
+from api.utils import circuit_breaker
+from api.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreakers, CircuitOpenError
+from api.utils.rapidapi import _send
+from api.utils.upstream_policy import LatencyTracker
+
+NEWS_HOST = 'google-news13.p.rapidapi.com'
+
+
+@pytest.fixture
+def breaker_app(app_with_user):
+    app = app_with_user(credits=10, MODE='beta_v2', CIRCUIT_MIN_CALLS=4)
+    db.session.add(App('google-news', 'Google News', 'Noticias', 'news', '/apps/google-news', 'google-news13'))
+    db.session.commit()
+    with mock.patch.object(circuit_breaker, '_breakers', None):
+        yield app
+
+
+def world_news(app, session):
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        return app.test_client().get('/api/beta_v1/google-news/world',
+                                     headers={'Authorization': f"Bearer {app.config['TEST_TOKEN']}"})
+
+
+def test_breaker_opens_probes_and_closes():
+    breakers = CircuitBreakers(min_calls=4, open_seconds=0.2)
+    for failed in (False, True, False, True):
+        assert breakers.before_call('api.example.com') is False
+        breakers.record('api.example.com', 0.1, failed=failed)
+    assert breakers.state('api.example.com')['state'] == OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breakers.before_call('api.example.com')
+    assert error.value.status_code == 503 and error.value.retry_after == 1
+
+    time.sleep(0.25)
+    assert breakers.before_call('api.example.com') is True  # Una sola llamada de prueba
+    assert breakers.state('api.example.com')['state'] == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breakers.before_call('api.example.com')
+    breakers.record('api.example.com', 0.1, failed=False, probe=True)
+    assert breakers.state('api.example.com') == dict(breakers.state('api.example.com'), state=CLOSED, calls=0)
+
+
+def test_probe_cut_by_our_deadline_leaves_circuit_half_open():
+    breakers = CircuitBreakers(min_calls=2, open_seconds=0.1)
+    for _ in range(2):
+        breakers.record('api.example.com', 0.1, failed=True)
+    time.sleep(0.15)
+    assert breakers.before_call('api.example.com') is True
+
+    session = mock.Mock()
+    session.request.side_effect = requests.exceptions.ReadTimeout('read timed out')
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session), \
+            pytest.raises(requests.exceptions.ReadTimeout):
+        _send(breakers, LatencyTracker(), 'GET', 'https://api.example.com/', 'api.example.com', (1, 1),
+              True, None, time.monotonic(), {})
+
+    # Sin veredicto: sigue semiabierto y la siguiente llamada vuelve a ser la de prueba
+    assert breakers.state('api.example.com')['state'] == HALF_OPEN
+    assert breakers.before_call('api.example.com') is True
+
+
+def test_slow_calls_trip_and_redis_outage_falls_back_to_memory():
+    client = mock.Mock()
+    client.hmget.side_effect = client.pipeline.side_effect = redis.ConnectionError('sin conexión')
+    breakers = CircuitBreakers(redis_client=client, min_calls=2, slow_call=1.0)
+    for _ in range(2):
+        breakers.before_call('lento.example.com')
+        breakers.record('lento.example.com', 2.5, failed=False)
+
+    assert breakers.state('lento.example.com')['state'] == OPEN
+    assert breakers.state('lento.example.com')['slow_rate'] == 1.0
+    assert client.hmget.call_count == 1  # Tras el primer fallo no se insiste con Redis
+
+
+def test_open_circuit_fails_fast_and_refunds(breaker_app):
+    failing = mock.Mock()
+    failing.request.side_effect = requests.exceptions.ConnectionError('reset')
+    for _ in range(4):
+        assert world_news(breaker_app, failing).status_code == 500
+    assert failing.request.call_count == 4
+
+    response = world_news(breaker_app, failing)
+    assert response.status_code == 503 and int(response.headers['Retry-After']) > 0
+    assert response.headers['X-Credits-Refunded'] == '1'
+    assert failing.request.call_count == 4  # El proveedor ya no se llama
+    assert User.query.get(breaker_app.config['TEST_USER_ID']).credits == 10 - 4
+
+
+def test_dashboard_status_follows_breaker(breaker_app):
+    healthy = mock.Mock()
+    healthy.request.return_value = mock.Mock(status_code=200, json=mock.Mock(return_value={'items': []}))
+    assert world_news(breaker_app, healthy).status_code == 200
+
+    [performance] = get_api_performance()
+    assert performance['status'] == 'Operativo' and performance['circuits'][0]['host'] == NEWS_HOST
+
+    breakers = circuit_breaker.get_circuit_breakers()
+    for _ in range(4):
+        breakers.record(NEWS_HOST, 0.2, failed=True)
+    [performance] = get_api_performance()
+    assert performance['status'] == 'Crítico' and performance['circuits'][0]['state'] == OPEN
+
+
+def test_dashboard_status_falls_back_to_uptime_without_circuits(breaker_app):
+    user_id = breaker_app.config['TEST_USER_ID']
+    db.session.add_all([ApiUsage(app_id='google-news', user_id=user_id, endpoint='/world', status_code=code,
+                                 response_time=120) for code in (200, 200, 200, 500)])
+    db.session.commit()
+
+    [performance] = get_api_performance()  # Tras un reinicio aún no se conoce ningún circuito
+    assert performance['circuits'] == []
+    assert performance['status'] == 'Crítico' and performance['uptime'] == 75.0
@@ -0,0 +1,114 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+import requests
+from flask import g
+
+from api.utils.deadline import DeadlineExceeded, start_deadline, upstream_timeout
+from api.utils.rapidapi import create_upstream_session
+
+
+@pytest.fixture
+def deadline_app(app_with_user):
+    return app_with_user(credits=20)
+
+
+def auth(app):
+    return {'Authorization': f"Bearer {app.config['TEST_TOKEN']}"}
+
+
+def upstream_response(payload):
+    response = mock.Mock(status_code=200, text='{}')
+    response.json.return_value = payload
+    return response
+
+
+def expire_and_timeout(*args, **kwargs):
+    g.deadline = 0  # El plazo vence mientras se espera al proveedor
+    raise requests.exceptions.Timeout('read timed out')
+
+
+def test_timeout_is_capped_by_remaining_budget(deadline_app):
+    with deadline_app.test_request_context():
+        assert upstream_timeout(5) == 5  # Sin plazo en curso manda el tope de la llamada
+        start_deadline(2)
+        assert 1.5 < upstream_timeout(30) <= 2
+        start_deadline(0.1)
+        with pytest.raises(DeadlineExceeded) as error:
+            upstream_timeout(30)
+        assert error.value.status_code == 504 and g.deadline_exceeded
+
+
+def test_route_class_sets_call_timeout(deadline_app):
+    session = mock.Mock()
+    session.request.return_value = upstream_response({'asn': 'AS15169'})
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        response = deadline_app.test_client().post('/api/beta_v1/whois-lookup/asn', json={'asn': '15169'},
+                                                   headers=auth(deadline_app))
+
+    assert response.status_code == 200
+    connect, read = session.request.call_args.kwargs['timeout']
+    assert connect == deadline_app.config['UPSTREAM_CONNECT_TIMEOUT']
+    assert 9 < read <= deadline_app.config['UPSTREAM_DEADLINES']['fast']  # Pedía 20 s, la clase 'fast' da 10
+
+
+def test_exhausted_budget_returns_504(deadline_app):
+    session = mock.Mock()
+    session.request.side_effect = expire_and_timeout
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        response = deadline_app.test_client().get('/api/beta_v1/google-news/world', headers=auth(deadline_app))
+
+    # La ruta captura cualquier error y responde 500: el hook lo convierte en 504
+    assert response.status_code == 504
+    assert session.request.call_count == 1
+
+
+def test_partial_results_travel_with_the_504(deadline_app):
+    session = mock.Mock()
+    responses = [upstream_response({'username': 'nasa'}), upstream_response({'highlights': []})]
+    session.request.side_effect = lambda *args, **kwargs: responses.pop(0) if responses else expire_and_timeout()
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        response = deadline_app.test_client().get('/api/beta_v1/instagram/full-profile?username=nasa',
+                                                  headers=auth(deadline_app))
+
+    assert response.status_code == 504
+    assert response.json['partial'] == {'profile': {'username': 'nasa'}, 'highlights': {'highlights': []}}
+    assert session.request.call_count == 3
+
+
+class DripHandler(BaseHTTPRequestHandler):
+    """Responde a tiempo pero envía el cuerpo gota a gota"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '40')
+        self.end_headers()
+        for _ in range(40):
+            self.wfile.write(b'x')
+            self.wfile.flush()
+            time.sleep(0.05)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_slow_body_cannot_outlive_the_deadline():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DripHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/'
+    session = create_upstream_session('http1')
+    try:
+        started = time.monotonic()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            # Cada bloque llega dentro del timeout de lectura; el total pasaría de 2 s
+            session.request('GET', url, timeout=(1, 1), deadline=started + 0.3)
+        assert time.monotonic() - started < 1
+
+        assert session.request('GET', url, timeout=(1, 1), deadline=time.monotonic() + 5).content == b'x' * 40
+    finally:
+        session.close()
+        server.shutdown()
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from api.models.user import User
+from api.utils import domain_intel
+from api.utils.domain_intel import canonical_domain, parse_domains
+from tests.conftest import FakeResponse
+
+
+@pytest.fixture
+def intel_app(app_with_user):
+    app = app_with_user(credits=100, MODE='beta_v2', DOMAIN_INTEL_HOST_CONCURRENCY={'default': 2})
+    with mock.patch.object(domain_intel, '_host_semaphores', {}):
+        yield app
+
+
+def test_canonical_domain_and_dedupe():
+    assert canonical_domain('HTTPS://www.Example.com:8443/path?q=1') == 'example.com'
+    assert canonical_domain('münchen.de') == 'xn--mnchen-3ya.de'
+    assert canonical_domain('localhost') is None
+
+    domains, invalid = parse_domains(['example.com', 'http://EXAMPLE.com/', 'otro.org', 'nope'], 10)
+    assert list(domains) == ['example.com', 'otro.org']
+    assert domains['example.com'] == ['example.com', 'http://EXAMPLE.com/']
+    assert invalid == ['nope']
+
+
+def test_bulk_streams_ndjson_with_host_limits_and_cache(intel_app):
+    lock = threading.Lock()
+    active = {'now': 0, 'max': 0}
+
+    def fake_get(url, headers, params=None, timeout=None):
+        with lock:
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.02)
+        with lock:
+            active['now'] -= 1
+        if params['url'] == 'broken.com':
+            return FakeResponse(500, {'message': 'boom'})
+        return FakeResponse(200, {'domain': params['url']})
+
+    client = intel_app.test_client()
+    headers = {'Authorization': f"Bearer {intel_app.config['TEST_TOKEN']}"}
+    body = {'domains': ['a.com', 'www.a.com', 'b.com', 'c.com', 'broken.com', '???'], 'checks': ['whois']}
+
+    with mock.patch('api.utils.domain_intel.upstream_get', side_effect=fake_get) as get:
+        response = client.post('/api/beta_v1/domain-intel/bulk', json=body, headers=headers)
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        again = client.post('/api/beta_v1/domain-intel/bulk', json={'domains': ['a.com'], 'checks': ['whois']},
+                            headers=headers)
+        again_lines = [json.loads(line) for line in again.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert lines[0] == {'type': 'invalid', 'input': '???'}
+    reports = {line['domain']: line for line in lines if line['type'] == 'domain'}
+    assert set(reports) == {'a.com', 'b.com', 'c.com', 'broken.com'}
+    assert reports['a.com']['input'] == ['a.com', 'www.a.com']
+    assert 'whois' in reports['broken.com']['errors']
+    assert lines[-1]['type'] == 'summary' and lines[-1]['credits_charged'] == 3
+    assert active['max'] <= 2
+    assert get.call_count == 4
+
+    # El segundo lote reutiliza el resultado en caché (cobrado con descuento)
+    assert again_lines[0]['cached'] == ['whois']
+    assert again_lines[-1]['credits_charged'] == 0
+    assert User.query.get(intel_app.config['TEST_USER_ID']).credits == 97
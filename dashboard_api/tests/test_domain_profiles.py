@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from api import db
+from api.models.domain_profile import DomainProfile
+from api.utils.domain_profiles import profile_key_for_url
+from tests.conftest import FakeResponse
+
+
+@pytest.fixture
+def profile_app(app_with_user):
+    return app_with_user()
+
+
+def test_profile_key_for_url():
+    assert profile_key_for_url('https://WWW.Example.com/blog?p=1') == ('example.com', '/blog?p=1')
+    assert profile_key_for_url('example.com') == ('example.com', '/')
+    assert profile_key_for_url('nope') == (None, None)
+
+
+def test_whois_reads_through_store_and_refetches_stale(profile_app):
+    client = profile_app.test_client()
+    headers = {'Authorization': f"Bearer {profile_app.config['TEST_TOKEN']}"}
+
+    with mock.patch('api.routes.whois_lookup.upstream_get',
+                    return_value=FakeResponse(200, {'registrar': 'ACME'})) as get:
+        first = client.post('/api/beta_v1/whois-lookup/domain', json={'url': 'https://www.example.com/x'}, headers=headers)
+        second = client.post('/api/beta_v1/whois-lookup/domain', json={'url': 'example.com'}, headers=headers)
+        assert get.call_count == 1
+
+        # Un dato más viejo que su antigüedad máxima se vuelve a consultar
+        record = DomainProfile.query.filter_by(domain='example.com', source='whois').one()
+        record.fetched_at = datetime.utcnow() - timedelta(days=8)
+        db.session.commit()
+        third = client.post('/api/beta_v1/whois-lookup/domain', json={'url': 'example.com'}, headers=headers)
+        assert get.call_count == 2
+
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT' and second.json == {'registrar': 'ACME'}
+    assert third.headers['X-Cache'] == 'MISS'
+
+    profile = client.get('/api/beta_v1/domain-intel/profile/example.com', headers=headers).json
+    assert profile['facets']['whois']['fresh'] is True
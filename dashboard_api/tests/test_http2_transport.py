@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import gzip
+
+import pytest
+import requests
+
+from api.utils.http2_transport import Http2Session, http2_available
+from api.utils.rapidapi import create_upstream_session
+
+pytestmark = pytest.mark.skipif(not http2_available(), reason='requiere httpx[http2]')
+
+
+@pytest.fixture
+def server():
+    from benchmark_upstream_transport import StandInServer
+    server = StandInServer(latency=0.05, tls=False).start()
+    yield server
+    server.stop()
+
+
+def test_concurrent_calls_share_one_http2_connection(server):
+    session = Http2Session(http1=False)  # HTTP/2 directo: el servidor de prueba va sin TLS
+    url = f'{server.base_url}/v1/noticias'
+
+    response = session.post(url, json={'q': 'x'}, timeout=(1, 5))
+    assert response.status_code == 200 and response.ok and response.http_version == 'HTTP/2'
+    assert response.json()['status'] == 'ok'
+    response.raise_for_status()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        statuses = list(executor.map(lambda _: session.get(url, timeout=(1, 5)).status_code, range(32)))
+    assert statuses == [200] * 32
+    assert server.connections == {'h2': 1, 'http/1.1': 0} and server.requests == 33
+    session.close()
+
+
+def test_errors_surface_as_requests_exceptions(server):
+    session = Http2Session(http1=False)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        session.get(f'{server.base_url}/lento', timeout=(1, 0.01))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get('http://localhost:1/cerrado', timeout=(1, 1))
+    session.close()
+
+
+def test_other_httpx_errors_map_to_requests_exceptions():
+    import httpx
+
+    def handler(request):
+        if request.url.path == '/bucle':
+            return httpx.Response(302, headers={'Location': str(request.url)})
+        return httpx.Response(200, headers={'Content-Encoding': 'gzip'}, content=gzip.compress(b'ok')[:-4] + b'xxxx')
+
+    session = Http2Session()
+    session.client = httpx.Client(transport=httpx.MockTransport(handler))
+    with pytest.raises(requests.exceptions.TooManyRedirects):
+        session.get('https://api.example.com/bucle', timeout=(1, 1))
+    with pytest.raises(requests.exceptions.InvalidURL):
+        session.get('http://[::1', timeout=(1, 1))
+    with pytest.raises(requests.exceptions.ContentDecodingError):
+        session.get('https://api.example.com/comprimido', timeout=(1, 1))
+    session.close()
+
+
+def test_transport_is_chosen_by_config():
+    assert isinstance(create_upstream_session('http2'), Http2Session)
+    assert isinstance(create_upstream_session('http1'), requests.Session)
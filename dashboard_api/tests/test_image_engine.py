@@ -0,0 +1,145 @@
+import base64
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+import requests
+from PIL import Image
+from flask_jwt_extended import create_access_token
+
+from api import create_app
+from api.utils import page_fetch, result_cache
+from api.utils.image_engine import (ImageEngineError, normalize_params, normalize_steps, open_image,
+                                    run_pipeline, transform_image)
+from api.utils.process_pool import ComputeExecutor
+from api.utils.rapidapi import upstream_get
+from config import TestingConfig
+
+
+def make_image(size=(400, 200), color=(200, 30, 30, 255), fmt='PNG'):
+    image = Image.new('RGBA' if fmt == 'PNG' else 'RGB', size, color if fmt == 'PNG' else color[:3])
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+@pytest.fixture
+def image_app():
+    app = create_app(TestingConfig)
+    app.config['PAGE_FETCH_ALLOW_PRIVATE'] = True
+    with app.app_context(), ThreadPoolExecutor(max_workers=2) as executor, \
+            mock.patch.object(page_fetch, '_page_cache', None), \
+            mock.patch.object(result_cache, '_result_cache', None), \
+            mock.patch('api.routes.advanced_image_manipulation.get_compute_executor', return_value=ComputeExecutor(2, executor=executor)):
+        app.config['TEST_HEADERS'] = {'Authorization': f"Bearer {create_access_token(identity='1')}"}
+        yield app
+
+
+@pytest.mark.parametrize('operation, params, size', [
+    ('resize', {'width': 100}, (100, 50)),
+    ('thumbnail', {'width': 80, 'height': 80}, (80, 40)),
+    ('crop', {'left': 10, 'upper': 20, 'right': 110, 'lower': 70}, (100, 50)),
+    ('rotate', {'angle': 90}, (200, 400)),
+    ('transpose', {'method': 'rotate_90'}, (200, 400)),
+    ('blur', {'blur': 3}, (400, 200)),
+])
+def test_transforms(operation, params, size):
+    data, content_type, width, height = transform_image(make_image(), operation, normalize_params(operation, params))
+    assert content_type == 'image/png'
+    assert (width, height) == size == decode(data).size
+
+
+def test_convert_flattens_transparency_for_jpeg():
+    data, content_type, _, _ = transform_image(make_image(color=(0, 0, 0, 0)), 'convert',
+                                               normalize_params('convert', {'convert_to': 'jpg'}))
+    image = decode(data)
+    assert content_type == 'image/jpeg' and image.mode == 'RGB'
+    assert image.getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_invalid_params_and_images_are_rejected():
+    with pytest.raises(ImageEngineError):
+        normalize_params('crop', {'left': 50, 'upper': 0, 'right': 10, 'lower': 10})
+    with pytest.raises(ImageEngineError):
+        normalize_params('resize', {})
+    with pytest.raises(ImageEngineError):
+        transform_image(b'no es una imagen', 'resize', {'width': 10, 'height': None})
+
+
+def test_endpoint_transforms_locally_and_memoizes(image_app, page_server):
+    page_server.routes['/foto.jpg'] = (200, {'Content-Type': 'image/jpeg', 'ETag': '"a"'}, make_image(fmt='JPEG'))
+    client = image_app.test_client()
+    payload = {'operation': 'resize', 'source_url': f'{page_server.base_url}/foto.jpg', 'params': {'width': '200'}}
+
+    with mock.patch('api.routes.advanced_image_manipulation.upstream_get', wraps=upstream_get) as get, \
+            mock.patch('api.routes.advanced_image_manipulation.run_pipeline', wraps=run_pipeline) as transform:
+        first = client.post('/api/beta_v1/image-manipulation', json=payload, headers=image_app.config['TEST_HEADERS'])
+        payload['params'] = {'width': 200}
+        second = client.post('/api/beta_v1/image-manipulation', json=payload, headers=image_app.config['TEST_HEADERS'])
+
+    assert not [call for call in get.call_args_list if 'rapidapi' in call.args[0]]
+    assert transform.call_count == 1
+    assert first.status_code == second.status_code == 200
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert first.json == second.json
+    header, encoded = first.json['urls'][0].split(',', 1)
+    assert header == 'data:image/jpeg;base64'
+    assert decode(base64.b64decode(encoded)).size == (200, 100)
+
+
+def test_pdf_to_images_stays_remote(image_app):
+    client = image_app.test_client()
+    upstream = mock.Mock(status_code=200)
+    upstream.json.return_value = {'urls': ['https://cdn.example.com/1.png']}
+    with mock.patch('api.routes.advanced_image_manipulation.upstream_get', return_value=upstream) as remote:
+        response = client.post('/api/beta_v1/image-manipulation',
+                               json={'operation': 'pdf_to_images', 'source_url': 'https://example.com/a.pdf'},
+                               headers=image_app.config['TEST_HEADERS'])
+    assert response.json == {'urls': ['https://cdn.example.com/1.png']}
+    assert '_t' not in remote.call_args.kwargs['params']
+
+
+def test_jpeg_downscale_decodes_in_draft_mode():
+    data = make_image(size=(1600, 1200), fmt='JPEG')
+    steps = normalize_steps([{'operation': 'resize', 'params': {'width': 190}}])
+    image, _ = open_image(data, steps[0])
+    assert image.size == (200, 150)  # Escala 1/8 del decodificador, no menor que lo pedido
+    assert run_pipeline(data, steps)[2:] == (190, 142)
+
+
+def test_pipeline_endpoint_chains_in_one_pass(image_app, page_server):
+    page_server.routes['/foto.jpg'] = (200, {'Content-Type': 'image/jpeg'}, make_image(size=(800, 600), fmt='JPEG'))
+    client = image_app.test_client()
+    payload = {'source_url': f'{page_server.base_url}/foto.jpg', 'operations': [
+        {'operation': 'crop', 'params': {'left': 0, 'upper': 0, 'right': 400, 'lower': 300}},
+        {'operation': 'resize', 'params': {'width': 100}},
+        {'operation': 'convert', 'params': {'convert_to': 'webp'}},
+    ]}
+
+    with mock.patch('api.routes.advanced_image_manipulation.run_pipeline', wraps=run_pipeline) as pipeline:
+        response = client.post('/api/beta_v1/image-manipulation/pipeline', json=payload, headers=image_app.config['TEST_HEADERS'])
+        again = client.post('/api/beta_v1/image-manipulation/pipeline', json=payload, headers=image_app.config['TEST_HEADERS'])
+
+    assert pipeline.call_count == 1
+    assert response.status_code == 200 and response.mimetype == 'image/webp'
+    assert (response.headers['X-Cache'], again.headers['X-Cache']) == ('MISS', 'HIT')
+    image = decode(response.data)
+    assert image.format == 'WEBP' and image.size == (100, 75)
+    assert response.headers['X-Image-Width'] == '100' and again.data == response.data
+
+    payload['operations'].append({'operation': 'rotate', 'params': {'angle': 'x'}})
+    error = client.post('/api/beta_v1/image-manipulation/pipeline', json=payload, headers=image_app.config['TEST_HEADERS'])
+    assert error.status_code == 400 and error.json['error'].startswith('Operación 4')
+
+
+def test_transform_endpoints_require_authentication(image_app):
+    client = image_app.test_client()
+    body = {'operation': 'resize', 'source_url': 'https://example.com/a.png', 'params': {'width': 10}}
+    assert client.post('/api/beta_v1/image-manipulation', json=body).status_code == 401
+    pipeline = {'source_url': body['source_url'], 'operations': [body]}
+    assert client.post('/api/beta_v1/image-manipulation/pipeline', json=pipeline).status_code == 401
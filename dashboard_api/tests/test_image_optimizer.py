@@ -0,0 +1,156 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pytest
+from flask_jwt_extended import create_access_token
+from PIL import Image, ImageFilter
+
+from api import create_app
+from api.utils import result_cache
+from api.utils.image_optimizer import OptimizeError, optimize_image
+from api.utils.process_pool import ComputeExecutor
+from config import TestingConfig
+
+
+def make_photo(size=(640, 480), fmt='JPEG', **options):
+    """Degradado con ruido suavizado: se comprime como una foto real"""
+    rng = np.random.default_rng(7)
+    noise = Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).filter(ImageFilter.GaussianBlur(2))
+    image = Image.blend(Image.linear_gradient('L').resize(size).convert('RGB'), noise, 0.4)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+@pytest.fixture
+def optimizer_app():
+    app = create_app(TestingConfig)
+    with app.app_context(), ThreadPoolExecutor(max_workers=2) as executor, \
+            mock.patch.object(result_cache, '_result_cache', None), \
+            mock.patch('api.routes.image_optimizer.get_compute_executor', return_value=ComputeExecutor(2, executor=executor)):
+        app.config['TEST_HEADERS'] = {'Authorization': f"Bearer {create_access_token(identity='1')}"}
+        yield app
+
+
+def test_jpeg_is_recompressed_within_ssim_budget():
+    exif = Image.Exif()
+    exif[0x010F] = 'Camara'  # Make
+    original = make_photo(quality=98, exif=exif.tobytes())
+    result = optimize_image(original, target_ssim=0.98)
+
+    assert result['optimized'] and result['bytes'] < len(original) * 0.6
+    assert result['ssim'] >= 0.98 and 40 <= result['quality'] < 92
+    image = decode(result['content'])
+    assert image.format == 'JPEG' and image.size == (640, 480)
+    assert image.info.get('progressive') and not image.getexif()
+
+
+def test_webp_option_and_original_kept_when_smaller():
+    webp = optimize_image(make_photo(fmt='PNG'), 'webp')
+    assert webp['content_type'] == 'image/webp' and decode(webp['content']).format == 'WEBP'
+
+    buffer = io.BytesIO()
+    Image.new('P', (32, 32)).save(buffer, format='PNG', optimize=True)
+    small = buffer.getvalue()
+    result = optimize_image(small)
+    assert not result['optimized'] and result['content'] == small
+
+    with pytest.raises(OptimizeError):
+        optimize_image(b'no es una imagen')
+
+
+def test_metadata_is_stripped_even_when_not_smaller():
+    exif = Image.Exif()
+    exif[0x8825] = {2: (40.0, 25.0, 0.0)}  # GPSInfo: GPSLatitude
+    buffer = io.BytesIO()
+    Image.new('P', (32, 32)).save(buffer, format='PNG', optimize=True, exif=exif.tobytes())
+    original = buffer.getvalue()
+    assert decode(original).getexif()
+
+    result = optimize_image(original)
+    assert result['optimized'] and result['content'] != original
+    assert not decode(result['content']).getexif()
+
+
+def test_animations_lose_their_metadata_but_keep_frames():
+    frames = [Image.new('RGB', (16, 16), color) for color in ('red', 'green', 'blue')]
+    exif = Image.Exif()
+    exif[0x8825] = {2: (40.0, 25.0, 0.0)}
+    sources = {'GIF': {'comment': b'autor y lugar'}, 'WEBP': {'exif': exif.tobytes()}}
+    for fmt, metadata in sources.items():
+        buffer = io.BytesIO()
+        frames[0].save(buffer, format=fmt, save_all=True, append_images=frames[1:], duration=[100, 200, 300],
+                       loop=0, lossless=True, **metadata)
+        original = buffer.getvalue()
+        clean = optimize_image(original)
+        assert clean['optimized'] and clean['content'] != original
+
+        image = decode(clean['content'])
+        assert image.n_frames == 3 and 'comment' not in image.info and not image.getexif()
+        durations = []
+        for index in range(3):
+            image.seek(index)
+            image.load()  # La duración de un fotograma WebP se conoce al decodificarlo
+            durations.append(image.info['duration'])
+        assert durations == [100, 200, 300]
+
+        buffer = io.BytesIO()
+        frames[0].save(buffer, format=fmt, save_all=True, append_images=frames[1:], duration=100, lossless=True)
+        assert optimize_image(buffer.getvalue())['content'] == buffer.getvalue()
+
+
+def test_endpoint_streams_and_memoizes_by_content(optimizer_app):
+    client = optimizer_app.test_client()
+    original = make_photo(quality=98)
+
+    def upload(name, **form):
+        return client.post('/api/beta_v1/image-optimize',
+                           data={'image': (io.BytesIO(original), name), **form},
+                           content_type='multipart/form-data', headers=optimizer_app.config['TEST_HEADERS'])
+
+    with mock.patch('api.routes.image_optimizer.run_optimizer', wraps=optimize_image) as engine, \
+            mock.patch('api.routes.image_optimizer.upstream_post') as upstream:
+        first = upload('foto.jpg')
+        second = upload('copia.jpeg')
+        webp = upload('foto.jpg', format='webp')
+
+    upstream.assert_not_called()
+    assert engine.call_count == 2
+    assert first.status_code == 200 and first.is_streamed
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert first.data == second.data and len(first.data) == int(first.headers['X-Optimized-Size'])
+    assert first.headers['Content-Disposition'] == 'attachment; filename=optimized_foto.jpg'
+    assert webp.mimetype == 'image/webp'
+
+    bad = upload('foto.jpg', format='bmp')
+    assert bad.status_code == 400
+
+
+def test_max_mode_relays_upstream(optimizer_app):
+    optimizer_app.config['RAPIDAPI_KEY'] = 'clave'
+    client = optimizer_app.test_client()
+    upstream = mock.Mock(status_code=200, headers={'Content-Type': 'image/jpeg'})
+    upstream.iter_content.return_value = [b'opt', b'imizada']
+
+    with mock.patch('api.routes.image_optimizer.upstream_post', return_value=upstream) as post:
+        for _ in range(2):
+            response = client.post('/api/beta_v1/image-optimize',
+                                   data={'image': (io.BytesIO(make_photo()), 'foto.jpg'), 'mode': 'max'},
+                                   content_type='multipart/form-data', headers=optimizer_app.config['TEST_HEADERS'])
+            assert response.data == b'optimizada'
+
+    assert post.call_count == 1
+    assert response.headers['X-Optimizer-Engine'] == 'rapidapi' and response.headers['X-Cache'] == 'HIT'
+
+
+def test_optimizer_requires_authentication(optimizer_app):
+    response = optimizer_app.test_client().post('/api/beta_v1/image-optimize',
+                                                data={'image': (io.BytesIO(make_photo()), 'foto.jpg')},
+                                                content_type='multipart/form-data')
+    assert response.status_code == 401
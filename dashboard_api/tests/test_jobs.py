@@ -0,0 +1,127 @@
+import io
+from unittest import mock
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from api import db
+from api.models.job import Job
+from api.models.user import User
+from api.utils import jobs
+from tests.conftest import FakeResponse
+
+
+class InlineExecutor:
+    """Ejecuta los trabajos en el mismo hilo para que las pruebas sean deterministas"""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@pytest.fixture
+def jobs_app(app_with_user, tmp_path):
+    app = app_with_user(credits=10, MODE='beta_v2', JOB_RESULTS_DIR=str(tmp_path))
+    with mock.patch.object(jobs, 'get_executor', return_value=InlineExecutor()):
+        yield app
+
+
+def auth(app, **extra):
+    return dict({'Authorization': f"Bearer {app.config['TEST_TOKEN']}"}, **extra)
+
+
+def test_async_request_returns_202_and_replays_idempotency_key(jobs_app):
+    client = jobs_app.test_client()
+    headers = auth(jobs_app, **{'Idempotency-Key': 'abc-123'})
+    upstream = FakeResponse(200, {'links': ['https://cdn.example.com/v.mp4']})
+
+    with mock.patch('api.routes.snap_video.upstream_post', return_value=upstream) as post:
+        first = client.post('/api/beta_v1/media-downloader/download?async=1', json={'url': 'https://x.com/v'}, headers=headers)
+        replay = client.post('/api/beta_v1/media-downloader/download?async=1', json={'url': 'https://x.com/v'}, headers=headers)
+
+    assert first.status_code == 202
+    assert first.headers['Location'].endswith(f"/jobs/{first.json['job_id']}")
+    assert replay.status_code == 200
+    assert replay.json['job_id'] == first.json['job_id']
+    assert post.call_count == 1
+    assert User.query.get(jobs_app.config['TEST_USER_ID']).credits == 9
+
+    status = client.get(first.json['status_url'], headers=auth(jobs_app))
+    assert status.json['status'] == Job.STATUS_SUCCEEDED
+    result = client.get(first.json['result_url'], headers=auth(jobs_app))
+    assert result.json == {'links': ['https://cdn.example.com/v.mp4']}
+
+
+def test_failed_job_refunds_credits(jobs_app):
+    client = jobs_app.test_client()
+    with mock.patch('api.routes.snap_video.upstream_post', return_value=FakeResponse(500, {'message': 'boom'})):
+        response = client.post('/api/beta_v1/media-downloader/download?async=1', json={'url': 'https://x.com/v'},
+                               headers=auth(jobs_app))
+
+    assert response.status_code == 202
+    result = client.get(response.json['result_url'], headers=auth(jobs_app))
+    assert result.status_code == 422
+    assert 'Media Downloader' in result.json['error']
+    assert User.query.get(jobs_app.config['TEST_USER_ID']).credits == 10
+
+
+def test_file_result_is_served_and_purged(jobs_app):
+    client = jobs_app.test_client()
+    image = b'II*\x00' + b'\x00' * 200
+    upstream = FakeResponse(200, content=image, headers={'content-type': 'image/tiff'})
+    data = {'pdfFile': (io.BytesIO(b'%PDF-1.4'), 'informe.pdf')}
+
+    with mock.patch('api.routes.pdf_converter.upstream_post', return_value=upstream):
+        response = client.post('/api/beta_v1/pdf-converter/to-image', data=data, content_type='multipart/form-data',
+                               headers=auth(jobs_app, Prefer='respond-async'))
+
+    assert response.status_code == 202
+    job = Job.query.get(response.json['job_id'])
+    assert job.payload['content'] == {'bytes': 8}
+
+    result = client.get(response.json['result_url'], headers=auth(jobs_app))
+    assert result.status_code == 200
+    assert result.data == image
+    assert 'informe.tifflzw' in result.headers['Content-Disposition']
+
+    # Otro usuario no puede ver el trabajo
+    other = create_access_token(identity='999')
+    assert client.get(response.json['status_url'], headers={'Authorization': f'Bearer {other}'}).status_code == 404
+
+    job.expires_at = job.completed_at
+    db.session.commit()
+    assert jobs.purge_expired_jobs() == 1
+    assert Job.query.get(response.json['job_id']) is None
+
+
+def test_stale_job_is_never_both_refunded_and_completed(jobs_app):
+    jobs_app.config['JOB_MAX_RUNTIME'] = 0
+    user_id = jobs_app.config['TEST_USER_ID']
+
+    def slow_handler(payload):
+        # El mantenimiento da el trabajo por colgado mientras sigue ejecutándose
+        assert jobs.fail_stale_jobs() == 1
+        return {'late': True}
+
+    with mock.patch.dict(jobs._handlers, {'lento': slow_handler}):
+        job, created, error = jobs.enqueue_job('lento', {}, user_id=user_id, credits=3)
+
+    db.session.expire_all()
+    job = Job.query.get(job.id)
+    assert created and error is None
+    assert job.status == Job.STATUS_FAILED and job.result is None
+    assert User.query.get(user_id).credits == 10  # Reembolsado una sola vez
+
+
+def test_idempotency_race_returns_existing_job(jobs_app):
+    user_id = jobs_app.config['TEST_USER_ID']
+    with mock.patch.dict(jobs._handlers, {'eco': lambda payload: payload}):
+        first, created, _ = jobs.enqueue_job('eco', {'n': 1}, user_id=user_id, credits=2, idempotency_key='k-1')
+        # La segunda petición no vio el trabajo en la consulta previa: el índice único la detiene
+        with mock.patch.object(jobs, '_find_idempotent_job', side_effect=[None, (first, False, None)]):
+            replay, replay_created, error = jobs.enqueue_job('eco', {'n': 1}, user_id=user_id, credits=2,
+                                                             idempotency_key='k-1')
+
+    assert created and not replay_created and error is None
+    assert replay.id == first.id
+    assert Job.query.filter_by(idempotency_key='k-1').count() == 1
+    assert User.query.get(user_id).credits == 8
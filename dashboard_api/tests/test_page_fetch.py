@@ -0,0 +1,105 @@
+import socket
+from unittest import mock
+
+import pytest
+import requests
+
+from api.utils import page_fetch, result_cache
+from api.utils.page_fetch import canonical_url, fetch_page
+
+HTML = b'<html><head><title>Cacheable</title></head><body>' + b'<p>contenido</p>' * 5000 + b'</body></html>'
+
+
+@pytest.fixture
+def fetch_app(app_with_user):
+    app = app_with_user(PAGE_FETCH_ALLOW_PRIVATE=True, PAGE_CACHE_FRESH_SECONDS=0)
+    with mock.patch.object(page_fetch, '_page_cache', None), \
+            mock.patch.object(result_cache, '_result_cache', None):
+        yield app
+
+
+def etag_route(body, content_type='text/html; charset=utf-8', etag='"v1"'):
+    def route(headers):
+        if headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+        return 200, {'Content-Type': content_type, 'ETag': etag}, body
+    return route
+
+
+def test_canonical_url():
+    assert canonical_url('HTTPS://Example.com:443/a?b=1#frag') == 'https://example.com/a?b=1'
+    assert canonical_url('example.com') == 'https://example.com/'
+    assert canonical_url('http://example.com:8080') == 'http://example.com:8080/'
+
+
+def test_revalidates_with_etag_and_serves_fresh_copies(fetch_app, page_server):
+    page_server.routes['/page'] = etag_route(HTML)
+    url = f'{page_server.base_url}/page'
+
+    first = fetch_page(url)
+    second = fetch_page(url)
+    assert (first.cache_status, second.cache_status) == ('MISS', 'REVALIDATED')
+    assert second.text == first.text and second.bytes_read == 0
+    assert page_server.requests[1][1]['If-None-Match'] == '"v1"'
+
+    fetch_app.config['PAGE_CACHE_FRESH_SECONDS'] = 60
+    fetch_page(url)  # Revalida y la copia queda fresca
+    assert fetch_page(url).cache_status == 'HIT'
+    assert len(page_server.requests) == 3
+
+
+def test_truncated_copy_is_completed_for_full_readers(fetch_app, page_server):
+    page_server.routes['/page'] = etag_route(HTML)
+    url = f'{page_server.base_url}/page'
+
+    chunks = []
+    partial = fetch_page(url, on_text=lambda text: chunks.append(text) or True)
+    assert partial.truncated and len(partial.text) < len(HTML)
+
+    # Un lector que necesita todo el texto no se conforma con la copia truncada
+    received = []
+    full = fetch_page(url, on_text=lambda text: received.append(text) and False)
+    assert not full.truncated and full.text == HTML.decode()
+    assert ''.join(received) == HTML.decode()
+
+    # Ahora la copia completa se revalida y basta con un 304
+    assert fetch_page(url).cache_status == 'REVALIDATED'
+
+
+def test_pdf_url_conversion_reuses_unchanged_download(fetch_app, page_server):
+    pdf = b'%PDF-1.4\n' + b'0' * 2048
+    page_server.routes['/doc.pdf'] = etag_route(pdf, content_type='application/pdf')
+    client = fetch_app.test_client()
+    headers = {'Authorization': f"Bearer {fetch_app.config['TEST_TOKEN']}"}
+    upstream = mock.Mock(status_code=200)
+    upstream.json.return_value = {'text': 'hola'}
+
+    with mock.patch('api.routes.pdf_converter.upstream_post', return_value=upstream) as post:
+        for _ in range(2):
+            response = client.get('/api/beta_v1/pdf-converter/to-text-url',
+                                  query_string={'pdfUrl': f'{page_server.base_url}/doc.pdf'}, headers=headers)
+            assert response.status_code == 200 and response.json == {'text': 'hola'}
+
+    assert post.call_count == 1
+    assert post.call_args.kwargs['files']['pdfFile'][1] == pdf
+    assert page_server.requests[1][1].get('If-None-Match') == '"v1"'
+
+
+def test_connects_to_the_vetted_address_without_resolving_again(fetch_app, page_server):
+    fetch_app.config['PAGE_FETCH_ALLOW_PRIVATE'] = False
+    page_server.routes['/page'] = (200, {'Content-Type': 'text/html'}, b'<p>validada</p>')
+    port = page_server.server_address[1]
+    real_getaddrinfo = socket.getaddrinfo
+
+    def rebinding(host, *args, **kwargs):
+        # Tras la validación el nombre ya apuntaría a otra dirección
+        if host == 'rebind.example':
+            raise AssertionError('el host se volvió a resolver')
+        return real_getaddrinfo(host, *args, **kwargs)
+
+    with mock.patch.object(page_fetch, 'resolve_public_address', return_value='127.0.0.1') as resolve, \
+            mock.patch('socket.getaddrinfo', side_effect=rebinding):
+        page = fetch_page(f'http://rebind.example:{port}/page')
+
+    assert resolve.call_count == 1 and page.text == '<p>validada</p>'
+    assert page_server.requests[0][1]['Host'] == f'rebind.example:{port}'
@@ -0,0 +1,96 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+from PIL import Image, ImageFilter
+
+from api import db
+from api.models.user import User
+from api.routes import picpulse
+from api.utils.image_hash import hamming, prepare_for_upload
+from api.utils.process_pool import ComputeExecutor
+
+MAX_UPLOAD = 2 * 1024 * 1024
+
+
+def make_photo(seed, size=(2400, 1800)):
+    """Foto sintética con estructura de baja frecuencia (como una foto real)"""
+    image = Image.effect_noise((64, 48), 80 + seed * 40).convert('RGB').filter(ImageFilter.GaussianBlur(3))
+    return image.resize(size, Image.Resampling.BICUBIC)
+
+
+def encode(image, fmt='PNG', **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def picpulse_app(app_with_user):
+    app = app_with_user(credits=20, MODE='beta_v2')
+    with ThreadPoolExecutor(max_workers=2) as executor, \
+            mock.patch.object(picpulse, '_analysis_cache', None), \
+            mock.patch('api.routes.picpulse.get_compute_executor', return_value=ComputeExecutor(2, executor=executor)):
+        yield app
+
+
+def test_reexported_photo_keeps_its_hashes():
+    photo = make_photo(1)
+    original = prepare_for_upload(encode(photo), 1024, MAX_UPLOAD)
+    reexport = prepare_for_upload(encode(photo.resize((1200, 900)), 'JPEG', quality=70), 1024, MAX_UPLOAD)
+    other = prepare_for_upload(encode(make_photo(2)), 1024, MAX_UPLOAD)
+
+    assert hamming(original['phash'], reexport['phash']) <= 4
+    assert hamming(original['phash'], other['phash']) > 10
+
+
+def test_oversized_images_are_downscaled_instead_of_rejected():
+    grain = Image.effect_noise((1600, 1200), 30).convert('RGB')
+    data = encode(Image.blend(make_photo(1, size=(1600, 1200)), grain, 0.3), compress_level=1)
+    assert len(data) > MAX_UPLOAD
+
+    prepared = prepare_for_upload(data, 1024, MAX_UPLOAD)
+    assert prepared['resized'] and prepared['content_type'] == 'image/jpeg'
+    assert len(prepared['content']) <= MAX_UPLOAD
+    assert Image.open(io.BytesIO(prepared['content'])).size == (1024, 768)
+
+
+def test_near_identical_uploads_reuse_the_analysis(picpulse_app):
+    client = picpulse_app.test_client()
+    headers = {'Authorization': f"Bearer {picpulse_app.config['TEST_TOKEN']}"}
+    photo = make_photo(1)
+    upstream = mock.Mock(status_code=200, text='{}')
+    upstream.json.return_value = {'combined_score': 7.5}
+
+    def analyze(data, filename, gender='Female'):
+        # Contexto propio por petición: g no se comparte entre peticiones
+        with picpulse_app.app_context():
+            return client.post('/api/beta_v1/picpulse/analyze', headers=headers, content_type='multipart/form-data',
+                               data={'image': (io.BytesIO(data), filename), 'gender': gender,
+                                     'age_group': '25-34'})
+
+    with mock.patch('api.routes.picpulse.upstream_post', return_value=upstream) as post:
+        first = analyze(encode(photo), 'foto.png')
+        second = analyze(encode(photo, 'JPEG', quality=75), 'foto-export.jpg')
+        other_audience = analyze(encode(photo), 'foto.png', gender='Male')
+
+    assert first.status_code == second.status_code == other_audience.status_code == 200
+    assert first.json['combined_score'] == second.json['combined_score'] == 7.5
+    # credits_required añade credits_info sin perder las cabeceras de la vista
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert second.json['credits_info']['deducted'] == 1
+    assert post.call_count == 2
+    filename, content, content_type = post.call_args_list[0].kwargs['files']['image']
+    assert content_type == 'image/jpeg' and len(content) <= MAX_UPLOAD
+    db.session.expire_all()
+    assert User.query.get(picpulse_app.config['TEST_USER_ID']).credits == 20 - 2 - 1 - 2
+
+
+def test_invalid_upload_is_not_charged(picpulse_app):
+    client = picpulse_app.test_client()
+    headers = {'Authorization': f"Bearer {picpulse_app.config['TEST_TOKEN']}"}
+    response = client.post('/api/beta_v1/picpulse/analyze', headers=headers, content_type='multipart/form-data',
+                           data={'image': (io.BytesIO(b'no es una imagen'), 'foto.png')})
+    assert response.status_code == 400
+    assert User.query.get(picpulse_app.config['TEST_USER_ID']).credits == 20
@@ -0,0 +1,102 @@
+import json
+from unittest import mock
+
+import pytest
+
+from api.models.user import User
+from api.utils.sse import iter_text_chunks, sse_event
+
+
+class FakeStreamResponse:
+    def __init__(self, lines=None, body=None, content_type='text/event-stream'):
+        self.status_code = 200
+        self.headers = {'Content-Type': content_type}
+        self._lines = lines or []
+        self._body = body
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self._lines
+
+    def json(self):
+        return self._body
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def chat_app(app_with_user):
+    return app_with_user(credits=5, MODE='beta_v2')
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def stream_chat(app, upstream):
+    client = app.test_client()
+    headers = {'Authorization': f"Bearer {app.config['TEST_TOKEN']}"}
+    with mock.patch('api.routes.prlabs.upstream_post', return_value=upstream) as post:
+        response = client.post('/api/beta_v1/prlabs/chat/stream', json={'prompt': 'hola'}, headers=headers)
+        body = response.get_data(as_text=True)
+    return response, body, post
+
+
+def test_relays_upstream_deltas_and_charges_at_end(chat_app):
+    upstream = FakeStreamResponse(lines=[
+        'data: {"choices": [{"delta": {"content": "Hola"}}]}',
+        '',
+        'data: {"choices": [{"delta": {"content": " mundo"}}]}',
+        'data: [DONE]',
+    ])
+    response, body, post = stream_chat(chat_app, upstream)
+
+    assert response.mimetype == 'text/event-stream'
+    assert post.call_args.kwargs['stream'] is True
+    events = parse_events(body)
+    assert events[:2] == [('token', {'content': 'Hola'}), ('token', {'content': ' mundo'})]
+    assert events[-1] == ('done', {'model': 'gpt-4', 'credits_charged': 2})
+    assert upstream.closed
+    assert User.query.get(chat_app.config['TEST_USER_ID']).credits == 3
+
+
+def test_reemits_full_completion_in_chunks(chat_app):
+    text = 'Una respuesta larga que llega completa de una vez.'
+    upstream = FakeStreamResponse(body={'result': text, 'status': True}, content_type='application/json')
+    _, body, _ = stream_chat(chat_app, upstream)
+
+    tokens = [data['content'] for event, data in parse_events(body) if event == 'token']
+    assert len(tokens) > 1
+    assert ''.join(tokens) == text
+
+
+def test_non_object_chunks_are_skipped():
+    from api.routes.prlabs import iter_chat_deltas
+
+    upstream = FakeStreamResponse(lines=[
+        'data: [1, 2]', 'data: 42', 'data: "suelto"', 'data: {"choices": ["x"]}',
+        'data: {"choices": [{"delta": "x"}]}', 'data: {"choices": [{"delta": {"content": "hola"}}]}',
+        'data: [DONE]',
+    ])
+    assert list(iter_chat_deltas(upstream)) == ['hola']
+
+
+def test_sse_helpers():
+    assert sse_event('a\nb', event='token') == 'event: token\ndata: a\ndata: b\n\n'
+    assert ''.join(iter_text_chunks('  uno dos\ntres  ', words_per_chunk=2)) == '  uno dos\ntres  '
+
+
+def test_sse_data_is_decoded_as_utf8_without_charset():
+    import io
+    import requests
+    from api.utils.sse import iter_sse_data
+
+    response = requests.Response()
+    response.headers['Content-Type'] = 'text/event-stream'
+    response.raw = io.BytesIO('data: {"t": "Diseño rápido"}\n\ndata: [DONE]\n\n'.encode('utf-8'))
+    assert [json.loads(data)['t'] for data in iter_sse_data(response)] == ['Diseño rápido']
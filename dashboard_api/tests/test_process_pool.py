@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+from api.utils.process_pool import ComputeBusyError, ComputeExecutor, ComputeTimeoutError, SharedBuffer, _run_task, get_pool_size
+
+
+def checksum(data):
+    return len(data), sum(data[::4096])
+
+
+def wait_for(event):
+    event.wait(5)
+    return 'ok'
+
+
+def test_run_returns_result_and_records_metrics():
+    compute = ComputeExecutor(2, executor=ThreadPoolExecutor(max_workers=2))
+    assert compute.run(checksum, b'abc', timeout=5) == (3, 97)
+    with pytest.raises(ZeroDivisionError):
+        compute.run(lambda: 1 / 0, name='division')
+
+    stats = compute.stats()
+    assert stats['inflight'] == 0
+    assert stats['tasks']['checksum']['completed'] == 1
+    assert stats['tasks']['division']['failed'] == 1
+    compute.shutdown()
+
+
+def test_bounded_queue_rejects_when_saturated():
+    release = threading.Event()
+    compute = ComputeExecutor(1, max_queue=1, queue_wait=0.05, executor=ThreadPoolExecutor(max_workers=1))
+    running = compute.submit(wait_for, release)
+    queued = compute.submit(wait_for, release)
+
+    with pytest.raises(ComputeBusyError) as error:
+        compute.run(wait_for, release, timeout=1)
+    assert error.value.status_code == 503
+    assert compute.stats()['tasks']['wait_for']['rejected'] == 1
+
+    release.set()
+    assert running.result(5) == queued.result(5) == 'ok'
+    assert compute.run(checksum, b'', timeout=5) == (0, 0)  # Los huecos se liberan al terminar
+    compute.shutdown()
+    with pytest.raises(ComputeBusyError):
+        compute.run(checksum, b'')
+
+
+def test_deadline_expires_in_queue_and_while_waiting():
+    with pytest.raises(ComputeTimeoutError):
+        _run_task(checksum, [b'x'], {}, time.time() - 2, time.time() - 1)
+
+    release = threading.Event()
+    compute = ComputeExecutor(1, executor=ThreadPoolExecutor(max_workers=1))
+    compute.submit(wait_for, release)
+    with pytest.raises(ComputeTimeoutError):
+        compute.run(checksum, b'x', timeout=0.05)  # Sigue en cola: se cancela sin ejecutarse
+    release.set()
+    compute.shutdown()
+    assert compute.stats()['tasks']['checksum'] == dict(
+        compute.stats()['tasks']['checksum'], completed=0, timeouts=1, cancelled=1)
+
+
+def test_large_buffers_travel_through_shared_memory():
+    compute = ComputeExecutor(1, shm_threshold=1024)
+    data = bytes(range(256)) * 64
+    blocks = []
+    assert isinstance(compute._share(data, blocks), SharedBuffer)
+    compute._release_blocks(blocks)
+
+    assert compute.run(checksum, data, timeout=30) == checksum(data)
+    assert compute.stats()['tasks']['checksum']['completed'] == 1
+    compute.shutdown()
+
+
+def spin(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+    return 'done'
+
+
+def test_running_task_is_interrupted_in_the_worker():
+    compute = ComputeExecutor(1)
+    started = time.time()
+    with pytest.raises(ComputeTimeoutError):
+        compute.run(spin, 30, timeout=0.3)
+    # El único worker queda libre enseguida en lugar de seguir 30 s con la tarea vencida
+    assert compute.run(spin, 0, timeout=5) == 'done'
+    assert time.time() - started < 5
+    compute.shutdown()
+
+
+def test_pool_size_splits_cores_between_web_workers():
+    with mock.patch('os.cpu_count', return_value=8), mock.patch('api.utils.process_pool._executor', None):
+        with mock.patch.dict('os.environ', {'WEB_CONCURRENCY': '3'}, clear=True):
+            assert get_pool_size() == 2
+        with mock.patch.dict('os.environ', {'WEB_CONCURRENCY': '16'}, clear=True):
+            assert get_pool_size() == 1
+        with mock.patch.dict('os.environ', {'WEB_CONCURRENCY': '4', 'COMPUTE_WORKERS': '6'}, clear=True):
+            assert get_pool_size() == 6
+        with mock.patch.dict('os.environ', {}, clear=True):
+            assert get_pool_size() == 8
@@ -0,0 +1,108 @@
+import base64
+import pytest
+from api.utils.qr_engine import render_qr, render_qr_response, QRRenderError, cache_info
+from api.routes.qrcode_generator import build_local_content
+
+
+def test_render_png_and_svg():
+    """El motor local genera PNG y SVG válidos."""
+    png, content_type = render_qr('https://example.com')
+    assert content_type == 'image/png'
+    assert png[:4] == b'\x89PNG'
+
+    svg, content_type = render_qr('https://example.com', {'output_format': 'svg'})
+    assert content_type == 'image/svg+xml'
+    assert b'<svg' in svg
+
+
+def test_render_is_cached_by_content_and_options():
+    """Las llamadas repetidas con el mismo contenido y opciones salen del cache."""
+    render_qr('cache-me', {'error_correction': 'H', 'margin': 2})
+    hits = cache_info()['hits']
+    render_qr('cache-me', {'error_correction': 'H', 'margin': 2})
+    assert cache_info()['hits'] == hits + 1
+
+
+def test_invalid_options_raise():
+    with pytest.raises(QRRenderError):
+        render_qr('x', {'output_format': 'gif'})
+    with pytest.raises(QRRenderError):
+        render_qr('x', {'error_correction': 'Z'})
+    with pytest.raises(QRRenderError):
+        render_qr('')
+
+
+def test_response_shape_matches_remote_provider():
+    body = render_qr_response('hola', {'output_format': 'png'})
+    assert body['provider'] == 'local'
+    assert base64.b64decode(body['image_base64'])[:4] == b'\x89PNG'
+
+
+def test_local_content_builders():
+    wifi = build_local_content('wifi', {'ssid': 'casa', 'password': 'secreto'})
+    assert wifi == 'WIFI:T:WPA;S:casa;P:secreto;H:false;;'
+    # Si sólo llega "data" se codifica tal cual (equivalente al antiguo /qr/auto)
+    assert build_local_content('email', {'data': 'a@b.com', 'output_format': 'png'}) == 'a@b.com'
+
+
+def test_batch_render_streams_zip_in_order():
+    """El lote se renderiza en orden y el ZIP se construye por fragmentos."""
+    import io
+    import zipfile
+    from concurrent.futures import ThreadPoolExecutor
+    from api.utils.qr_engine import iter_render_batch
+    from api.utils.zip_stream import iter_zip
+
+    jobs = [(i, f'item-{i}', {'output_format': 'png'}) for i in range(20)]
+    jobs.append((20, 'x' * 5000, {}))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(iter_render_batch(jobs, executor, window=4))
+
+    assert [r[0] for r in results] == list(range(21))
+    assert results[-1][3] is not None  # contenido demasiado largo
+
+    entries = ((f'{index}.png', data, False) for index, data, _, error in results if not error)
+    chunks = list(iter_zip(entries))
+    assert len(chunks) > 1
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    assert len(archive.namelist()) == 20
+
+
+def test_batch_charges_only_valid_items():
+    """Un lote rechazado no cobra y los elementos fallidos se devuelven."""
+    import io
+    import json
+    import zipfile
+    from flask_jwt_extended import create_access_token
+    from api import create_app, db
+    from api.models.user import User
+    from config import TestingConfig
+
+    app = create_app(TestingConfig)
+    app.config['MODE'] = 'beta_v2'
+    with app.app_context():
+        db.create_all()
+        user = User('lote@example.com', 'secret', 'Lote', credits=10)
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user_id))}"}
+
+    def credits():
+        with app.app_context():
+            return User.query.get(user_id).credits
+
+    # Cada petición con su propio contexto (g no se comparte entre peticiones)
+    client = app.test_client()
+    url = '/api/beta_v1/qrcode-generator/batch'
+    assert client.post(url, json={'items': []}, headers=headers).status_code == 400
+    assert client.post(url, json={'items': ['a']}, query_string={'output_format': 'gif'},
+                       headers=headers).status_code == 400
+    assert credits() == 10
+
+    response = client.post(url, json={'items': ['uno', {'type': 'fax'}, 'tres']}, headers=headers)
+    summary = json.loads(zipfile.ZipFile(io.BytesIO(response.get_data())).read('manifest.json'))
+    assert summary['failed'] == 1 and summary['credits_refunded'] == 1
+    assert credits() == 10 - 2
+    with app.app_context():
+        db.drop_all()
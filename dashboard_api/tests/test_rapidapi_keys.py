@@ -0,0 +1,115 @@
+import time
+from unittest import mock
+
+import pytest
+
+from api import create_app
+from api.utils import circuit_breaker, rapidapi_keys
+from api.utils.deadline import start_deadline
+from api.utils.rapidapi import upstream_get
+from api.utils.rapidapi_keys import RapidApiKeyPool, get_key_pool, parse_rate_limit
+from api.utils.upstream_policy import LatencyTracker
+from config import TestingConfig
+
+HOST = 'google-news13.p.rapidapi.com'
+
+
+def response(status=200, text='', **headers):
+    return mock.Mock(status_code=status, headers=headers, text=text)
+
+
+@pytest.fixture
+def pool_app():
+    app = create_app(TestingConfig)
+    app.config.update(RAPIDAPI_KEYS=['clave-uno', 'clave-dos'], RAPIDAPI_KEY='clave-uno', UPSTREAM_RETRY_ATTEMPTS=2)
+    with app.test_request_context(), mock.patch.object(rapidapi_keys, '_pool', None), \
+            mock.patch.object(circuit_breaker, '_breakers', None):
+        start_deadline(5)
+        yield app
+
+
+def test_parse_rate_limit_keeps_tightest_quota():
+    assert parse_rate_limit({
+        'X-RateLimit-Requests-Limit': '1000',
+        'X-RateLimit-Requests-Remaining': '500',
+        'X-RateLimit-Requests-Reset': '86400',
+        'X-RateLimit-rapid-free-plans-hard-limit-Remaining': '3',
+        'X-RateLimit-rapid-free-plans-hard-limit-Reset': '30',
+        'Content-Type': 'application/json',
+    }) == (3, 30)
+    assert parse_rate_limit({'Content-Type': 'application/json'}) == (None, None)
+
+
+def test_pool_balances_by_headroom_and_quarantines():
+    pool = RapidApiKeyPool(['a', 'b', 'c'], quarantine=60, forbidden_quarantine=3600)
+    picks = [pool.acquire(HOST) for _ in range(3)]
+    assert sorted(picks) == ['a', 'b', 'c']  # Sin cuota conocida: reparto por uso
+    pool.observe('a', HOST, response(**{'X-RateLimit-Requests-Remaining': '10'}))
+    pool.observe('b', HOST, response(**{'X-RateLimit-Requests-Remaining': '2'}))
+    pool.observe('c', HOST, response(**{'X-RateLimit-Requests-Remaining': '40'}))
+    assert pool.acquire(HOST) == 'c'
+
+    pool.observe('c', HOST, response(429, **{'Retry-After': '5'}))
+    pool.observe('a', HOST, response(403, text='{"message":"You are not subscribed to this API."}'))
+    assert pool.acquire(HOST) == 'b'  # Única clave sin cuarentena
+    pool.observe('b', HOST, response(429))
+    assert not pool.available(HOST)
+    assert pool.acquire(HOST) == 'c'  # La que antes sale de cuarentena
+    assert pool.acquire('otra.p.rapidapi.com') in {'a', 'b', 'c'}  # La cuarentena es por host
+
+    stats = pool.stats()
+    assert sum(entry['throttled'] for entry in stats) == 2 and sum(entry['forbidden'] for entry in stats) == 1
+
+
+def test_throttled_key_is_swapped_without_waiting(pool_app):
+    session = mock.Mock()
+    session.request.side_effect = [response(429, **{'Retry-After': '30'}), response(200)]
+    started = time.monotonic()
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        result = upstream_get(f'https://{HOST}/world', headers={'X-RapidAPI-Key': 'clave-uno', 'x-rapidapi-host': HOST})
+
+    assert result.status_code == 200 and time.monotonic() - started < 1
+    used = [call.kwargs['headers']['x-rapidapi-key'] for call in session.request.call_args_list]
+    assert sorted(used) == ['clave-dos', 'clave-uno']
+    assert all('X-RapidAPI-Key' not in call.kwargs['headers'] for call in session.request.call_args_list)
+
+    # Claves ajenas al pool no se tocan
+    session.request.side_effect = [response(200)]
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        upstream_get('https://api.example.com/v1', headers={'x-rapidapi-key': 'otra'})
+    assert session.request.call_args.kwargs['headers'] == {'x-rapidapi-key': 'otra'}
+
+
+def test_forbidden_resource_does_not_quarantine_the_key():
+    pool = RapidApiKeyPool(['a', 'b'], forbidden_quarantine=3600)
+    pool.acquire(HOST)
+    pool.observe('a', HOST, response(403, text='{"message":"Forbidden: private profile"}'))
+    pool.observe('b', HOST, response(403, text='{"message":"Invalid API key. Go to https://docs.rapidapi.com"}'))
+
+    assert [entry['quarantined_for'] for entry in pool.stats()] == [0, 3600]
+    assert [entry['forbidden'] for entry in pool.stats()] == [0, 1]
+
+
+def test_each_hedged_attempt_holds_its_own_key_slot(pool_app):
+    tracker = LatencyTracker(ratio=1, burst=1, min_samples=5)
+    for _ in range(5):
+        tracker.observe(HOST, 0.01)
+    seen = []
+
+    def respond(*args, **kwargs):
+        seen.append(sum(entry['inflight'] for entry in get_key_pool().stats()))
+        time.sleep(0.3 if len(seen) == 1 else 0)  # El primero se retrasa y gana el segundo intento
+        return response(200)
+
+    session = mock.Mock()
+    session.request.side_effect = respond
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session), \
+            mock.patch('api.utils.rapidapi.get_latency_tracker', return_value=tracker):
+        result = upstream_get(f'https://{HOST}/world', hedge=True,
+                              headers={'x-rapidapi-key': 'clave-uno', 'x-rapidapi-host': HOST})
+        assert result.status_code == 200
+        time.sleep(0.4)  # El intento perdedor termina y libera su hueco
+
+    assert seen == [1, 2]
+    [usage] = [entry for entry in get_key_pool().stats() if entry['calls']]
+    assert usage['calls'] == 2 and usage['inflight'] == 0
@@ -0,0 +1,62 @@
+from unittest import mock
+
+import pytest
+
+from api.models.user import User
+from api.utils import result_cache
+from api.utils.result_cache import TTLCache, canonical_key
+from tests.conftest import FakeResponse
+
+
+@pytest.fixture
+def cache_app(app_with_user):
+    app = app_with_user(credits=20, MODE='beta_v2')
+    with mock.patch.object(result_cache, '_result_cache', None):
+        yield app
+
+
+def search(app, client, body, query=''):
+    headers = {'Authorization': f"Bearer {app.config['TEST_TOKEN']}"}
+    return client.post(f'/api/beta_v1/perplexity/search{query}', json=body, headers=headers)
+
+
+def credits(app):
+    return User.query.get(app.config['TEST_USER_ID']).credits
+
+
+def test_identical_requests_hit_cache_with_discount(cache_app):
+    client = cache_app.test_client()
+    with mock.patch('api.routes.perplexity.upstream_post', return_value=FakeResponse(200, {'success': True, 'answer': 'respuesta'})) as post:
+        first = search(cache_app, client, {'content': 'clima en Madrid'})
+        second = search(cache_app, client, {'content': '  clima en Madrid\r\n'})
+
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.json['answer'] == 'respuesta'
+    assert second.json['credits_info'] == {'deducted': 1, 'cached': True}
+    assert post.call_count == 1
+    assert credits(cache_app) == 20 - 3 - 1
+
+
+def test_bypass_calls_upstream_again(cache_app):
+    client = cache_app.test_client()
+    with mock.patch('api.routes.perplexity.upstream_post', return_value=FakeResponse(200, {'success': True, 'answer': 'respuesta'})) as post:
+        search(cache_app, client, {'content': 'noticias'})
+        bypass = search(cache_app, client, {'content': 'noticias'}, query='?cache=bypass')
+
+    assert bypass.headers['X-Cache'] == 'BYPASS'
+    assert post.call_count == 2
+    assert credits(cache_app) == 20 - 3 - 3
+
+
+def test_ttl_cache_is_bounded_and_keys_are_canonical():
+    cache = TTLCache(max_entries=10, max_bytes=10)
+    cache.set('a', 'x' * 6, ttl=60, size=6)
+    cache.set('b', 'y' * 6, ttl=60, size=6)
+    assert cache.get('a') is None
+    assert cache.get('b') == 'yyyyyy'
+    cache.set('c', 'z', ttl=0)
+    assert cache.get('c') is None
+
+    assert canonical_key('t', {'b': 1, 'a': ' hola ', 'cache': 'bypass'}) == canonical_key('t', {'a': 'hola', 'b': 1})
+    assert canonical_key('t', {'a': 'hola'}) != canonical_key('otra', {'a': 'hola'})
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from api import db
+from api.models.job import Job
+from api.utils import runway_jobs
+from tests.conftest import FakeResponse
+
+
+@pytest.fixture
+def jobs_app(app_with_user):
+    return app_with_user(PUBLIC_API_URL='https://api.example.com')
+
+
+def submit(client, app):
+    headers = {'Authorization': f"Bearer {app.config['TEST_TOKEN']}"}
+    payload = {'operation': 'generate_by_text', 'text_prompt': 'gato', 'model': 'gen3', 'width': 1280,
+               'height': 768, 'motion': 5, 'seed': 1, 'time': 5}
+    upstream = FakeResponse(200, {'uuid': 'task-1', 'status': 'Task is in queue'})
+    with mock.patch('api.utils.runway_jobs.upstream_post', return_value=upstream) as post:
+        response = client.post('/api/beta_v1/runwayml/process', json=payload, headers=headers)
+    return response, post, headers
+
+
+def test_process_creates_job_with_callback(jobs_app):
+    client = jobs_app.test_client()
+    response, post, headers = submit(client, jobs_app)
+
+    assert response.status_code == 200
+    job = Job.query.get(response.json['job_id'])
+    assert job.status == Job.STATUS_RUNNING
+    assert post.call_args.kwargs['json']['callback_url'].endswith(f'/runwayml/callback/{job.callback_token}')
+
+    # El estado se sirve desde la DB, sin llamar al proveedor
+    with mock.patch('api.routes.runwayml.upstream_get') as get:
+        status = client.get('/api/beta_v1/runwayml/status/task-1', headers=headers)
+    assert status.json['status'] == 'Task is in queue'
+    get.assert_not_called()
+
+
+def test_poller_backs_off_and_webhook_completes(jobs_app):
+    client = jobs_app.test_client()
+    response, _, headers = submit(client, jobs_app)
+    job = Job.query.get(response.json['job_id'])
+    job.next_poll_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    with mock.patch('api.utils.runway_jobs.upstream_get', return_value=FakeResponse(200, {'status': 'processing'})):
+        assert runway_jobs.poll_due_jobs() == 1
+    assert job.attempts == 1
+    assert job.next_poll_at > datetime.utcnow()
+    # Nada vence hasta la siguiente ventana de backoff
+    assert runway_jobs.poll_due_jobs() == 0
+
+    callback = client.post(f'/api/beta_v1/runwayml/callback/{job.callback_token}',
+                           json={'status': 'success', 'video_url': 'https://cdn.example.com/v.mp4'})
+    assert callback.json['status'] == Job.STATUS_SUCCEEDED
+
+    result = client.get('/api/beta_v1/runwayml/result/task-1', headers=headers)
+    assert result.json['video_url'] == 'https://cdn.example.com/v.mp4'
+    assert client.get(f'/api/beta_v1/runwayml/jobs/{job.id}', headers=headers).json['status'] == 'succeeded'
+
+
+def test_unknown_callback_token(jobs_app):
+    response = jobs_app.test_client().post('/api/beta_v1/runwayml/callback/nope', json={'status': 'success'})
+    assert response.status_code == 404
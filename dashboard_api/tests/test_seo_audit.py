@@ -0,0 +1,76 @@
+import os
+from unittest import mock
+
+import pytest
+import requests
+
+from api.utils.page_fetch import PageFetchError, fetch_page
+from api.utils.seo_audit import audit_url
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def audit_app(app_with_user):
+    return app_with_user(PAGE_FETCH_ALLOW_PRIVATE=True)
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def test_audit_extracts_onpage_signals(audit_app, page_server):
+    page_server.routes['/zapatillas'] = (200, {'Content-Type': 'text/html; charset=utf-8'}, read_fixture('seo_page.html'))
+    result = audit_url(f'{page_server.base_url}/zapatillas')
+    onpage = result['onpage']
+
+    assert onpage['title'] == 'Zapatillas de running | Tienda Ejemplo'
+    assert onpage['metaRobots'] == 'index, follow'
+    assert onpage['canonical'] == f'{page_server.base_url}/zapatillas'
+    assert onpage['lang'] == 'es' and onpage['hreflang'] == 1
+    assert onpage['headings'] == {'h1': ['Zapatillas de running'], 'h1Count': 1, 'h2Count': 2, 'h3Count': 0}
+    assert onpage['images'] == {'count': 3, 'withoutAlt': 2, 'withoutAltSamples': ['/img/b.jpg', '/img/c.jpg']}
+    assert onpage['links'] == {'internal': 1, 'external': 1, 'nofollow': 1}
+    assert onpage['openGraph'] == {'og:title': 'Zapatillas de running'}
+
+    codes = {issue['code'] for issue in result['issues']}
+    assert codes == {'no_https', 'images_without_alt'}
+    assert result['score'] == 100 - 20 - 4
+    assert result['http_status'] == 200 and result['engine'] == 'local'
+
+
+def test_audit_stops_reading_after_body_budget(audit_app, page_server):
+    audit_app.config['SEO_AUDIT_BODY_BUDGET'] = 4096
+    body = b'<html><head><title>Grande</title></head><body>' + b'<p>texto de relleno</p>' * 200000 + b'</body></html>'
+    page_server.routes['/grande'] = (200, {'Content-Type': 'text/html'}, body)
+
+    result = audit_url(f'{page_server.base_url}/grande')
+
+    assert result['onpage']['title'] == 'Grande'
+    assert result['content_size']['bytes'] == len(body)  # Tamaño real según Content-Length
+    page = fetch_page(f'{page_server.base_url}/grande', on_text=lambda text: True)
+    assert page.truncated and page.bytes_read < 64 * 1024
+
+
+def test_private_addresses_are_rejected(audit_app):
+    audit_app.config['PAGE_FETCH_ALLOW_PRIVATE'] = False
+    with pytest.raises(PageFetchError) as error:
+        fetch_page('http://127.0.0.1:9/')
+    assert error.value.status_code == 400
+
+
+def test_analyze_endpoint_uses_local_audit(audit_app, page_server):
+    page_server.routes['/'] = (200, {'Content-Type': 'text/html'}, read_fixture('seo_page.html'))
+    client = audit_app.test_client()
+    headers = {'Authorization': f"Bearer {audit_app.config['TEST_TOKEN']}"}
+
+    with mock.patch('api.utils.page_fetch.requests.get', wraps=requests.get) as get, \
+            mock.patch('api.routes.seo_analyzer.upstream_get') as upstream:
+        response = client.post('/api/beta_v1/seo-analyzer/analyze', json={'url': page_server.base_url}, headers=headers)
+
+    upstream.assert_not_called()
+    assert [call.args[0] for call in get.call_args_list] == [page_server.base_url]
+    assert response.status_code == 200
+    assert response.json['onpage']['title'] == 'Zapatillas de running | Tienda Ejemplo'
+    assert set(response.json) >= {'url', 'http_status', 'using_https', 'content_size', 'headers', 'score'}
@@ -0,0 +1,126 @@
+import threading
+import time
+from unittest import mock
+
+import pytest
+from flask import current_app, g
+
+from api import db
+from api.models.user import User
+from api.utils import result_cache
+from api.utils.text_chunks import chunk_document, process_chunks, reassemble
+from tests.conftest import FakeResponse
+
+CODE = "```python\ndef f():\n\n    return 1\n```\n\n"
+
+
+def long_document(paragraphs=20, sentences=20):
+    body = []
+    for p in range(paragraphs):
+        body.append(' '.join(f'Oración {p}-{s} con algunas palabras más.' for s in range(sentences)))
+    return '# Informe\n\n' + '\n\n'.join(body[:3]) + '\n\n' + CODE + '\n\n'.join(body[3:]) + '\n'
+
+
+def test_chunks_respect_limits_and_keep_code_blocks():
+    doc = long_document()
+    chunks = chunk_document(doc, max_words=150, skip_code=True, skip_markdown=True)
+
+    assert ''.join(text for text, _ in chunks) == doc
+    assert (CODE, False) in chunks
+    assert chunks[0] == ('# Informe\n\n', False)
+    assert all(len(text.split()) <= 150 for text, process in chunks if process)
+
+    results = process_chunks(chunks, str.upper, max_workers=3)
+    output = reassemble(results)
+    assert CODE in output
+    assert 'ORACIÓN 19-19 CON ALGUNAS PALABRAS MÁS.\n' in output
+
+
+@pytest.fixture
+def humanizer_app(app_with_user):
+    return app_with_user(HUMANIZER_CHUNK_WORDS=300)
+
+
+def test_long_document_is_humanized_in_order_with_retry(humanizer_app):
+    doc = long_document()
+    lock = threading.Lock()
+    failed = []
+
+    def fake_post(url, json, headers, timeout):
+        with lock:
+            if not failed:
+                failed.append(json['text'])
+                return FakeResponse(503, {'message': 'busy'})
+        return FakeResponse(200, {'humanized_text': json['text'].upper()})
+
+    client = humanizer_app.test_client()
+    headers = {'Authorization': f"Bearer {humanizer_app.config['TEST_TOKEN']}"}
+    with mock.patch('api.routes.ai_humanizer.upstream_post', side_effect=fake_post) as post, \
+            mock.patch('api.utils.text_chunks.time.sleep'):
+        response = client.post('/api/beta_v1/ai-humanizer/', json={'text': doc, 'type': 'article'}, headers=headers)
+
+    assert response.status_code == 200
+    fragments = response.json['metadatos']['fragmentos']
+    assert fragments > 1
+    assert post.call_count == fragments + 1
+    generated = response.json['contenido_generado']
+    assert generated.startswith('# Informe\n\nORACIÓN 0-0')
+    assert CODE in generated
+    assert generated.index('ORACIÓN 5-0') < generated.index('ORACIÓN 6-0')
+
+
+def test_long_document_is_charged_per_upstream_call(humanizer_app):
+    humanizer_app.config.update(MODE='beta_v2', RESULT_CACHE_ENABLED=False)
+    user = User.query.get(humanizer_app.config['TEST_USER_ID'])
+    user.credits = 100
+    db.session.commit()
+    client = humanizer_app.test_client()
+    headers = {'Authorization': f"Bearer {humanizer_app.config['TEST_TOKEN']}"}
+
+    def fake_post(url, json, headers, timeout):
+        return FakeResponse(200, {'humanized_text': json['text']})
+
+    humanizer_app.config['HUMANIZER_MAX_WORDS'] = 10
+    with mock.patch('api.routes.ai_humanizer.upstream_post', side_effect=fake_post) as post:
+        rejected = client.post('/api/beta_v1/ai-humanizer/', json={'text': long_document()}, headers=headers)
+        assert rejected.status_code == 400 and post.call_count == 0
+        humanizer_app.config['HUMANIZER_MAX_WORDS'] = 20000
+        response = client.post('/api/beta_v1/ai-humanizer/', json={'text': long_document(), 'type': 'article'},
+                               headers=headers)
+
+    assert response.status_code == 200
+    assert response.json['credits_info']['deducted'] == 2 * post.call_count
+    db.session.expire_all()
+    assert User.query.get(user.id).credits == 100 - 2 * post.call_count
+
+
+def test_process_chunks_stops_waiting_at_the_deadline():
+    chunks = [('uno ', True), ('dos ', True)]
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        process_chunks(chunks, lambda text: time.sleep(0.5), max_workers=2, retries=0,
+                       deadline=time.monotonic() + 0.05)
+    assert time.monotonic() - started < 0.4
+
+
+def test_chunks_run_with_app_context_and_request_deadline(humanizer_app):
+    humanizer_app.config.update(MODE='beta_v2', RESULT_CACHE_ENABLED=True)
+    client = humanizer_app.test_client()
+    headers = {'Authorization': f"Bearer {humanizer_app.config['TEST_TOKEN']}"}
+    seen = []
+
+    def fake_post(url, json, headers, timeout):
+        seen.append((g.get('deadline'), current_app.config['HUMANIZER_CHUNK_WORDS']))
+        return FakeResponse(200, {'humanized_text': json['text']})
+
+    payload = {'text': long_document(), 'type': 'article'}
+    with mock.patch.object(result_cache, '_result_cache', None), \
+            mock.patch('api.routes.ai_humanizer.upstream_post', side_effect=fake_post) as post:
+        first = client.post('/api/beta_v1/ai-humanizer/', json=payload, headers=headers)
+        second = client.post('/api/beta_v1/ai-humanizer/', json=payload, headers=headers)
+
+    assert first.status_code == 200 and second.headers['X-Cache'] == 'HIT'
+    assert all(deadline is not None and words == 300 for deadline, words in seen)
+    # El acierto cuesta la mitad de lo que costó la petición completa (2 créditos por fragmento)
+    assert first.json['credits_info']['deducted'] == 2 * post.call_count
+    assert second.json['credits_info'] == {'deducted': post.call_count, 'cached': True}
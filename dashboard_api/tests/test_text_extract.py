@@ -0,0 +1,77 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+import requests
+
+from api.utils import page_fetch
+from api.utils.readability import ExtractionError, extract_content
+from api.utils.process_pool import ComputeExecutor
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def extract_app(app_with_user):
+    app = app_with_user(PAGE_FETCH_ALLOW_PRIVATE=True)
+    with ThreadPoolExecutor(max_workers=2) as executor, \
+            mock.patch.object(page_fetch, '_page_cache', None), \
+            mock.patch('api.utils.readability.get_compute_executor', return_value=ComputeExecutor(2, executor=executor)):
+        yield app
+
+
+def test_extracts_main_content_without_boilerplate():
+    result = extract_content(read_fixture('article_page.html').decode('utf-8'), 'https://example.com/maraton')
+
+    assert result['title'] == 'Cómo entrenar para tu primer maratón'
+    assert result['author'] == 'Laura Méndez' and result['lang'] == 'es'
+    assert result['text'].startswith('Cómo entrenar para tu primer maratón\n\nPreparar un maratón')
+    assert 'El descanso también entrena.' in result['text']
+    for boilerplate in ('Tienda', 'zapatillas de la temporada', 'Muy buen artículo', 'derechos', 'tracking'):
+        assert boilerplate not in result['text']
+    assert result['paragraphs'] == 6
+    assert result['wordCount'] == len(result['text'].split())
+
+
+def test_pages_without_content_are_rejected():
+    with pytest.raises(ExtractionError):
+        extract_content('<html><body><nav><a href="/">Inicio</a></nav><p>Hola</p></body></html>')
+
+
+def test_endpoint_extracts_locally(extract_app, page_server):
+    page_server.routes['/maraton'] = (200, {'Content-Type': 'text/html; charset=utf-8'}, read_fixture('article_page.html'))
+    client = extract_app.test_client()
+    headers = {'Authorization': f"Bearer {extract_app.config['TEST_TOKEN']}"}
+
+    with mock.patch('api.utils.page_fetch.requests.get', wraps=requests.get) as get, \
+            mock.patch('api.routes.text_extract.upstream_get') as upstream:
+        response = client.post('/api/beta_v1/text-extract/extract', json={'url': f'{page_server.base_url}/maraton'},
+                               headers=headers)
+
+    upstream.assert_not_called()
+    assert response.status_code == 200
+    assert response.json['engine'] == 'local'
+    assert response.json['title'] == 'Cómo entrenar para tu primer maratón'
+    assert [call.args[0] for call in get.call_args_list] == [f'{page_server.base_url}/maraton']
+
+
+def test_endpoint_falls_back_to_upstream(extract_app, page_server):
+    page_server.routes['/vacia'] = (200, {'Content-Type': 'text/html'}, b'<html><body><p>Hola</p></body></html>')
+    client = extract_app.test_client()
+    headers = {'Authorization': f"Bearer {extract_app.config['TEST_TOKEN']}"}
+    upstream = mock.Mock(status_code=200, text='Texto remoto\n\nSegundo párrafo')
+    upstream.json.side_effect = ValueError
+
+    with mock.patch('api.routes.text_extract.upstream_get', return_value=upstream):
+        response = client.post('/api/beta_v1/text-extract/extract', json={'url': f'{page_server.base_url}/vacia'},
+                               headers=headers)
+
+    assert response.status_code == 200
+    assert response.json['engine'] == 'rapidapi'
+    assert response.json['text'] == 'Texto remoto\n\nSegundo párrafo' and response.json['paragraphs'] == 2
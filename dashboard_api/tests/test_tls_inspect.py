@@ -0,0 +1,227 @@
+import os
+import socket
+import ssl
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from api import create_app, db
+from api.models.notification import Notification
+from api.models.ssl_watch import SSLWatch
+from api.models.user import User
+from api.utils.ssl_watch import scan_due_watches
+from api.utils.tls_inspect import TLSTargetError, inspect_certificate, inspect_many, parse_target
+from config import TestingConfig
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def tls_server():
+    """Servidor TLS local con un certificado autofirmado"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(os.path.join(FIXTURES, 'selfsigned.crt'), os.path.join(FIXTURES, 'selfsigned.key'))
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+    listener.settimeout(0.2)
+    stop = threading.Event()
+    handshakes = []
+
+    def serve():
+        while not stop.is_set():
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                continue
+            try:
+                with context.wrap_socket(conn, server_side=True) as tls:
+                    handshakes.append(tls.version())
+            except (ssl.SSLError, OSError):
+                pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield listener.getsockname()[1], handshakes
+    stop.set()
+    thread.join()
+    listener.close()
+
+
+def test_parse_target():
+    assert parse_target('https://Example.com:8443/path') == ('example.com', 8443)
+    assert parse_target('example.com', 993) == ('example.com', 993)
+    assert parse_target('example.com') == ('example.com', 443)
+    assert parse_target('') == (None, None)
+
+
+def test_inspect_self_signed_certificate(tls_server):
+    port, _ = tls_server
+    result = inspect_certificate('127.0.0.1', port, timeout=5, allow_private=True, allowed_ports=None)
+
+    assert result['issuer'] == 'Orchestra Test CA'
+    assert result['isValid'] is False and result['isExpired'] is False
+    assert result['daysLeft'] > 30000 and result['lifespan'] == 36500
+    assert result['port'] == port and result['domain'] == '127.0.0.1'
+    assert 'self' in result['message'].lower()
+
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    outcomes = {target: (result, error) for target, result, error in
+                inspect_many([('127.0.0.1', port), ('127.0.0.1', closed_port)], timeout=2,
+                                 allow_private=True, allowed_ports=None)}
+    assert outcomes[('127.0.0.1', port)][0]['issuer'] == 'Orchestra Test CA'
+    assert outcomes[('127.0.0.1', closed_port)][1]
+
+
+def test_check_endpoint_uses_local_handshake_and_caches(tls_server):
+    port, handshakes = tls_server
+    app = create_app(TestingConfig)
+    app.config.update(SSL_CHECKER_ALLOW_PRIVATE=True, SSL_CHECKER_PORTS=None)
+    with app.app_context():
+        db.create_all()
+        user = User('tls@example.com', 'secret', 'TLS')
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+        body = {'domain': '127.0.0.1', 'port': port, 'timeout': 5}
+
+        with mock.patch('api.routes.ssl_checker.upstream_get') as upstream:
+            first = client.post('/api/beta_v1/ssl-checker/check', json=body, headers=headers)
+            count = len(handshakes)
+            second = client.post('/api/beta_v1/ssl-checker/check', json=body, headers=headers)
+
+        assert upstream.call_count == 0
+        assert first.status_code == 200 and first.headers['X-Cache'] == 'MISS'
+        assert first.json['data']['issuer'] == 'Orchestra Test CA'
+        assert second.headers['X-Cache'] == 'HIT' and len(handshakes) == count
+        db.session.remove()
+        db.drop_all()
+
+
+def test_www_and_bare_host_are_checked_separately():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        user = User('tls@example.com', 'secret', 'TLS')
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+
+        def inspect(host, port, timeout, **policy):
+            return {'domain': host, 'port': port, 'issuer': f'CA de {host}'}
+
+        with mock.patch('api.routes.ssl_checker.inspect_certificate', side_effect=inspect) as local:
+            bare = client.post('/api/beta_v1/ssl-checker/check', json={'domain': 'example.com'}, headers=headers)
+            www = client.post('/api/beta_v1/ssl-checker/check', json={'domain': 'www.example.com'}, headers=headers)
+
+        assert local.call_count == 2
+        assert bare.json['data']['issuer'] == 'CA de example.com'
+        assert www.headers['X-Cache'] == 'MISS' and www.json['data']['issuer'] == 'CA de www.example.com'
+        db.session.remove()
+        db.drop_all()
+
+
+def test_watchlist_scan_notifies_once_per_threshold(tls_server):
+    port, handshakes = tls_server
+    app = create_app(TestingConfig)
+    app.config.update(SSL_WATCH_THRESHOLDS=[40000, 30], SSL_WATCH_JITTER=0, SSL_CHECKER_TIMEOUT=2,
+                      SSL_CHECKER_ALLOW_PRIVATE=True, SSL_CHECKER_PORTS=None)
+    with app.app_context():
+        db.create_all()
+        users = [User(f'watch{i}@example.com', 'secret', 'Watch') for i in range(2)]
+        db.session.add_all(users)
+        db.session.commit()
+        client = app.test_client()
+        for user in users:
+            headers = {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+            added = client.post('/api/beta_v1/ssl-checker/watchlist',
+                                json={'domains': [f'127.0.0.1:{port}', '127.0.0.1:1', 'nope:99999']}, headers=headers)
+            assert added.status_code == 201 and added.json['added'] == 2 and added.json['invalid'] == ['nope:99999']
+
+        summary = scan_due_watches(app.config)
+        assert summary == {'scanned': 4, 'targets': 2, 'errors': 1, 'notifications': 2}
+        assert len(handshakes) == 1  # Un solo handshake para los dos usuarios
+
+        notes = Notification.query.all()
+        assert {note.user_id for note in notes} == {user.id for user in users}
+        assert all(note.type == 'warning' and f'127.0.0.1:{port}' in note.message for note in notes)
+
+        watchlist = client.get('/api/beta_v1/ssl-checker/watchlist', headers=headers).json['watchlist']
+        assert watchlist[0]['daysLeft'] > 30000 and watchlist[0]['issuer'] == 'Orchestra Test CA'
+        assert watchlist[1]['lastError']
+
+        # Un nuevo escaneo sin cruzar otro umbral no repite el aviso
+        SSLWatch.query.update({SSLWatch.next_check_at: datetime.utcnow() - timedelta(minutes=1)})
+        db.session.commit()
+        assert scan_due_watches(app.config)['notifications'] == 0
+        assert scan_due_watches(app.config)['scanned'] == 0
+        db.session.remove()
+        db.drop_all()
+
+
+def test_internal_targets_and_unusual_ports_are_rejected(tls_server):
+    port, handshakes = tls_server
+    with pytest.raises(TLSTargetError):
+        inspect_certificate('127.0.0.1', 443)
+    with pytest.raises(TLSTargetError):
+        inspect_certificate('example.com', 22)
+    assert not handshakes
+
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        user = User('ssrf@example.com', 'secret', 'SSRF')
+        db.session.add(user)
+        db.session.commit()
+        client = app.test_client()
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+        with mock.patch('api.routes.ssl_checker.upstream_get') as upstream:
+            internal = client.post('/api/beta_v1/ssl-checker/check', json={'domain': 'localhost'}, headers=headers)
+            scan = client.post('/api/beta_v1/ssl-checker/check', json={'domain': 'example.com', 'port': 6379},
+                               headers=headers)
+        assert internal.status_code == 400 and scan.status_code == 400
+        assert upstream.call_count == 0
+        db.session.remove()
+        db.drop_all()
+
+
+def test_watchlist_rejects_internal_targets():
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        user = User('vigia@example.com', 'secret', 'Vigia')
+        db.session.add(user)
+        db.session.commit()
+        headers = {'Authorization': f"Bearer {create_access_token(identity=str(user.id))}"}
+        addresses = {'localhost': '127.0.0.1', '10.0.0.5': '10.0.0.5', 'example.com': '93.184.215.14'}
+
+        def resolve(host, port, **kwargs):
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (addresses[host], port))]
+
+        with mock.patch('api.utils.tls_inspect.socket.getaddrinfo', side_effect=resolve):
+            added = app.test_client().post('/api/beta_v1/ssl-checker/watchlist', headers=headers,
+                                           json={'domains': ['localhost', '10.0.0.5', 'example.com:22', 'example.com']})
+
+        assert added.status_code == 201 and added.json['added'] == 1
+        assert [entry['domain'] for entry in added.json['rejected']] == ['localhost:443', '10.0.0.5:443', 'example.com:22']
+        assert [watch.host for watch in SSLWatch.query.all()] == ['example.com']
+
+        # El escaneo vuelve a comprobar el destino: si el DNS pasa a una red interna no hay handshake
+        SSLWatch.query.update({SSLWatch.next_check_at: datetime.utcnow() - timedelta(minutes=1)})
+        db.session.commit()
+        with mock.patch('api.utils.tls_inspect.socket.getaddrinfo',
+                        return_value=[(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.168.1.10', 443))]), \
+                mock.patch('api.utils.tls_inspect.socket.create_connection') as connect:
+            assert scan_due_watches(app.config)['errors'] == 1
+        assert connect.call_count == 0
+        assert 'no pública' in SSLWatch.query.first().last_error
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,87 @@
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+import requests
+
+from api import create_app
+from api.utils import circuit_breaker
+from api.utils.deadline import start_deadline
+from api.utils.rapidapi import upstream_get, upstream_request
+from api.utils.upstream_policy import LatencyTracker, RetryPolicy, parse_retry_after
+from config import TestingConfig
+
+URL = 'https://whois.p.rapidapi.com/domain'
+
+
+def reply(status, delay=0, headers=None):
+    def respond(*args, **kwargs):
+        time.sleep(delay)
+        return mock.Mock(status_code=status, headers=headers or {})
+    return respond
+
+
+@pytest.fixture
+def policy_app():
+    app = create_app(TestingConfig)
+    app.config.update(UPSTREAM_RETRY_ATTEMPTS=3, UPSTREAM_RETRY_BASE_DELAY=0.01)
+    with app.test_request_context(), mock.patch.object(circuit_breaker, '_breakers', None):
+        start_deadline(5)
+        yield app
+
+
+def test_retry_policy_decisions():
+    policy = RetryPolicy(attempts=3, base_delay=0.1)
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert parse_retry_after('2') == 2 and 28 < parse_retry_after(later) <= 30 and parse_retry_after('x') is None
+
+    assert 2 <= policy.next_delay('GET', 0, mock.Mock(status_code=429, headers={'Retry-After': '2'})) <= 2.1
+    assert 0 <= policy.next_delay('GET', 1, mock.Mock(status_code=503, headers={})) <= 0.2
+    assert policy.next_delay('GET', 2, mock.Mock(status_code=503, headers={})) is None  # Último intento
+    assert policy.next_delay('GET', 0, mock.Mock(status_code=429, headers={'Retry-After': '60'})) is None
+    assert policy.next_delay('GET', 0, mock.Mock(status_code=404, headers={})) is None
+    assert policy.next_delay('POST', 0, mock.Mock(status_code=500, headers={})) is None  # No idempotente
+    assert policy.next_delay('POST', 0, mock.Mock(status_code=429, headers={})) is not None
+    assert policy.next_delay('GET', 0, error=requests.exceptions.ConnectionError()) is not None
+    assert policy.next_delay('POST', 0, error=requests.exceptions.ReadTimeout()) is None
+
+
+def test_retries_until_success_within_budget(policy_app):
+    session = mock.Mock()
+    session.request.side_effect = [reply(503)(), reply(200)()]
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        assert upstream_get(URL).status_code == 200
+    assert session.request.call_count == 2
+
+    # Un Retry-After que no cabe en el plazo no se espera: se devuelve el 429
+    start_deadline(1)
+    session.request.side_effect = reply(429, headers={'Retry-After': '3'})
+    started = time.monotonic()
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session):
+        assert upstream_request('GET', URL).status_code == 429
+    assert time.monotonic() - started < 0.5 and session.request.call_count == 3
+
+
+def test_hedged_get_takes_first_answer_within_budget(policy_app):
+    tracker = LatencyTracker(ratio=0.5, burst=1, min_samples=5)
+    for _ in range(5):
+        tracker.observe('whois.p.rapidapi.com', 0.01)
+    tracker.earn('whois.p.rapidapi.com')  # Media ficha ahorrada: con la de esta petición alcanza para una
+    session = mock.Mock()
+    answers = iter([reply(201, delay=0.5), reply(200), reply(202, delay=0.3)])
+    session.request.side_effect = lambda *args, **kwargs: next(answers)(*args, **kwargs)
+
+    with mock.patch('api.utils.rapidapi.get_upstream_session', return_value=session), \
+            mock.patch('api.utils.rapidapi.get_latency_tracker', return_value=tracker):
+        started = time.monotonic()
+        first = upstream_get(URL, hedge=True)
+        hedged_in = time.monotonic() - started
+        second = upstream_get(URL, hedge=True)  # Sin fichas: no hay segundo intento
+
+    assert first.status_code == 200 and hedged_in < 0.3
+    assert second.status_code == 202
+    assert session.request.call_count == 3
+    assert tracker.stats()['whois.p.rapidapi.com'] == dict(tracker.stats()['whois.p.rapidapi.com'],
+                                                           hedged=1, hedge_wins=1)